@@ -0,0 +1,99 @@
+"""
+FakeCanvas - Headless stand-in for the Tk canvas used by the benchmarks
+"""
+
+
+class FakeCanvas:
+    """Records canvas items in memory with the parts of the Tk canvas API the app uses."""
+
+    def __init__(self, width=1200, height=800):
+        """Initialize an empty canvas of the given size."""
+        self.width = width
+        self.height = height
+        self.items = {}
+        self.next_id = 1
+
+    def _create(self, kind, coords, options):
+        """Store a new item and return its id."""
+        tags = options.get('tags', ())
+        if isinstance(tags, str):
+            tags = (tags,)
+        item = self.next_id
+        self.next_id += 1
+        self.items[item] = [kind, list(coords), set(tags)]
+        return item
+
+    def __getattr__(self, name):
+        """Provide create_line, create_oval, create_text and the other item factories."""
+        if name.startswith("create_"):
+            kind = name[len("create_"):]
+            return lambda *coords, **options: self._create(kind, coords, options)
+        raise AttributeError(name)
+
+    def bind(self, sequence, callback):
+        """Accept an event binding."""
+
+    def winfo_width(self):
+        """Return the canvas width."""
+        return self.width
+
+    def winfo_height(self):
+        """Return the canvas height."""
+        return self.height
+
+    def _matching(self, tag_or_id):
+        """Return the ids of the items with a tag or id."""
+        if tag_or_id == "all":
+            return list(self.items)
+        if isinstance(tag_or_id, int):
+            return [tag_or_id] if tag_or_id in self.items else []
+        return [item for item, (_, _, tags) in self.items.items() if tag_or_id in tags]
+
+    def delete(self, tag_or_id):
+        """Delete the items with a tag or id."""
+        if tag_or_id == "all":
+            self.items.clear()
+            return
+        for item in self._matching(tag_or_id):
+            del self.items[item]
+
+    def move(self, tag_or_id, dx, dy):
+        """Move the items with a tag or id."""
+        for item in self._matching(tag_or_id):
+            coords = self.items[item][1]
+            for i in range(0, len(coords) - 1, 2):
+                coords[i] += dx
+                coords[i + 1] += dy
+
+    def bbox(self, tag_or_id):
+        """Return the bounding box of the items with a tag or id."""
+        xs, ys = [], []
+        for item in self._matching(tag_or_id):
+            coords = self.items[item][1]
+            xs += coords[0::2]
+            ys += coords[1::2]
+        if not xs:
+            return None
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def itemconfig(self, tag_or_id, **options):
+        """Accept item option changes."""
+
+    def coords(self, tag_or_id, *coords):
+        """Set the coordinates of the first item with a tag or id."""
+        items = self._matching(tag_or_id)
+        if items:
+            self.items[items[0]][1] = list(coords)
+
+    def addtag(self, new_tag, how, tag_or_id):
+        """Add a tag to the items with a tag or id (only the 'withtag' form)."""
+        for item in self._matching(tag_or_id):
+            self.items[item][2].add(new_tag)
+
+    def dtag(self, tag_or_id, tag=None):
+        """Remove a tag (by default tag_or_id itself) from the items with a tag or id."""
+        for item in self._matching(tag_or_id):
+            self.items[item][2].discard(tag_or_id if tag is None else tag)
+
+    def focus_set(self):
+        """Accept keyboard focus."""
@@ -0,0 +1,253 @@
+"""
+Benchmark runner - Times the model, generator, canvas and export paths on synthetic diagrams
+
+Run from the application directory:
+
+    python benchmarks/run_benchmarks.py --sizes 10,100,1000 --output results.json
+    python benchmarks/run_benchmarks.py --baseline results.json --threshold 1.5
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'src')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from app.gui.canvas_manager import CanvasManager
+from app.models.diagram import Diagram, resolve_beams
+from app.utils.compiler import LatexCompiler
+from app.utils.constraints import ConstraintSolver
+from app.utils.export import PDFExporter
+from app.utils.latex_generator import LatexGenerator
+from benchmarks.fake_canvas import FakeCanvas
+from benchmarks.synthetic import SHAPES
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+
+# Timings shorter than this are too noisy to flag as regressions
+NOISE_FLOOR = 0.001
+
+# Number of clicks timed by the hit-testing benchmark
+CLICKS = 100
+
+# Number of mouse motion steps timed by the constrained drag benchmark
+DRAG_STEPS = 10
+
+
+class StubCompiler(LatexCompiler):
+    """LatexCompiler that writes the source as the PDF instead of running TeX."""
+
+    def __init__(self, work_dir=None):
+        """Initialize without a precompiled format."""
+        super().__init__(work_dir=work_dir, use_format=False)
+
+    def run(self, command, cwd, cancel_event=None):
+        """Pretend to run the engine: copy the .tex file to the PDF path."""
+        tex_path = command[-1]
+        output_dir = command[command.index('-output-directory') + 1]
+        shutil.copyfile(tex_path, os.path.join(output_dir, "diagram.pdf"))
+        return 0, ""
+
+
+class Event:
+    """Mouse event stand-in."""
+
+    def __init__(self, x, y):
+        """Initialize with the click position."""
+        self.x = x
+        self.y = y
+
+
+def build_diagram(shape, size):
+    """Return a Diagram of a synthetic shape and size."""
+    components, beams = SHAPES[shape](size)
+    diagram = Diagram(f"{shape}-{size}")
+    for component in components:
+        diagram.add_component(component)
+    diagram.beams = beams
+    return diagram
+
+
+def bench_save(diagram, scratch):
+    """Time saving the diagram to JSON."""
+    path = os.path.join(scratch, "diagram.json")
+    started = time.perf_counter()
+    diagram.save(path)
+    return time.perf_counter() - started
+
+
+def bench_load(diagram, scratch):
+    """Time loading the diagram from JSON."""
+    path = os.path.join(scratch, "diagram.json")
+    if not os.path.exists(path):
+        diagram.save(path)
+    started = time.perf_counter()
+    Diagram.load(path)
+    return time.perf_counter() - started
+
+
+def bench_generate(diagram, scratch):
+    """Time generating the LaTeX code."""
+    components = diagram.get_component_dicts()
+    started = time.perf_counter()
+    LatexGenerator().generate_latex_code(components)
+    return time.perf_counter() - started
+
+
+def bench_redraw(diagram, scratch):
+    """Time a full redraw on a headless canvas."""
+    manager = CanvasManager(FakeCanvas(), diagram.get_component_dicts(), diagram.beams)
+    started = time.perf_counter()
+    manager.redraw_canvas()
+    return time.perf_counter() - started
+
+
+def bench_hit_test(diagram, scratch):
+    """Time clicking on the canvas, half of the clicks on components."""
+    components = diagram.get_component_dicts()
+    manager = CanvasManager(FakeCanvas(), components, diagram.beams)
+    manager.redraw_canvas()
+    generator = random.Random(0)
+    clicks = []
+    for i in range(CLICKS):
+        if i % 2:
+            x, y = generator.choice(components)['position']
+        else:
+            x, y = generator.randrange(2000), generator.randrange(2000)
+        clicks.append(Event(x, y))
+    started = time.perf_counter()
+    for event in clicks:
+        manager.on_mouse_down(event)
+        manager.on_mouse_up(event)
+    return time.perf_counter() - started
+
+
+def bench_export(diagram, scratch):
+    """Time a PDF export through the stub compiler, including tiling of large diagrams."""
+    latex_code = LatexGenerator().generate_latex_code(diagram.get_component_dicts())
+    # A fresh compiler so nothing comes from the compile cache
+    exporter = PDFExporter(StubCompiler(tempfile.mkdtemp(dir=scratch)))
+    started = time.perf_counter()
+    result = exporter.build_pdf(latex_code)
+    elapsed = time.perf_counter() - started
+    if not result.success:
+        raise RuntimeError(f"Stub export failed: {result.error_summary()}")
+    return elapsed
+
+
+def bench_constraint_drag(diagram, scratch):
+    """Time dragging the middle component of the diagram with its beams constrained.
+
+    Beams already on an axis are kept there and every beam keeps its length, so the
+    drag carries a whole cluster of components along.
+    """
+    components = diagram.get_component_dicts()
+    solver = ConstraintSolver(components)
+    for beam in resolve_beams(len(components), diagram.beams):
+        if beam['start'] == beam['end']:
+            continue
+        (x1, y1), (x2, y2) = components[beam['start']]['position'], components[beam['end']]['position']
+        if y1 == y2 or x1 == x2:
+            solver.add('horizontal' if y1 == y2 else 'vertical', (beam['start'], beam['end']))
+        solver.add('distance', (beam['start'], beam['end']))
+    middle = len(components) // 2
+    solver.drag([middle], 0, 0)
+    started = time.perf_counter()
+    for step in range(DRAG_STEPS):
+        solver.drag([middle], 3, 2)
+    return time.perf_counter() - started
+
+
+# Benchmarks by name
+BENCHMARKS = {
+    'save': bench_save,
+    'load': bench_load,
+    'generate_latex_code': bench_generate,
+    'redraw_canvas': bench_redraw,
+    'hit_test': bench_hit_test,
+    'constraint_drag': bench_constraint_drag,
+    'export_pdf': bench_export,
+}
+
+
+def run(sizes=DEFAULT_SIZES, shapes=tuple(SHAPES), benchmarks=tuple(BENCHMARKS), repeat=3, log=print):
+    """Run the benchmarks and return the results document."""
+    results = {}
+    for shape in shapes:
+        for size in sizes:
+            diagram = build_diagram(shape, size)
+            # Large sizes run once; they take long enough to be stable
+            runs = repeat if size < 10000 else 1
+            with tempfile.TemporaryDirectory() as scratch:
+                for name in benchmarks:
+                    timings = [BENCHMARKS[name](diagram, scratch) for _ in range(runs)]
+                    case = f"{name}/{shape}/{size}"
+                    results[case] = {'min': min(timings), 'median': statistics.median(timings), 'runs': runs}
+                    log(f"{case:<40} {min(timings) * 1000:>12.3f} ms")
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=1.5, noise_floor=NOISE_FLOOR):
+    """Return (case, baseline s, current s, ratio) for every case slower than threshold times its baseline."""
+    regressions = []
+    for case, current in results['results'].items():
+        previous = baseline['results'].get(case)
+        if previous is None or max(previous['min'], current['min']) < noise_floor:
+            continue
+        ratio = current['min'] / max(previous['min'], 1e-9)
+        if ratio > threshold:
+            regressions.append((case, previous['min'], current['min'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line; exits with 1 on regressions."""
+    parser = argparse.ArgumentParser(description="Benchmark the Optical Diagram Creator.")
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated component counts")
+    parser.add_argument('--shapes', default=",".join(SHAPES), help="comma separated diagram shapes")
+    parser.add_argument('--benchmarks', default=",".join(BENCHMARKS), help="comma separated benchmarks")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case below 10000 components")
+    parser.add_argument('--output', help="write the results JSON to this file")
+    parser.add_argument('--baseline', help="compare against a results JSON")
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help="slowdown ratio against the baseline counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = run([int(size) for size in args.sizes.split(",")], args.shapes.split(","),
+                  args.benchmarks.split(","), args.repeat)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for case, previous, current, ratio in regressions:
+            print(f"REGRESSION {case}: {previous * 1000:.3f} ms -> {current * 1000:.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
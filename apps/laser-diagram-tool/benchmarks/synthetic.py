@@ -0,0 +1,101 @@
+"""
+Synthetic - Generators of synthetic diagrams for the benchmarks
+"""
+
+import random
+
+
+def _component(name, latex, label, position):
+    """Return a component dictionary."""
+    return {'name': name, 'latex': latex, 'params': {'label': label}, 'position': position}
+
+
+def chain(count, spacing=100):
+    """Return (components, beams) of a laser followed by a straight chain of optics.
+
+    The chain folds into rows of 50 so large chains stay roughly square; beams are the
+    implicit chain between consecutive components.
+    """
+    kinds = [("Lens", "\\lens"), ("Mirror", "\\mirror"), ("Filter", "\\optfilter"), ("Wave Plate", "\\optretplate")]
+    components = []
+    for i in range(count):
+        row, column = divmod(i, 50)
+        position = (100 + column * spacing, 100 + row * spacing)
+        if i == 0:
+            components.append(_component("Laser", "\\laser", "Laser", position))
+        elif i == count - 1:
+            components.append(_component("Detector", "\\optdetector", "Det", position))
+        else:
+            name, latex = kinds[i % len(kinds)]
+            components.append(_component(name, latex, f"{name[0]}{i}", position))
+    return components, []
+
+
+def interferometer_network(count, spacing=100):
+    """Return (components, beams) of cascaded Mach-Zehnder interferometers.
+
+    Each stage splits the beam on a beam splitter, sends both arms over mirrors and
+    recombines them on a second beam splitter whose other output goes to a detector.
+    """
+    components = [_component("Laser", "\\laser", "Laser", (100, 100))]
+    beams = []
+    stage = 0
+    last = 0
+    while len(components) + 6 <= count:
+        x0 = 100 + (stage % 40) * 4 * spacing
+        y0 = 300 + (stage // 40) * 3 * spacing
+        first = len(components)
+        components += [
+            _component("Beam Splitter", "\\beamsplitter", f"BS{stage}a", (x0, y0)),
+            _component("Mirror", "\\mirror", f"M{stage}a", (x0 + spacing, y0)),
+            _component("Mirror", "\\mirror", f"M{stage}b", (x0, y0 + spacing)),
+            _component("Beam Splitter", "\\beamsplitter", f"BS{stage}b", (x0 + spacing, y0 + spacing)),
+            _component("Photodiode", "\\optdetector", f"PD{stage}", (x0 + 2 * spacing, y0 + spacing)),
+        ]
+        beams += [
+            {'start': last, 'end': first, 'type': 'wide'},
+            {'start': first, 'end': first + 1, 'type': 'wide'},
+            {'start': first, 'end': first + 2, 'type': 'wide'},
+            {'start': first + 1, 'end': first + 3, 'type': 'wide'},
+            {'start': first + 2, 'end': first + 3, 'type': 'wide'},
+            {'start': first + 3, 'end': first + 4, 'type': 'wide'},
+        ]
+        last = first + 3
+        stage += 1
+    # Pad with lenses after the last stage to reach the exact size
+    while len(components) < count:
+        components.append(_component("Lens", "\\lens", f"L{len(components)}",
+                                     (100 + len(components) % 50 * spacing, 100 + spacing)))
+        beams.append({'start': last, 'end': len(components) - 1, 'type': 'wide'})
+        last = len(components) - 1
+    return components, beams
+
+
+def random_layout(count, seed=0, density=150):
+    """Return (components, beams) of randomly placed components with random local beams.
+
+    Components are numbered in bands from top to bottom, so beams to the next few
+    indices (and the implicit neighbours used by the LaTeX generator) stay local, as in
+    real diagrams.
+    """
+    generator = random.Random(seed)
+    kinds = [("Laser", "\\laser"), ("Lens", "\\lens"), ("Mirror", "\\mirror"), ("Beam Splitter", "\\beamsplitter"),
+             ("Filter", "\\optfilter"), ("Photodiode", "\\optdetector")]
+    side = max(1, int(count ** 0.5)) * density
+    positions = [(generator.randrange(side), generator.randrange(side)) for _ in range(count)]
+    positions.sort(key=lambda position: (position[1] // (4 * density), position[0]))
+    components = []
+    for i, position in enumerate(positions):
+        name, latex = generator.choice(kinds)
+        components.append(_component(name, latex, f"C{i}", position))
+    beams = [{'start': i, 'end': min(count - 1, i + generator.randint(1, 5)), 'type': 'wide'}
+             for i in range(count - 1) if generator.random() < 0.8]
+    return components, beams
+
+
+# Diagram generators by name
+SHAPES = {
+    'chain': chain,
+    'interferometer': interferometer_network,
+    'random': random_layout,
+}
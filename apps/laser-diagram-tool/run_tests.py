@@ -7,13 +7,62 @@ if __name__ == '__main__':
     sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
     # Now that the path is set, we can import the test
-    from tests.test_application import TestHandleTab
+    from tests.test_application import TestDiagramTabs, TestHandleTab
+    from tests.test_tolerance import TestToleranceAnalyzer
+    from tests.test_layout import TestLayoutEngine
+    from tests.test_collision import TestCollisionChecker
+    from tests.test_snapping import TestSnapEngine
+    from tests.test_reachability import TestBeamGraphAnalyzer
+    from tests.test_image_export import TestImageExport
+    from tests.test_compiler import TestLatexCompiler
+    from tests.test_tiling import TestTiling
+    from tests.test_render_service import TestRenderService
+    from tests.test_profiling import TestProfiler
+    from tests.test_benchmarks import TestBenchmarks
+    from tests.test_startup import TestStartup
+    from tests.test_latex_highlighter import TestLatexHighlighter
+    from tests.test_file_ops import TestFileOps
+    from tests.test_revision_store import TestRevisionStore
+    from tests.test_diagram_diff import TestDiagramDiff
+    from tests.test_group_ops import TestGroupOps
+    from tests.test_diagram_builder import TestDiagramBuilder
+    from tests.test_setup_instance import TestSetupInstance
+    from tests.test_figure_catalog import TestFigureCatalog
+    from tests.test_thumbnails import TestThumbnails
+    from tests.test_property_editor import TestPropertyEditor
+    from tests.test_constraints import TestConstraints
+    from tests.test_workspace import TestWorkspace
 
     # Create a TestSuite
     suite = unittest.TestSuite()
 
     # Add tests from the TestHandleTab class
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestHandleTab))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestDiagramTabs))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestToleranceAnalyzer))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestLayoutEngine))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestCollisionChecker))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestSnapEngine))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestBeamGraphAnalyzer))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestImageExport))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestLatexCompiler))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestTiling))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestRenderService))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestProfiler))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestBenchmarks))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestStartup))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestLatexHighlighter))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestFileOps))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestRevisionStore))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestDiagramDiff))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestGroupOps))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestDiagramBuilder))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestSetupInstance))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestFigureCatalog))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestThumbnails))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestPropertyEditor))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestConstraints))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestWorkspace))
 
     # Run the tests
     runner = unittest.TextTestRunner()
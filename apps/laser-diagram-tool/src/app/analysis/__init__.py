@@ -0,0 +1,3 @@
+"""
+Analysis engines for the Optical Diagram Creator
+"""
@@ -0,0 +1,275 @@
+"""
+Collision - Detection of beams passing through components or crossing other beams
+"""
+
+import math
+from app.models.diagram import resolve_beams
+
+def component_half_extent(name):
+    """Return the half width and height of the body drawn by CanvasManager.draw_component."""
+    if "Lens" in name:
+        return (30, 40)
+    if "Mirror" in name:
+        return (40, 40)
+    if "Beam Splitter" in name or "BS" in name:
+        return (30, 30) if "Polarizing" in name or "PBS" in name else (5, 30)
+    if "Wave Plate" in name or "WP" in name:
+        return (20, 30)
+    if "Filter" in name:
+        return (30, 7)
+    if "Isolator" in name:
+        return (25, 25)
+    if "Modulator" in name or "AOM" in name or "EOM" in name:
+        return (35, 25)
+    if "Grating" in name:
+        return (30, 7)
+    if "Fiber" in name:
+        return (40, 40)
+    if "Source" in name or "Laser" in name or "LED" in name:
+        return (40, 30)
+    if "Detector" in name or "Photodiode" in name or "Camera" in name:
+        return (40, 30)
+    if "Circulator" in name:
+        return (30, 30)
+    if "Amplifier" in name:
+        return (30, 25)
+    return (30, 30)
+
+
+def component_bbox(component):
+    """Return the (x1, y1, x2, y2) bounding box of a component's body on the canvas."""
+    x, y = component['position']
+    half_w, half_h = component_half_extent(component['name'])
+    return (x - half_w, y - half_h, x + half_w, y + half_h)
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    """Return the sign of the turn a -> b -> c."""
+    value = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    return (value > 0) - (value < 0)
+
+
+def _on_segment(ax, ay, bx, by, cx, cy):
+    """Check whether the collinear point c lies within the box spanned by a and b."""
+    return min(ax, bx) <= cx <= max(ax, bx) and min(ay, by) <= cy <= max(ay, by)
+
+
+def segments_intersect(a, b):
+    """Check whether two (x1, y1, x2, y2) segments touch or cross."""
+    ax, ay, bx, by = a
+    cx, cy, dx, dy = b
+    o1 = _orientation(ax, ay, bx, by, cx, cy)
+    o2 = _orientation(ax, ay, bx, by, dx, dy)
+    o3 = _orientation(cx, cy, dx, dy, ax, ay)
+    o4 = _orientation(cx, cy, dx, dy, bx, by)
+    if o1 != o2 and o3 != o4:
+        return True
+    return ((o1 == 0 and _on_segment(ax, ay, bx, by, cx, cy))
+            or (o2 == 0 and _on_segment(ax, ay, bx, by, dx, dy))
+            or (o3 == 0 and _on_segment(cx, cy, dx, dy, ax, ay))
+            or (o4 == 0 and _on_segment(cx, cy, dx, dy, bx, by)))
+
+
+def segment_hits_box(segment, box):
+    """Check whether a segment passes through a box (Liang-Barsky clipping)."""
+    x1, y1, x2, y2 = segment
+    left, top, right, bottom = box
+    dx, dy = x2 - x1, y2 - y1
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x1 - left), (dx, right - x1), (-dy, y1 - top), (dy, bottom - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+
+class CollisionReport:
+    """Result of a collision check."""
+
+    def __init__(self, beam_component, beam_beam):
+        """Initialize with (beam, component) and (beam, beam) index pairs."""
+        self.beam_component = sorted(beam_component)
+        self.beam_beam = sorted(beam_beam)
+
+    def __len__(self):
+        """Return the number of collisions."""
+        return len(self.beam_component) + len(self.beam_beam)
+
+    def offending_components(self):
+        """Return the indices of components that a beam passes through."""
+        return {component for _, component in self.beam_component}
+
+    def offending_beams(self):
+        """Return the indices of beams involved in any collision."""
+        beams = {beam for beam, _ in self.beam_component}
+        for first, second in self.beam_beam:
+            beams.add(first)
+            beams.add(second)
+        return beams
+
+
+class CollisionChecker:
+    """Class for finding beam collisions with a uniform grid index over segments and boxes.
+
+    Every beam segment is registered in the grid cells it traverses and every component
+    box in the cells it covers, so only items sharing a cell are tested exactly. The index
+    is kept between checks so a moved component only re-tests its own box and beams.
+    """
+
+    def __init__(self, components, beams=None, cell_size=100):
+        """Initialize the index for the given components and beams."""
+        self.cell_size = cell_size
+        self.rebuild(components, beams)
+
+    def rebuild(self, components, beams=None):
+        """Rebuild the index from scratch, e.g. after components were added or removed."""
+        self.components = components
+        self.beams = resolve_beams(len(components), beams)
+        self.cells = {}
+        self.item_cells = {}
+        self.geometry = {}
+        self.bounds = {}
+        self.collisions = {}
+        self.incident = [[] for _ in components]
+        for index, beam in enumerate(self.beams):
+            self.incident[beam['start']].append(index)
+            self.incident[beam['end']].append(index)
+
+        for index in range(len(self.components)):
+            self._insert(('c', index))
+        for index in range(len(self.beams)):
+            self._insert(('b', index))
+        # Each pair only needs testing once while building
+        for item in list(self.geometry):
+            self._detect(item, later_only=True)
+
+    def check(self):
+        """Return the current collisions."""
+        beam_component = []
+        beam_beam = []
+        for (kind, index), others in self.collisions.items():
+            if kind != 'b':
+                continue
+            for other_kind, other in others:
+                if other_kind == 'c':
+                    beam_component.append((index, other))
+                elif index < other:
+                    beam_beam.append((index, other))
+        return CollisionReport(beam_component, beam_beam)
+
+    def move_component(self, index):
+        """Re-check only the moved component and its beams, then return all collisions."""
+        moved = [('c', index)] + [('b', beam) for beam in dict.fromkeys(self.incident[index])]
+        for item in moved:
+            self._remove(item)
+        for item in moved:
+            self._insert(item)
+        for item in moved:
+            self._detect(item)
+        return self.check()
+
+    def _item_geometry(self, item):
+        """Return the segment or box of an index item."""
+        kind, index = item
+        if kind == 'c':
+            return component_bbox(self.components[index])
+        beam = self.beams[index]
+        x1, y1 = self.components[beam['start']]['position']
+        x2, y2 = self.components[beam['end']]['position']
+        return (x1, y1, x2, y2)
+
+    def _cells_for(self, item, geometry):
+        """Return the grid cells covered by a box or traversed by a segment."""
+        size = self.cell_size
+        if item[0] == 'c':
+            left, top, right, bottom = geometry
+            return [(cx, cy)
+                    for cx in range(math.floor(left / size), math.floor(right / size) + 1)
+                    for cy in range(math.floor(top / size), math.floor(bottom / size) + 1)]
+
+        # Grid traversal (Amanatides-Woo) along the segment
+        x1, y1, x2, y2 = geometry
+        cx, cy = math.floor(x1 / size), math.floor(y1 / size)
+        end_x, end_y = math.floor(x2 / size), math.floor(y2 / size)
+        dx, dy = x2 - x1, y2 - y1
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        next_x = ((cx + (step_x > 0)) * size - x1) / dx if dx else math.inf
+        next_y = ((cy + (step_y > 0)) * size - y1) / dy if dy else math.inf
+        delta_x = size / abs(dx) if dx else math.inf
+        delta_y = size / abs(dy) if dy else math.inf
+        cells = [(cx, cy)]
+        for _ in range(abs(end_x - cx) + abs(end_y - cy)):
+            if next_x < next_y:
+                cx += step_x
+                next_x += delta_x
+            else:
+                cy += step_y
+                next_y += delta_y
+            cells.append((cx, cy))
+        return cells
+
+    def _insert(self, item):
+        """Add an item to the grid."""
+        geometry = self._item_geometry(item)
+        cells = self._cells_for(item, geometry)
+        self.geometry[item] = geometry
+        x1, y1, x2, y2 = geometry
+        self.bounds[item] = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        self.item_cells[item] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(item)
+
+    def _remove(self, item):
+        """Remove an item and its collisions from the grid."""
+        for cell in self.item_cells.pop(item, ()):
+            bucket = self.cells[cell]
+            bucket.remove(item)
+            if not bucket:
+                del self.cells[cell]
+        self.geometry.pop(item, None)
+        self.bounds.pop(item, None)
+        for other in self.collisions.pop(item, ()):
+            self.collisions[other].discard(item)
+
+    def _detect(self, item, later_only=False):
+        """Record every collision between an item and the items sharing its cells."""
+        candidates = set()
+        for cell in self.item_cells[item]:
+            candidates.update(self.cells[cell])
+        candidates.discard(item)
+        found = self.collisions.setdefault(item, set())
+        left, top, right, bottom = self.bounds[item]
+        for other in candidates:
+            if other in found or (later_only and other < item) or (item[0] == 'c' and other[0] == 'c'):
+                continue
+            # Cheap bounding box rejection before the exact test
+            other_left, other_top, other_right, other_bottom = self.bounds[other]
+            if other_left > right or other_right < left or other_top > bottom or other_bottom < top:
+                continue
+            if self._collides(item, other):
+                found.add(other)
+                self.collisions.setdefault(other, set()).add(item)
+
+    def _collides(self, first, second):
+        """Exact test between a beam and another item, ignoring the beam's own endpoints."""
+        if first[0] == 'c':
+            first, second = second, first
+        beam = self.beams[first[1]]
+        endpoints = (beam['start'], beam['end'])
+        if second[0] == 'c':
+            if second[1] in endpoints:
+                return False
+            return segment_hits_box(self.geometry[first], self.geometry[second])
+        other = self.beams[second[1]]
+        if other['start'] in endpoints or other['end'] in endpoints:
+            return False
+        return segments_intersect(self.geometry[first], self.geometry[second])
@@ -0,0 +1,485 @@
+"""
+Reachability - Source-to-detector reachability, cavities and orphans of the beam graph
+"""
+
+import heapq
+from collections import Counter, deque
+from app.models.diagram import resolve_beams
+from app.models.optical_component import classify_component
+
+
+def strongly_connected_components(successors, nodes=None):
+    """Return (component_of, components) using an iterative Tarjan search.
+
+    Only the given nodes (default all) are searched and edges leaving them are ignored.
+    Components are numbered in the order Tarjan completes them, which is a reverse
+    topological order of the condensation: every edge between components points from
+    a higher component number to a lower one.
+    """
+    count = len(successors)
+    if nodes is None:
+        nodes = range(count)
+        index = [-1] * count
+    else:
+        # -2 marks nodes outside the search
+        index = [-2] * count
+        for node in nodes:
+            index[node] = -1
+    low = [0] * count
+    on_stack = [False] * count
+    stack = []
+    component_of = [-1] * count
+    components = []
+    counter = 0
+
+    for root in nodes:
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, children = work[-1]
+            descended = False
+            for child in children:
+                if index[child] == -2:
+                    continue
+                if index[child] == -1:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, iter(successors[child])))
+                    descended = True
+                    break
+                if on_stack[child]:
+                    low[node] = min(low[node], index[child])
+            if descended:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component_of[member] = len(components)
+                    members.append(member)
+                    if member == node:
+                        break
+                components.append(members)
+
+    return component_of, components
+
+
+class BeamGraphReport:
+    """Result of a beam graph analysis.
+
+    Reachability is kept as one detector bitset per source and only decoded on request,
+    so building a report for a large diagram stays cheap.
+    """
+
+    def __init__(self, version, sources, detectors, source_reach, cavities, orphans, unreached):
+        """Initialize the report fields; bit i of a source's bitset stands for detectors[i]."""
+        self.version = version
+        self.sources = sources
+        self.detectors = detectors
+        self.source_reach = source_reach
+        self.cavities = cavities
+        self.orphans = orphans
+        self.unreached = unreached
+
+    def detectors_reached_from(self, source):
+        """Return the detectors that a source's light reaches."""
+        bits = self.source_reach[source]
+        detectors = []
+        while bits:
+            lowest = bits & -bits
+            detectors.append(self.detectors[lowest.bit_length() - 1])
+            bits ^= lowest
+        return detectors
+
+    @property
+    def reachable(self):
+        """Return a mapping of every source to the detectors it reaches."""
+        return {source: self.detectors_reached_from(source) for source in self.sources}
+
+    def fed_by(self, detector):
+        """Return the sources whose light reaches a detector."""
+        bit = 1 << self.detectors.index(detector)
+        return [source for source in self.sources if self.source_reach[source] & bit]
+
+    def dark_detectors(self):
+        """Return the detectors that no source reaches."""
+        fed = 0
+        for bits in self.source_reach.values():
+            fed |= bits
+        return [detector for position, detector in enumerate(self.detectors) if not fed >> position & 1]
+
+
+class BeamGraphAnalyzer:
+    """Class for analysing the directed graph formed by a diagram's beams.
+
+    The strongly connected components (cavities), a topological rank of the condensed
+    graph and, per component, a bitset of the detectors it reaches are kept between
+    calls. Adding a beam reorders only the components ranked between its ends, merging
+    them if the beam closes a loop; removing one splits its own component locally and
+    recomputes the bitsets upstream of it. The report is cached per graph version.
+    """
+
+    def __init__(self, components=(), beams=None):
+        """Initialize the analyzer for the given components and beams."""
+        self.reset(components, beams)
+
+    def reset(self, components, beams=None):
+        """Rebuild the graph from scratch."""
+        self.roles = [classify_component(component['name']) for component in components]
+        self.successors = [Counter() for _ in self.roles]
+        self.predecessors = [Counter() for _ in self.roles]
+        self.edges = Counter()
+        for beam in resolve_beams(len(components), beams):
+            self._link(beam['start'], beam['end'])
+        self.version = 0
+        self._report = None
+        self._recompute()
+
+    def sync(self, components, beams=None):
+        """Bring the graph up to date with a diagram, incrementally where possible."""
+        roles = [classify_component(component['name']) for component in components]
+        if len(roles) < len(self.roles) or roles[:len(self.roles)] != self.roles:
+            self.reset(components, beams)
+            return
+        for role in roles[len(self.roles):]:
+            self.add_node(role)
+
+        wanted = Counter((beam['start'], beam['end']) for beam in resolve_beams(len(components), beams))
+        for (start, end), extra in (self.edges - wanted).items():
+            for _ in range(extra):
+                self.remove_edge(start, end)
+        for (start, end), missing in (wanted - self.edges).items():
+            for _ in range(missing):
+                self.add_edge(start, end)
+
+    def _link(self, start, end):
+        """Record an edge in the adjacency maps."""
+        self.successors[start][end] += 1
+        self.predecessors[end][start] += 1
+        self.edges[(start, end)] += 1
+
+    def _unlink(self, start, end):
+        """Remove one occurrence of an edge from the adjacency maps."""
+        for table, key, value in ((self.successors, start, end), (self.predecessors, end, start)):
+            table[key][value] -= 1
+            if not table[key][value]:
+                del table[key][value]
+        self.edges[(start, end)] -= 1
+        if not self.edges[(start, end)]:
+            del self.edges[(start, end)]
+
+    def _recompute(self):
+        """Recompute components, condensation, ranks and reachability bitsets from scratch."""
+        count = len(self.roles)
+        self.component_of, self.components = strongly_connected_components(self.successors)
+        self.detector_bit = {}
+        for node, role in enumerate(self.roles):
+            if role == 'detector':
+                self.detector_bit[node] = len(self.detector_bit)
+
+        self.condensed_successors = [Counter() for _ in self.components]
+        self.condensed_predecessors = [Counter() for _ in self.components]
+        for (start, end), multiplicity in self.edges.items():
+            first, second = self.component_of[start], self.component_of[end]
+            if first != second:
+                self.condensed_successors[first][second] += multiplicity
+                self.condensed_predecessors[second][first] += multiplicity
+
+        # Every condensed edge points from a higher rank to a lower one, so bitsets are
+        # computed in rank order
+        self.rank = list(range(len(self.components)))
+        self.next_rank = len(self.components)
+        self.reach = [0] * len(self.components)
+        for component in range(len(self.components)):
+            self.reach[component] = self._component_reach(component)
+        self._unreached = None
+
+    def _component_reach(self, component):
+        """Return the detector bitset of a component from its members and successors."""
+        bits = 0
+        for member in self.components[component]:
+            if member in self.detector_bit:
+                bits |= 1 << self.detector_bit[member]
+        for successor in self.condensed_successors[component]:
+            bits |= self.reach[successor]
+        return bits
+
+    def _propagate(self, components, regrouped=False):
+        """Recompute the bitsets of components and, where they change, of their ancestors.
+
+        Components that were merged or split gained predecessors whose bitsets must be
+        revisited even if their own bitset is unchanged, so regrouped forces that.
+        """
+        if regrouped:
+            for component in components:
+                self.reach[component] = -1
+        pending = [(self.rank[component], component) for component in set(components)]
+        heapq.heapify(pending)
+        queued = set(components)
+        while pending:
+            _, component = heapq.heappop(pending)
+            queued.discard(component)
+            updated = self._component_reach(component)
+            if updated == self.reach[component]:
+                continue
+            self.reach[component] = updated
+            for predecessor in self.condensed_predecessors[component]:
+                if predecessor not in queued:
+                    queued.add(predecessor)
+                    heapq.heappush(pending, (self.rank[predecessor], predecessor))
+
+    def _search(self, component, table, allowed):
+        """Return the components reachable through table while allowed holds."""
+        found = {component}
+        pending = [component]
+        while pending:
+            for neighbour in table[pending.pop()]:
+                if neighbour not in found and allowed(neighbour):
+                    found.add(neighbour)
+                    pending.append(neighbour)
+        return found
+
+    def add_node(self, role='other'):
+        """Add an unconnected component and return its index."""
+        node = len(self.roles)
+        self.roles.append(role)
+        self.successors.append(Counter())
+        self.predecessors.append(Counter())
+        self.component_of.append(len(self.components))
+        self.components.append([node])
+        self.condensed_successors.append(Counter())
+        self.condensed_predecessors.append(Counter())
+        self.rank.append(self.next_rank)
+        self.next_rank += 1
+        bits = 0
+        if role == 'detector':
+            self.detector_bit[node] = len(self.detector_bit)
+            bits = 1 << self.detector_bit[node]
+        self.reach.append(bits)
+        if self._unreached is not None and role != 'source':
+            self._unreached.add(node)
+        self.version += 1
+        return node
+
+    def add_edge(self, start, end):
+        """Add a beam from start to end."""
+        self._link(start, end)
+        self.version += 1
+        if self._unreached is not None and start not in self._unreached and end in self._unreached:
+            self._mark_reached([end])
+
+        first, second = self.component_of[start], self.component_of[end]
+        if first == second:
+            return
+        if self.rank[second] > self.rank[first]:
+            cycle = self._reorder(first, second)
+            if cycle:
+                self._merge(cycle)
+                self._propagate([self.component_of[start]], regrouped=True)
+                return
+
+        self.condensed_successors[first][second] += 1
+        self.condensed_predecessors[second][first] += 1
+        self._propagate([first])
+
+    def _reorder(self, first, second):
+        """Restore the rank order after an edge first -> second was added against it.
+
+        Only the components ranked between the two ends are visited (Pearce-Kelly). Returns
+        the components that now form a loop with the new edge, or an empty set.
+        """
+        low, high = self.rank[first], self.rank[second]
+        forward = self._search(second, self.condensed_successors, lambda c: self.rank[c] >= low)
+        backward = self._search(first, self.condensed_predecessors, lambda c: self.rank[c] <= high)
+        cycle = forward & backward
+        ranks = sorted(self.rank[component] for component in forward | backward)
+        # The loop takes the ranks between the two sides; its members are merged into
+        # the one that ends up with the highest of them
+        ordered = sorted(forward - cycle, key=self.rank.__getitem__)
+        if cycle:
+            target = min(cycle)
+            ordered.extend(sorted(cycle - {target}))
+            ordered.append(target)
+        ordered.extend(sorted(backward - cycle, key=self.rank.__getitem__))
+        for component, rank in zip(ordered, ranks):
+            self.rank[component] = rank
+        return cycle
+
+    def _merge(self, cycle):
+        """Merge components that a new edge joined into one loop."""
+        target = min(cycle)
+        outgoing = Counter()
+        incoming = Counter()
+        for component in cycle:
+            for successor, multiplicity in self.condensed_successors[component].items():
+                if successor not in cycle:
+                    outgoing[successor] += multiplicity
+                    del self.condensed_predecessors[successor][component]
+            for predecessor, multiplicity in self.condensed_predecessors[component].items():
+                if predecessor not in cycle:
+                    incoming[predecessor] += multiplicity
+                    del self.condensed_successors[predecessor][component]
+            self.condensed_successors[component] = Counter()
+            self.condensed_predecessors[component] = Counter()
+            if component != target:
+                for member in self.components[component]:
+                    self.component_of[member] = target
+                self.components[target].extend(self.components[component])
+                self.components[component] = []
+
+        self.condensed_successors[target] = outgoing
+        self.condensed_predecessors[target] = incoming
+        for successor, multiplicity in outgoing.items():
+            self.condensed_predecessors[successor][target] = multiplicity
+        for predecessor, multiplicity in incoming.items():
+            self.condensed_successors[predecessor][target] = multiplicity
+
+    def remove_edge(self, start, end):
+        """Remove one beam from start to end."""
+        if not self.edges.get((start, end)):
+            return
+        self._unlink(start, end)
+        self.version += 1
+        if self._unreached is not None and start not in self._unreached:
+            self._unreached = None
+
+        first, second = self.component_of[start], self.component_of[end]
+        if first == second:
+            # The loop survives as long as start still reaches end inside it
+            if start != end and (start, end) not in self.edges and not self._connected(start, end):
+                self._split(first)
+            return
+
+        self.condensed_successors[first][second] -= 1
+        self.condensed_predecessors[second][first] -= 1
+        if self.condensed_successors[first][second]:
+            return
+        del self.condensed_successors[first][second]
+        del self.condensed_predecessors[second][first]
+        self._propagate([first])
+
+    def _connected(self, start, end):
+        """Check whether end is reachable from start without leaving their component."""
+        component = self.component_of[start]
+        seen = {start}
+        pending = deque([start])
+        while pending:
+            for successor in self.successors[pending.popleft()]:
+                if successor == end:
+                    return True
+                if successor not in seen and self.component_of[successor] == component:
+                    seen.add(successor)
+                    pending.append(successor)
+        return False
+
+    def _split(self, component):
+        """Re-run the component search inside a loop that may have been broken."""
+        members = self.components[component]
+        _, pieces = strongly_connected_components(self.successors, members)
+        if len(pieces) == 1:
+            return
+
+        # The first piece keeps the component's number and the pieces take the
+        # component's place in the rank order
+        numbers = [component] + list(range(len(self.components), len(self.components) + len(pieces) - 1))
+        order = {c: (rank, 0) for c, rank in enumerate(self.rank) if self.components[c]}
+        for piece, number in enumerate(numbers):
+            order[number] = (self.rank[component], piece)
+            if number != component:
+                self.components.append([])
+                self.condensed_successors.append(Counter())
+                self.condensed_predecessors.append(Counter())
+                self.reach.append(0)
+                self.rank.append(0)
+            self.components[number] = pieces[piece]
+            for member in self.components[number]:
+                self.component_of[member] = number
+        for rank, number in enumerate(sorted(order, key=order.__getitem__)):
+            self.rank[number] = rank
+        self.next_rank = len(order)
+
+        for neighbour in self.condensed_successors[component]:
+            del self.condensed_predecessors[neighbour][component]
+        for neighbour in self.condensed_predecessors[component]:
+            del self.condensed_successors[neighbour][component]
+        self.condensed_successors[component] = Counter()
+        self.condensed_predecessors[component] = Counter()
+        for member in members:
+            first = self.component_of[member]
+            for successor, multiplicity in self.successors[member].items():
+                second = self.component_of[successor]
+                if first != second:
+                    self.condensed_successors[first][second] += multiplicity
+                    self.condensed_predecessors[second][first] += multiplicity
+            for predecessor, multiplicity in self.predecessors[member].items():
+                second = self.component_of[predecessor]
+                if second not in numbers:
+                    self.condensed_successors[second][first] += multiplicity
+                    self.condensed_predecessors[first][second] += multiplicity
+        self._propagate(numbers, regrouped=True)
+
+    def _mark_reached(self, nodes):
+        """Remove nodes and everything downstream of them from the unreached set."""
+        pending = deque(node for node in nodes if node in self._unreached)
+        for node in pending:
+            self._unreached.discard(node)
+        while pending:
+            for successor in self.successors[pending.popleft()]:
+                if successor in self._unreached:
+                    self._unreached.discard(successor)
+                    pending.append(successor)
+
+    def unreached(self):
+        """Return the set of components that no source illuminates."""
+        if self._unreached is None:
+            # Walk the condensed graph, so a large cavity is visited as a single step
+            reached = {self.component_of[node] for node, role in enumerate(self.roles) if role == 'source'}
+            pending = list(reached)
+            while pending:
+                for successor in self.condensed_successors[pending.pop()]:
+                    if successor not in reached:
+                        reached.add(successor)
+                        pending.append(successor)
+            self._unreached = {
+                node for node, component in enumerate(self.component_of) if component not in reached
+            }
+        return self._unreached
+
+    def analyze(self):
+        """Return the analysis report, reusing the cached one if the graph is unchanged."""
+        if self._report is not None and self._report.version == self.version:
+            return self._report
+
+        sources = [node for node, role in enumerate(self.roles) if role == 'source']
+        detectors = list(self.detector_bit)
+        cavities = sorted(
+            sorted(members) for members in self.components
+            if len(members) > 1 or (members and members[0] in self.successors[members[0]])
+        )
+        orphans = [
+            node for node in range(len(self.roles))
+            if not self.successors[node] and not self.predecessors[node]
+        ]
+        self._report = BeamGraphReport(
+            self.version,
+            sources,
+            detectors,
+            {source: self.reach[self.component_of[source]] for source in sources},
+            cavities,
+            orphans,
+            sorted(self.unreached())
+        )
+        return self._report
@@ -0,0 +1,265 @@
+"""
+Tolerance - Monte Carlo tolerance analysis of component placement and focal lengths
+"""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from app.models.diagram import resolve_beams
+from app.models.optical_component import classify_component
+
+# Canvas coordinates are scaled by 1/50 into LaTeX centimetres, so 1 px = 0.2 mm
+PIXELS_PER_MM = 5.0
+
+# Radius of the collimated beam leaving each source, in millimetres
+DEFAULT_BEAM_RADIUS_MM = 1.0
+
+
+class ToleranceStats:
+    """Running mean/variance/min/max of the tolerance metrics, mergeable across batches."""
+
+    def __init__(self, names):
+        """Initialize empty statistics for the named metrics."""
+        self.names = list(names)
+        size = len(self.names)
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.minimum = np.full(size, np.inf)
+        self.maximum = np.full(size, -np.inf)
+
+    def add_batch(self, values):
+        """Fold a (samples, metrics) array of evaluated samples into the statistics."""
+        batch = ToleranceStats(self.names)
+        batch.count = values.shape[0]
+        if batch.count:
+            batch.mean = values.mean(axis=0)
+            batch.m2 = ((values - batch.mean) ** 2).sum(axis=0)
+            batch.minimum = values.min(axis=0)
+            batch.maximum = values.max(axis=0)
+        self.merge(batch)
+
+    def merge(self, other):
+        """Merge statistics computed on another batch (Chan et al. parallel update)."""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / total)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / total)
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.count = total
+
+    @property
+    def std(self):
+        """Sample standard deviation of each metric."""
+        if self.count < 2:
+            return np.zeros(len(self.names))
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    def summary(self):
+        """Return one dictionary per metric with mean, std, min and max."""
+        std = self.std
+        return [
+            {
+                'name': name,
+                'mean': float(self.mean[i]),
+                'std': float(std[i]),
+                'min': float(self.minimum[i]),
+                'max': float(self.maximum[i])
+            }
+            for i, name in enumerate(self.names)
+        ]
+
+
+def _evaluate_samples(model, rng, size):
+    """Evaluate a batch of perturbed samples and return a (samples, metrics) array."""
+    base_positions = model['positions']
+    paths = model['paths']
+    valid = model['valid']
+    beams = model['beams']
+
+    # Component-major (components, samples) arrays keep the index gathers contiguous
+    count = base_positions.shape[0]
+    sigma = model['position_sigma']
+    x = base_positions[:, 0, None] + rng.normal(0.0, sigma, (count, size))
+    y = base_positions[:, 1, None] + rng.normal(0.0, sigma, (count, size))
+    focal = model['focal_lengths'][:, None] * (1.0 + rng.normal(0.0, model['focal_sigma'], (count, size)))
+
+    # Total length of every beam segment in the layout
+    if len(beams):
+        total_length = np.hypot(x[beams[:, 1]] - x[beams[:, 0]],
+                                y[beams[:, 1]] - y[beams[:, 0]]).sum(axis=0) / PIXELS_PER_MM
+    else:
+        total_length = np.zeros(size)
+
+    # Segment lengths and lens powers for every step of every path at once
+    starts, ends = paths[:, :-1], paths[:, 1:]
+    distance = np.hypot(x[ends] - x[starts], y[ends] - y[starts]) / PIXELS_PER_MM
+    distance *= valid[:, :-1, None]
+    # Thin-lens refraction at the element reached, except at the detector itself
+    power = (valid[:, :-1] & valid[:, 1:])[..., None] / focal[ends]
+    path_length = distance.sum(axis=1)
+
+    # Trace a paraxial marginal ray along each source-to-detector path
+    height = np.full((paths.shape[0], size), model['beam_radius'])
+    slope = np.zeros((paths.shape[0], size))
+    for step in range(paths.shape[1] - 1):
+        height = height + distance[:, step] * slope
+        slope = slope - height * power[:, step]
+
+    return np.column_stack([total_length, path_length.T, np.abs(height).T])
+
+
+def _run_batch(model, seed, size):
+    """Process pool entry point: evaluate one batch and return its statistics."""
+    stats = ToleranceStats(model['metric_names'])
+    stats.add_batch(_evaluate_samples(model, np.random.default_rng(seed), size))
+    return stats
+
+
+class ToleranceAnalyzer:
+    """Class for Monte Carlo tolerance analysis of an optical diagram."""
+
+    def __init__(self, components, beams=None, position_sigma=1.0, focal_sigma=0.01,
+                 beam_radius=DEFAULT_BEAM_RADIUS_MM, seed=None):
+        """Initialize from component dictionaries and beam definitions."""
+        self.components = components
+        self.beams = resolve_beams(len(components), beams)
+        self.position_sigma = position_sigma
+        self.focal_sigma = focal_sigma
+        self.beam_radius = beam_radius
+        self.seed = seed
+        self.detectors, self.paths = self._trace_paths()
+
+    @classmethod
+    def from_diagram(cls, diagram, **kwargs):
+        """Create an analyzer for a Diagram model."""
+        return cls(diagram.get_component_dicts(), diagram.get_beams(), **kwargs)
+
+    @property
+    def metric_names(self):
+        """Names of the evaluated metrics, in column order."""
+        labels = [self._label(i) for i in self.detectors]
+        return (["Total beam length (mm)"]
+                + [f"Path length to {label} (mm)" for label in labels]
+                + [f"Beam radius at {label} (mm)" for label in labels])
+
+    def _label(self, index):
+        """Return a readable label for a component."""
+        component = self.components[index]
+        return component['params'].get('label', component['name'])
+
+    def _trace_paths(self):
+        """Find the shortest beam path from any source to each detector."""
+        count = len(self.components)
+        roles = [classify_component(component['name']) for component in self.components]
+        successors = [[] for _ in range(count)]
+        has_input = [False] * count
+        for beam in self.beams:
+            successors[beam['start']].append(beam['end'])
+            has_input[beam['end']] = True
+
+        sources = [i for i in range(count) if roles[i] == 'source']
+        if not sources:
+            sources = [i for i in range(count) if not has_input[i]]
+        detectors = [i for i in range(count) if roles[i] == 'detector']
+        if not detectors:
+            detectors = [i for i in range(count) if not successors[i]]
+
+        # Multi-source breadth-first search keeps a parent pointer per component
+        parent = [None] * count
+        seen = set(sources)
+        queue = deque(sources)
+        while queue:
+            node = queue.popleft()
+            for nxt in successors[node]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    parent[nxt] = node
+                    queue.append(nxt)
+
+        reached = []
+        paths = []
+        for detector in detectors:
+            if detector not in seen:
+                continue
+            path = [detector]
+            while parent[path[-1]] is not None:
+                path.append(parent[path[-1]])
+            reached.append(detector)
+            paths.append(path[::-1])
+        return reached, paths
+
+    def _build_model(self):
+        """Pack the diagram into the plain arrays shipped to worker processes."""
+        count = len(self.components)
+        positions = np.array([component['position'] for component in self.components],
+                             dtype=float).reshape(count, 2)
+        focal_lengths = np.full(count, np.inf)
+        for i, component in enumerate(self.components):
+            if classify_component(component['name']) == 'lens':
+                focal_lengths[i] = float(component['params'].get('focal_length', np.inf))
+
+        # Pad the paths to a rectangular array with a validity mask
+        longest = max((len(path) for path in self.paths), default=1)
+        paths = np.zeros((len(self.paths), longest), dtype=int)
+        valid = np.zeros((len(self.paths), longest), dtype=bool)
+        for row, path in enumerate(self.paths):
+            paths[row, :len(path)] = path
+            paths[row, len(path):] = path[-1]
+            valid[row, :len(path) - 1] = True
+
+        return {
+            'positions': positions,
+            'focal_lengths': focal_lengths,
+            'beams': np.array([(b['start'], b['end']) for b in self.beams], dtype=int).reshape(-1, 2),
+            'paths': paths,
+            'valid': valid,
+            'position_sigma': self.position_sigma,
+            'focal_sigma': self.focal_sigma,
+            'beam_radius': self.beam_radius,
+            'metric_names': self.metric_names
+        }
+
+    def run(self, samples=10000, batch_size=2048, workers=None, callback=None, cancel_event=None):
+        """Run the analysis, streaming merged statistics to the callback after each batch.
+
+        The callback receives (stats, completed_samples, total_samples). Batches are
+        distributed over a process pool unless workers is 1.
+        """
+        model = self._build_model()
+        stats = ToleranceStats(model['metric_names'])
+        sizes = [min(batch_size, samples - start) for start in range(0, samples, batch_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        completed = 0
+
+        if workers == 1:
+            for seed, size in zip(seeds, sizes):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                stats.merge(_run_batch(model, seed, size))
+                completed += size
+                if callback:
+                    callback(stats, completed, samples)
+            return stats
+
+        # Spawned workers avoid inheriting the Tk interpreter of the GUI process
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {pool.submit(_run_batch, model, seed, size): size
+                       for seed, size in zip(seeds, sizes)}
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                stats.merge(future.result())
+                completed += futures[future]
+                if callback:
+                    callback(stats, completed, samples)
+        return stats
@@ -3,19 +3,31 @@ OpticalDiagramCreator - Main application class for the Optical Diagram Creator.
 """
 
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
+import json
+import os
 import re
 from app.gui.canvas_manager import CanvasManager
 from app.gui.component_library import ComponentLibrary
-from app.utils.latex_generator import LatexGenerator
-from app.utils.export import PDFExporter
-from app.utils.latex_parser import LatexParser
+from app.utils.compiler import LatexCompiler
+from app.models.diagram import Diagram, resolve_beams
+from app.models.diagram_diff import DiagramDiff, carry_ids, format_conflict, merge
+from app.models.optical_component import new_component_id
+from app.models.setup_instance import SetupDefinition, SetupInstance, flatten, instances_to_dict
+from app.utils import group_ops
+from app.utils.snapping import SnapEngine
+from app.gui.preview_pane import PreviewPane
+from app.gui.property_editor import PropertyEditor
+from app.gui.latex_highlighter import LatexHighlighter, update_text
+from app.utils.profiling import PROFILER, span
+from app.utils.file_ops import FileOperation, revisions_path
+from app.utils.workspace import DEFAULT_BUDGET, Workspace
 
 class OpticalDiagramCreator:
     """Main application class for the Optical Diagram Creator."""
     
-    def __init__(self, root):
-        """Initialize the application."""
+    def __init__(self, root, memory_budget=DEFAULT_BUDGET):
+        """Initialize the application; inactive diagrams are spilled to disk beyond memory_budget bytes."""
         self.root = root
         self.root.title("Optical Diagram Creator")
         self.root.geometry("1200x800")
@@ -25,28 +37,63 @@ class OpticalDiagramCreator:
         
         # Current diagram data
         self.diagram_components = []
+        self.diagram_beams = []
         self.selected_component = None
         
-        # Set up the main frame structure
-        self.setup_ui()
+        # Setups placed as instances of shared definitions, and the definitions by name
+        self.diagram_instances = []
+        self.setup_definitions = {}
         
-        # Initialize the canvas manager
-        self.canvas_manager = CanvasManager(self.canvas, self.diagram_components)
+        # Diagram file and the open or save running in the background
+        self.diagram_name = "Untitled Diagram"
+        self.diagram_path = None
+        self.file_operation = None
+        self.file_operation_finish = None
+        
+        # Diagrams open in tabs; the active one is edited in the lists above
+        self.workspace = Workspace(memory_budget)
+        self.workspace.activate(self.workspace.add(self.diagram_name))
         
-        # Initialize LaTeX generator
-        self.latex_generator = LatexGenerator()
+        # LaTeX compiler shared by the live preview and PDF export
+        self.latex_compiler = LatexCompiler(warm_workers=1)
         
-        # Initialize LaTeX parser
-        self.latex_parser = LatexParser()
+        # Set up the main frame structure
+        self.setup_ui()
         
-        # Initialize PDF exporter
-        self.pdf_exporter = PDFExporter()
+        # Initialize the canvas manager
+        self.canvas_manager = CanvasManager(self.canvas, self.diagram_components, self.diagram_beams,
+                                            self.diagram_instances)
+        self.canvas_manager.move_listeners.append(self.on_component_moved)
+        self.canvas_manager.group_listeners.append(self.on_components_changed)
+        self.canvas_manager.selection_listeners.append(lambda selection: self.refresh_properties())
+        self.canvas_manager.instance_move_listeners.append(self.on_instance_moved)
+        self.canvas_manager.instance_open_listeners.append(self.expand_instance)
+        
+        # LaTeX generator, parser, PDF exporter and layout engine, imported and built on
+        # first use (see the properties below) so the window appears sooner
+        self._latex_generator = None
+        self._latex_parser = None
+        self._pdf_exporter = None
+        self._layout_engine = None
+        self._constraint_solver = None
+        
+        # Collision checker, built while collision checking is enabled
+        self.collision_checker = None
+        
+        # Beam graph analysis, kept between runs so edits are applied incrementally
+        self.beam_graph_analyzer = None
+        
+        # Grid snapping and alignment guides while dragging
+        self.snap_engine = SnapEngine()
+        self.canvas_manager.snap_engine = self.snap_engine
         
         # Flag to prevent update loops when editing LaTeX
         self.updating_latex = False
         
     def setup_ui(self):
         """Set up the main UI layout."""
+        self.setup_menu()
+        
         # Create main frame containers
         self.left_panel = ttk.Frame(self.root, padding="10")
         self.left_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=False, padx=5, pady=5)
@@ -68,6 +115,12 @@ class OpticalDiagramCreator:
         
         # Center panel - Diagram canvas
         ttk.Label(self.center_panel, text="Diagram Canvas", font=('Arial', 12, 'bold')).pack(anchor=tk.W)
+        
+        # One tab per open diagram; the tabs are empty, the canvas below shows the active diagram
+        self.diagram_tabs = ttk.Notebook(self.center_panel)
+        self.diagram_tabs.pack(fill=tk.X)
+        self.diagram_tabs.add(ttk.Frame(self.diagram_tabs), text=self.diagram_name)
+        self.diagram_tabs.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         self.canvas_frame = ttk.Frame(self.center_panel, relief=tk.SUNKEN, borderwidth=1)
         self.canvas_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
@@ -79,13 +132,26 @@ class OpticalDiagramCreator:
                   command=self.generate_latex).pack(side=tk.LEFT, padx=5)
         ttk.Button(self.toolbar, text="Export PDF", 
                   command=self.export_pdf).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.toolbar, text="Export PNG", 
+                  command=self.export_png).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.toolbar, text="Export SVG", 
+                  command=self.export_svg).pack(side=tk.LEFT, padx=5)
         ttk.Button(self.toolbar, text="Clear Canvas", 
                   command=self.clear_canvas).pack(side=tk.LEFT, padx=5)
         
+        # Progress of a background open or save, shown only while one runs
+        self.file_progress = ttk.Frame(self.center_panel)
+        self.file_progress_label = ttk.Label(self.file_progress)
+        self.file_progress_label.pack(side=tk.LEFT, padx=5)
+        self.file_progress_bar = ttk.Progressbar(self.file_progress, maximum=1.0)
+        self.file_progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Button(self.file_progress, text="Cancel",
+                  command=self.cancel_file_operation).pack(side=tk.RIGHT, padx=5)
+        
         # Right panel - Properties and LaTeX preview/editor
         ttk.Label(self.right_panel, text="Properties", font=('Arial', 12, 'bold')).pack(anchor=tk.W)
-        self.properties_frame = ttk.Frame(self.right_panel)
-        self.properties_frame.pack(fill=tk.X, pady=5)
+        self.property_editor = PropertyEditor(self.right_panel, self.set_selected_param)
+        self.property_editor.pack(fill=tk.X, pady=5)
         
         # LaTeX editor section
         latex_frame = ttk.Frame(self.right_panel)
@@ -97,19 +163,158 @@ class OpticalDiagramCreator:
         ttk.Label(latex_header, text="LaTeX Code", font=('Arial', 12, 'bold')).pack(side=tk.LEFT)
         ttk.Button(latex_header, text="Apply Changes", command=self.apply_latex_changes).pack(side=tk.RIGHT)
         
-        # LaTeX editor with syntax highlighting (future enhancement)
+        # LaTeX editor with syntax highlighting
         self.latex_preview = scrolledtext.ScrolledText(latex_frame, height=20, font=('Courier', 10))
         self.latex_preview.pack(fill=tk.BOTH, expand=True)
+        self.latex_highlighter = LatexHighlighter(self.latex_preview)
         
         # Add key bindings for common editor features
         self.latex_preview.bind("<Tab>", self.handle_tab)
+        self.latex_preview.bind("<KeyRelease>", self.schedule_pdf_preview, add="+")
+        
+        # Live PDF preview, recompiled in the background after edits settle
+        self.preview_pane = PreviewPane(self.right_panel, self.latex_compiler)
+        self.preview_pane.pack(fill=tk.BOTH, expand=True, pady=5)
         
         # Canvas setup
         self.canvas = tk.Canvas(self.canvas_frame, bg="white")
         self.canvas.pack(fill=tk.BOTH, expand=True)
         
-        # Load components into the library panel
-        self.component_library.load_components_to_tree(self.component_tree)
+        # Fill the library panel once the first frame is on screen
+        self.root.after_idle(self.populate_component_library)
+        
+    def populate_component_library(self):
+        """Load the components into the library panel; thumbnails load as their rows come into view."""
+        with span("populate_component_library", "startup"):
+            self.component_library.load_components_to_tree(self.component_tree)
+        from app.gui.thumbnail_loader import ThumbnailLoader, thumbnail_style
+        from app.utils.thumbnails import LIBRARY_THUMBNAIL_SIZE, ThumbnailCache
+        self.component_tree.configure(style=thumbnail_style("Library", LIBRARY_THUMBNAIL_SIZE))
+        self.library_thumbnails = ThumbnailLoader(self.component_tree, ThumbnailCache(size=LIBRARY_THUMBNAIL_SIZE),
+                                                  self.describe_library_row)
+    
+    def describe_library_row(self, row):
+        """Return the thumbnail description of a library row, or None for a category."""
+        if not self.component_tree.parent(row):
+            return None
+        component = self.component_library.get_component_by_name(self.component_tree.item(row, 'text'))
+        if component is None:
+            return None
+        name, latex, params = component
+        return ('entry', name, latex, params)
+    
+    @property
+    def latex_generator(self):
+        """LaTeX generator, imported on first use."""
+        if self._latex_generator is None:
+            from app.utils.latex_generator import LatexGenerator
+            self._latex_generator = LatexGenerator()
+        return self._latex_generator
+    
+    @property
+    def latex_parser(self):
+        """LaTeX parser, imported on first use."""
+        if self._latex_parser is None:
+            from app.utils.latex_parser import LatexParser
+            self._latex_parser = LatexParser()
+        return self._latex_parser
+    
+    @property
+    def pdf_exporter(self):
+        """PDF and image exporter, imported on first use."""
+        if self._pdf_exporter is None:
+            from app.utils.export import PDFExporter
+            self._pdf_exporter = PDFExporter(self.latex_compiler)
+        return self._pdf_exporter
+    
+    @property
+    def layout_engine(self):
+        """Automatic layout engine, imported on first use."""
+        if self._layout_engine is None:
+            from app.utils.layout import LayoutEngine
+            self._layout_engine = LayoutEngine()
+        return self._layout_engine
+    
+    @property
+    def constraint_solver(self):
+        """Constraint solver of the diagram, imported on first use and then used while dragging."""
+        if self._constraint_solver is None:
+            from app.utils.constraints import ConstraintSolver
+            self._constraint_solver = ConstraintSolver(self.diagram_components)
+            self.canvas_manager.constraint_solver = self._constraint_solver
+        return self._constraint_solver
+        
+    def setup_menu(self):
+        """Set up the application menu bar."""
+        self.menubar = tk.Menu(self.root)
+        
+        self.file_menu = tk.Menu(self.menubar, tearoff=0)
+        self.file_menu.add_command(label="New", command=self.new_diagram)
+        self.file_menu.add_command(label="Open...", command=self.open_diagram)
+        self.file_menu.add_command(label="Browse Diagrams...", command=self.open_diagram_browser)
+        self.file_menu.add_command(label="Save", command=self.save_diagram)
+        self.file_menu.add_command(label="Save As...", command=self.save_diagram_as)
+        self.file_menu.add_command(label="Close Tab", command=self.close_tab)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label="Compare With...", command=self.compare_with_file)
+        self.file_menu.add_command(label="Merge With...", command=self.merge_with_file)
+        self.file_menu.add_command(label="Revision History...", command=self.open_revision_history)
+        self.file_menu.add_command(label="Figure Catalog...", command=self.open_figure_catalog)
+        self.menubar.add_cascade(label="File", menu=self.file_menu)
+        
+        self.arrange_menu = tk.Menu(self.menubar, tearoff=0)
+        self.arrange_menu.add_command(label="Select All", command=self.select_all)
+        self.arrange_menu.add_command(label="Delete Selected", command=lambda: self.canvas_manager.delete_selection())
+        self.arrange_menu.add_separator()
+        self.arrange_menu.add_command(label="Rotate 90° Clockwise", command=lambda: self.arrange(group_ops.rotate, 90))
+        self.arrange_menu.add_command(label="Rotate 90° Counterclockwise",
+                                      command=lambda: self.arrange(group_ops.rotate, -90))
+        self.arrange_menu.add_separator()
+        for label, edge in (("Left", 'left'), ("Right", 'right'), ("Top", 'top'), ("Bottom", 'bottom'),
+                            ("Centers Vertically", 'center_x'), ("Centers Horizontally", 'center_y')):
+            self.arrange_menu.add_command(label=f"Align {label}",
+                                          command=lambda edge=edge: self.arrange(group_ops.align, edge))
+        self.arrange_menu.add_separator()
+        self.arrange_menu.add_command(label="Distribute Horizontally",
+                                      command=lambda: self.arrange(group_ops.distribute, 'x'))
+        self.arrange_menu.add_command(label="Distribute Vertically",
+                                      command=lambda: self.arrange(group_ops.distribute, 'y'))
+        self.menubar.add_cascade(label="Arrange", menu=self.arrange_menu)
+        
+        self.constraints_menu = tk.Menu(self.menubar, tearoff=0)
+        for label, finder in (("Keep Beams on Axes", 'axes'), ("Keep Beam Lengths", 'distances'),
+                              ("Keep Equal Spacing", 'spacing'), ("Keep on One Line", 'collinear'),
+                              ("Keep Mirror Reflections", 'reflections'), ("Fix Positions", 'fixed')):
+            self.constraints_menu.add_command(label=label, command=lambda finder=finder: self.constrain(finder))
+        self.constraints_menu.add_separator()
+        self.constraints_menu.add_command(label="Remove Constraints of Selected", command=self.remove_constraints)
+        self.constraints_menu.add_command(label="Solve All Constraints", command=self.solve_constraints)
+        self.menubar.add_cascade(label="Constraints", menu=self.constraints_menu)
+        
+        self.tools_menu = tk.Menu(self.menubar, tearoff=0)
+        self.tools_menu.add_command(label="Auto Layout",
+                                    command=lambda: self.auto_layout(sorted(self.canvas_manager.selection) or None))
+        self.tools_menu.add_command(label="Tolerance Analysis...", command=self.open_tolerance_analysis)
+        self.tools_menu.add_command(label="Analyze Beam Graph", command=self.analyze_beam_graph)
+        self.tools_menu.add_command(label="Clear Analysis Highlights", command=self.clear_beam_graph_highlights)
+        self.tools_menu.add_separator()
+        self.snap_var = tk.BooleanVar(value=True)
+        self.tools_menu.add_checkbutton(label="Snap to Grid and Guides", variable=self.snap_var,
+                                        command=self.toggle_snapping)
+        self.check_collisions_var = tk.BooleanVar(value=False)
+        self.tools_menu.add_checkbutton(label="Check Beam Collisions", variable=self.check_collisions_var,
+                                        command=self.refresh_collisions)
+        self.live_preview_var = tk.BooleanVar(value=True)
+        self.tools_menu.add_checkbutton(label="Live PDF Preview", variable=self.live_preview_var,
+                                        command=self.toggle_pdf_preview)
+        self.tools_menu.add_separator()
+        self.profile_var = tk.BooleanVar(value=PROFILER.enabled)
+        self.tools_menu.add_checkbutton(label="Record Profile", variable=self.profile_var,
+                                        command=self.toggle_profiling)
+        self.tools_menu.add_command(label="Save Profile Trace...", command=self.save_profile_trace)
+        self.menubar.add_cascade(label="Tools", menu=self.tools_menu)
+        
+        self.root.config(menu=self.menubar)
         
     def handle_tab(self, event):
         """Handle tab key in the LaTeX editor to insert spaces or indent selected lines."""
@@ -164,57 +369,171 @@ class OpticalDiagramCreator:
                         'name': component[0],
                         'latex': component[1],
                         'params': component[2].copy(),
-                        'position': (100, 100)  # Default position
+                        'position': self.layout_engine.find_free_position(self.diagram_components),
+                        'id': new_component_id()
                     })
                     
                     # Update the canvas and preview
-                    self.canvas_manager.redraw_canvas()
-                    self.update_latex_preview()
+                    self.refresh_diagram()
                     messagebox.showinfo("Component Added", f"Added {component_name} to diagram")
     
     def add_complex_setup(self, setup_name):
-        """Add a predefined complex optical setup to the diagram."""
-        # Get the components and beam definitions for this setup
-        setup_components, setup_beams = self.component_library.get_setup_components(setup_name)
-        
-        if not setup_components:
-            messagebox.showerror("Error", f"Failed to get components for {setup_name}")
-            return
-        
-        # Store current component count to calculate new indices
-        start_idx = len(self.diagram_components)
-        
-        # Create a temporary storage for new components
-        new_components = []
-        
-        # Add each component from the setup
-        for comp in setup_components:
-            component_type = comp["type"]
-            position = comp["position"]
-            params = comp["params"]
-            
-            # Get the component template
-            template = self.component_library.get_component_by_name(component_type)
-            
-            if template:
-                # Create component based on template but with our specified params
-                new_components.append({
-                    'name': component_type,
-                    'latex': template[1],
-                    'params': params,
-                    'position': position
-                })
-            else:
+        """Add a predefined complex optical setup as an instance of its shared definition."""
+        definition = self.setup_definitions.get(setup_name)
+        if definition is None:
+            try:
+                definition = SetupDefinition.from_library(self.component_library, setup_name)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            for component_type in definition.missing_types:
                 messagebox.showwarning("Warning", f"Component type {component_type} not found")
+            self.setup_definitions[setup_name] = definition
         
-        # Add all new components to the diagram
-        self.diagram_components.extend(new_components)
+        self.diagram_instances.append(SetupInstance(definition, self.free_setup_offset(definition)))
         
         # Update the canvas and preview
+        self.refresh_diagram()
+        
+        messagebox.showinfo("Setup Added", f"Added {setup_name} with {len(definition.components)} components "
+                                           "(double-click it to edit its components)")
+    
+    def free_setup_offset(self, definition):
+        """Return the offset placing a new setup instance below the rest of the diagram."""
+        bottoms = [component['position'][1] for component in self.diagram_components]
+        bottoms += [instance.offset[1] + instance.definition.bounds()[3] for instance in self.diagram_instances]
+        if not bottoms:
+            return (0, 0)
+        return (0, max(bottoms) + 150 - definition.bounds()[1])
+    
+    def flat_diagram(self):
+        """Return the components and beams with the setup instances expanded, for analyses."""
+        return flatten(self.diagram_components, self.diagram_beams, self.diagram_instances)
+    
+    def on_instance_moved(self, index):
+        """Update the LaTeX code and collisions after a setup instance was dragged."""
+        self.update_latex_preview()
+        self.refresh_collisions()
+        self.snap_engine.rebuild(*self.flat_diagram())
+    
+    def expand_instance(self, index):
+        """Replace a setup instance by editable copies of its components."""
+        instance = self.diagram_instances.pop(index)
+        start = len(self.diagram_components)
+        # Explicit beams keep the default chain of the existing components
+        self.diagram_beams[:] = resolve_beams(start, self.diagram_beams)
+        self.diagram_beams.extend(instance.beams(start))
+        self.diagram_components.extend(dict(component, id=new_component_id()) for component in instance.expand())
+        self.refresh_diagram()
+    
+    def refresh_diagram(self):
+        """Redraw the canvas and refresh everything derived from the diagram."""
         self.canvas_manager.redraw_canvas()
         self.update_latex_preview()
-        
-        messagebox.showinfo("Setup Added", f"Added {setup_name} with {len(new_components)} components")
+        self.refresh_collisions()
+        self.snap_engine.rebuild(*self.flat_diagram())
+        self.refresh_properties()
+    
+    def refresh_collisions(self):
+        """Rebuild the collision index and highlight offenders, if checking is enabled."""
+        if not self.check_collisions_var.get():
+            self.collision_checker = None
+            self.canvas_manager.clear_highlight("collision")
+            return
+        from app.analysis.collision import CollisionChecker
+        self.collision_checker = CollisionChecker(*self.flat_diagram())
+        self.show_collisions(self.collision_checker.check())
+    
+    def toggle_snapping(self):
+        """Enable or disable snapping while dragging components."""
+        self.canvas_manager.snap_engine = self.snap_engine if self.snap_var.get() else None
+        self.snap_engine.rebuild(*self.flat_diagram())
+    
+    def select_all(self):
+        """Select every component of the diagram."""
+        self.canvas_manager.set_selection(range(len(self.diagram_components)))
+    
+    def arrange(self, operation, *args):
+        """Apply a group operation (rotate, align, distribute) to the selected components."""
+        if not self.canvas_manager.selection:
+            messagebox.showinfo("Selection Required",
+                                "Select components first: click, shift-click or drag a rectangle around them.")
+            return
+        self.canvas_manager.transform_selection(operation, *args)
+    
+    def constrain(self, finder):
+        """Constrain the selected components with a finder of app.utils.constraints.FINDERS."""
+        if not self.canvas_manager.selection:
+            messagebox.showinfo("Selection Required",
+                                "Select components first: click, shift-click or drag a rectangle around them.")
+            return
+        from app.utils.constraints import FINDERS
+        indices = sorted(self.canvas_manager.selection)
+        found = FINDERS[finder](self.diagram_components, self.diagram_beams, indices)
+        added = 0
+        for kind, components in found:
+            if self.constraint_solver.add(kind, components) is not None:
+                added += 1
+        if not added:
+            messagebox.showinfo("Constraints", "The selection has no new constraints of this kind.")
+            return
+        self.apply_constraints(indices)
+    
+    def apply_constraints(self, indices=None):
+        """Solve the constraints of the components at indices (all if None) and show the result."""
+        deltas = self.constraint_solver.solve(indices)
+        self.canvas_manager.apply_moves(deltas)
+        if deltas:
+            self.canvas_manager.notify_group('constrain', sorted(deltas))
+    
+    def remove_constraints(self):
+        """Remove the constraints on the selected components."""
+        if self._constraint_solver is not None:
+            self._constraint_solver.remove_touching(self.canvas_manager.selection)
+    
+    def solve_constraints(self):
+        """Move the components to satisfy every constraint, such as after editing mirror angles."""
+        if self._constraint_solver is not None:
+            self.apply_constraints()
+    
+    def load_constraints(self, stored):
+        """Replace the constraints with those of a diagram file."""
+        if stored or self._constraint_solver is not None:
+            self.constraint_solver.load(stored)
+    
+    def on_components_changed(self, operation, indices):
+        """Update the LaTeX code, collisions, snapping and properties after a group operation."""
+        self.update_latex_preview()
+        if operation != 'set_param':
+            # Params do not change where components are
+            self.refresh_collisions()
+            self.snap_engine.rebuild(*self.flat_diagram())
+        self.refresh_properties()
+    
+    def refresh_properties(self):
+        """Show the params of the selected components in the property panel."""
+        self.property_editor.show(self.diagram_components, sorted(self.canvas_manager.selection))
+    
+    def set_selected_param(self, key, value):
+        """Set a param of every selected component from the property panel."""
+        changed = self.canvas_manager.set_selection_param(key, value)
+        if key == 'angle' and changed and self._constraint_solver is not None:
+            # Reflections follow the angles of their mirrors
+            self.apply_constraints(changed)
+    
+    def on_component_moved(self, index):
+        """Incrementally re-check collisions after a component was dragged."""
+        if self.collision_checker is not None:
+            self.show_collisions(self.collision_checker.move_component(index))
+    
+    def show_collisions(self, report):
+        """Highlight the components and beams involved in collisions."""
+        self.canvas_manager.set_highlight(
+            "collision",
+            components=report.offending_components(),
+            beams=report.offending_beams(),
+            color="orange"
+        )
     
     def update_latex_preview(self):
         """Update the LaTeX code preview based on current components."""
@@ -222,10 +541,20 @@ class OpticalDiagramCreator:
             return
             
         self.updating_latex = True
-        latex_code = self.latex_generator.generate_latex_code(self.diagram_components)
-        self.latex_preview.delete(1.0, tk.END)
-        self.latex_preview.insert(tk.END, latex_code)
+        latex_code = self.latex_generator.generate_latex_code(self.diagram_components, self.diagram_instances)
+        # Only the regenerated lines are replaced, so only they are re-highlighted
+        update_text(self.latex_preview, latex_code)
         self.updating_latex = False
+        self.preview_pane.schedule(latex_code)
+    
+    def schedule_pdf_preview(self, event=None):
+        """Queue a preview compile of the edited LaTeX code."""
+        # The buffer is read when the debounce delay passes, not per keystroke
+        self.preview_pane.schedule(lambda: self.latex_preview.get(1.0, tk.END))
+    
+    def toggle_pdf_preview(self):
+        """Enable or disable the live PDF preview."""
+        self.preview_pane.set_enabled(self.live_preview_var.get())
         
     def apply_latex_changes(self):
         """Apply the LaTeX code changes to update the diagram."""
@@ -234,14 +563,22 @@ class OpticalDiagramCreator:
             latex_code = self.latex_preview.get(1.0, tk.END)
             
             # Parse the LaTeX code to extract components and their properties
-            components = self.latex_parser.parse_latex_code(latex_code)
+            with span("parse_latex_code", "latex"):
+                components = self.latex_parser.parse_latex_code(latex_code)
             
             if components:
-                # Update the diagram components
-                self.diagram_components = components
+                # Parsed components continue the ones they were generated from
+                carry_ids(self.diagram_components, components)
+                # Update the diagram components in place, since the canvas and the
+                # constraint solver share the list; constraints do not survive reparsing
+                self.diagram_components[:] = components
+                self.diagram_beams.clear()
+                self.load_constraints([])
                 
                 # Redraw the canvas
                 self.canvas_manager.redraw_canvas()
+                self.refresh_collisions()
+                self.snap_engine.rebuild(*self.flat_diagram())
                 
                 messagebox.showinfo("Success", "LaTeX code changes applied successfully")
             else:
@@ -251,7 +588,7 @@ class OpticalDiagramCreator:
     
     def generate_latex(self):
         """Generate LaTeX file from current diagram."""
-        self.latex_generator.save_latex_file(self.diagram_components)
+        self.latex_generator.save_latex_file(self.diagram_components, self.diagram_instances)
             
     def export_pdf(self):
         """Export the current diagram as a PDF."""
@@ -259,9 +596,392 @@ class OpticalDiagramCreator:
         # This allows users to export their manually edited LaTeX
         latex_code = self.latex_preview.get(1.0, tk.END)
         self.pdf_exporter.export_pdf(latex_code)
+    
+    def export_png(self):
+        """Export the current diagram as a PNG image without running LaTeX."""
+        self.pdf_exporter.export_png(*self.flat_diagram(), widget=self.root)
+    
+    def export_svg(self):
+        """Export the current diagram as an SVG drawing without running LaTeX."""
+        self.pdf_exporter.export_svg(*self.flat_diagram())
                 
+    def auto_layout(self, selection=None):
+        """Lay out the diagram (or the given component indices) along its beam paths."""
+        if not self.diagram_components:
+            return
+        self.layout_engine.apply(self.diagram_components, self.diagram_beams, selection)
+        self.refresh_diagram()
+    
+    def open_tolerance_analysis(self):
+        """Open the Monte Carlo tolerance analysis window for the current diagram."""
+        if not self.diagram_components and not self.diagram_instances:
+            messagebox.showinfo("Empty Diagram", "Add components to the diagram before running an analysis.")
+            return
+        from app.gui.tolerance_dialog import ToleranceDialog
+        components, beams = self.flat_diagram()
+        ToleranceDialog(self.root, list(components), list(beams))
+    
+    def analyze_beam_graph(self):
+        """Report source-to-detector reachability, cavities and orphans, and highlight them."""
+        if not self.diagram_components and not self.diagram_instances:
+            messagebox.showinfo("Empty Diagram", "Add components to the diagram before running an analysis.")
+            return
+        components, beams = self.flat_diagram()
+        if self.beam_graph_analyzer is None:
+            from app.analysis.reachability import BeamGraphAnalyzer
+            self.beam_graph_analyzer = BeamGraphAnalyzer(components, beams)
+        else:
+            self.beam_graph_analyzer.sync(components, beams)
+        report = self.beam_graph_analyzer.analyze()
+        
+        cavity_of = {}
+        for number, members in enumerate(report.cavities):
+            for member in members:
+                cavity_of[member] = number
+        cavity_beams = [
+            index for index, beam in enumerate(resolve_beams(len(components), beams))
+            if beam['start'] in cavity_of and cavity_of[beam['start']] == cavity_of.get(beam['end'])
+        ]
+        self.canvas_manager.set_highlight("cavity", components=cavity_of, beams=cavity_beams, color="purple")
+        self.canvas_manager.set_highlight("unreached", components=report.unreached, color="red")
+        
+        def names(indices, limit=10):
+            labels = [f"{components[i]['name']} (#{i + 1})" for i in indices[:limit]]
+            if len(indices) > limit:
+                labels.append(f"... {len(indices) - limit} more")
+            return ", ".join(labels) or "none"
+        
+        lines = [f"{len(report.sources)} sources, {len(report.detectors)} detectors"]
+        for detector in report.detectors[:10]:
+            lines.append(f"{names([detector])} <- {names(report.fed_by(detector), limit=3)}")
+        lines.append(f"Cavities: {len(report.cavities)}")
+        lines.append(f"Orphans: {names(report.orphans)}")
+        lines.append(f"Not reached by any source: {names(report.unreached)}")
+        messagebox.showinfo("Beam Graph Analysis", "\n".join(lines))
+    
+    def clear_beam_graph_highlights(self):
+        """Remove the beam graph analysis highlights from the canvas."""
+        self.canvas_manager.clear_highlight("cavity")
+        self.canvas_manager.clear_highlight("unreached")
+    
+    def toggle_profiling(self):
+        """Start or stop recording stage timings."""
+        if self.profile_var.get():
+            PROFILER.clear()
+            PROFILER.enable()
+        else:
+            PROFILER.disable()
+    
+    def save_profile_trace(self):
+        """Save the recorded stage timings as a Chrome trace and show their summary."""
+        if not PROFILER.events:
+            messagebox.showinfo("Profile", "Nothing recorded yet. Enable Tools → Record Profile first.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            PROFILER.write_chrome_trace(file_path)
+            messagebox.showinfo("Profile", f"Trace saved to {file_path}\n\n{PROFILER.format_summary()}")
+    
     def clear_canvas(self):
         """Clear the canvas and reset components."""
         self.diagram_components.clear()
+        self.diagram_beams.clear()
+        self.diagram_instances.clear()
+        self.load_constraints([])
+        self.refresh_diagram()
+    
+    def new_diagram(self):
+        """Start an empty, unsaved diagram in a new tab."""
+        self.open_tab("Untitled Diagram")
+    
+    def open_tab(self, name):
+        """Add an empty diagram in a new tab and switch to it."""
+        if self.file_operation is not None:
+            return
+        index = self.workspace.add(name)
+        self.diagram_tabs.add(ttk.Frame(self.diagram_tabs), text=name)
+        self.switch_to(index)
+    
+    def close_tab(self):
+        """Close the active diagram's tab; closing the last one leaves an empty diagram."""
+        if self.file_operation is not None:
+            return
+        index = self.workspace.active
+        self.workspace.close(index)
+        self.diagram_tabs.forget(index)
+        if not len(self.workspace):
+            self.workspace.add("Untitled Diagram")
+            self.diagram_tabs.add(ttk.Frame(self.diagram_tabs), text="Untitled Diagram")
+        self.switch_to(min(index, len(self.workspace) - 1))
+    
+    def on_tab_changed(self, event):
+        """Switch to the diagram of the tab the user selected."""
+        self.switch_to(self.diagram_tabs.index('current'))
+    
+    def switch_to(self, index):
+        """Make the diagram of tab index the edited one, spilling others to stay within the memory budget."""
+        if index == self.workspace.active:
+            return
+        if self.file_operation is not None:
+            # The running open or save belongs to the active diagram
+            self.diagram_tabs.select(self.workspace.active)
+            return
+        if self.workspace.active is not None:
+            self.workspace.update(self.workspace.active, **self.document_state())
+        self.load_document(self.workspace.activate(index))
+        self.diagram_tabs.select(index)
+    
+    def document_state(self):
+        """Return the active diagram's content as workspace.update arguments."""
+        return {'name': self.diagram_name, 'path': self.diagram_path,
+                'components': self.diagram_components, 'beams': self.diagram_beams,
+                'instances': self.diagram_instances,
+                'constraints': self._constraint_solver.to_list() if self._constraint_solver is not None else []}
+    
+    def load_document(self, document):
+        """Show a workspace diagram on the canvas and in the LaTeX editor."""
+        self.canvas_manager.set_selection(())
+        self.diagram_components[:] = document.components
+        self.diagram_beams[:] = document.beams
+        self.diagram_instances[:] = document.instances
+        for instance in document.instances:
+            self.setup_definitions.setdefault(instance.definition.name, instance.definition)
+        self.diagram_name = document.name
+        self.diagram_path = document.path
+        self.load_constraints(document.constraints)
+        self.refresh_diagram()
+        self.refresh_tab()
+    
+    def refresh_tab(self):
+        """Show the diagram's name on its tab."""
+        self.diagram_tabs.tab(self.workspace.active, text=self.diagram_name)
+    
+    def open_diagram(self):
+        """Load a diagram file in the background, drawing it while it loads."""
+        if self.file_operation is not None:
+            return
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Diagram files", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            self.open_diagram_file(file_path)
+    
+    def open_diagram_file(self, file_path):
+        """Load the diagram file at file_path in the background."""
+        if self.file_operation is not None:
+            return
+        # The active diagram's entry is otherwise only brought up to date when switching
+        # away, and its path may have changed since (opened or saved as)
+        self.workspace.update(self.workspace.active, **self.document_state())
+        index = self.workspace.find(file_path)
+        if index is not None:
+            self.switch_to(index)
+            return
+        if self.diagram_components or self.diagram_instances or self.diagram_path is not None:
+            # Only an empty, unsaved diagram is replaced; anything else keeps its tab
+            self.open_tab("Untitled Diagram")
+        self.diagram_components.clear()
+        self.diagram_beams.clear()
+        self.diagram_instances.clear()
+        self.load_constraints([])
         self.canvas_manager.redraw_canvas()
-        self.update_latex_preview() 
\ No newline at end of file
+        self.diagram_tabs.tab(self.workspace.active, text=os.path.basename(file_path))
+        self.start_file_operation(FileOperation.load(file_path),
+                                  f"Opening {os.path.basename(file_path)}", self.finish_open)
+    
+    def finish_open(self, outcome, diagram):
+        """Complete the diagram once its components have all been drawn."""
+        if outcome == 'done':
+            self.diagram_beams.extend(diagram.beams)
+            self.diagram_instances.extend(diagram.instances)
+            for instance in diagram.instances:
+                self.setup_definitions.setdefault(instance.definition.name, instance.definition)
+            self.diagram_name = diagram.name
+            self.diagram_path = diagram.file_path
+            self.load_constraints(diagram.constraints)
+        else:
+            # A partly loaded diagram would be mistaken for the file's content
+            self.diagram_components.clear()
+        self.refresh_diagram()
+        self.refresh_tab()
+    
+    def save_diagram(self):
+        """Save the diagram to its file, asking for one if it has none."""
+        if self.diagram_path is None:
+            self.save_diagram_as()
+        else:
+            self.write_diagram(self.diagram_path)
+    
+    def save_diagram_as(self):
+        """Save the diagram to a new file."""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("Diagram files", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            self.write_diagram(file_path)
+    
+    def diagram_data(self):
+        """Return a snapshot of the diagram as diagram file data."""
+        data = {
+            'name': self.diagram_name,
+            'components': [{**component, 'params': dict(component['params']),
+                            'position': list(component['position'])}
+                           for component in self.diagram_components],
+            'beams': [dict(beam) for beam in self.diagram_beams]
+        }
+        if self.diagram_instances:
+            data.update(instances_to_dict(self.diagram_instances))
+        if self._constraint_solver is not None and len(self._constraint_solver):
+            data['constraints'] = self._constraint_solver.to_list()
+        return data
+    
+    def write_diagram(self, file_path):
+        """Write the diagram to a file in the background."""
+        if self.file_operation is not None:
+            return
+        # Snapshot the diagram so edits made during the save do not reach the file
+        data = self.diagram_data()
+        
+        def finish_save(outcome, result):
+            if outcome == 'done':
+                self.diagram_path = file_path
+        
+        self.start_file_operation(FileOperation.save(data, file_path, keep_revision=True),
+                                  f"Saving {os.path.basename(file_path)}", finish_save)
+    
+    def read_diagram_file(self, title):
+        """Ask for a diagram file and return its data, or None."""
+        file_path = filedialog.askopenfilename(
+            title=title,
+            filetypes=[("Diagram files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return None
+        try:
+            with open(file_path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to read {os.path.basename(file_path)}: {e}")
+            return None
+    
+    def compare_with_file(self):
+        """Show the changes from a diagram file to the current diagram."""
+        data = self.read_diagram_file("Compare With")
+        if data is None:
+            return
+        diff = DiagramDiff(data, self.diagram_data())
+        if not diff:
+            messagebox.showinfo("Compare", "The diagram matches the file.")
+            return
+        self.canvas_manager.set_highlight("diff", components=diff.added + [j for _, j in diff.modified],
+                                          color="blue")
+        messagebox.showinfo("Compare", "\n".join(diff.summary()))
+        self.canvas_manager.clear_highlight("diff")
+    
+    def merge_with_file(self):
+        """Merge another copy of the diagram into this one, given the version both started from."""
+        if self.file_operation is not None:
+            return
+        base = self.read_diagram_file("Merge: common base version")
+        if base is None:
+            return
+        theirs = self.read_diagram_file("Merge: version to merge in")
+        if theirs is None:
+            return
+        data, conflicts = merge(base, self.diagram_data(), theirs)
+        self.replace_diagram(data)
+        if conflicts:
+            self.canvas_manager.set_highlight("conflict", components=[
+                conflict.component for conflict in conflicts if conflict.component is not None
+            ], color="red")
+            lines = [format_conflict(conflict) for conflict in conflicts[:20]]
+            messagebox.showwarning("Merge Conflicts", f"{len(conflicts)} conflicts kept this diagram's values:\n"
+                                   + "\n".join(lines))
+        else:
+            messagebox.showinfo("Merge", "Merged without conflicts.")
+    
+    def open_revision_history(self):
+        """Open the saved revisions of the diagram's file."""
+        if self.diagram_path is None or not os.path.exists(revisions_path(self.diagram_path)):
+            messagebox.showinfo("Revision History", "Save the diagram to start keeping its revisions.")
+            return
+        from app.gui.revision_dialog import RevisionDialog
+        RevisionDialog(self.root, revisions_path(self.diagram_path), self.replace_diagram)
+    
+    def open_diagram_browser(self):
+        """Browse the diagrams in the current diagram's folder by their thumbnails."""
+        from app.gui.diagram_browser import DiagramBrowser
+        directory = os.path.dirname(os.path.abspath(self.diagram_path)) if self.diagram_path else os.getcwd()
+        DiagramBrowser(self.root, directory, self.open_diagram_file)
+    
+    def open_figure_catalog(self):
+        """Search the LaTeX figures below the diagram's directory and import one as the diagram.
+
+        An unsaved diagram has no directory, so one is asked for: the catalog is stored in
+        it and the whole tree below it is indexed.
+        """
+        from app.gui.figure_catalog_dialog import FigureCatalogDialog
+        if self.diagram_path:
+            directory = os.path.dirname(os.path.abspath(self.diagram_path))
+        else:
+            directory = filedialog.askdirectory(title="Figure Catalog: directory of figures")
+            if not directory:
+                return
+        FigureCatalogDialog(self.root, directory, self.replace_diagram)
+    
+    def replace_diagram(self, data):
+        """Replace the diagram with diagram file data, such as a saved revision or a merge."""
+        if self.file_operation is not None:
+            return
+        diagram = Diagram.from_dict(data)
+        self.diagram_components[:] = diagram.get_component_dicts()
+        self.diagram_beams[:] = diagram.beams
+        self.diagram_instances[:] = diagram.instances
+        for instance in diagram.instances:
+            self.setup_definitions.setdefault(instance.definition.name, instance.definition)
+        self.diagram_name = diagram.name
+        self.load_constraints(diagram.constraints)
+        self.refresh_diagram()
+        self.refresh_tab()
+    
+    def start_file_operation(self, operation, label, on_finish):
+        """Run a file operation, showing its progress until on_finish(outcome, result) is called."""
+        self.file_operation = operation
+        self.file_operation_finish = on_finish
+        self.file_progress_label.config(text=label)
+        self.file_progress_bar['value'] = 0
+        self.file_progress.pack(fill=tk.X, pady=5)
+        operation.start()
+        self.root.after(50, self.poll_file_operation)
+    
+    def cancel_file_operation(self):
+        """Stop the running open or save; a cancelled save leaves the file untouched."""
+        if self.file_operation is not None:
+            self.file_operation.cancel()
+    
+    def poll_file_operation(self):
+        """Apply the progress and components posted by the file operation until it ends."""
+        operation = self.file_operation
+        # A few batches per call keep the window responsive while a large diagram loads
+        messages = operation.poll(limit=8)
+        for kind, value in messages:
+            if kind == 'progress':
+                self.file_progress_bar['value'] = value
+            elif kind == 'components':
+                start = len(self.diagram_components)
+                self.diagram_components.extend(value)
+                self.canvas_manager.draw_new_components(start)
+        if not operation.finished:
+            self.root.after(20, self.poll_file_operation)
+            return
+        
+        self.file_operation = None
+        self.file_progress.pack_forget()
+        outcome, result = messages[-1]
+        if outcome == 'error':
+            messagebox.showerror("Error", f"{self.file_progress_label.cget('text')} failed: {result}")
+        self.file_operation_finish(outcome, result) 
\ No newline at end of file
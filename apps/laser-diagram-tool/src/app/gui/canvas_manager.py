@@ -3,15 +3,48 @@ CanvasManager - Handles the drawing and interaction with the diagram canvas
 """
 
 import tkinter as tk
+from app.models.diagram import resolve_beams
+from app.utils import group_ops
+from app.utils.profiling import count, profiled
+from app.utils.shapes import BEAM_STYLE, COLORS, Shape, component_shapes
 
 class CanvasManager:
     """Class to manage the diagram canvas and component rendering."""
     
-    def __init__(self, canvas, components_list):
-        """Initialize with the canvas and components list."""
+    def __init__(self, canvas, components_list, beams_list=None, instances_list=None):
+        """Initialize with the canvas, components list and optional beams and setup instances lists."""
         self.canvas = canvas
         self.components = components_list
+        self.beams = beams_list if beams_list is not None else []
+        self.instances = instances_list if instances_list is not None else []
         self.canvas_objects = []
+        self.instance_objects = []
+        
+        # Shapes of each distinct setup in its own coordinates, shared by its instances
+        self.setup_shapes = {}
+        
+        # Highlight overlays by tag: (component indices, beam indices, color)
+        self.highlights = {}
+        
+        # Callbacks notified with the component index after a drag ends
+        self.move_listeners = []
+        
+        # Callbacks notified with (operation name, component indices) after a group
+        # of components was dragged, transformed or deleted
+        self.group_listeners = []
+        
+        # Callbacks notified with the selected component indices when the selection changes
+        self.selection_listeners = []
+        
+        # Callbacks notified with the setup instance index after it was dragged or double-clicked
+        self.instance_move_listeners = []
+        self.instance_open_listeners = []
+        
+        # Optional SnapEngine used while dragging
+        self.snap_engine = None
+        
+        # Optional ConstraintSolver moving constrained components along with a drag
+        self.constraint_solver = None
         
         # Set up canvas interactions
         self.setup_canvas_interactions()
@@ -22,20 +55,44 @@ class CanvasManager:
         self.canvas.bind("<ButtonPress-1>", self.on_mouse_down)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_up)
+        self.canvas.bind("<Double-Button-1>", self.on_double_click)
+        
+        # Keyboard shortcuts for the selection
+        self.canvas.bind("<Delete>", lambda event: self.delete_selection())
+        self.canvas.bind("<Escape>", lambda event: self.set_selection(()))
         
-        # Selection functionality
+        # Selection functionality: the selected component indices share the canvas tag
+        # "selected", so the whole group moves with one canvas call
+        self.selection = set()
+        # Beams with one end selected, (beam index, start, end), redrawn while dragging
+        self.boundary_beams = []
+        # Rubber-band start (x, y, extend selection) while dragging out a rectangle,
+        # and the rectangle's item once the mouse moved
+        self.band_start = None
+        self.band_item = None
+        self.selection_box = None
         self.selected_item = None
+        self.selected_instance = None
         self.drag_start_x = 0
         self.drag_start_y = 0
+        self.drag_moved = False
+        # Components the constraint solver moved during the current drag
+        self.drag_solved = set()
+        # Components taken out of the snap indexes for the current drag
+        self.drag_group = set()
         
+    @profiled("redraw_canvas", "canvas")
     def redraw_canvas(self):
         """Redraw all components on the canvas."""
         # Clear the canvas
         self.canvas.delete("all")
         self.canvas_objects = []
+        self.instance_objects = []
+        self.selection_box = None
+        self.selection = {index for index in self.selection if index < len(self.components)}
         
         # If no components, draw placeholder text
-        if not self.components:
+        if not self.components and not self.instances:
             self.canvas.create_text(
                 self.canvas.winfo_width() // 2,
                 self.canvas.winfo_height() // 2,
@@ -50,144 +107,37 @@ class CanvasManager:
         
         # Draw connections between components
         self.draw_connections()
-    
-    def draw_component(self, component, index):
-        """Draw a single component on the canvas."""
-        x, y = component['position']
-        component_name = component['name']
-        
-        # Different drawing methods based on component type
-        if "Lens" in component_name:
-            if "Thick" in component_name:
-                # Draw thick lens
-                obj_id = self.canvas.create_oval(x-30, y-40, x+30, y+40, outline="black", width=2)
-                self.canvas.create_oval(x-25, y-35, x+25, y+35, outline="black", width=1, dash=(2,2))
-                text_id = self.canvas.create_text(x, y, text=component['params']['label'])
-            elif "Objective" in component_name:
-                # Draw objective lens
-                obj_id = self.canvas.create_oval(x-30, y-40, x+30, y+40, outline="black", width=2, fill="light gray")
-                text_id = self.canvas.create_text(x, y, text=component['params']['label'])
-            else:
-                # Draw standard lens as ellipse
-                obj_id = self.canvas.create_oval(x-30, y-40, x+30, y+40, outline="black", width=2)
-                text_id = self.canvas.create_text(x, y, text=component['params']['label'])
-        
-        elif "Mirror" in component_name:
-            if "Curved" in component_name:
-                # Draw curved mirror
-                obj_id = self.canvas.create_arc(x-40, y-40, x+40, y+40, 
-                                               start=135, extent=90, 
-                                               style="arc", outline="black", width=3)
-                text_id = self.canvas.create_text(x+10, y-10, text=component['params']['label'])
-            else:
-                # Draw standard mirror as line
-                obj_id = self.canvas.create_line(x-40, y-40, x+40, y+40, fill="black", width=3)
-                text_id = self.canvas.create_text(x+10, y-10, text=component['params']['label'])
-        
-        elif "Beam Splitter" in component_name or "BS" in component_name:
-            if "Polarizing" in component_name or "PBS" in component_name:
-                # Draw PBS as a cube
-                obj_id = self.canvas.create_rectangle(x-30, y-30, x+30, y+30, outline="black", width=2, fill="light gray")
-                self.canvas.create_line(x-30, y-30, x+30, y+30, fill="black", width=1)
-                text_id = self.canvas.create_text(x, y-40, text=component['params']['label'])
-            else:
-                # Draw regular beam splitter as a plate
-                obj_id = self.canvas.create_rectangle(x-5, y-30, x+5, y+30, outline="black", width=2, fill="light blue")
-                self.canvas.create_line(x-30, y, x+30, y, fill="black", width=1, dash=(4,2))
-                text_id = self.canvas.create_text(x, y-40, text=component['params']['label'])
-        
-        elif "Wave Plate" in component_name or "WP" in component_name:
-            # Draw wave plate as a rectangle with lines
-            obj_id = self.canvas.create_rectangle(x-20, y-30, x+20, y+30, outline="black", width=2, fill="light yellow")
-            # Different patterns for half vs quarter wave plates
-            if "Half" in component_name or "HWP" in component_name:
-                self.canvas.create_line(x-20, y-15, x+20, y-15, fill="black")
-                self.canvas.create_line(x-20, y+15, x+20, y+15, fill="black")
-            else:
-                self.canvas.create_line(x-20, y-10, x+20, y-10, fill="black")
-                self.canvas.create_line(x-20, y, x+20, y, fill="black")
-                self.canvas.create_line(x-20, y+10, x+20, y+10, fill="black")
-            text_id = self.canvas.create_text(x, y, text=component['params']['label'])
-        
-        elif "Filter" in component_name:
-            # Draw filter as a thin rectangle
-            obj_id = self.canvas.create_rectangle(x-30, y-7, x+30, y+7, outline="black", width=2, fill="light green")
-            text_id = self.canvas.create_text(x, y-20, text=component['params']['label'])
-        
-        elif "Isolator" in component_name:
-            # Draw optical isolator
-            obj_id = self.canvas.create_oval(x-25, y-25, x+25, y+25, outline="black", width=2)
-            # Draw directional arrow inside
-            self.canvas.create_line(x-15, y, x+15, y, fill="black", arrow=tk.LAST, width=2)
-            text_id = self.canvas.create_text(x, y-35, text=component['params']['label'])
         
-        elif "Modulator" in component_name or "AOM" in component_name or "EOM" in component_name:
-            # Draw modulator as rectangle with zigzag line
-            obj_id = self.canvas.create_rectangle(x-35, y-25, x+35, y+25, outline="black", width=2)
-            # Draw a zigzag line to represent modulation
-            points = [x-25, y-10, x-15, y+10, x-5, y-10, x+5, y+10, x+15, y-10, x+25, y+10]
-            self.canvas.create_line(points, fill="black", width=1)
-            text_id = self.canvas.create_text(x, y-35, text=component['params']['label'])
+        # Draw setup instances
+        for i, instance in enumerate(self.instances):
+            self.draw_instance(instance, i)
         
-        elif "Grating" in component_name:
-            # Draw diffraction grating
-            obj_id = self.canvas.create_rectangle(x-30, y-4, x+30, y+4, outline="black", width=1, fill="gray")
-            # Add grating lines
-            for i in range(-25, 26, 5):
-                self.canvas.create_line(x+i, y-7, x+i, y+7, fill="black", width=1)
-            text_id = self.canvas.create_text(x, y-15, text=component['params']['label'])
+        # Restore highlight overlays
+        for tag in self.highlights:
+            self.draw_highlight(tag)
         
-        elif "Fiber" in component_name:
-            # Draw fiber as curved line
-            obj_id = self.canvas.create_arc(x-40, y-40, x+40, y+40, 
-                                           start=0, extent=180, 
-                                           style="arc", outline="blue", width=2)
-            text_id = self.canvas.create_text(x, y+25, text=component['params']['label'])
-        
-        elif "Source" in component_name or "Laser" in component_name or "LED" in component_name:
-            # Draw light source as rectangle with distinctive colors
-            if "Laser" in component_name:
-                fill_color = "light yellow"
-            elif "LED" in component_name:
-                fill_color = "light green"
-            else:
-                fill_color = "white"
-            obj_id = self.canvas.create_rectangle(x-40, y-30, x+40, y+30, outline="black", fill=fill_color)
-            text_id = self.canvas.create_text(x, y, text=component['params']['label'])
-        
-        elif "Detector" in component_name or "Photodiode" in component_name or "Camera" in component_name:
-            # Draw detector as rectangle with distinctive colors
-            if "Camera" in component_name:
-                fill_color = "light blue"
-                # Add camera lens symbol
-                self.canvas.create_oval(x-15, y-15, x+15, y+15, outline="black")
-            elif "Spectrometer" in component_name:
-                fill_color = "light purple"
-            elif "Power" in component_name:
-                fill_color = "light green"
-            else:
-                fill_color = "light gray"
-            obj_id = self.canvas.create_rectangle(x-40, y-30, x+40, y+30, outline="black", fill=fill_color)
-            text_id = self.canvas.create_text(x, y, text=component['params']['label'])
-        
-        elif "Circulator" in component_name:
-            # Draw optical circulator as circle with curved arrow
-            obj_id = self.canvas.create_oval(x-30, y-30, x+30, y+30, outline="black", width=2, fill="light yellow")
-            # Draw a circular arrow inside
-            self.canvas.create_arc(x-20, y-20, x+20, y+20, start=45, extent=270, 
-                                   style="arc", outline="black", width=2, arrow=tk.LAST)
-            text_id = self.canvas.create_text(x, y-40, text=component['params']['label'])
-        
-        elif "Amplifier" in component_name:
-            # Draw optical amplifier as a triangle
-            obj_id = self.canvas.create_polygon(x-30, y-25, x-30, y+25, x+30, y, 
-                                               outline="black", fill="light green", width=2)
-            text_id = self.canvas.create_text(x, y-35, text=component['params']['label'])
-        
-        else:
-            # Generic component
-            obj_id = self.canvas.create_rectangle(x-30, y-30, x+30, y+30, outline="black")
-            text_id = self.canvas.create_text(x, y, text=component['params']['label'])
+        _, self.boundary_beams = self.selection_beams()
+        self.draw_selection_box()
+    
+    def draw_new_components(self, start):
+        """Draw the components from index start on, leaving those already drawn."""
+        if start == 0:
+            # Drop the placeholder text
+            self.canvas.delete("all")
+            self.canvas_objects = []
+        for i in range(start, len(self.components)):
+            self.draw_component(self.components[i], i)
+    
+    def draw_component(self, component, index):
+        """Draw a single component on the canvas."""
+        obj_id = text_id = None
+        tags = ("component", f"comp{index}") + (("selected",) if index in self.selection else ())
+        for shape in component_shapes(component):
+            item = self.draw_shape(shape, tags)
+            if shape.role == 'body':
+                obj_id = item
+            elif shape.role == 'label':
+                text_id = item
         
         # Store the canvas objects for later reference
         self.canvas_objects.append({
@@ -196,61 +146,372 @@ class CanvasManager:
             'text_id': text_id
         })
     
+    def draw_instance(self, instance, index):
+        """Draw a setup instance from its definition's shapes, moved to the instance's offset."""
+        key = instance.variant_key()
+        shapes = self.setup_shapes.get(key)
+        if shapes is None:
+            components = instance.local_components()
+            shapes = [shape for component in components for shape in component_shapes(component)]
+            for beam in instance.beams():
+                coords = components[beam['start']]['position'] + components[beam['end']]['position']
+                shapes.append(Shape('line', coords, BEAM_STYLE, 'beam'))
+            self.setup_shapes[key] = shapes
+        
+        dx, dy = instance.offset
+        tag = f"instance{index}"
+        for shape in shapes:
+            coords = [value + (dy if i % 2 else dx) for i, value in enumerate(shape.coords)]
+            self.draw_shape(shape._replace(coords=coords), tags=("instance", tag))
+        self.instance_objects.append({'instance_index': index, 'tag': tag, 'bbox': self.canvas.bbox(tag)})
+    
+    def instance_at(self, x, y):
+        """Return the canvas object of the topmost setup instance at a point, or None."""
+        for obj in reversed(self.instance_objects):
+            bbox = obj['bbox']
+            if bbox and bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]:
+                return obj
+        return None
+    
+    def draw_shape(self, shape, tags=()):
+        """Create the canvas item for a shape and return its id."""
+        options = dict(shape.options)
+        for key in ('fill', 'outline'):
+            if options.get(key) in COLORS:
+                options[key] = "#%02x%02x%02x" % COLORS[options[key]]
+        if shape.kind == 'arc':
+            # Tk arcs cannot carry arrowheads
+            options.pop('arrow', None)
+        count("canvas items created")
+        return getattr(self.canvas, f"create_{shape.kind}")(*shape.coords, tags=tags, **options)
+    
     def draw_connections(self):
         """Draw beam connections between components."""
         if len(self.components) < 2:
             return
         
-        # Draw straight lines between consecutive components
-        for i in range(len(self.components) - 1):
-            x1, y1 = self.components[i]['position']
-            x2, y2 = self.components[i+1]['position']
+        # Draw straight lines along the beams (consecutive components by default)
+        for i, beam in enumerate(resolve_beams(len(self.components), self.beams)):
+            x1, y1 = self.components[beam['start']]['position']
+            x2, y2 = self.components[beam['end']]['position']
             
-            # Create a beam line with proper tagging for redrawing
+            # Create a beam line with proper tagging for redrawing; beams inside the
+            # selection move with it
+            tags = ("connection", f"beam{i}")
+            if beam['start'] in self.selection and beam['end'] in self.selection:
+                tags += ("selected",)
+            count("canvas items created")
             self.canvas.create_line(
                 x1, y1, x2, y2, 
-                fill="red", 
-                width=2, 
-                dash=(4, 2),
-                tags="connection"
+                tags=tags,
+                **BEAM_STYLE
+            )
+    
+    def run_batch(self, commands):
+        """Run canvas commands, given as (command, *args) tuples, with one call into Tk.
+        
+        The arguments are tags and numbers, so the commands are joined into a single
+        Tcl script instead of costing a Python-to-Tk round trip each.
+        """
+        if not commands:
+            return
+        count("canvas batches")
+        tk = getattr(self.canvas, 'tk', None)
+        if tk is None:
+            # Canvases without a Tcl interpreter, like the benchmarks' fake canvas
+            for name, *args in commands:
+                getattr(self.canvas, name)(*args)
+            return
+        widget = self.canvas._w
+        tk.eval("\n".join(f"{widget} {' '.join(str(arg) for arg in command)}" for command in commands))
+    
+    def beam_coords(self, index, start, end):
+        """Return the batch command placing beam index between its components."""
+        x1, y1 = self.components[start]['position']
+        x2, y2 = self.components[end]['position']
+        return ("coords", f"beam{index}", x1, y1, x2, y2)
+    
+    def selection_beams(self):
+        """Return the indices of beams inside the selection and the (index, start, end) of
+        beams with one end in it."""
+        internal, boundary = [], []
+        if not self.selection or len(self.components) < 2:
+            return internal, boundary
+        for i, beam in enumerate(resolve_beams(len(self.components), self.beams)):
+            start_selected = beam['start'] in self.selection
+            end_selected = beam['end'] in self.selection
+            if start_selected and end_selected:
+                internal.append(i)
+            elif start_selected or end_selected:
+                boundary.append((i, beam['start'], beam['end']))
+        return internal, boundary
+    
+    def set_selection(self, indices):
+        """Select the components with the given indices, retagging the canvas in one batch."""
+        selection = {index for index in indices if 0 <= index < len(self.components)}
+        if selection == self.selection:
+            return
+        commands = [("dtag", "selected")] if self.selection else []
+        self.selection = selection
+        internal, self.boundary_beams = self.selection_beams()
+        commands += [("addtag", "selected", "withtag", f"comp{index}") for index in self.selection]
+        commands += [("addtag", "selected", "withtag", f"beam{index}") for index in internal]
+        self.run_batch(commands)
+        self.draw_selection_box()
+        for listener in self.selection_listeners:
+            listener(self.selection)
+    
+    def draw_selection_box(self):
+        """Outline the selection with a dashed rectangle that moves with it."""
+        if self.selection_box is not None:
+            self.canvas.delete(self.selection_box)
+            self.selection_box = None
+        if not self.selection:
+            return
+        bbox = self.canvas.bbox("selected")
+        if bbox:
+            self.selection_box = self.canvas.create_rectangle(
+                bbox[0] - 6, bbox[1] - 6, bbox[2] + 6, bbox[3] + 6,
+                outline="deep sky blue", dash=(4, 2), tags=("selection_box", "selected")
             )
     
+    def apply_moves(self, deltas):
+        """Move the items of components by {index: (dx, dy)} and refit their beams in one batch."""
+        if not deltas:
+            return
+        commands = [("move", f"comp{index}", dx, dy) for index, (dx, dy) in deltas.items()]
+        if len(self.components) >= 2:
+            for i, beam in enumerate(resolve_beams(len(self.components), self.beams)):
+                if beam['start'] in deltas or beam['end'] in deltas:
+                    commands.append(self.beam_coords(i, beam['start'], beam['end']))
+        self.run_batch(commands)
+        self.draw_selection_box()
+    
+    def transform_selection(self, operation, *args):
+        """Apply a group_ops transform (rotate, align, distribute) to the selection."""
+        deltas = operation(self.components, sorted(self.selection), *args)
+        self.apply_moves(deltas)
+        if deltas:
+            self.notify_group(operation.__name__, sorted(deltas))
+        return deltas
+    
+    def set_selection_param(self, key, value):
+        """Set a param of every selected component as one model update.
+        
+        A label edit retags the changed labels in one batch and sets their text with
+        one call on the tag; other params are not drawn.
+        """
+        changed = group_ops.set_param(self.components, sorted(self.selection), key, value)
+        if not changed:
+            return changed
+        if key == 'label':
+            commands = [("addtag", "relabel", "withtag", self.canvas_objects[index]['text_id'])
+                        for index in changed
+                        if index < len(self.canvas_objects) and self.canvas_objects[index]['text_id'] is not None]
+            self.run_batch(commands)
+            self.canvas.itemconfig("relabel", text=value)
+            self.canvas.dtag("relabel")
+        self.notify_group('set_param', changed)
+        return changed
+    
+    def delete_selection(self):
+        """Delete the selected components and their beams."""
+        if not self.selection:
+            return
+        indices = sorted(self.selection)
+        mapping = group_ops.delete(self.components, self.beams, indices)
+        if self.constraint_solver is not None:
+            self.constraint_solver.remap(mapping)
+        self.selection = set()
+        # Overlays refer to the old component indices
+        self.highlights.clear()
+        self.redraw_canvas()
+        self.notify_group('delete', indices)
+    
+    def notify_group(self, operation, indices):
+        """Tell the group listeners that an operation changed the components at indices."""
+        for listener in self.group_listeners:
+            listener(operation, indices)
+    
+    def set_highlight(self, tag, components=(), beams=(), color="orange"):
+        """Highlight components and beams with an overlay identified by a tag."""
+        self.highlights[tag] = (set(components), set(beams), color)
+        self.draw_highlight(tag)
+    
+    def clear_highlight(self, tag):
+        """Remove a highlight overlay."""
+        self.highlights.pop(tag, None)
+        self.canvas.delete(tag)
+    
+    def draw_highlight(self, tag):
+        """Draw the overlay items of a highlight."""
+        self.canvas.delete(tag)
+        components, beams, color = self.highlights[tag]
+        
+        for obj in self.canvas_objects:
+            if obj['component_index'] in components:
+                bbox = self.canvas.bbox(obj['obj_id'])
+                if bbox:
+                    self.canvas.create_rectangle(
+                        bbox[0] - 4, bbox[1] - 4, bbox[2] + 4, bbox[3] + 4,
+                        outline=color, width=2, dash=(3, 2), tags=(tag, "highlight")
+                    )
+        
+        all_beams = resolve_beams(len(self.components), self.beams) if beams else []
+        for index in beams:
+            if index < len(all_beams):
+                x1, y1 = self.components[all_beams[index]['start']]['position']
+                x2, y2 = self.components[all_beams[index]['end']]['position']
+                self.canvas.create_line(x1, y1, x2, y2, fill=color, width=4, tags=(tag, "highlight"))
+    
     def on_mouse_down(self, event):
         """Handle mouse button press on the canvas."""
+        self.canvas.focus_set()
+        # Shift-click adds to or removes from the selection
+        extend = bool(getattr(event, 'state', 0) & 0x0001)
+        
         # Check if clicked on any component
         for obj in self.canvas_objects:
             item = obj['obj_id']
             bbox = self.canvas.bbox(item)
             if bbox and bbox[0] <= event.x <= bbox[2] and bbox[1] <= event.y <= bbox[3]:
+                if extend:
+                    self.set_selection(self.selection ^ {obj['component_index']})
+                    return
+                # Clicking outside the selection starts a new one; inside it drags the group
+                if obj['component_index'] not in self.selection:
+                    self.set_selection({obj['component_index']})
                 self.selected_item = obj
                 self.drag_start_x = event.x
                 self.drag_start_y = event.y
+                self.drag_moved = False
+                
+                # Remember where the drag started so snapping works on the raw position
+                component_index = obj['component_index']
+                self.drag_origin = self.components[component_index]['position']
+                self.drag_anchor = (event.x, event.y)
+                self.drag_solved = set()
+                # The whole selection moves, and with it the components constrained to it,
+                # so none of them may serve as an alignment target
+                self.drag_group = set(self.selection)
+                if self.constraint_solver is not None:
+                    for index in self.selection:
+                        self.drag_group.update(self.constraint_solver.cluster(index))
+                if self.snap_engine:
+                    self.snap_engine.begin_drag(self.drag_group)
                 break
+        
+        # Setup instances are dragged as a whole
+        if self.selected_item is None:
+            self.selected_instance = self.instance_at(event.x, event.y)
+            self.drag_start_x = event.x
+            self.drag_start_y = event.y
+            self.drag_moved = False
+        
+        # Dragging on empty canvas selects the components inside a rectangle
+        if self.selected_item is None and self.selected_instance is None:
+            self.band_start = (event.x, event.y, extend)
     
     def on_mouse_drag(self, event):
         """Handle mouse drag on the canvas."""
-        if self.selected_item:
-            # Calculate movement delta
+        if self.selected_instance:
             dx = event.x - self.drag_start_x
             dy = event.y - self.drag_start_y
+            self.canvas.move(self.selected_instance['tag'], dx, dy)
+            instance = self.instances[self.selected_instance['instance_index']]
+            instance.offset = (instance.offset[0] + dx, instance.offset[1] + dy)
+            x1, y1, x2, y2 = self.selected_instance['bbox']
+            self.selected_instance['bbox'] = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+            self.drag_start_x = event.x
+            self.drag_start_y = event.y
+            self.drag_moved = True
+        
+        if self.band_start is not None:
+            x, y, _ = self.band_start
+            if self.band_item is None:
+                self.band_item = self.canvas.create_rectangle(x, y, event.x, event.y, outline="deep sky blue",
+                                                              dash=(2, 2), tags="rubberband")
+            else:
+                self.canvas.coords(self.band_item, x, y, event.x, event.y)
+        
+        if self.selected_item:
+            component_index = self.selected_item['component_index']
+            x, y = self.components[component_index]['position']
+            
+            # Target position of the component, snapped to grid and guides if enabled
+            target_x = self.drag_origin[0] + event.x - self.drag_anchor[0]
+            target_y = self.drag_origin[1] + event.y - self.drag_anchor[1]
+            guides = []
+            if self.snap_engine:
+                target_x, target_y, guides = self.snap_engine.snap(target_x, target_y)
             
-            # Move the component and its label
-            self.canvas.move(self.selected_item['obj_id'], dx, dy)
-            self.canvas.move(self.selected_item['text_id'], dx, dy)
+            # Calculate movement delta
+            dx = target_x - x
+            dy = target_y - y
             
             # Update tracking position
             self.drag_start_x = event.x
             self.drag_start_y = event.y
+            self.drag_moved = True
             
-            # Update component position in the data structure
-            component_index = self.selected_item['component_index']
-            x, y = self.components[component_index]['position']
-            self.components[component_index]['position'] = (x + dx, y + dy)
+            constrained = self.constraint_solver is not None and any(
+                self.constraint_solver.constrained(index) for index in self.selection)
+            if (dx or dy) and constrained:
+                # The solver moves the components constrained to the selection too
+                deltas = self.constraint_solver.drag(sorted(self.selection), dx, dy)
+                self.drag_solved.update(deltas)
+                self.apply_moves(deltas)
+            elif dx or dy:
+                # Move the selected components in the data structure, then their items,
+                # the beams inside the selection and the selection box with the shared
+                # tag, refitting only the beams that leave the selection
+                group_ops.move(self.components, self.selection, dx, dy)
+                commands = [("move", "selected", dx, dy)]
+                commands += [self.beam_coords(*beam) for beam in self.boundary_beams]
+                self.run_batch(commands)
             
-            # Redraw connections
-            self.canvas.delete("connection")
-            self.draw_connections()
+            # Redraw alignment guides
+            self.draw_guides(guides)
+    
+    def draw_guides(self, guides):
+        """Draw alignment guide lines across the visible canvas."""
+        self.canvas.delete("guide")
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        for axis, value in guides:
+            if axis == 'x':
+                self.canvas.create_line(value, 0, value, height, fill="deep sky blue", dash=(2, 2), tags="guide")
+            else:
+                self.canvas.create_line(0, value, width, value, fill="deep sky blue", dash=(2, 2), tags="guide")
     
     def on_mouse_up(self, event):
         """Handle mouse button release on the canvas."""
-        self.selected_item = None 
\ No newline at end of file
+        self.canvas.delete("guide")
+        if self.band_start is not None:
+            x, y, extend = self.band_start
+            self.band_start = None
+            if self.band_item is not None:
+                self.canvas.delete(self.band_item)
+                self.band_item = None
+            indices = group_ops.in_rectangle(self.components, x, y, event.x, event.y)
+            self.set_selection(self.selection.union(indices) if extend else indices)
+        if self.selected_item and self.snap_engine:
+            self.snap_engine.end_drag(self.drag_group)
+        if self.selected_item and self.drag_moved:
+            if len(self.selection) > 1 or self.drag_solved - self.selection:
+                self.notify_group('move', sorted(self.selection | self.drag_solved))
+            else:
+                for listener in self.move_listeners:
+                    listener(self.selected_item['component_index'])
+        if self.selected_instance and self.drag_moved:
+            for listener in self.instance_move_listeners:
+                listener(self.selected_instance['instance_index'])
+        self.selected_item = None
+        self.selected_instance = None
+    
+    def on_double_click(self, event):
+        """Open a setup instance for editing when it is double-clicked."""
+        obj = self.instance_at(event.x, event.y)
+        if obj is not None:
+            for listener in self.instance_open_listeners:
+                listener(obj['instance_index']) 
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+DiagramBrowser - Window listing the diagram files of a folder with their thumbnails
+"""
+
+import os
+import time
+import tkinter as tk
+from tkinter import ttk, filedialog
+from app.gui.thumbnail_loader import ThumbnailLoader, thumbnail_style
+from app.utils.thumbnails import THUMBNAIL_SIZE, ThumbnailCache
+
+class DiagramBrowser(tk.Toplevel):
+    """Dialog browsing a folder of diagrams; thumbnails appear as they are rendered."""
+
+    def __init__(self, parent, directory, on_open):
+        """Initialize the browser for directory; on_open receives the path of the chosen diagram."""
+        super().__init__(parent)
+        self.title("Browse Diagrams")
+        self.geometry("640x520")
+
+        self.on_open = on_open
+        self.directory_var = tk.StringVar(value=directory)
+
+        self.setup_ui()
+        self.loader = ThumbnailLoader(self.file_tree, ThumbnailCache(size=THUMBNAIL_SIZE),
+                                      lambda row: ('diagram', row))
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.load_directory()
+
+    def setup_ui(self):
+        """Set up the folder field, the file table and buttons."""
+        form = ttk.Frame(self, padding="10")
+        form.pack(fill=tk.X)
+        ttk.Label(form, text="Folder").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(form, textvariable=self.directory_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Button(form, text="Browse...", command=self.browse).pack(side=tk.LEFT, padx=5)
+
+        table = ttk.Frame(self, padding=(10, 0))
+        table.pack(fill=tk.BOTH, expand=True)
+        columns = ("modified", "size")
+        self.file_tree = ttk.Treeview(table, columns=columns, selectmode="browse",
+                                      style=thumbnail_style("Thumbnail", THUMBNAIL_SIZE))
+        self.file_tree.heading("#0", text="Diagram")
+        self.file_tree.column("#0", width=320)
+        self.file_tree.heading("modified", text="Modified")
+        self.file_tree.column("modified", width=150)
+        self.file_tree.heading("size", text="Size")
+        self.file_tree.column("size", width=80, anchor=tk.E)
+        scrollbar = ttk.Scrollbar(table, orient=tk.VERTICAL, command=self.file_tree.yview)
+        self.file_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.file_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.file_tree.bind("<Double-Button-1>", lambda event: self.open_selected())
+
+        buttons = ttk.Frame(self, padding="10")
+        buttons.pack(fill=tk.X)
+        ttk.Button(buttons, text="Open", command=self.open_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Close", command=self.on_close).pack(side=tk.LEFT, padx=5)
+        self.status_label = ttk.Label(buttons, text="")
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
+    def browse(self):
+        """Choose another folder."""
+        directory = filedialog.askdirectory(parent=self, initialdir=self.directory_var.get())
+        if directory:
+            self.directory_var.set(directory)
+            self.load_directory()
+
+    def load_directory(self):
+        """List the folder's diagram files; thumbnails load for the rows in view."""
+        self.file_tree.delete(*self.file_tree.get_children())
+        directory = self.directory_var.get()
+        try:
+            entries = sorted((entry for entry in os.scandir(directory)
+                              if entry.is_file() and entry.name.endswith(".json")),
+                             key=lambda entry: entry.name.lower())
+        except OSError as e:
+            self.status_label.configure(text=str(e))
+            entries = []
+        for entry in entries:
+            stat = entry.stat()
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(stat.st_mtime))
+            self.file_tree.insert("", tk.END, iid=entry.path, text=entry.name,
+                                  values=(modified, f"{stat.st_size / 1024:.0f} KB"))
+        if entries:
+            self.status_label.configure(text=f"{len(entries):,} diagrams")
+        self.loader.reset()
+
+    def open_selected(self):
+        """Hand the selected diagram to the application."""
+        selection = self.file_tree.selection()
+        if selection:
+            self.on_open(selection[0])
+
+    def on_close(self):
+        """Stop rendering thumbnails and close the window."""
+        self.loader.close()
+        self.destroy()
@@ -0,0 +1,192 @@
+"""
+FigureCatalogDialog - Window searching a tree of LaTeX figures and importing matches
+"""
+
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+from app.utils.figure_catalog import FigureCatalog
+
+class FigureCatalogDialog(tk.Toplevel):
+    """Dialog that indexes a directory of figures in the background and searches it as you type."""
+
+    def __init__(self, parent, root_directory, on_import):
+        """Initialize the dialog for the tree at root_directory; on_import receives the diagram data."""
+        super().__init__(parent)
+        self.title("Figure Catalog")
+        self.geometry("760x440")
+
+        self.on_import = on_import
+        self.catalog = None
+        self.matches = {}
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
+        self.poll_id = None
+
+        self.directory_var = tk.StringVar(value=root_directory)
+        self.query_var = tk.StringVar()
+
+        self.setup_ui()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.open_catalog()
+
+    def setup_ui(self):
+        """Set up the directory and search fields, the results table and buttons."""
+        form = ttk.Frame(self, padding="10")
+        form.pack(fill=tk.X)
+        ttk.Label(form, text="Directory").grid(row=0, column=0, sticky=tk.W, padx=5)
+        ttk.Entry(form, textvariable=self.directory_var, width=60).grid(row=0, column=1, sticky=tk.EW, padx=5)
+        ttk.Button(form, text="Browse...", command=self.browse).grid(row=0, column=2, padx=5)
+        ttk.Label(form, text="Search").grid(row=1, column=0, sticky=tk.W, padx=5, pady=(5, 0))
+        search_entry = ttk.Entry(form, textvariable=self.query_var, width=60)
+        search_entry.grid(row=1, column=1, sticky=tk.EW, padx=5, pady=(5, 0))
+        search_entry.bind("<KeyRelease>", lambda event: self.run_search())
+        form.columnconfigure(1, weight=1)
+
+        columns = ("components", "labels")
+        self.results_tree = ttk.Treeview(self, columns=columns, selectmode="browse")
+        self.results_tree.heading("#0", text="Figure")
+        self.results_tree.column("#0", width=260)
+        self.results_tree.heading("components", text="Components")
+        self.results_tree.column("components", width=90, anchor=tk.E)
+        self.results_tree.heading("labels", text="Labels")
+        self.results_tree.column("labels", width=360)
+        self.results_tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.results_tree.bind("<Double-Button-1>", lambda event: self.import_selected())
+
+        buttons = ttk.Frame(self, padding="10")
+        buttons.pack(fill=tk.X)
+        ttk.Button(buttons, text="Import", command=self.import_selected).pack(side=tk.LEFT, padx=5)
+        self.reindex_button = ttk.Button(buttons, text="Reindex", command=self.start_indexing)
+        self.reindex_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Close", command=self.on_close).pack(side=tk.LEFT, padx=5)
+        self.status_label = ttk.Label(buttons, text="")
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
+    def browse(self):
+        """Choose another directory and index it."""
+        directory = filedialog.askdirectory(parent=self, initialdir=self.directory_var.get())
+        if directory:
+            self.directory_var.set(directory)
+            self.open_catalog()
+
+    def open_catalog(self):
+        """Open the catalog of the chosen directory, show what it holds and bring it up to date."""
+        self.release_catalog()
+        try:
+            self.catalog = FigureCatalog(self.directory_var.get())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open the figure catalog: {e}", parent=self)
+            return
+        self.run_search()
+        self.start_indexing()
+
+    def start_indexing(self):
+        """Update the index in a worker thread; results refresh when it finishes."""
+        if self.catalog is None or self.worker is not None:
+            return
+        self.cancel_event = threading.Event()
+        # A queue per run, so a cancelled run left to finish cannot report into the next one
+        self.results = queue.Queue()
+        self.reindex_button.configure(state=tk.DISABLED)
+        self.status_label.configure(text="Indexing...")
+        self.worker = threading.Thread(target=self.run_indexing,
+                                       args=(self.catalog, self.cancel_event, self.results), daemon=True)
+        self.worker.start()
+        self.poll_id = self.after(100, self.poll_results)
+
+    def run_indexing(self, catalog, cancel_event, results):
+        """Worker thread body: update the index and queue progress and the outcome.
+
+        A cancelled run belongs to a catalog the dialog has let go of, so it closes it.
+        """
+        def report(done, total):
+            results.put(('progress', done, total))
+
+        try:
+            stats = catalog.update(progress=report, cancel_event=cancel_event)
+            results.put(('done', stats, None))
+        except Exception as e:
+            results.put(('error', str(e), None))
+        finally:
+            if cancel_event.is_set():
+                catalog.close()
+
+    def poll_results(self):
+        """Apply queued indexing progress on the Tk event loop."""
+        finished = False
+        while True:
+            try:
+                kind, payload, total = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.status_label.configure(text=f"Indexing {payload:,} of {total:,} changed figures...")
+            elif kind == 'error':
+                messagebox.showerror("Error", f"Indexing failed: {payload}", parent=self)
+                finished = True
+            else:
+                self.status_label.configure(
+                    text=f"{payload.scanned:,} figures, {payload.indexed:,} reindexed")
+                finished = True
+
+        if finished:
+            self.poll_id = None
+            self.worker = None
+            self.reindex_button.configure(state=tk.NORMAL)
+            self.run_search()
+        else:
+            self.poll_id = self.after(100, self.poll_results)
+
+    def release_catalog(self):
+        """Cancel a running update, stop polling for it and close the catalog.
+
+        A running update is not waited for, since it may be parsing a large file: it
+        stops after its current file and closes the catalog in its own thread.
+        """
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
+        if self.worker is not None:
+            # A run that ended just before this leaves the catalog to be closed when collected
+            self.cancel_event.set()
+            self.worker = None
+        elif self.catalog is not None:
+            self.catalog.close()
+        self.catalog = None
+        self.reindex_button.configure(state=tk.NORMAL)
+
+    def run_search(self):
+        """Show the figures matching the search words."""
+        if self.catalog is None:
+            return
+        self.results_tree.delete(*self.results_tree.get_children())
+        self.matches = {}
+        for match in self.catalog.search(self.query_var.get(), limit=200):
+            self.matches[match.path] = match
+            labels = ", ".join(label.replace("\\\\", " ") for label in match.labels[:8])
+            self.results_tree.insert("", tk.END, iid=match.path, text=match.path,
+                                     values=(match.component_count, labels))
+
+    def import_selected(self):
+        """Hand the selected figure to the application as a diagram."""
+        selection = self.results_tree.selection()
+        if not selection:
+            messagebox.showinfo("Figure Catalog", "Select a figure to import.", parent=self)
+            return
+        try:
+            data = self.catalog.import_match(self.matches[selection[0]])
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to import figure: {e}", parent=self)
+            return
+        if not data['components']:
+            messagebox.showinfo("Figure Catalog", "The figure has no components with known positions.", parent=self)
+            return
+        self.on_import(data)
+
+    def on_close(self):
+        """Stop indexing, close the catalog and the window."""
+        self.release_catalog()
+        self.destroy()
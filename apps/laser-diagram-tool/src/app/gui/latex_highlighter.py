@@ -0,0 +1,243 @@
+"""
+LatexHighlighter - Incremental syntax highlighting for the LaTeX editor
+"""
+
+import re
+
+# Lines highlighted per idle step; larger documents are highlighted over several steps
+CHUNK_LINES = 400
+
+# Text tag options per token kind
+TAG_STYLES = {
+    'command': {'foreground': "#1f3fbf"},
+    'option': {'foreground': "#a05a00"},
+    'node': {'foreground': "#00805a"},
+    'comment': {'foreground': "#808080"},
+}
+
+# Tokens of one line. Commands come first so an escaped \% never starts a comment;
+# an option without its closing bracket runs to the end of the line. Nodes are
+# references like (Node0) and names defined after coordinates, as in (1,2){Node0}.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<command>\\(?:[A-Za-z@]+\*?|.))
+  | (?P<comment>%.*)
+  | (?P<option>\[[^\]]*\]?)
+  | (?P<node>\([A-Za-z_]\w*\))
+  | (?P<definition>\(\s*-?[\d.]+\s*,\s*-?[\d.]+\s*\)\{[A-Za-z_]\w*\})
+""", re.VERBOSE)
+
+
+def tokenize_line(line):
+    """Return (tag, start column, end column) for the highlighted tokens of a line."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(line):
+        if match.lastgroup == 'definition':
+            # Only the name of a defined node, not its coordinates
+            tokens.append(('node', line.index("{", match.start()), match.end()))
+        else:
+            tokens.append((match.lastgroup, match.start(), match.end()))
+    return tokens
+
+
+def changed_lines(old_lines, new_lines):
+    """Return (first, old_end, new_end): lines first to old_end of the old text became
+    lines first to new_end of the new text (0-based, end exclusive)."""
+    limit = min(len(old_lines), len(new_lines))
+    first = 0
+    while first < limit and old_lines[first] == new_lines[first]:
+        first += 1
+    old_end, new_end = len(old_lines), len(new_lines)
+    while old_end > first and new_end > first and old_lines[old_end - 1] == new_lines[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    return first, old_end, new_end
+
+
+def update_text(text, new_text):
+    """Replace the content of a Text widget, touching only the lines that changed.
+
+    Regenerated LaTeX mostly differs in a few lines, so this keeps the highlighting
+    and the scroll position of everything else.
+    """
+    old_lines = text.get("1.0", "end-1c").split("\n")
+    new_lines = new_text.split("\n")
+    first, old_end, new_end = changed_lines(old_lines, new_lines)
+    if first == old_end == new_end:
+        return
+    replacement = "\n".join(new_lines[first:new_end])
+    if old_end < len(old_lines) and new_end < len(new_lines):
+        # The unchanged tail keeps its line; replace whole lines up to it
+        text.delete(f"{first + 1}.0", f"{old_end + 1}.0")
+        text.insert(f"{first + 1}.0", replacement + "\n" if new_end > first else "")
+    elif first > 0:
+        # The change runs to the end: replace from the end of the last unchanged line
+        text.delete(f"{first}.end", "end-1c")
+        text.insert(f"{first}.end", "\n" + replacement if new_end > first else "")
+    else:
+        text.delete("1.0", "end-1c")
+        text.insert("1.0", replacement)
+
+
+class DirtyLines:
+    """Sorted, merged ranges of line numbers (inclusive) waiting to be highlighted."""
+
+    def __init__(self):
+        """Initialize with nothing to do."""
+        self.ranges = []
+
+    def __bool__(self):
+        return bool(self.ranges)
+
+    def mark(self, first, last):
+        """Add the lines first to last."""
+        self.ranges.append([first, last])
+        self._merge()
+
+    def shift(self, line, delta):
+        """Move pending lines below line by delta after lines were inserted or removed there."""
+        for bounds in self.ranges:
+            for side in (0, 1):
+                if bounds[side] > line:
+                    bounds[side] = max(line, bounds[side] + delta)
+        self._merge()
+
+    def _merge(self):
+        self.ranges.sort()
+        merged = []
+        for first, last in self.ranges:
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        self.ranges = merged
+
+    def pop(self, count, visible=None):
+        """Remove and return up to count lines (first, last), from the visible lines if possible."""
+        index = 0
+        if visible is not None:
+            for i, (first, last) in enumerate(self.ranges):
+                if first <= visible[1] and last >= visible[0]:
+                    index = i
+                    break
+        first, last = self.ranges[index]
+        if visible is not None and first <= visible[1] and last >= visible[0]:
+            # Start at the top of the screen rather than far above it
+            if first < visible[0]:
+                self.ranges.insert(index, [first, visible[0] - 1])
+                index += 1
+                first = visible[0]
+        end = min(last, first + count - 1)
+        if end == last:
+            del self.ranges[index]
+        else:
+            self.ranges[index] = [end + 1, last]
+        return first, end
+
+
+class LatexHighlighter:
+    """Class highlighting commands, options, node references and comments in a Text widget.
+
+    The widget's Tcl command is wrapped so every insert, delete and replace marks just
+    the lines it touched; those lines are re-tokenized in idle-time chunks, visible
+    lines first, so typing never rescans the buffer and large documents are tagged
+    without blocking the event loop.
+    """
+
+    def __init__(self, text, chunk_lines=CHUNK_LINES):
+        """Attach to a Text widget and highlight its current content."""
+        self.text = text
+        self.chunk_lines = chunk_lines
+        self.dirty = DirtyLines()
+        self.job = None
+        for tag, options in TAG_STYLES.items():
+            text.tag_configure(tag, **options)
+        # Comments win over anything inside them
+        text.tag_raise('comment')
+
+        # Route the widget's command through the proxy
+        self.original = text._w + "_highlighted"
+        text.tk.call("rename", text._w, self.original)
+        text.tk.createcommand(text._w, self.proxy)
+
+        self.dirty.mark(1, self.line_of("end-1c"))
+        self.schedule()
+
+    def call(self, *args):
+        """Run a command on the wrapped widget."""
+        return self.text.tk.call((self.original,) + args)
+
+    def line_of(self, index):
+        """Return the line number of a text index."""
+        return int(str(self.call("index", index)).split(".")[0])
+
+    def proxy(self, command, *args):
+        """Forward a widget command and record the lines it changed."""
+        if command == "insert" and args:
+            first = min(self.line_of(args[0]), self.line_of("end-1c"))
+            added = sum(str(chars).count("\n") for chars in args[1::2])
+            result = self.call(command, *args)
+            self.changed(first, added)
+            return result
+        if command == "delete" and args:
+            first = self.line_of(args[0])
+            # Deleting a single character may join two lines
+            last = self.line_of(args[-1] if len(args) > 1 else f"{args[0]}+1c")
+            result = self.call(command, *args)
+            self.changed(first, first - last)
+            return result
+        if command == "replace" and len(args) > 1:
+            first = self.line_of(args[0])
+            last = self.line_of(args[1])
+            added = sum(str(chars).count("\n") for chars in args[2::2])
+            result = self.call(command, *args)
+            self.changed(first, added - (last - first))
+            return result
+        return self.call(command, *args)
+
+    def changed(self, line, delta):
+        """Mark an edit at line that added (or, if negative, removed) delta lines."""
+        self.dirty.shift(line, delta)
+        self.dirty.mark(line, line + max(delta, 0))
+        self.schedule()
+
+    def schedule(self):
+        """Highlight the pending lines once the event loop is idle."""
+        if self.job is None and self.dirty:
+            self.job = self.text.after_idle(self.step)
+
+    def step(self):
+        """Highlight one chunk of pending lines, visible lines first."""
+        self.job = None
+        last_line = self.line_of("end-1c")
+        visible = (self.line_of("@0,0"), self.line_of(f"@0,{self.text.winfo_height()}"))
+        budget = self.chunk_lines
+        while budget > 0 and self.dirty:
+            first, last = self.dirty.pop(budget, visible)
+            last = min(last, last_line)
+            if first <= last:
+                self.highlight(first, last)
+                budget -= last - first + 1
+        if self.dirty:
+            # Let pending events run between chunks
+            self.job = self.text.after(1, self.step)
+
+    def highlight(self, first, last):
+        """Re-tokenize and tag the lines first to last."""
+        start, end = f"{first}.0", f"{last}.end"
+        for tag in TAG_STYLES:
+            self.call("tag", "remove", tag, start, end)
+        indices = {tag: [] for tag in TAG_STYLES}
+        for number, line in enumerate(str(self.call("get", start, end)).split("\n"), first):
+            for tag, token_start, token_end in tokenize_line(line):
+                indices[tag] += [f"{number}.{token_start}", f"{number}.{token_end}"]
+        for tag, tag_indices in indices.items():
+            if tag_indices:
+                self.call("tag", "add", tag, *tag_indices)
+
+    def detach(self):
+        """Stop highlighting and restore the widget's own command."""
+        if self.job is not None:
+            self.text.after_cancel(self.job)
+            self.job = None
+        self.text.tk.deletecommand(self.text._w)
+        self.text.tk.call("rename", self.original, self.text._w)
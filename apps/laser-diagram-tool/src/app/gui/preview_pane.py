@@ -0,0 +1,178 @@
+"""
+PreviewPane - Live PDF preview that recompiles the LaTeX source in the background
+"""
+
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+from app.utils.compiler import CompileCancelled, CompileResult, LatexCompiler, source_hash
+
+class PreviewPane(ttk.Frame):
+    """Frame showing the last good render of the LaTeX source.
+
+    Edits are debounced, a compile only starts once the source has been stable for the
+    delay, an unchanged source hash is never recompiled, and a newer source cancels the
+    compile in flight. Compiles run in a worker thread and report back through a queue
+    polled from the Tk event loop.
+    """
+
+    def __init__(self, parent, compiler=None, delay=800):
+        """Initialize the pane with a LatexCompiler and the debounce delay in milliseconds."""
+        super().__init__(parent)
+        self.compiler = compiler or LatexCompiler()
+        self.delay = delay
+        self.enabled = True
+
+        self.pending_source = None
+        self.debounce_id = None
+        self.poll_id = None
+        self.results = queue.Queue()
+
+        # Number, source hash and cancel event of the newest job handed to a worker
+        self.job_count = 0
+        self.current_job = None
+        self.current_hash = None
+        self.cancel_event = None
+        # Hash of the source shown in the pane
+        self.rendered_hash = None
+        self.image = None
+
+        self.setup_ui()
+
+    def setup_ui(self):
+        """Set up the status line and the image area."""
+        header = ttk.Frame(self)
+        header.pack(fill=tk.X)
+        ttk.Label(header, text="PDF Preview", font=('Arial', 12, 'bold')).pack(side=tk.LEFT)
+        self.status_label = ttk.Label(header, text="")
+        self.status_label.pack(side=tk.RIGHT)
+
+        self.image_label = ttk.Label(self, anchor=tk.CENTER)
+        self.image_label.pack(fill=tk.BOTH, expand=True)
+
+        if not self.compiler.available():
+            self.status_label.config(text=f"{self.compiler.engine} not found")
+
+    def schedule(self, latex_code):
+        """Recompile the source once it has not changed for the debounce delay.
+
+        latex_code may also be a function returning the source, so editors only read
+        their buffer once typing pauses rather than on every keystroke.
+        """
+        self.pending_source = latex_code
+        if self.debounce_id is not None:
+            self.after_cancel(self.debounce_id)
+        self.debounce_id = self.after(self.delay, self.start_compile)
+
+    def set_enabled(self, enabled):
+        """Turn live compilation on or off."""
+        self.enabled = enabled
+        if not enabled:
+            if self.debounce_id is not None:
+                self.after_cancel(self.debounce_id)
+                self.debounce_id = None
+            self.cancel()
+            self.status_label.config(text="Paused")
+        elif self.pending_source is not None:
+            self.schedule(self.pending_source)
+
+    def start_compile(self):
+        """Start compiling the pending source unless it is already shown or compiling."""
+        self.debounce_id = None
+        if not self.enabled or self.pending_source is None or not self.compiler.available():
+            return
+        if callable(self.pending_source):
+            self.pending_source = self.pending_source()
+        digest = source_hash(self.pending_source)
+        if digest == self.current_hash:
+            return
+
+        # A newer source makes the compile in flight stale
+        self.cancel()
+        if digest == self.rendered_hash:
+            self.status_label.config(text="Up to date")
+            return
+        self.job_count += 1
+        self.current_job = self.job_count
+        self.current_hash = digest
+        self.cancel_event = threading.Event()
+        self.status_label.config(text="Compiling...")
+
+        worker = threading.Thread(target=self.compile_worker,
+                                  args=(self.current_job, self.pending_source, self.cancel_event), daemon=True)
+        worker.start()
+        if self.poll_id is None:
+            self.poll_id = self.after(100, self.poll_results)
+
+    def compile_worker(self, job, latex_code, cancel_event):
+        """Compile a source and render its first page (runs in a worker thread).
+
+        A result is always posted, so the pane never waits on a worker that failed.
+        """
+        png_path = None
+        try:
+            result = self.compiler.compile(latex_code, cancel_event)
+            if result.success:
+                try:
+                    png_path = self.compiler.render_png(result, cancel_event=cancel_event)
+                except CompileCancelled:
+                    result.cancelled = True
+        except Exception as e:
+            result = CompileResult(source_hash(latex_code), False, log=f"! {type(e).__name__}: {e}")
+        self.results.put((job, result, png_path))
+
+    def poll_results(self):
+        """Show finished compiles and keep polling while one is in flight."""
+        self.poll_id = None
+        while True:
+            try:
+                job, result, png_path = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.show_result(job, result, png_path)
+
+        if self.current_job is not None:
+            self.poll_id = self.after(100, self.poll_results)
+
+    def show_result(self, job, result, png_path):
+        """Display a compile result if it belongs to the newest job."""
+        if job != self.current_job:
+            # Superseded by a newer source
+            return
+        self.current_job = None
+        self.current_hash = None
+        self.cancel_event = None
+        if result.cancelled:
+            return
+        if not result.success:
+            # Keep showing the last good render
+            self.status_label.config(text=f"Error: {result.error_summary()}")
+            return
+
+        self.rendered_hash = result.source_hash
+        if png_path:
+            self.image = tk.PhotoImage(file=png_path)
+            self.image_label.config(image=self.image, text="")
+        else:
+            self.image_label.config(image="", text=f"PDF ready:\n{result.pdf_path}")
+        self.status_label.config(text=f"Up to date ({result.duration:.1f} s, {result.mode})")
+
+    def cancel(self):
+        """Cancel the in-flight compile."""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.cancel_event = None
+        self.current_job = None
+        self.current_hash = None
+
+    def destroy(self):
+        """Stop background work before destroying the widget."""
+        if self.debounce_id is not None:
+            self.after_cancel(self.debounce_id)
+            self.debounce_id = None
+        self.cancel()
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
+        super().destroy()
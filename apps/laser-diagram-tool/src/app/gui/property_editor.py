@@ -0,0 +1,168 @@
+"""
+PropertyEditor - Panel editing the parameters of the selected components
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from app.utils.group_ops import MIXED, param_table
+
+# Text shown for a parameter whose value differs between the selected components
+MIXED_TEXT = "(mixed)"
+
+# Parameter values edited as text; lists such as a setup's components are left out
+SCALAR_TYPES = (str, int, float, bool)
+
+
+class PropertyEditor(ttk.Frame):
+    """Panel showing the params of one or many components, with a fixed pool of row widgets.
+
+    However many params the selection has, only `rows` label and entry pairs exist;
+    scrolling rebinds them to other params. An edit is handed to on_change(key, value),
+    which applies it to the whole selection at once.
+    """
+
+    def __init__(self, parent, on_change, rows=8):
+        """Initialize an empty panel; on_change(key, value) applies an edit."""
+        super().__init__(parent)
+        self.on_change = on_change
+        self.params = []
+        self.indices = []
+        self.offset = 0
+        self.row_count = rows
+
+        ttk.Style().configure("Mixed.TEntry", foreground="gray")
+        self.setup_ui()
+        self.show([], [])
+
+    def setup_ui(self):
+        """Set up the summary, the pool of rows with its scrollbar and the new param row."""
+        self.summary_label = ttk.Label(self, text="")
+        self.summary_label.pack(anchor=tk.W)
+
+        body = ttk.Frame(self)
+        body.pack(fill=tk.X)
+        self.scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.grid_frame = ttk.Frame(body)
+        self.grid_frame.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.grid_frame.columnconfigure(1, weight=1)
+
+        self.slots = []
+        for slot in range(self.row_count):
+            label = ttk.Label(self.grid_frame, width=14, anchor=tk.W)
+            variable = tk.StringVar()
+            entry = ttk.Entry(self.grid_frame, textvariable=variable)
+            entry.bind("<Return>", lambda event, slot=slot: self.commit(slot))
+            entry.bind("<FocusOut>", lambda event, slot=slot: self.commit(slot))
+            entry.bind("<FocusIn>", lambda event, slot=slot: self.begin_edit(slot))
+            for widget in (label, entry):
+                widget.bind("<MouseWheel>", self.on_wheel)
+                widget.bind("<Button-4>", self.on_wheel)
+                widget.bind("<Button-5>", self.on_wheel)
+            self.slots.append((label, variable, entry))
+
+        add_row = ttk.Frame(self)
+        add_row.pack(fill=tk.X, pady=(5, 0))
+        self.new_key_var = tk.StringVar()
+        self.new_value_var = tk.StringVar()
+        ttk.Entry(add_row, textvariable=self.new_key_var, width=14).pack(side=tk.LEFT)
+        ttk.Entry(add_row, textvariable=self.new_value_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.add_button = ttk.Button(add_row, text="Add", command=self.add_param)
+        self.add_button.pack(side=tk.LEFT)
+
+    def show(self, components, indices):
+        """Show the params of the components at indices; the scroll position is kept for the same selection."""
+        indices = list(indices)
+        if indices != self.indices:
+            self.offset = 0
+        self.indices = indices
+        self.params = [(key, value, count) for key, value, count in param_table(components, indices)
+                       if value is MIXED or isinstance(value, SCALAR_TYPES)]
+        if not indices:
+            self.summary_label.config(text="Select components to edit their properties")
+        elif len(indices) == 1:
+            self.summary_label.config(text=components[indices[0]]['name'])
+        else:
+            self.summary_label.config(text=f"{len(indices):,} components")
+        self.add_button.configure(state=tk.NORMAL if indices else tk.DISABLED)
+        self.render()
+
+    def render(self):
+        """Bind the pool of rows to the params from the scroll offset on."""
+        self.offset = max(0, min(self.offset, len(self.params) - self.row_count))
+        for slot, (label, variable, entry) in enumerate(self.slots):
+            index = self.offset + slot
+            if index >= len(self.params):
+                label.grid_remove()
+                entry.grid_remove()
+                continue
+            key, value, count = self.params[index]
+            # Params only some of the components have show how many have them
+            label.config(text=key if count == len(self.indices) else f"{key} ({count:,})")
+            variable.set(MIXED_TEXT if value is MIXED else str(value))
+            entry.configure(style="Mixed.TEntry" if value is MIXED else "TEntry")
+            label.grid(row=slot, column=0, sticky=tk.W, padx=(0, 5))
+            entry.grid(row=slot, column=1, sticky=tk.EW, pady=1)
+        if self.params:
+            self.scrollbar.set(self.offset / len(self.params),
+                               min(1.0, (self.offset + self.row_count) / len(self.params)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, offset):
+        """Show the params from offset on, applying edits in the rows being rebound first."""
+        for slot in range(self.row_count):
+            self.commit(slot)
+        self.offset = offset
+        self.render()
+
+    def yview(self, *args):
+        """Scroll from the scrollbar: ('moveto', fraction) or ('scroll', amount, 'units' or 'pages')."""
+        if args[0] == 'moveto':
+            self.scroll_to(round(float(args[1]) * len(self.params)))
+        elif args[0] == 'scroll':
+            step = self.row_count if args[2] == 'pages' else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+
+    def on_wheel(self, event):
+        """Scroll one row per mouse wheel step."""
+        if getattr(event, 'num', None) == 4 or getattr(event, 'delta', 0) > 0:
+            self.scroll_to(self.offset - 1)
+        else:
+            self.scroll_to(self.offset + 1)
+
+    def begin_edit(self, slot):
+        """Clear the placeholder of a mixed value, so a new value can be typed."""
+        index = self.offset + slot
+        if index < len(self.params) and self.params[index][1] is MIXED:
+            label, variable, entry = self.slots[slot]
+            if variable.get() == MIXED_TEXT:
+                variable.set("")
+                entry.configure(style="TEntry")
+
+    def commit(self, slot):
+        """Apply the text of a row if it was edited."""
+        index = self.offset + slot
+        if index >= len(self.params):
+            return
+        key, value, _ = self.params[index]
+        label, variable, entry = self.slots[slot]
+        text = variable.get()
+        if value is MIXED:
+            if text in ("", MIXED_TEXT):
+                # Left without typing a value: keep the components' own values
+                variable.set(MIXED_TEXT)
+                entry.configure(style="Mixed.TEntry")
+                return
+        elif text == str(value):
+            return
+        self.on_change(key, text)
+
+    def add_param(self):
+        """Add the param typed in the new param row to every selected component."""
+        key = self.new_key_var.get().strip()
+        if not key or not self.indices:
+            return
+        self.on_change(key, self.new_value_var.get())
+        self.new_key_var.set("")
+        self.new_value_var.set("")
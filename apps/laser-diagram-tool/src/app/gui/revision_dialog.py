@@ -0,0 +1,74 @@
+"""
+RevisionDialog - Window listing the saved revisions of a diagram
+"""
+
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+from app.models.revision_store import RevisionStore
+
+class RevisionDialog(tk.Toplevel):
+    """Dialog showing the history of a revision store and checking out a revision."""
+
+    def __init__(self, parent, store_path, on_checkout):
+        """Initialize the dialog for the store at store_path; on_checkout receives the diagram data."""
+        super().__init__(parent)
+        self.title("Revision History")
+        self.geometry("640x360")
+
+        self.store = RevisionStore(store_path)
+        self.on_checkout = on_checkout
+
+        self.setup_ui()
+        self.load_history()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def setup_ui(self):
+        """Set up the history table and buttons."""
+        columns = ("saved", "components", "message")
+        self.history_tree = ttk.Treeview(self, columns=columns, selectmode="browse")
+        self.history_tree.heading("#0", text="Revision")
+        self.history_tree.column("#0", width=80)
+        self.history_tree.heading("saved", text="Saved")
+        self.history_tree.column("saved", width=150)
+        self.history_tree.heading("components", text="Components")
+        self.history_tree.column("components", width=90, anchor=tk.E)
+        self.history_tree.heading("message", text="Message")
+        self.history_tree.column("message", width=280)
+        self.history_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.history_tree.bind("<Double-Button-1>", lambda event: self.check_out())
+
+        buttons = ttk.Frame(self, padding="10")
+        buttons.pack(fill=tk.X)
+        ttk.Button(buttons, text="Check Out", command=self.check_out).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Close", command=self.on_close).pack(side=tk.LEFT, padx=5)
+        self.status_label = ttk.Label(buttons, text="")
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
+    def load_history(self):
+        """Fill the table with the revisions, newest first."""
+        revisions = self.store.history()
+        for revision in revisions:
+            saved = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(revision.created))
+            self.history_tree.insert("", tk.END, iid=str(revision.id), text=str(revision.id),
+                                     values=(saved, revision.component_count, revision.message))
+        size = self.store.stored_bytes()
+        self.status_label.config(text=f"{len(revisions)} revisions, {size / 1024:.0f} KB stored")
+
+    def check_out(self):
+        """Hand the selected revision to the application."""
+        selection = self.history_tree.selection()
+        if not selection:
+            messagebox.showinfo("Revision History", "Select a revision to check out.", parent=self)
+            return
+        try:
+            data = self.store.checkout(int(selection[0]))
+        except (KeyError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to check out revision: {e}", parent=self)
+            return
+        self.on_checkout(data)
+
+    def on_close(self):
+        """Close the store and the window."""
+        self.store.close()
+        self.destroy()
@@ -0,0 +1,123 @@
+"""
+ThumbnailLoader - Lazy loading of thumbnails into the visible rows of a Treeview
+"""
+
+import queue
+import tkinter as tk
+from tkinter import ttk
+
+# Milliseconds between the last scroll and loading the rows it revealed
+SCROLL_DELAY = 50
+
+# Milliseconds between polls for finished thumbnails
+POLL_INTERVAL = 100
+
+
+def visible_rows(tree, step=8):
+    """Return the ids of the rows currently shown by a Treeview, top to bottom."""
+    rows = []
+    for y in range(1, max(tree.winfo_height(), 1), step):
+        row = tree.identify_row(y)
+        if row and (not rows or rows[-1] != row):
+            rows.append(row)
+    return rows
+
+
+def thumbnail_style(name, size):
+    """Configure and return a Treeview style whose rows are tall enough for size pixel thumbnails."""
+    style = f"{name}.Treeview"
+    ttk.Style().configure(style, rowheight=size + 4)
+    return style
+
+
+class ThumbnailLoader:
+    """Class loading thumbnails into a Treeview's rows as they scroll into view.
+
+    describe(row) returns ('entry', name, latex, params), ('diagram', path) or None
+    for rows without a thumbnail. Rows are requested from a ThumbnailCache when they
+    become visible, requests for rows scrolled away are dropped, and finished
+    thumbnails are set as row images from the Tk event loop.
+    """
+
+    def __init__(self, tree, cache, describe):
+        """Attach to a Treeview; its yscrollcommand keeps working as before."""
+        self.tree = tree
+        self.cache = cache
+        self.describe = describe
+        self.images = {}
+        self.requested = set()
+        self.scroll_id = None
+        self.poll_id = None
+
+        self.scroll_command = tree.cget("yscrollcommand")
+        tree.configure(yscrollcommand=self.on_scroll)
+        tree.bind("<Configure>", lambda event: self.schedule(), add="+")
+        tree.bind("<<TreeviewOpen>>", lambda event: self.schedule(), add="+")
+
+    def on_scroll(self, first, last):
+        """Forward the scroll position and load the rows that came into view."""
+        if self.scroll_command:
+            self.tree.tk.call(self.scroll_command, first, last)
+        self.schedule()
+
+    def schedule(self):
+        """Load the visible rows once scrolling pauses."""
+        if self.scroll_id is not None:
+            self.tree.after_cancel(self.scroll_id)
+        self.scroll_id = self.tree.after(SCROLL_DELAY, self.load_visible)
+
+    def reset(self):
+        """Forget the loaded thumbnails, after the tree's rows have been replaced."""
+        self.images.clear()
+        self.requested.clear()
+        self.cache.keep_only(set())
+        self.schedule()
+
+    def load_visible(self):
+        """Request the thumbnails of the visible rows that have none."""
+        self.scroll_id = None
+        visible = visible_rows(self.tree)
+        self.cache.keep_only(set(visible))
+        # Requests dropped by keep_only are made again when their rows come back
+        self.requested.intersection_update(visible)
+        for row in visible:
+            if row in self.images or row in self.requested:
+                continue
+            description = self.describe(row)
+            if description is None:
+                continue
+            self.requested.add(row)
+            if description[0] == 'diagram':
+                self.cache.request_diagram(row, description[1])
+            else:
+                self.cache.request_entry(row, *description[1:])
+        if self.poll_id is None:
+            self.poll_id = self.tree.after(POLL_INTERVAL, self.poll_results)
+
+    def poll_results(self):
+        """Set the finished thumbnails on their rows."""
+        self.poll_id = None
+        while True:
+            try:
+                row, path, error = self.cache.results.get_nowait()
+            except queue.Empty:
+                break
+            self.requested.discard(row)
+            if path is None or not self.tree.exists(row):
+                continue
+            try:
+                image = tk.PhotoImage(master=self.tree, file=path)
+            except tk.TclError:
+                continue
+            self.images[row] = image
+            self.tree.item(row, image=image)
+        if self.requested or self.cache.has_pending():
+            self.poll_id = self.tree.after(POLL_INTERVAL, self.poll_results)
+
+    def close(self):
+        """Stop loading and shut the cache's workers down."""
+        for job in (self.scroll_id, self.poll_id):
+            if job is not None:
+                self.tree.after_cancel(job)
+        self.scroll_id = self.poll_id = None
+        self.cache.shutdown()
@@ -0,0 +1,153 @@
+"""
+ToleranceDialog - Window for running Monte Carlo tolerance analysis
+"""
+
+import os
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+from app.analysis.tolerance import ToleranceAnalyzer
+
+class ToleranceDialog(tk.Toplevel):
+    """Dialog that runs a tolerance analysis in the background and streams its statistics."""
+
+    def __init__(self, parent, components, beams):
+        """Initialize the dialog for the given diagram components and beams."""
+        super().__init__(parent)
+        self.title("Tolerance Analysis")
+        self.geometry("720x420")
+
+        self.components = components
+        self.beams = beams
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
+        self.poll_id = None
+
+        self.setup_ui()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def setup_ui(self):
+        """Set up the settings form, progress bar and results table."""
+        settings = ttk.Frame(self, padding="10")
+        settings.pack(fill=tk.X)
+
+        self.samples_var = tk.IntVar(value=100000)
+        self.position_sigma_var = tk.DoubleVar(value=1.0)
+        self.focal_sigma_var = tk.DoubleVar(value=1.0)
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+
+        fields = [
+            ("Samples", self.samples_var),
+            ("Position sigma (px)", self.position_sigma_var),
+            ("Focal length sigma (%)", self.focal_sigma_var),
+            ("Worker processes", self.workers_var)
+        ]
+        for column, (label, variable) in enumerate(fields):
+            ttk.Label(settings, text=label).grid(row=0, column=column, sticky=tk.W, padx=5)
+            ttk.Entry(settings, textvariable=variable, width=12).grid(row=1, column=column, padx=5)
+
+        buttons = ttk.Frame(self, padding="10")
+        buttons.pack(fill=tk.X)
+        self.run_button = ttk.Button(buttons, text="Run", command=self.start_analysis)
+        self.run_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(buttons, text="Cancel", command=self.cancel_event.set, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.status_label = ttk.Label(buttons, text="")
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
+        self.progress = ttk.Progressbar(self, mode="determinate")
+        self.progress.pack(fill=tk.X, padx=10)
+
+        columns = ("mean", "std", "min", "max")
+        self.results_tree = ttk.Treeview(self, columns=columns)
+        self.results_tree.heading("#0", text="Metric")
+        self.results_tree.column("#0", width=280)
+        for column in columns:
+            self.results_tree.heading(column, text=column.capitalize())
+            self.results_tree.column(column, width=90, anchor=tk.E)
+        self.results_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def start_analysis(self):
+        """Validate the settings and start the analysis on a worker thread."""
+        try:
+            samples = self.samples_var.get()
+            analyzer = ToleranceAnalyzer(
+                self.components,
+                self.beams,
+                position_sigma=self.position_sigma_var.get(),
+                focal_sigma=self.focal_sigma_var.get() / 100.0
+            )
+            workers = max(1, self.workers_var.get())
+        except (tk.TclError, ValueError) as e:
+            messagebox.showerror("Error", f"Invalid analysis settings: {str(e)}", parent=self)
+            return
+
+        if samples <= 0 or not analyzer.detectors:
+            messagebox.showwarning("Warning", "The diagram needs a beam path from a source to a detector", parent=self)
+            return
+
+        self.cancel_event.clear()
+        self.progress.configure(maximum=samples, value=0)
+        self.run_button.configure(state=tk.DISABLED)
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.status_label.configure(text="Running...")
+
+        self.worker = threading.Thread(
+            target=self.run_analysis, args=(analyzer, samples, workers), daemon=True
+        )
+        self.worker.start()
+        self.poll_id = self.after(100, self.poll_results)
+
+    def run_analysis(self, analyzer, samples, workers):
+        """Worker thread body: run the analysis and queue each statistics update."""
+        def report(stats, completed, total):
+            self.results.put(('progress', stats.summary(), completed))
+
+        try:
+            analyzer.run(samples, workers=workers, callback=report, cancel_event=self.cancel_event)
+            self.results.put(('done', None, None))
+        except Exception as e:
+            self.results.put(('error', str(e), None))
+
+    def poll_results(self):
+        """Apply queued statistics updates on the Tk event loop."""
+        finished = False
+        while True:
+            try:
+                kind, payload, completed = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.show_summary(payload)
+                self.progress.configure(value=completed)
+                self.status_label.configure(text=f"{completed:,} samples")
+            elif kind == 'error':
+                messagebox.showerror("Error", f"Tolerance analysis failed: {payload}", parent=self)
+                finished = True
+            else:
+                finished = True
+
+        if finished:
+            self.run_button.configure(state=tk.NORMAL)
+            self.cancel_button.configure(state=tk.DISABLED)
+            if self.cancel_event.is_set():
+                self.status_label.configure(text="Cancelled")
+        else:
+            self.poll_id = self.after(100, self.poll_results)
+
+    def show_summary(self, summary):
+        """Show the latest aggregated statistics in the results table."""
+        self.results_tree.delete(*self.results_tree.get_children())
+        for row in summary:
+            self.results_tree.insert("", "end", text=row['name'], values=(
+                f"{row['mean']:.4g}", f"{row['std']:.3g}", f"{row['min']:.4g}", f"{row['max']:.4g}"
+            ))
+
+    def on_close(self):
+        """Cancel any running analysis and close the dialog."""
+        self.cancel_event.set()
+        if self.poll_id:
+            self.after_cancel(self.poll_id)
+        self.destroy()
@@ -5,6 +5,15 @@ Diagram - Model for optical diagrams
 import json
 import os
 from app.models.optical_component import OpticalComponent
+from app.utils.profiling import profiled
+
+
+def resolve_beams(component_count, beams=None):
+    """Return the explicit beams, or chain consecutive components when none are defined."""
+    if beams:
+        return list(beams)
+    return [{'start': i, 'end': i + 1, 'type': 'wide'} for i in range(component_count - 1)]
+
 
 class Diagram:
     """Class representing an optical diagram."""
@@ -13,6 +22,11 @@ class Diagram:
         """Initialize a new diagram."""
         self.name = name
         self.components = []
+        self.beams = []
+        # SetupInstance objects placed in the diagram
+        self.instances = []
+        # Constraints between component positions, as stored by ConstraintSolver.to_list()
+        self.constraints = []
         self.file_path = None
     
     def add_component(self, component):
@@ -24,15 +38,49 @@ class Diagram:
         else:
             raise TypeError("Component must be an OpticalComponent or dict")
     
+    def add_components(self, components):
+        """Add OpticalComponents or dicts to the diagram in one batch."""
+        self.components.extend(
+            component if isinstance(component, OpticalComponent) else OpticalComponent.from_dict(component)
+            for component in components
+        )
+    
     def remove_component(self, index):
         """Remove a component from the diagram."""
         if 0 <= index < len(self.components):
             del self.components[index]
+            # Drop beams touching the component and shift the later indices
+            self.beams = [
+                {**beam,
+                 'start': beam['start'] - (beam['start'] > index),
+                 'end': beam['end'] - (beam['end'] > index)}
+                for beam in self.beams
+                if index not in (beam['start'], beam['end'])
+            ]
+            self.constraints = [
+                {**constraint, 'components': [other - (other > index) for other in constraint['components']]}
+                for constraint in self.constraints
+                if index not in constraint['components']
+            ]
+    
+    def add_beam(self, start, end, beam_type="wide"):
+        """Add a beam between two component indices."""
+        if not (0 <= start < len(self.components) and 0 <= end < len(self.components)):
+            raise IndexError("Beam endpoints must reference existing components")
+        self.beams.append({'start': start, 'end': end, 'type': beam_type})
+    
+    def get_beams(self):
+        """Get the beams of the diagram, chaining components if none are defined."""
+        return resolve_beams(len(self.components), self.beams)
     
     def clear(self):
         """Clear all components from the diagram."""
         self.components = []
+        self.beams = []
+        self.instances = []
+        self.constraints = []
     
+    @profiled("Diagram.save", "io")
     def save(self, file_path=None):
         """Save the diagram to a file."""
         if file_path:
@@ -40,33 +88,57 @@ class Diagram:
         elif not self.file_path:
             raise ValueError("No file path specified")
         
-        # Convert components to dictionaries
-        component_dicts = [comp.to_dict() for comp in self.components]
-        
-        # Create the diagram data
-        diagram_data = {
-            'name': self.name,
-            'components': component_dicts
-        }
-        
         # Write to file
         with open(self.file_path, 'w') as f:
-            json.dump(diagram_data, f, indent=2)
+            json.dump(self.to_dict(), f, indent=2)
+    
+    def to_dict(self):
+        """Convert the diagram to the dictionary stored in diagram files."""
+        data = {
+            'name': self.name,
+            'components': self.get_component_dicts(),
+            'beams': self.beams
+        }
+        # Setups are only stored by diagrams that use them
+        if self.instances:
+            from app.models.setup_instance import instances_to_dict
+            data.update(instances_to_dict(self.instances))
+        if self.constraints:
+            data['constraints'] = self.constraints
+        return data
     
     @classmethod
-    def load(cls, file_path):
-        """Load a diagram from a file."""
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
+    def from_dict(cls, data):
+        """Create a diagram from the dictionary stored in diagram files."""
         # Create a new diagram
         diagram = cls(data.get('name', 'Untitled Diagram'))
-        diagram.file_path = file_path
         
         # Add components
         for comp_data in data.get('components', []):
             diagram.add_component(comp_data)
         
+        # Add beams
+        diagram.beams = [dict(beam) for beam in data.get('beams', [])]
+        
+        # Add setup instances
+        if data.get('instances'):
+            from app.models.setup_instance import instances_from_dict
+            diagram.instances = instances_from_dict(data)
+        
+        # Add constraints
+        diagram.constraints = [dict(constraint) for constraint in data.get('constraints', [])]
+        
+        return diagram
+    
+    @classmethod
+    @profiled("Diagram.load", "io")
+    def load(cls, file_path):
+        """Load a diagram from a file."""
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        
+        diagram = cls.from_dict(data)
+        diagram.file_path = file_path
         return diagram
     
     def get_component_dicts(self):
@@ -0,0 +1,184 @@
+"""
+DiagramBuilder - Scripting API building parametric diagrams from NumPy arrays
+"""
+
+import numpy as np
+from app.models.diagram import Diagram
+from app.models.optical_component import OpticalComponent
+
+
+def line_positions(count, start=(100, 100), step=(100, 0)):
+    """Return (count, 2) positions evenly spaced from start."""
+    return np.asarray(start, dtype=float) + np.arange(count)[:, None] * np.asarray(step, dtype=float)
+
+
+def grid_positions(rows, columns, origin=(100, 100), spacing=(100, 100)):
+    """Return (rows * columns, 2) positions of a grid, row by row."""
+    row, column = np.divmod(np.arange(rows * columns), columns)
+    return np.asarray(origin, dtype=float) + np.stack([column, row], axis=1) * np.asarray(spacing, dtype=float)
+
+
+def arc_positions(count, center, radius, start_angle=-45, end_angle=45):
+    """Return (count, 2) positions spread over an arc; angles in degrees, clockwise on screen."""
+    angles = np.radians(np.linspace(start_angle, end_angle, count))
+    return np.asarray(center, dtype=float) + radius * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+
+def _column(values, count):
+    """Return a params column as a list of count strings.
+
+    A string is repeated, with each {i} replaced by the index within the block; other
+    braces are kept as they are, so LaTeX like "\\textbf{L{i}}" works. Numbers and
+    arrays of numbers are formatted like hand-written params.
+    """
+    if isinstance(values, str):
+        parts = values.split("{i}")
+        if len(parts) == 1:
+            return [values] * count
+        return [index.join(parts) for index in map(str, range(count))]
+    array = np.asarray(values)
+    if array.ndim == 0:
+        array = np.full(count, array)
+    if array.shape != (count,):
+        raise ValueError(f"Expected {count} values, got shape {array.shape}")
+    if array.dtype.kind == "f" and np.array_equal(array, np.round(array)):
+        array = array.astype(np.int64)
+    if array.dtype.kind == "f":
+        return list(map("{:g}".format, array.tolist()))
+    return array.astype(str).tolist()
+
+
+class ComponentBlock:
+    """Class holding components of one type as arrays: an (N, 2) array of positions and
+    one column per parameter."""
+
+    def __init__(self, name, latex, positions, params=None, id_prefix=None):
+        """Initialize from the positions and {param: value, string with {i} or array}.
+
+        With id_prefix the components get the stable ids id_prefix + index, so a
+        regenerated diagram diffs and merges against the previous one.
+        """
+        positions = np.asarray(positions)
+        if positions.ndim != 2 or positions.shape[1] != 2:
+            raise ValueError(f"Positions must have shape (N, 2), got {positions.shape}")
+        if positions.dtype.kind == "f" and np.array_equal(positions, np.round(positions)):
+            # Whole pixel positions are stored as ints, like those placed in the editor
+            positions = positions.astype(np.int64)
+        self.name = name
+        self.latex = latex
+        self.positions = positions
+        self.params = {key: _column(values, len(positions)) for key, values in (params or {}).items()}
+        self.id_prefix = id_prefix
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _rows(self):
+        """Return (position tuples, params dicts, ids) of the components."""
+        positions = list(map(tuple, self.positions.tolist()))
+        keys = list(self.params)
+        if keys:
+            params = [dict(zip(keys, row)) for row in zip(*self.params.values())]
+        else:
+            params = [{} for _ in range(len(positions))]
+        if self.id_prefix is None:
+            ids = [None] * len(positions)
+        else:
+            ids = [f"{self.id_prefix}{i}" for i in range(len(positions))]
+        return positions, params, ids
+
+    def components(self):
+        """Return OpticalComponent objects, the storage of Diagram."""
+        return [OpticalComponent(self.name, self.latex, params, position, component_id)
+                for position, params, component_id in zip(*self._rows())]
+
+    def component_dicts(self):
+        """Return component dictionaries, the storage of the editor."""
+        dicts = [{'name': self.name, 'latex': self.latex, 'params': params, 'position': position}
+                 for position, params, _ in zip(*self._rows())]
+        if self.id_prefix is not None:
+            for i, component in enumerate(dicts):
+                component['id'] = f"{self.id_prefix}{i}"
+        return dicts
+
+
+class DiagramBuilder:
+    """Class building a diagram from blocks of components and arrays of beam endpoints.
+
+    Example: a laser, a 64-element lens array fed by a fan-out and a detector grid.
+
+        builder = DiagramBuilder("Lens array")
+        laser = builder.add("Laser", "\\\\laser", [[0, 400]], {'label': "Laser"})
+        lenses = builder.add("Lens", "\\\\lens", line_positions(64, (200, 0), (0, 12.5)), {'label': "L{i}"})
+        builder.fan_out(laser[0], lenses)
+        diagram = builder.build()
+    """
+
+    def __init__(self, name="Untitled Diagram"):
+        """Initialize an empty builder for a diagram with the given name."""
+        self.name = name
+        self.blocks = []
+        self.count = 0
+        self.beam_starts = []
+        self.beam_ends = []
+        self.beam_types = []
+
+    def add_block(self, block):
+        """Append a ComponentBlock and return the diagram indices of its components."""
+        indices = np.arange(self.count, self.count + len(block))
+        self.blocks.append(block)
+        self.count += len(block)
+        return indices
+
+    def add(self, name, latex, positions, params=None, id_prefix=None):
+        """Append components of one type and return their diagram indices."""
+        return self.add_block(ComponentBlock(name, latex, positions, params, id_prefix))
+
+    def add_template(self, template, positions, params=None, id_prefix=None):
+        """Append components from a library template (name, latex, default params)."""
+        name, latex, defaults = template
+        return self.add(name, latex, positions, {**defaults, **(params or {})}, id_prefix)
+
+    def connect(self, starts, ends, beam_type="wide"):
+        """Add beams between arrays of component indices (a scalar is repeated)."""
+        starts, ends = np.broadcast_arrays(np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+        starts, ends = starts.ravel(), ends.ravel()
+        if starts.size and (min(starts.min(), ends.min()) < 0 or max(starts.max(), ends.max()) >= self.count):
+            raise IndexError("Beam endpoints must reference existing components")
+        self.beam_starts.append(starts)
+        self.beam_ends.append(ends)
+        self.beam_types.append(np.full(starts.size, beam_type, dtype=object))
+
+    def chain(self, indices, beam_type="wide"):
+        """Add beams between consecutive components of an index array."""
+        indices = np.asarray(indices)
+        self.connect(indices[:-1], indices[1:], beam_type)
+
+    def fan_out(self, source, targets, beam_type="wide"):
+        """Add beams from one component to each of the targets."""
+        self.connect(source, targets, beam_type)
+
+    def fan_in(self, sources, target, beam_type="wide"):
+        """Add beams from each of the sources to one component."""
+        self.connect(sources, target, beam_type)
+
+    def beams(self):
+        """Return the beam dictionaries."""
+        if not self.beam_starts:
+            return []
+        starts = np.concatenate(self.beam_starts).tolist()
+        ends = np.concatenate(self.beam_ends).tolist()
+        types = np.concatenate(self.beam_types).tolist()
+        return [{'start': start, 'end': end, 'type': beam_type}
+                for start, end, beam_type in zip(starts, ends, types)]
+
+    def component_dicts(self):
+        """Return the component dictionaries, as used by the editor."""
+        return [component for block in self.blocks for component in block.component_dicts()]
+
+    def build(self):
+        """Return the Diagram."""
+        diagram = Diagram(self.name)
+        diagram.add_components([component for block in self.blocks for component in block.components()])
+        diagram.beams = self.beams()
+        return diagram
@@ -0,0 +1,435 @@
+"""
+DiagramDiff - Structural diff and three-way merge of diagram files
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict, deque, namedtuple
+from app.models.diagram import resolve_beams
+
+# Component fields merged one by one; params are merged per key
+FIELDS = ('name', 'latex', 'position')
+
+# One conflict of a merge. component is the index in the merged diagram (None for
+# diagram-level values), field the component field or params key (None for the whole
+# component); the merged diagram keeps the ours value.
+Conflict = namedtuple('Conflict', ['kind', 'component', 'field', 'ours', 'theirs'])
+
+
+def _hashable(value):
+    """Return a hashable form of a JSON value."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def _params_key(component):
+    params = component.get('params') or {}
+    try:
+        key = tuple(sorted(params.items()))
+        hash(key)
+    except TypeError:
+        key = _hashable(params)
+    return key
+
+
+def _position(component):
+    return tuple(component.get('position', ()))
+
+
+def same_component(a, b):
+    """Return True if two component dicts are equal, whatever sequence type their positions use."""
+    if a == b:
+        return True
+    return (a.get('name') == b.get('name') and a.get('latex') == b.get('latex')
+            and a.get('params') == b.get('params') and _position(a) == _position(b)
+            and a.get('id') == b.get('id'))
+
+
+def _align(old, new, old_indices, new_indices, matches):
+    """Match equal components in order, skipping single insertions and deletions.
+
+    Plain dict comparison needs no keys, so the unchanged runs that make up most of
+    a diagram cost one comparison per component. Returns the unmatched indices.
+    """
+    unmatched_old, unmatched_new = [], []
+    a = b = 0
+    while a < len(old_indices) and b < len(new_indices):
+        i, j = old_indices[a], new_indices[b]
+        if old[i] == new[j]:
+            matches[j] = i
+            a += 1
+            b += 1
+        elif a + 1 < len(old_indices) and old[old_indices[a + 1]] == new[j]:
+            unmatched_old.append(i)
+            a += 1
+        elif b + 1 < len(new_indices) and old[i] == new[new_indices[b + 1]]:
+            unmatched_new.append(j)
+            b += 1
+        else:
+            unmatched_old.append(i)
+            unmatched_new.append(j)
+            a += 1
+            b += 1
+    return unmatched_old + old_indices[a:], unmatched_new + new_indices[b:]
+
+
+# Keys used, in turn, to match the components left by _align: unchanged but out of
+# order, moved, and edited in place
+MATCH_KEYS = (
+    lambda components: [(component.get('name'), component.get('latex'), _params_key(component),
+                         _position(component)) for component in components],
+    lambda components: [(component.get('name'), component.get('latex'), _params_key(component))
+                        for component in components],
+    lambda components: [(component.get('name'), _position(component)) for component in components],
+)
+
+
+def match_components(old, new):
+    """Return, for each new component, the index of the old component it continues, or None.
+
+    Components with an id are matched by id; a new component with an unknown id was
+    added. The others are matched against the remaining old components: equal runs in
+    order first, then by identical content and position, by content alone (moved) and
+    finally by name and position (parameters edited), taking equal candidates in
+    order. Every pass is a scan or one dictionary build and lookup, so matching takes
+    linear time.
+    """
+    matches = [None] * len(new)
+    old_ids = {}
+    for i, component in enumerate(old):
+        component_id = component.get('id')
+        if component_id is not None:
+            old_ids[component_id] = i
+    matched = set()
+    pending = []
+    for j, component in enumerate(new):
+        component_id = component.get('id')
+        if component_id is None:
+            pending.append(j)
+        elif component_id in old_ids:
+            matches[j] = old_ids[component_id]
+            matched.add(matches[j])
+
+    remaining = [i for i in range(len(old)) if i not in matched] if pending else []
+    remaining, pending = _align(old, new, remaining, pending, matches)
+    for keys in MATCH_KEYS:
+        if not pending or not remaining:
+            break
+        candidates = defaultdict(deque)
+        for i, key in zip(remaining, keys([old[i] for i in remaining])):
+            candidates[key].append(i)
+        unmatched = []
+        for j, key in zip(pending, keys([new[j] for j in pending])):
+            queue = candidates.get(key)
+            if queue:
+                matches[j] = queue.popleft()
+                matched.add(matches[j])
+            else:
+                unmatched.append(j)
+        pending = unmatched
+        remaining = [i for i in remaining if i not in matched]
+    return matches
+
+
+def carry_ids(old, new):
+    """Give the new components without an id the id of the old component they continue."""
+    for component, i in zip(new, match_components(old, new)):
+        if i is not None and component.get('id') is None and old[i].get('id') is not None:
+            component['id'] = old[i]['id']
+
+
+def describe(component, index):
+    """Return a short description of a component for reports."""
+    label = (component.get('params') or {}).get('label')
+    text = f"#{index} {component.get('name')}"
+    return f"{text} '{label}'" if label else text
+
+
+class DiagramDiff:
+    """Class holding the component and beam changes from one diagram file's data to another's.
+
+    Indices in removed refer to the old components, in added to the new ones, and
+    modified holds (old index, new index) pairs. Beams are compared through the
+    component matching, so reordering components changes no beam.
+    """
+
+    def __init__(self, old, new):
+        """Compare the data of two diagram files (as from Diagram.to_dict)."""
+        self.old = old
+        self.new = new
+        old_components = old.get('components', [])
+        new_components = new.get('components', [])
+        self.matches = match_components(old_components, new_components)
+
+        old_to_new = [None] * len(old_components)
+        self.added = []
+        self.modified = []
+        for j, i in enumerate(self.matches):
+            if i is None:
+                self.added.append(j)
+            else:
+                old_to_new[i] = j
+                if not same_component(old_components[i], new_components[j]):
+                    self.modified.append((i, j))
+        self.removed = [i for i, j in enumerate(old_to_new) if j is None]
+
+        # Beams as (start, end, type) in new indices; old beams to removed components are removed
+        old_beams = resolve_beams(len(old_components), old.get('beams'))
+        new_beams = resolve_beams(len(new_components), new.get('beams'))
+        mapped = {}
+        self.beams_removed = []
+        for beam in old_beams:
+            start, end = old_to_new[beam['start']], old_to_new[beam['end']]
+            if start is None or end is None:
+                self.beams_removed.append(beam)
+            else:
+                mapped.setdefault((start, end, beam.get('type', 'wide')), beam)
+        new_keys = {(beam['start'], beam['end'], beam.get('type', 'wide')) for beam in new_beams}
+        self.beams_removed += [beam for key, beam in mapped.items() if key not in new_keys]
+        self.beams_added = [beam for beam in new_beams
+                            if (beam['start'], beam['end'], beam.get('type', 'wide')) not in mapped]
+
+        self.values_changed = [key for key in dict.fromkeys([*old, *new])
+                               if key not in ('components', 'beams') and old.get(key) != new.get(key)]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified or self.beams_added
+                    or self.beams_removed or self.values_changed)
+
+    def summary(self, limit=20):
+        """Return the changes as lines of text, listing at most limit components per kind."""
+        old_components = self.old.get('components', [])
+        new_components = self.new.get('components', [])
+        lines = [f"{len(self.added)} added, {len(self.removed)} removed, {len(self.modified)} modified "
+                 f"components; {len(self.beams_added)} added, {len(self.beams_removed)} removed beams"]
+        lines += [f"changed {key}" for key in self.values_changed]
+        for prefix, entries in (
+            ("+", [describe(new_components[j], j) for j in self.added[:limit]]),
+            ("-", [describe(old_components[i], i) for i in self.removed[:limit]]),
+            ("~", [describe(new_components[j], j) for _, j in self.modified[:limit]]),
+        ):
+            lines += [f"{prefix} {entry}" for entry in entries]
+        return lines
+
+    def to_dict(self):
+        """Convert to a JSON-serialisable change set."""
+        new_components = self.new.get('components', [])
+        old_components = self.old.get('components', [])
+        return {
+            'added': [{'index': j, 'component': new_components[j]} for j in self.added],
+            'removed': [{'index': i, 'component': old_components[i]} for i in self.removed],
+            'modified': [{'old_index': i, 'index': j, 'component': new_components[j]} for i, j in self.modified],
+            'beams_added': self.beams_added,
+            'beams_removed': self.beams_removed,
+            'values_changed': self.values_changed,
+        }
+
+
+def _merge_value(base, ours, theirs):
+    """Return (value, conflicting) of a three-way merge of one value."""
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base:
+        return theirs, False
+    return ours, True
+
+
+def merge_component(base, ours, theirs, index, conflicts):
+    """Merge the two versions of a base component field by field, recording conflicts."""
+    if same_component(ours, theirs) or same_component(base, theirs):
+        return ours
+    if same_component(base, ours):
+        return theirs
+    merged = dict(ours)
+    for field in FIELDS:
+        normalise = _position if field == 'position' else (lambda component, f=field: component.get(f))
+        value, conflicting = _merge_value(normalise(base), normalise(ours), normalise(theirs))
+        merged[field] = ours.get(field) if value == normalise(ours) else theirs.get(field)
+        if conflicting:
+            conflicts.append(Conflict('modify/modify', index, field, ours.get(field), theirs.get(field)))
+    base_params, our_params, their_params = (component.get('params') or {} for component in (base, ours, theirs))
+    params = {}
+    missing = object()
+    for key in dict.fromkeys([*our_params, *their_params]):
+        value, conflicting = _merge_value(base_params.get(key, missing), our_params.get(key, missing),
+                                          their_params.get(key, missing))
+        if conflicting:
+            conflicts.append(Conflict('modify/modify', index, key, our_params.get(key), their_params.get(key)))
+        if value is not missing:
+            params[key] = value
+    merged['params'] = params
+    return merged
+
+
+def merge(base, ours, theirs):
+    """Three-way merge the data of diagram files; return (merged data, conflicts).
+
+    Components are matched to the base with match_components. Changes made on one side
+    are taken; fields changed differently on both sides are conflicts that keep ours.
+    A component deleted on one side and modified on the other is kept, as a conflict.
+    Beams and constraints are merged as sets of connections between matched
+    components, so those of a component deleted on either side are dropped, and other
+    values (name, setups, instances) as a whole.
+    """
+    base_components = base.get('components', [])
+    our_components = ours.get('components', [])
+    their_components = theirs.get('components', [])
+    our_matches = match_components(base_components, our_components)
+    their_matches = match_components(base_components, their_components)
+    base_to_theirs = {i: k for k, i in enumerate(their_matches) if i is not None}
+    base_to_ours = {i: j for j, i in enumerate(our_matches) if i is not None}
+
+    merged = []
+    conflicts = []
+    # Merged index of every component, keyed by its identity in the base or the side adding it
+    positions = {}
+    our_keys = [('base', i) if i is not None else ('ours', j) for j, i in enumerate(our_matches)]
+    their_keys = [('base', i) if i is not None else ('theirs', k) for k, i in enumerate(their_matches)]
+
+    for j, component in enumerate(our_components):
+        i = our_matches[j]
+        if i is not None:
+            k = base_to_theirs.get(i)
+            if k is None:
+                if same_component(base_components[i], component):
+                    continue
+                conflicts.append(Conflict('modify/delete', len(merged), None, component, None))
+            else:
+                component = merge_component(base_components[i], component, their_components[k],
+                                            len(merged), conflicts)
+        positions[our_keys[j]] = len(merged)
+        merged.append(component)
+
+    for i, k in base_to_theirs.items():
+        if i not in base_to_ours and not same_component(base_components[i], their_components[k]):
+            conflicts.append(Conflict('delete/modify', len(merged), None, None, their_components[k]))
+            positions[('base', i)] = len(merged)
+            merged.append(their_components[k])
+
+    our_added_ids = {component['id']: j for j, component in enumerate(our_components)
+                     if our_matches[j] is None and component.get('id') is not None}
+    for k, component in enumerate(their_components):
+        if their_matches[k] is not None:
+            continue
+        j = our_added_ids.get(component.get('id'))
+        if j is not None:
+            # Both sides added the same component
+            their_keys[k] = ('ours', j)
+            if not same_component(our_components[j], component):
+                conflicts.append(Conflict('add/add', positions[('ours', j)], None, our_components[j], component))
+            continue
+        positions[('theirs', k)] = len(merged)
+        merged.append(component)
+
+    data = {'name': None, 'components': merged, 'beams': []}
+    if base.get('beams') or ours.get('beams') or theirs.get('beams'):
+        def beam_keys(components, beams, keys):
+            return [(keys[beam['start']], keys[beam['end']], beam.get('type', 'wide'))
+                    for beam in resolve_beams(len(components), beams)]
+        base_beams = set(beam_keys(base_components, base.get('beams'),
+                                   [('base', i) for i in range(len(base_components))]))
+        our_beams = beam_keys(our_components, ours.get('beams'), our_keys)
+        their_beams = beam_keys(their_components, theirs.get('beams'), their_keys)
+        our_set, their_set = set(our_beams), set(their_beams)
+        kept = [beam for beam in our_beams if beam in their_set or beam not in base_beams]
+        kept += [beam for beam in their_beams if beam not in our_set and beam not in base_beams]
+        for start, end, beam_type in dict.fromkeys(kept):
+            if start in positions and end in positions:
+                data['beams'].append({'start': positions[start], 'end': positions[end], 'type': beam_type})
+
+    if base.get('constraints') or ours.get('constraints') or theirs.get('constraints'):
+        def constraint_keys(constraints, keys):
+            return [(constraint['kind'], tuple(keys[index] for index in constraint['components']),
+                     constraint.get('value'))
+                    for constraint in constraints or []
+                    if all(0 <= index < len(keys) for index in constraint['components'])]
+        base_constraints = set(constraint_keys(base.get('constraints'),
+                                               [('base', i) for i in range(len(base_components))]))
+        our_constraints = constraint_keys(ours.get('constraints'), our_keys)
+        their_constraints = constraint_keys(theirs.get('constraints'), their_keys)
+        our_set, their_set = set(our_constraints), set(their_constraints)
+        kept = [key for key in our_constraints if key in their_set or key not in base_constraints]
+        kept += [key for key in their_constraints if key not in our_set and key not in base_constraints]
+        constraints = []
+        for kind, members, value in dict.fromkeys(kept):
+            if all(member in positions for member in members):
+                constraint = {'kind': kind, 'components': [positions[member] for member in members]}
+                if value is not None:
+                    constraint['value'] = value
+                constraints.append(constraint)
+        if constraints:
+            data['constraints'] = constraints
+
+    for key in dict.fromkeys([*ours, *theirs]):
+        if key in ('components', 'beams', 'constraints'):
+            continue
+        value, conflicting = _merge_value(base.get(key), ours.get(key), theirs.get(key))
+        if conflicting:
+            conflicts.append(Conflict('value', None, key, ours.get(key), theirs.get(key)))
+        if value is not None:
+            data[key] = value
+    if data['name'] is None:
+        data['name'] = "Untitled Diagram"
+    return data, conflicts
+
+
+def format_conflict(conflict):
+    """Return a one-line description of a merge conflict."""
+    where = f"component #{conflict.component}" if conflict.component is not None else "diagram"
+    if conflict.field is not None:
+        where += f" {conflict.field}"
+    if conflict.kind in ('modify/modify', 'value'):
+        return f"{conflict.kind}: {where}: ours {conflict.ours!r}, theirs {conflict.theirs!r}"
+    return f"{conflict.kind}: {where}"
+
+
+def _load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    """Diff or merge diagram files from the command line.
+
+    diff exits with 1 if the diagrams differ and merge with 1 if there are conflicts,
+    like diff and git merge-file.
+    """
+    parser = argparse.ArgumentParser(description="Compare and merge optical diagram files.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    diff_parser = commands.add_parser('diff', help="list the changes from OLD to NEW")
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    diff_parser.add_argument('--json', action='store_true', help="print the change set as JSON")
+    diff_parser.add_argument('--limit', type=int, default=20, help="components listed per kind of change")
+    merge_parser = commands.add_parser('merge', help="merge the changes of OURS and THEIRS to BASE")
+    merge_parser.add_argument('base')
+    merge_parser.add_argument('ours')
+    merge_parser.add_argument('theirs')
+    merge_parser.add_argument('-o', '--output', help="file to write the merged diagram to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'diff':
+        diff = DiagramDiff(_load(args.old), _load(args.new))
+        if args.json:
+            print(json.dumps(diff.to_dict(), indent=2))
+        else:
+            print("\n".join(diff.summary(args.limit)))
+        return 1 if diff else 0
+
+    data, conflicts = merge(_load(args.base), _load(args.ours), _load(args.theirs))
+    if args.output:
+        from app.utils.file_ops import save_diagram
+        save_diagram(data, args.output)
+    else:
+        print(json.dumps(data, indent=2))
+    for conflict in conflicts:
+        print(format_conflict(conflict), file=sys.stderr)
+    return 1 if conflicts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,24 +2,58 @@
 OpticalComponent - Models for optical components and their properties
 """
 
+import uuid
+
+# Name fragments used to recognise the optical role of a component
+SOURCE_KEYWORDS = ("Source", "Laser")
+DETECTOR_KEYWORDS = ("Detector", "Photodiode", "Camera", "Spectrometer",
+                     "Power Meter", "Counter", "Block")
+
+
+def classify_component(name):
+    """Return the optical role of a component from its display name."""
+    if any(keyword in name for keyword in SOURCE_KEYWORDS):
+        return 'source'
+    if any(keyword in name for keyword in DETECTOR_KEYWORDS):
+        return 'detector'
+    if "Lens" in name:
+        return 'lens'
+    if "Mirror" in name:
+        return 'mirror'
+    if "Beam Splitter" in name or "BS" in name:
+        return 'splitter'
+    return 'other'
+
+
+def new_component_id():
+    """Return a new stable id for a component, kept across edits, saves and merges."""
+    return uuid.uuid4().hex[:16]
+
+
 class OpticalComponent:
     """Base class for all optical components."""
     
-    def __init__(self, name, latex_cmd, params, position=(0, 0)):
+    def __init__(self, name, latex_cmd, params, position=(0, 0), component_id=None):
         """Initialize an optical component."""
         self.name = name
         self.latex_cmd = latex_cmd
         self.params = params
         self.position = position
+        # Stable id used to match the component between versions of a diagram
+        self.id = component_id
     
     def to_dict(self):
         """Convert to dictionary representation."""
-        return {
+        data = {
             'name': self.name,
             'latex': self.latex_cmd,
             'params': self.params,
             'position': self.position
         }
+        # Components created before ids were introduced have none
+        if self.id is not None:
+            data['id'] = self.id
+        return data
     
     @classmethod
     def from_dict(cls, data):
@@ -28,7 +62,8 @@ class OpticalComponent:
             data['name'],
             data['latex'],
             data['params'],
-            data['position']
+            data['position'],
+            data.get('id')
         )
 
 
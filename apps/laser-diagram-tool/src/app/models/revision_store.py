@@ -0,0 +1,209 @@
+"""
+RevisionStore - Content-addressed store of diagram revisions with component-level deduplication
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# Items per list node on average; boundaries depend on content, so an insertion or
+# deletion only changes the nodes around it
+CHUNK_AVERAGE = 4
+
+# Smallest and largest number of items in one list node; at least two per node
+# guarantees every level of the tree is smaller than the one below
+CHUNK_MIN = 2
+CHUNK_MAX = 4 * CHUNK_AVERAGE
+
+# Largest number of hashes looked up per query
+FETCH_BATCH = 500
+
+# First byte of list nodes: leaves hold item hashes, inner nodes hold node hashes
+LEAF, INNER = b"\x00", b"\x01"
+
+# Encoder of canonical JSON, shared by every object
+ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+# One entry of the history
+Revision = namedtuple('Revision', ['id', 'parent', 'created', 'name', 'message', 'component_count'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (hash BLOB PRIMARY KEY, data BLOB NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS revisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent INTEGER,
+    created REAL NOT NULL,
+    name TEXT NOT NULL,
+    message TEXT NOT NULL,
+    component_count INTEGER NOT NULL,
+    manifest BLOB NOT NULL
+);
+"""
+
+
+def object_hash(data):
+    """Return the 16 byte content hash of an object."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def canonical(value):
+    """Return the canonical JSON bytes of a value, equal for equal content."""
+    return ENCODER.encode(value).encode('utf-8')
+
+
+def chunk_boundaries(digests):
+    """Split digests into runs ending where a digest's content picks a boundary."""
+    chunks = []
+    start = 0
+    for i, digest in enumerate(digests):
+        size = i + 1 - start
+        if (size >= CHUNK_MIN and digest[-1] % CHUNK_AVERAGE == 0) or size >= CHUNK_MAX:
+            chunks.append(digests[start:i + 1])
+            start = i + 1
+    if start < len(digests) or not chunks:
+        chunks.append(digests[start:])
+    return chunks
+
+
+class RevisionStore:
+    """Class storing revisions of diagrams in one SQLite file.
+
+    Every component, beam and other list item is stored once under the hash of its
+    content. Lists are trees of small nodes of item hashes whose boundaries depend on
+    the content, and a revision is a manifest of the roots of these trees. A revision
+    that changes a few components therefore only adds those components, the nodes on
+    their paths to the root and the manifest.
+    """
+
+    def __init__(self, path):
+        """Open or create the store at path."""
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        # Hashes this store committed; other stored objects are skipped by INSERT OR IGNORE
+        self.known = set()
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def _put(self, objects):
+        """Store the (hash, data) pairs that are not stored yet and return those written.
+
+        The caller adds the returned hashes to known once its transaction commits.
+        """
+        new = [(digest, data) for digest, data in objects if digest not in self.known]
+        self.connection.executemany("INSERT OR IGNORE INTO objects VALUES (?, ?)", new)
+        return new
+
+    def _get(self, digests):
+        """Return {hash: data} of stored objects."""
+        found = {}
+        unique = list(set(digests))
+        for start in range(0, len(unique), FETCH_BATCH):
+            batch = unique[start:start + FETCH_BATCH]
+            query = f"SELECT hash, data FROM objects WHERE hash IN ({','.join('?' * len(batch))})"
+            found.update(self.connection.execute(query, batch))
+        missing = len(unique) - len(found)
+        if missing:
+            raise KeyError(f"{missing} objects missing from the revision store")
+        return found
+
+    def _store_list(self, items, objects):
+        """Add a list's items and tree nodes to objects and return the root hash."""
+        level = []
+        for item in items:
+            data = canonical(item)
+            digest = object_hash(data)
+            objects.append((digest, data))
+            level.append(digest)
+
+        kind = LEAF
+        while True:
+            nodes = []
+            for chunk in chunk_boundaries(level):
+                data = kind + b"".join(chunk)
+                digest = object_hash(data)
+                objects.append((digest, data))
+                nodes.append(digest)
+            if len(nodes) == 1:
+                return nodes[0]
+            level, kind = nodes, INNER
+
+    def _load_list(self, root):
+        """Return the items of the list with the given root hash."""
+        nodes = [root]
+        while True:
+            data = self._get(nodes)
+            if data[nodes[0]][:1] == LEAF:
+                break
+            nodes = [node[i:i + 16] for node in (data[digest][1:] for digest in nodes)
+                     for i in range(0, len(node), 16)]
+        digests = [node[i:i + 16] for node in (data[digest][1:] for digest in nodes)
+                   for i in range(0, len(node), 16)]
+        items = self._get(digests)
+        return [json.loads(items[digest]) for digest in digests]
+
+    def commit(self, diagram_data, message="", parent=None):
+        """Store a revision of diagram file data (as from Diagram.to_dict) and return its id."""
+        objects = []
+        manifest = {}
+        for key, value in diagram_data.items():
+            if isinstance(value, list):
+                manifest[key] = {'list': self._store_list(value, objects).hex()}
+            else:
+                data = canonical(value)
+                digest = object_hash(data)
+                objects.append((digest, data))
+                manifest[key] = {'value': digest.hex()}
+        manifest_data = canonical(manifest)
+        manifest_hash = object_hash(manifest_data)
+        objects.append((manifest_hash, manifest_data))
+
+        with self.lock:
+            with self.connection:
+                new = self._put(objects)
+                if parent is None:
+                    row = self.connection.execute("SELECT MAX(id) FROM revisions").fetchone()
+                    parent = row[0]
+                cursor = self.connection.execute(
+                    "INSERT INTO revisions (parent, created, name, message, component_count, manifest) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (parent, time.time(), str(diagram_data.get('name', "")), message,
+                     len(diagram_data.get('components', [])), manifest_hash))
+            # A rolled back transaction stored none of them
+            self.known.update(digest for digest, _ in new)
+            return cursor.lastrowid
+
+    def checkout(self, revision_id):
+        """Return the diagram file data of a revision."""
+        with self.lock:
+            row = self.connection.execute("SELECT manifest FROM revisions WHERE id = ?", (revision_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"No revision {revision_id}")
+            manifest = json.loads(self._get([row[0]])[row[0]])
+            data = {}
+            for key, entry in manifest.items():
+                if 'list' in entry:
+                    data[key] = self._load_list(bytes.fromhex(entry['list']))
+                else:
+                    digest = bytes.fromhex(entry['value'])
+                    data[key] = json.loads(self._get([digest])[digest])
+            return data
+
+    def history(self, limit=None):
+        """Return the revisions, newest first."""
+        query = "SELECT id, parent, created, name, message, component_count FROM revisions ORDER BY id DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self.lock:
+            return [Revision(*row) for row in self.connection.execute(query)]
+
+    def stored_bytes(self):
+        """Return the total size of the stored objects."""
+        with self.lock:
+            return self.connection.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM objects").fetchone()[0]
@@ -0,0 +1,147 @@
+"""
+SetupInstance - Optical setups placed as instances of shared definitions
+"""
+
+from app.models.diagram import resolve_beams
+
+
+class SetupDefinition:
+    """Class holding the components and beams of an optical setup, shared by its instances.
+
+    The components are stored once, in the setup's own coordinates; every instance of
+    the setup only adds a translation and the parameters it overrides.
+    """
+
+    def __init__(self, name, components, beams=()):
+        """Initialize with the setup's components and beams between their indices."""
+        self.name = name
+        # Own copies, so neither the library templates nor the instances share params dicts
+        self.components = [
+            {'name': component['name'], 'latex': component['latex'],
+             'params': dict(component['params']), 'position': tuple(component['position'])}
+            for component in components
+        ]
+        self.beams = [dict(beam) for beam in beams]
+        # Component types of the library setup that had no template and were left out
+        self.missing_types = []
+
+    @classmethod
+    def from_library(cls, library, setup_name):
+        """Build the definition of a complex setup of a ComponentLibrary.
+
+        Components without a template are left out, and the setup's beams with them
+        since their indices would no longer match.
+        """
+        setup_components, setup_beams = library.get_setup_components(setup_name)
+        components = []
+        missing_types = []
+        for comp in setup_components:
+            template = library.get_component_by_name(comp["type"])
+            if template is None:
+                missing_types.append(comp["type"])
+                continue
+            components.append({'name': comp["type"], 'latex': template[1],
+                               'params': comp["params"], 'position': comp["position"]})
+        if not components:
+            raise ValueError(f"Failed to get components for {setup_name}")
+        definition = cls(setup_name, components, [] if missing_types else setup_beams)
+        definition.missing_types = missing_types
+        return definition
+
+    def bounds(self):
+        """Return (x1, y1, x2, y2) of the component positions in setup coordinates."""
+        xs = [component['position'][0] for component in self.components]
+        ys = [component['position'][1] for component in self.components]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def to_dict(self):
+        """Convert to the dictionary stored in diagram files."""
+        return {'components': [dict(component, position=list(component['position']))
+                               for component in self.components],
+                'beams': self.beams}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        """Create a definition from the dictionary stored in diagram files."""
+        return cls(name, data.get('components', []), data.get('beams', []))
+
+
+class SetupInstance:
+    """Class placing a SetupDefinition with a translation and per-instance parameter overrides."""
+
+    def __init__(self, definition, offset=(0, 0), overrides=None):
+        """Initialize with the shared definition, the offset and {component index: params}."""
+        self.definition = definition
+        self.offset = tuple(offset)
+        self.overrides = {int(index): dict(params) for index, params in (overrides or {}).items()}
+
+    def variant_key(self):
+        """Return a key shared by the instances that draw the same apart from their offset."""
+        return (self.definition, tuple(sorted((index, tuple(sorted(params.items())))
+                                              for index, params in self.overrides.items())))
+
+    def local_components(self):
+        """Return the components with this instance's overrides, in setup coordinates."""
+        if not self.overrides:
+            return self.definition.components
+        return [dict(component, params={**component['params'], **self.overrides[index]})
+                if index in self.overrides else component
+                for index, component in enumerate(self.definition.components)]
+
+    def expand(self):
+        """Return independent copies of the components, placed in diagram coordinates."""
+        dx, dy = self.offset
+        return [{'name': component['name'], 'latex': component['latex'],
+                 'params': dict(component['params']),
+                 'position': (component['position'][0] + dx, component['position'][1] + dy)}
+                for component in self.local_components()]
+
+    def beams(self, start=0):
+        """Return the setup's beams for components numbered from start."""
+        return [{**beam, 'start': beam['start'] + start, 'end': beam['end'] + start}
+                for beam in resolve_beams(len(self.definition.components), self.definition.beams)]
+
+    def to_dict(self):
+        """Convert to the dictionary stored in diagram files."""
+        data = {'setup': self.definition.name, 'offset': list(self.offset)}
+        if self.overrides:
+            data['overrides'] = {str(index): params for index, params in self.overrides.items()}
+        return data
+
+
+def flatten(components, beams, instances):
+    """Return the components and beams of a diagram with its setup instances expanded.
+
+    Analyses that need every element work on this view; the diagram itself keeps
+    one definition per setup.
+    """
+    if not instances:
+        return components, beams
+    flat_components = list(components)
+    # The free components' beams become explicit so they keep their default chain
+    flat_beams = resolve_beams(len(components), beams)
+    for instance in instances:
+        flat_beams.extend(instance.beams(len(flat_components)))
+        flat_components.extend(instance.expand())
+    return flat_components, flat_beams
+
+
+def instances_to_dict(instances):
+    """Return the 'setups' and 'instances' entries of a diagram file."""
+    setups = {}
+    for instance in instances:
+        if instance.definition.name not in setups:
+            setups[instance.definition.name] = instance.definition.to_dict()
+    return {'setups': setups, 'instances': [instance.to_dict() for instance in instances]}
+
+
+def instances_from_dict(data):
+    """Create the setup instances of a diagram file; instances of a setup share its definition."""
+    definitions = {name: SetupDefinition.from_dict(name, setup) for name, setup in data.get('setups', {}).items()}
+    instances = []
+    for entry in data.get('instances', []):
+        if entry['setup'] not in definitions:
+            raise ValueError(f"Unknown setup {entry['setup']}")
+        instances.append(SetupInstance(definitions[entry['setup']], entry.get('offset', (0, 0)),
+                                       entry.get('overrides')))
+    return instances
@@ -0,0 +1,3 @@
+"""
+Headless services for the Optical Diagram Creator
+"""
@@ -0,0 +1,411 @@
+"""
+RenderService - Local HTTP service rendering diagrams without the GUI
+"""
+
+import argparse
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from app.models.diagram import Diagram
+from app.models.setup_instance import flatten
+from app.utils.compiler import LatexCompiler, source_hash, split_preamble
+from app.utils.export import PDFExporter
+from app.utils.image_export import encode_png, iter_svg, render_image
+from app.utils.latex_generator import LatexGenerator
+
+# Output formats and their content types
+FORMATS = {
+    'pdf': "application/pdf",
+    'tex': "application/x-tex",
+    'svg': "image/svg+xml",
+    'png': "image/png",
+}
+
+# Number of recent request latencies kept for the metrics
+LATENCY_WINDOW = 1000
+
+
+class RenderResult:
+    """Outcome of one render request."""
+
+    def __init__(self, key, fmt, success, content=b"", error="", cached=False):
+        """Initialize the result fields."""
+        self.key = key
+        self.format = fmt
+        self.success = success
+        self.content = content
+        self.error = error
+        self.cached = cached
+
+    @property
+    def content_type(self):
+        """Return the content type of the rendered format."""
+        return FORMATS[self.format]
+
+
+class RenderService:
+    """Class rendering diagram dictionaries to PDF, LaTeX, SVG or PNG.
+
+    Results are content addressed by the canonical JSON of the diagram and the format,
+    kept in an in-memory LRU and on disk, so a repeated diagram never renders twice.
+    Identical requests that arrive while one is rendering wait for the same result.
+    Misses are queued; a dispatcher collects them into batches (up to batch_size or
+    batch_window seconds) and prepares each batch once: its LaTeX is generated, the
+    compiler keeps a job directory for every PDF in it and the format of each distinct
+    preamble is dumped before any of its compiles start. The renders then run side by
+    side on a worker pool.
+    """
+
+    def __init__(self, compiler=None, cache_dir=None, batch_window=0.005, batch_size=16, workers=None,
+                 memory_entries=256):
+        """Initialize the service and start its dispatcher thread."""
+        self.exporter = PDFExporter(compiler)
+        self.generator = LatexGenerator()
+        self.cache_dir = cache_dir or os.path.join(self.exporter.compiler.work_dir, "renders")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.memory_entries = memory_entries
+
+        self.lock = threading.Lock()
+        # Request key -> content of recently served results
+        self.memory = OrderedDict()
+        # Request key -> Future of the render in progress
+        self.inflight = {}
+        self.pending = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+
+        self.counters = {'requests': 0, 'cache_hits': 0, 'deduplicated': 0, 'renders': 0,
+                         'failures': 0, 'batches': 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+        self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def request_key(self, data, fmt):
+        """Return the content address of a diagram rendered in a format."""
+        canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+        return source_hash(fmt + "\n" + canonical)
+
+    def cache_path(self, key, fmt):
+        """Return the disk cache file of a result."""
+        return os.path.join(self.cache_dir, f"{key}.{fmt}")
+
+    def cached(self, key, fmt):
+        """Return the cached result of a request key, or None."""
+        with self.lock:
+            content = self.memory.get(key)
+            if content is not None:
+                self.memory.move_to_end(key)
+        if content is None:
+            path = self.cache_path(key, fmt)
+            if not os.path.exists(path):
+                return None
+            with open(path, 'rb') as file:
+                content = file.read()
+            self.remember(key, content)
+        return RenderResult(key, fmt, True, content, cached=True)
+
+    def store(self, key, fmt, content):
+        """Write a result to the disk cache through a temporary file, so cached() never reads a partial one."""
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(content)
+            os.replace(temp_path, self.cache_path(key, fmt))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def remember(self, key, content):
+        """Keep a result in the in-memory LRU."""
+        with self.lock:
+            self.memory[key] = content
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def render(self, data, fmt='pdf', timeout=None):
+        """Render a diagram dictionary and return a RenderResult; blocks until it is done.
+
+        Raises ValueError for an unknown format and KeyError, TypeError or ValueError for
+        a malformed diagram.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+        started = time.perf_counter()
+        key = self.request_key(data, fmt)
+        result = self.cached(key, fmt)
+        if result is not None:
+            with self.lock:
+                self.counters['cache_hits'] += 1
+        else:
+            with self.lock:
+                future = self.inflight.get(key)
+                if future is not None:
+                    self.counters['deduplicated'] += 1
+            if future is None:
+                # Only diagrams that are not cached are parsed
+                diagram = Diagram.from_dict(data)
+                with self.lock:
+                    future = self.inflight.get(key)
+                    if future is None:
+                        future = Future()
+                        self.inflight[key] = future
+                        self.pending.put((key, fmt, diagram, future))
+            result = future.result(timeout)
+
+        with self.lock:
+            self.counters['requests'] += 1
+            self.latencies.append(time.perf_counter() - started)
+        return result
+
+    def dispatch(self):
+        """Collect queued renders into batches and hand them to the worker pool."""
+        while True:
+            job = self.pending.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.pending.put(None)
+                    break
+                batch.append(job)
+
+            with self.lock:
+                self.counters['batches'] += 1
+            self.run_batch(batch)
+
+    def run_batch(self, batch):
+        """Prepare a batch of queued renders once and hand them to the worker pool."""
+        # Native formats need no preparation
+        for key, fmt, diagram, future in batch:
+            if fmt != 'pdf':
+                self.pool.submit(self.run_job, key, fmt, diagram, future)
+        jobs = []
+        preambles = set()
+        for key, fmt, diagram, future in batch:
+            if fmt != 'pdf':
+                continue
+            try:
+                latex_code = self.generator.generate_latex_code(diagram.get_component_dicts(), diagram.instances)
+            except Exception:
+                # The job's own render reports the error
+                latex_code = None
+            else:
+                preambles.add(split_preamble(latex_code)[0])
+            jobs.append((key, fmt, diagram, future, latex_code))
+        if jobs:
+            compiler = self.exporter.compiler
+            # Every PDF of the batch must still exist when it is read back
+            compiler.reserve_jobs(len(jobs))
+            if compiler.use_format:
+                for preamble in preambles - {None}:
+                    try:
+                        compiler.ensure_format(preamble)
+                    except OSError:
+                        # The compiles then try the format again and report the error
+                        pass
+        for job in jobs:
+            self.pool.submit(self.run_job, *job)
+
+    def run_job(self, key, fmt, diagram, future, latex_code=None):
+        """Render one queued request, store it and wake everyone waiting for it."""
+        result = RenderResult(key, fmt, False, error="Render did not finish")
+        try:
+            result = self.produce(key, fmt, diagram, latex_code)
+            if result.success:
+                self.store(key, fmt, result.content)
+                self.remember(key, result.content)
+        except Exception as e:
+            # A broken diagram or a failed cache write must not leave its waiters hanging
+            result = RenderResult(key, fmt, False, error=f"{type(e).__name__}: {e}")
+        finally:
+            with self.lock:
+                self.counters['renders'] += 1
+                self.counters['failures'] += not result.success
+                del self.inflight[key]
+            future.set_result(result)
+
+    def produce(self, key, fmt, diagram, latex_code=None):
+        """Render a diagram in a format, from its LaTeX code if that was generated already."""
+        components = diagram.get_component_dicts()
+        if fmt in ('svg', 'png'):
+            flat_components, flat_beams = flatten(components, diagram.beams, diagram.instances)
+            if fmt == 'svg':
+                return RenderResult(key, fmt, True, "".join(iter_svg(flat_components, flat_beams)).encode('utf-8'))
+            return RenderResult(key, fmt, True, encode_png(render_image(flat_components, flat_beams)))
+
+        if latex_code is None:
+            latex_code = self.generator.generate_latex_code(components, diagram.instances)
+        if fmt == 'tex':
+            return RenderResult(key, fmt, True, latex_code.encode('utf-8'))
+        compiled = self.exporter.build_pdf(latex_code)
+        if not compiled.success:
+            return RenderResult(key, fmt, False, error=compiled.error_summary())
+        with open(compiled.pdf_path, 'rb') as file:
+            return RenderResult(key, fmt, True, file.read())
+
+    def metrics(self):
+        """Return the queue depth, counters and latency percentiles in milliseconds."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            metrics = dict(self.counters)
+            metrics['in_flight'] = len(self.inflight)
+        metrics['queue_depth'] = self.pending.qsize()
+        metrics['latency_ms'] = {}
+        if latencies:
+            for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+                index = min(len(latencies) - 1, int(fraction * len(latencies)))
+                metrics['latency_ms'][name] = round(latencies[index] * 1000, 3)
+            metrics['latency_ms']['max'] = round(latencies[-1] * 1000, 3)
+        return metrics
+
+    def close(self):
+        """Stop the dispatcher and the worker pool."""
+        self.pending.put(None)
+        self.dispatcher.join()
+        self.pool.shutdown()
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a RenderService.
+
+    POST /render?format=pdf with diagram JSON renders it, GET /render/<key>.<format>
+    returns a cached result, GET /metrics and GET /health report on the service.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, keep-alive responses stall
+    # on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        """Render the posted diagram."""
+        url = urlparse(self.path)
+        if url.path != "/render":
+            self.send_json(404, {'error': "Not found"})
+            return
+        fmt = parse_qs(url.query).get('format', ['pdf'])[0]
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body cannot be delimited, so the connection cannot be reused either
+            self.send_json(400, {'error': "Invalid Content-Length"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+        try:
+            result = self.server.service.render(json.loads(body), fmt)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.send_json(400, {'error': "Body is not valid JSON"})
+            return
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            self.send_json(400, {'error': f"Invalid diagram: {e}"})
+            return
+
+        if result.success:
+            self.send_content(result)
+        else:
+            self.send_json(422, {'key': result.key, 'error': result.error})
+
+    def do_GET(self):
+        """Serve cached results, metrics and the health check."""
+        path = urlparse(self.path).path
+        if path == "/health":
+            self.send_json(200, {'status': "ok"})
+        elif path == "/metrics":
+            self.send_json(200, self.server.service.metrics())
+        elif path.startswith("/render/"):
+            key, _, fmt = path[len("/render/"):].partition(".")
+            result = self.server.service.cached(key, fmt) if fmt in FORMATS and key.isalnum() else None
+            if result is None:
+                self.send_json(404, {'error': "Not cached"})
+            else:
+                self.send_content(result)
+        else:
+            self.send_json(404, {'error': "Not found"})
+
+    def send_content(self, result):
+        """Send a rendered result."""
+        self.send_response(200)
+        self.send_header('Content-Type', result.content_type)
+        self.send_header('Content-Length', str(len(result.content)))
+        self.send_header('X-Render-Key', result.key)
+        self.send_header('X-Cache', "hit" if result.cached else "miss")
+        self.end_headers()
+        self.wfile.write(result.content)
+
+    def send_json(self, status, data):
+        """Send a JSON response."""
+        content = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        """Log requests only when the server is verbose."""
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class RenderServer(ThreadingHTTPServer):
+    """Threaded HTTP server owning a RenderService."""
+
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        """Bind to address and serve requests with the service."""
+        super().__init__(address, RenderRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def main(argv=None):
+    """Run the render service from the command line."""
+    parser = argparse.ArgumentParser(description="Render optical diagrams over HTTP.")
+    parser.add_argument('--host', default="127.0.0.1", help="address to listen on")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on")
+    parser.add_argument('--engine', default="xelatex", help="TeX engine used for PDFs")
+    parser.add_argument('--cache-dir', help="directory of the result cache")
+    parser.add_argument('--workers', type=int, help="number of parallel renders")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    service = RenderService(LatexCompiler(args.engine, warm_workers=1), args.cache_dir, workers=args.workers)
+    server = RenderServer((args.host, args.port), service, args.verbose)
+    print(f"Render service listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
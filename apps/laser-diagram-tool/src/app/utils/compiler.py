@@ -0,0 +1,373 @@
+"""
+Compiler - Cancellable background-friendly LaTeX compilation
+"""
+
+import atexit
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from app.utils.profiling import span
+
+# Seconds between checks of the cancel event while a process runs
+POLL_INTERVAL = 0.05
+
+# Job directories kept by default; the least recently used ones beyond it are deleted
+MAX_JOBS = 256
+
+# Compile results kept for timing_summary
+HISTORY_LENGTH = 1000
+
+
+def source_hash(latex_code):
+    """Return the content hash identifying a LaTeX source."""
+    return hashlib.sha256(latex_code.encode('utf-8')).hexdigest()
+
+
+def split_preamble(latex_code):
+    """Split a LaTeX source at \\begin{document} into (preamble, body).
+
+    The preamble is None if the source has no document environment.
+    """
+    index = latex_code.find("\\begin{document}")
+    if index < 0:
+        return None, latex_code
+    return latex_code[:index], latex_code[index:]
+
+
+class CompileResult:
+    """Outcome of one compilation.
+
+    mode tells how the PDF was produced: 'cached', 'cold' (plain engine run), 'format'
+    (engine run with the precompiled preamble) or 'warm' (a waiting worker process).
+    timings holds the seconds spent dumping the format and compiling the document.
+    """
+
+    def __init__(self, source_hash, success, pdf_path=None, log="", duration=0.0, cancelled=False,
+                 mode='cold', timings=None):
+        """Initialize the result fields."""
+        self.source_hash = source_hash
+        self.success = success
+        self.pdf_path = pdf_path
+        self.log = log
+        self.duration = duration
+        self.cancelled = cancelled
+        self.mode = mode
+        self.timings = timings or {}
+
+    def error_summary(self):
+        """Return the first LaTeX error line of the log, or the end of the log."""
+        for line in self.log.splitlines():
+            if line.startswith("!"):
+                return line
+        return self.log.strip().splitlines()[-1] if self.log.strip() else "Compilation failed"
+
+
+class CompileCancelled(Exception):
+    """Raised inside a compilation when its cancel event is set."""
+
+
+class WarmWorker:
+    """A TeX engine started ahead of time with a format loaded, waiting for its input."""
+
+    def __init__(self, format_name, directory, command, env=None):
+        """Start the engine in its own directory."""
+        self.format_name = format_name
+        self.directory = directory
+        self.command = command
+        self.process = subprocess.Popen(command, cwd=directory, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                        errors='replace', env=env)
+
+    def alive(self):
+        """Check whether the engine is still waiting."""
+        return self.process.poll() is None
+
+    def stop(self):
+        """Kill the engine and remove its directory."""
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.communicate()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class LatexCompiler:
+    """Class for compiling LaTeX sources into PDFs in a private working directory.
+
+    Every source is compiled in a directory named after its hash, so a source that was
+    compiled before returns its PDF immediately. The external processes are polled so a
+    compilation can be cancelled from another thread at any time.
+
+    With use_format the preamble is dumped once into a format (mylatexformat) named after
+    its hash, and documents are compiled against it, so a changed preamble gets a new
+    format automatically. With warm_workers that many engines are kept started with the
+    format loaded, and a compile hands its source to one of them.
+
+    Only the max_jobs most recently used job directories are kept. A working directory
+    the compiler created itself is deleted with the compiler.
+    """
+
+    def __init__(self, engine="xelatex", work_dir=None, timeout=120, use_format=True, warm_workers=0,
+                 max_jobs=MAX_JOBS):
+        """Initialize with the TeX engine, an optional working directory and a timeout in seconds."""
+        self.engine = engine
+        if work_dir is None:
+            work_dir = tempfile.mkdtemp(prefix="optical-diagram-")
+            weakref.finalize(self, shutil.rmtree, work_dir, True)
+        self.work_dir = work_dir
+        self.timeout = timeout
+        self.use_format = use_format
+        self.warm_workers = warm_workers
+        self.format_dir = os.path.join(self.work_dir, "formats")
+
+        # Format name -> whether dumping it succeeded, so a broken preamble is tried once
+        self.formats = {}
+        self.format_lock = threading.Lock()
+        self.idle_workers = []
+        self.worker_lock = threading.Lock()
+        # Job directories by source hash, least recently used first
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.job_lock = threading.Lock()
+        # Results of the latest compiles, for timing_summary
+        self.history = deque(maxlen=HISTORY_LENGTH)
+        if warm_workers:
+            atexit.register(self.close)
+
+    def available(self):
+        """Check whether the TeX engine is installed."""
+        return shutil.which(self.engine) is not None
+
+    def job_dir(self, digest):
+        """Return the working directory of a source hash."""
+        return os.path.join(self.work_dir, digest[:16])
+
+    def use_job(self, digest):
+        """Mark the job directory of a source hash as used and delete the least recently used ones beyond max_jobs."""
+        with self.job_lock:
+            self.jobs[digest[:16]] = True
+            self.jobs.move_to_end(digest[:16])
+            stale = []
+            while len(self.jobs) > self.max_jobs:
+                stale.append(self.jobs.popitem(last=False)[0])
+        for name in stale:
+            shutil.rmtree(os.path.join(self.work_dir, name), ignore_errors=True)
+
+    def reserve_jobs(self, count):
+        """Keep at least count job directories, for callers that need that many results at once."""
+        with self.job_lock:
+            self.max_jobs = max(self.max_jobs, count)
+
+    def compile(self, latex_code, cancel_event=None):
+        """Compile a LaTeX source and return a CompileResult.
+
+        The call blocks, so run it in a worker thread; setting cancel_event stops it.
+        """
+        digest = source_hash(latex_code)
+        self.use_job(digest)
+        job_dir = self.job_dir(digest)
+        pdf_path = os.path.join(job_dir, "diagram.pdf")
+        if os.path.exists(pdf_path):
+            return CompileResult(digest, True, pdf_path, mode='cached')
+
+        tex_path = os.path.join(job_dir, "diagram.tex")
+        started = time.perf_counter()
+        timings = {'format': 0.0}
+        mode = 'cold'
+        try:
+            os.makedirs(job_dir, exist_ok=True)
+            with open(tex_path, 'w') as tex:
+                tex.write(latex_code)
+            format_name = None
+            preamble, _ = split_preamble(latex_code)
+            if self.use_format and preamble is not None:
+                format_name, timings['format'] = self.ensure_format(preamble, cancel_event)
+
+            compile_started = time.perf_counter()
+            worker = self.take_worker(format_name)
+            if worker is not None:
+                mode = 'warm'
+                returncode, log = self.run_worker(worker, latex_code, pdf_path, cancel_event)
+            else:
+                mode = 'format' if format_name else 'cold'
+                returncode, log = self.run(self.command(tex_path, job_dir, format_name), job_dir, cancel_event)
+            timings['compile'] = time.perf_counter() - compile_started
+        except CompileCancelled:
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+            return CompileResult(digest, False, cancelled=True, duration=time.perf_counter() - started,
+                                 mode=mode, timings=timings)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            return CompileResult(digest, False, log=str(e), duration=time.perf_counter() - started,
+                                 mode=mode, timings=timings)
+
+        success = returncode == 0 and os.path.exists(pdf_path)
+        if not success and os.path.exists(pdf_path):
+            # Never let a partial PDF be reused as the result of this source
+            os.remove(pdf_path)
+        result = CompileResult(digest, success, pdf_path if success else None, log,
+                               time.perf_counter() - started, mode=mode, timings=timings)
+        self.history.append(result)
+        return result
+
+    def format_name(self, preamble):
+        """Return the name of the format dumped from a preamble."""
+        return "preamble-" + source_hash(self.engine + preamble)[:16]
+
+    def ensure_format(self, preamble, cancel_event=None):
+        """Dump the format of a preamble unless that was tried before.
+
+        Returns (format name, seconds spent dumping); the name is None if dumping failed,
+        in which case documents are compiled without a format.
+        """
+        name = self.format_name(preamble)
+        with self.format_lock:
+            if name in self.formats:
+                return (name if self.formats[name] else None), 0.0
+
+            started = time.perf_counter()
+            os.makedirs(self.format_dir, exist_ok=True)
+            with open(os.path.join(self.format_dir, name + ".tex"), 'w') as tex:
+                tex.write(preamble + "\\begin{document}\n\\end{document}\n")
+            try:
+                returncode, _ = self.run(self.format_command(name), self.format_dir, cancel_event)
+            except (OSError, subprocess.TimeoutExpired):
+                returncode = None
+            self.formats[name] = returncode == 0 and os.path.exists(os.path.join(self.format_dir, name + ".fmt"))
+            return (name if self.formats[name] else None), time.perf_counter() - started
+
+    def environment(self):
+        """Return the environment of the engine processes, with the format directory searched first."""
+        env = dict(os.environ)
+        # The empty entry after the separator keeps the engine's default search path
+        env['TEXFORMATS'] = self.format_dir + os.pathsep + env.get('TEXFORMATS', '')
+        return env
+
+    def command(self, tex_path, output_dir, format_name=None):
+        """Return the command line compiling a file, against a format if one is given."""
+        command = [self.engine, '-interaction=nonstopmode', '-halt-on-error']
+        if format_name:
+            command.append(f'-fmt={format_name}')
+        return command + ['-output-directory', output_dir, tex_path]
+
+    def format_command(self, format_name):
+        """Return the command line dumping the format of {format_name}.tex in the format directory."""
+        return [self.engine, '-ini', '-interaction=nonstopmode', '-halt-on-error',
+                f'-jobname={format_name}', f'&{self.engine}', 'mylatexformat.ltx', format_name + ".tex"]
+
+    def worker_command(self, format_name):
+        """Return the command line of a warm worker, which reads its first line from stdin."""
+        return [self.engine, '-halt-on-error', '-jobname=diagram', f'-fmt={format_name}']
+
+    def take_worker(self, format_name):
+        """Return an idle warm worker for a format, or None, and start its replacement."""
+        if not self.warm_workers or not format_name:
+            return None
+        with self.worker_lock:
+            worker = None
+            for candidate in self.idle_workers:
+                if worker is None and candidate.format_name == format_name and candidate.alive():
+                    worker = candidate
+                else:
+                    # Workers of an older preamble are useless now
+                    candidate.stop()
+            self.idle_workers = []
+            while len(self.idle_workers) < self.warm_workers:
+                directory = tempfile.mkdtemp(prefix="worker-", dir=self.work_dir)
+                try:
+                    self.idle_workers.append(WarmWorker(format_name, directory,
+                                                        self.worker_command(format_name), self.environment()))
+                except OSError:
+                    shutil.rmtree(directory, ignore_errors=True)
+                    break
+        return worker
+
+    def run_worker(self, worker, latex_code, pdf_path, cancel_event=None):
+        """Compile a source on a warm worker and move its PDF to pdf_path.
+
+        Returns (returncode, output) like run.
+        """
+        try:
+            with open(os.path.join(worker.directory, "diagram.tex"), 'w') as tex:
+                tex.write(latex_code)
+            with span("warm worker", "subprocess"):
+                returncode, log = self.wait(worker.process, worker.command, cancel_event,
+                                            "\\nonstopmode\\input{diagram.tex}\n")
+            worker_pdf = os.path.join(worker.directory, "diagram.pdf")
+            if returncode == 0 and os.path.exists(worker_pdf):
+                shutil.move(worker_pdf, pdf_path)
+            return returncode, log
+        finally:
+            worker.stop()
+
+    def close(self):
+        """Stop the idle warm workers."""
+        with self.worker_lock:
+            for worker in self.idle_workers:
+                worker.stop()
+            self.idle_workers = []
+
+    def timing_summary(self):
+        """Return {mode: (compiles, mean seconds)} over the compiles run so far."""
+        totals = {}
+        for result in self.history:
+            count, seconds = totals.get(result.mode, (0, 0.0))
+            totals[result.mode] = (count + 1, seconds + result.duration)
+        return {mode: (count, seconds / count) for mode, (count, seconds) in totals.items()}
+
+    def run(self, command, cwd, cancel_event=None):
+        """Run a command, killing it if cancel_event is set or the timeout passes.
+
+        Returns (returncode, output). Raises CompileCancelled or subprocess.TimeoutExpired.
+        """
+        with span(os.path.basename(command[0]), "subprocess", command=" ".join(command)):
+            process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                       errors='replace', env=self.environment())
+            return self.wait(process, command, cancel_event)
+
+    def wait(self, process, command, cancel_event=None, input=None):
+        """Wait for a started process, sending input to it first; see run."""
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                try:
+                    output, _ = process.communicate(input, timeout=POLL_INTERVAL)
+                    return process.returncode, output
+                except subprocess.TimeoutExpired:
+                    # The input was sent by the first call
+                    input = None
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise CompileCancelled()
+                    if time.monotonic() > deadline:
+                        raise subprocess.TimeoutExpired(command, self.timeout)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.communicate()
+
+    def render_png(self, result, resolution=100, cancel_event=None):
+        """Convert the PDF of a successful result to a PNG with pdftoppm and return its path.
+
+        Returns None if pdftoppm is not installed or the conversion fails, and raises
+        CompileCancelled if cancel_event is set.
+        """
+        if not result.success or shutil.which("pdftoppm") is None:
+            return None
+        job_dir = os.path.dirname(result.pdf_path)
+        png_path = os.path.join(job_dir, "preview.png")
+        if not os.path.exists(png_path):
+            command = ["pdftoppm", "-png", "-r", str(resolution), "-singlefile",
+                       result.pdf_path, os.path.join(job_dir, "preview")]
+            try:
+                returncode, _ = self.run(command, job_dir, cancel_event)
+            except (OSError, subprocess.TimeoutExpired):
+                return None
+            if returncode != 0:
+                return None
+        return png_path
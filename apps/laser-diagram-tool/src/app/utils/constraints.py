@@ -0,0 +1,594 @@
+"""
+Constraints - Incremental geometric constraint solver for keeping beams and mirrors aligned
+"""
+
+import math
+from collections import namedtuple
+import numpy as np
+from app.models.diagram import resolve_beams
+from app.models.optical_component import classify_component
+from app.utils.group_ops import apply_targets
+
+# Component count of each kind of constraint, and the residuals each one contributes:
+#   horizontal (a, b)           a and b at the same height
+#   vertical (a, b)             a and b above one another
+#   collinear (a, b, c)         c on the line through a and b
+#   distance (a, b)             a and b value px apart
+#   spacing (a, b, c)           b halfway between a and c, for equal spacing along a row
+#   reflection (s, m, t)        the beam s -> m reflected by mirror m at value degrees (or
+#                               at the mirror's angle param) goes through t
+#   fixed (a,)                  a stays where it is
+KINDS = {
+    'horizontal': 2,
+    'vertical': 2,
+    'collinear': 3,
+    'distance': 2,
+    'spacing': 3,
+    'reflection': 3,
+    'fixed': 1,
+}
+
+# Kinds that take a value; reflections without one follow the mirror's angle param
+VALUE_KINDS = {'distance', 'reflection'}
+
+# Largest residual, in pixels, of a solved cluster
+TOLERANCE = 0.01
+
+# Gauss-Newton steps per solve; linear constraints need one
+MAX_ITERATIONS = 20
+
+# A step must shrink the largest residual below this fraction of the last one to go on
+STAGNATION = 0.9
+
+# Clusters with up to this many unknowns are solved with dense normal equations;
+# larger ones with conjugate gradients on the sparse Jacobian
+DENSE_VARIABLES = 300
+
+# Conjugate gradient iterations per step, and the relative damping that keeps
+# redundant or conflicting constraints from making the step blow up
+CG_ITERATIONS = 400
+DAMPING = 1e-6
+
+# Fraction of the residual norm conjugate gradients may leave for the next step
+FORCING = 0.05
+
+# One constraint: kind, tuple of component indices and value (or None)
+Constraint = namedtuple('Constraint', ['kind', 'components', 'value'])
+
+
+def _block(indices, residuals, gradients):
+    """Return (residuals, columns, values) of constraints on the components in indices.
+
+    gradients holds one (k, 2) array per component column of indices: the derivative of
+    the residuals by that component's x and y.
+    """
+    columns = np.empty((len(indices), 2 * len(gradients)), dtype=np.int64)
+    values = np.empty((len(indices), 2 * len(gradients)))
+    for j, gradient in enumerate(gradients):
+        columns[:, 2 * j] = 2 * indices[:, j]
+        columns[:, 2 * j + 1] = 2 * indices[:, j] + 1
+        values[:, 2 * j:2 * j + 2] = gradient
+    return residuals, columns, values
+
+
+def _unit(vectors):
+    """Return unit vectors and lengths of (k, 2) vectors; zero vectors keep length 1e-9."""
+    lengths = np.maximum(np.hypot(vectors[:, 0], vectors[:, 1]), 1e-9)
+    return vectors / lengths[:, None], lengths
+
+
+def _collinear(P, indices, values):
+    # Distance of c from the line through a and b
+    a, b, c = P[indices[:, 0]], P[indices[:, 1]], P[indices[:, 2]]
+    u, v = b - a, c - a
+    lengths = np.maximum(np.hypot(u[:, 0], u[:, 1]), 1e-9)
+    residuals = (u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]) / lengths
+    grad_c = np.stack([-u[:, 1], u[:, 0]], 1) / lengths[:, None]
+    grad_b = (np.stack([v[:, 1], -v[:, 0]], 1) - residuals[:, None] * u / lengths[:, None]) / lengths[:, None]
+    return [_block(indices, residuals, [-(grad_b + grad_c), grad_b, grad_c])]
+
+
+def _distance(P, indices, values):
+    direction, lengths = _unit(P[indices[:, 1]] - P[indices[:, 0]])
+    return [_block(indices, lengths - values, [-direction, direction])]
+
+
+def _spacing(P, indices, values):
+    # a - 2b + c = 0 in x and in y
+    a, b, c = P[indices[:, 0]], P[indices[:, 1]], P[indices[:, 2]]
+    residuals = a - 2 * b + c
+    blocks = []
+    for axis in (0, 1):
+        unit = np.zeros((len(indices), 2))
+        unit[:, axis] = 1
+        blocks.append(_block(indices, residuals[:, axis], [unit, -2 * unit, unit]))
+    return blocks
+
+
+def _reflection(P, indices, values):
+    # Distance of t from the ray leaving the mirror: the incoming direction u reflected
+    # by the mirror normal n is rho = u - 2 (u . n) n, and the residual is rho x (t - m)
+    s, m, t = P[indices[:, 0]], P[indices[:, 1]], P[indices[:, 2]]
+    # The surface is at the angle param, so its normal is 90 degrees less (as in the layout engine)
+    normal_angles = np.radians(values - 90)
+    n = np.stack([np.cos(normal_angles), np.sin(normal_angles)], 1)
+    u, incoming = _unit(m - s)
+    rho = u - 2 * np.sum(u * n, axis=1)[:, None] * n
+    v = t - m
+    residuals = rho[:, 0] * v[:, 1] - rho[:, 1] * v[:, 0]
+    grad_t = np.stack([-rho[:, 1], rho[:, 0]], 1)
+    # d(residual)/du = R J v with R the reflection and J v = (v_y, -v_x); projected on
+    # the directions u can turn to and divided by the incoming length, it is d/dm
+    jv = np.stack([v[:, 1], -v[:, 0]], 1)
+    w = jv - 2 * np.sum(jv * n, axis=1)[:, None] * n
+    turn = (w - np.sum(w * u, axis=1)[:, None] * u) / incoming[:, None]
+    return [_block(indices, residuals, [-turn, turn - grad_t, grad_t])]
+
+
+# Residual and Jacobian blocks of each kind, vectorized over its constraints
+# (horizontal and vertical constraints are eliminated instead, see _Cluster)
+EQUATIONS = {
+    'collinear': _collinear,
+    'distance': _distance,
+    'spacing': _spacing,
+    'reflection': _reflection,
+}
+
+
+def _flatten(blocks):
+    """Return (residuals, rows, columns, values) of the sparse Jacobian of blocks of any widths."""
+    residuals = np.concatenate([block[0] for block in blocks])
+    rows = []
+    offset = 0
+    for block in blocks:
+        count, width = block[1].shape
+        rows.append(np.repeat(np.arange(offset, offset + count), width))
+        offset += count
+    return (residuals, np.concatenate(rows), np.concatenate([block[1].ravel() for block in blocks]),
+            np.concatenate([block[2].ravel() for block in blocks]))
+
+
+def _normal_step(blocks, variables, translations):
+    """Return the smallest change of the variables that zeroes the linearized residuals on top
+    of the best common translation.
+
+    Solves the damped normal equations (J^T J + damping) x = J^T r, accumulated block by
+    block, which is the minimum norm step as the damping goes to zero.
+    """
+    shift, blocks = _carry(blocks, translations)
+    normal = np.zeros(variables * variables)
+    gradient = np.zeros(variables)
+    for residuals, columns, values in blocks:
+        pairs = (columns[:, :, None] * variables + columns[:, None, :]).ravel()
+        normal += np.bincount(pairs, (values[:, :, None] * values[:, None, :]).ravel(),
+                              minlength=variables * variables)
+        gradient += np.bincount(columns.ravel(), (values * residuals[:, None]).ravel(), minlength=variables)
+    normal = normal.reshape(variables, variables)
+    diagonal = np.diag_indices(variables)
+    normal[diagonal] += DAMPING * max(1.0, float(np.mean(normal[diagonal])))
+    return translations @ shift + np.linalg.solve(normal, gradient)
+
+
+def _carry(blocks, translations):
+    """Return the best common translation of the free components for the linearized residuals,
+    and the blocks with the residuals it leaves.
+
+    translations holds the unknowns of moving every free component by one in x and in y.
+    A drag thus carries the free components along before the smallest change is added:
+    conjugate gradients spread a change one constraint further per iteration, too slowly
+    for a long chain dragged at one end.
+    """
+    moved = [(entries[:, :, None] * translations[columns]).sum(axis=1) for _, columns, entries in blocks]
+    shift = np.linalg.lstsq(np.concatenate(moved), np.concatenate([block[0] for block in blocks]),
+                            rcond=None)[0]
+    return shift, [(residuals - carried @ shift, columns, entries)
+                   for (residuals, columns, entries), carried in zip(blocks, moved)]
+
+
+def _sparse_step(blocks, variables, translations):
+    """Return the same step as _normal_step by conjugate gradients on J J^T, for large clusters."""
+    residuals = np.concatenate([block[0] for block in blocks])
+    # The Gauss-Newton iterations correct what is left, so a step need not be exact
+    target = max(FORCING ** 2 * (residuals @ residuals), (TOLERANCE / 10) ** 2)
+    shift, blocks = _carry(blocks, translations)
+    residuals, rows, columns, values = _flatten(blocks)
+    count = len(residuals)
+
+    def jacobian(vector):
+        return np.bincount(rows, values * vector[columns], minlength=count)
+
+    def transposed(vector):
+        return np.bincount(columns, values * vector[rows], minlength=variables)
+
+    y = np.zeros(count)
+    remainder = residuals.copy()
+    direction = remainder.copy()
+    norm = remainder @ remainder
+    for _ in range(CG_ITERATIONS):
+        if norm <= target:
+            break
+        product = jacobian(transposed(direction)) + DAMPING * direction
+        alpha = norm / (direction @ product)
+        y += alpha * direction
+        remainder -= alpha * product
+        new_norm = remainder @ remainder
+        direction = remainder + (new_norm / norm) * direction
+        norm = new_norm
+    return translations @ shift + transposed(y)
+
+
+class _Cluster:
+    """Constraints of one connected group of components, compiled to index arrays.
+
+    Horizontal and vertical constraints are equalities between coordinates, so they
+    are eliminated rather than solved: coordinates they tie together form one class,
+    which is one unknown. Beams aligned to the axes thus collapse a large cluster to a
+    few unknowns per row and column, and the remaining constraints are solved for the
+    class values, weighted by class size so the step is the smallest change of the
+    component positions.
+    """
+
+    def __init__(self, members, constraints):
+        self.members = np.array(sorted(members), dtype=np.int64)
+        local = {index: position for position, index in enumerate(self.members.tolist())}
+        # Coordinate 2 i is the x of member i and 2 i + 1 its y
+        parents = list(range(2 * len(self.members)))
+
+        def find(coordinate):
+            while parents[coordinate] != coordinate:
+                parents[coordinate] = parents[parents[coordinate]]
+                coordinate = parents[coordinate]
+            return coordinate
+
+        by_kind = {}
+        self.fixed = []
+        for constraint in constraints:
+            if constraint.kind == 'fixed':
+                self.fixed.append(local[constraint.components[0]])
+            elif constraint.kind in ('horizontal', 'vertical'):
+                axis = 1 if constraint.kind == 'horizontal' else 0
+                first, second = (2 * local[index] + axis for index in constraint.components)
+                parents[find(first)] = find(second)
+            else:
+                by_kind.setdefault(constraint.kind, []).append(constraint)
+        roots = np.array([find(coordinate) for coordinate in range(len(parents))], dtype=np.int64)
+        _, self.classes = np.unique(roots, return_inverse=True)
+        self.sizes = np.bincount(self.classes).astype(float)
+
+        self.kinds = []
+        for kind, group in by_kind.items():
+            indices = np.array([[local[index] for index in constraint.components] for constraint in group],
+                               dtype=np.int64)
+            self.kinds.append((kind, indices, [constraint.value for constraint in group],
+                               [constraint.components[1] for constraint in group]))
+
+    def values(self, components, kind, values, mirrors):
+        """Return the values array of a kind, reading reflection angles from mirror params when unset."""
+        if kind != 'reflection':
+            return np.array([value if value is not None else 0.0 for value in values], dtype=float)
+        angles = []
+        for value, mirror in zip(values, mirrors):
+            if value is None:
+                try:
+                    value = float(components[mirror]['params'].get('angle', 45))
+                except (TypeError, ValueError):
+                    value = 45.0
+            angles.append(value)
+        return np.array(angles, dtype=float)
+
+    def solve(self, components, pinned=()):
+        """Move the free members to satisfy the constraints with the smallest change.
+
+        Returns the new (n, 2) positions of the members and the largest residual left.
+        """
+        coordinates = np.array([components[index]['position'] for index in self.members.tolist()],
+                               dtype=float).ravel()
+        locked = np.zeros(len(self.members), dtype=bool)
+        locked[self.fixed] = True
+        if len(pinned):
+            locked[np.searchsorted(self.members, np.fromiter(pinned, dtype=np.int64))] = True
+        locked = np.repeat(locked, 2)
+        classes = self.classes
+        class_count = len(self.sizes)
+
+        # Start from the aligned positions: each class at the mean of its locked
+        # coordinates if it has any, otherwise of all of them
+        locked_counts = np.bincount(classes, locked, minlength=class_count)
+        class_values = np.where(locked_counts > 0,
+                                np.bincount(classes, coordinates * locked, minlength=class_count)
+                                / np.maximum(locked_counts, 1),
+                                np.bincount(classes, coordinates, minlength=class_count) / self.sizes)
+        coordinates = np.where(locked, coordinates, class_values[classes])
+
+        # Unknowns are scaled by the square root of their class size, so the minimum norm
+        # step in them is the smallest change of the positions; locked classes drop out
+        scales = np.where(locked_counts > 0, 0.0, 1 / np.sqrt(self.sizes))
+        # Moving every free component by one in x, and in y, in those unknowns
+        translations = np.zeros((class_count, 2))
+        translations[classes[0::2], 0] = 1
+        translations[classes[1::2], 1] = 1
+        translations *= np.where(scales > 0, np.sqrt(self.sizes), 0.0)[:, None]
+        values = [self.values(components, kind, raw, mirrors) for kind, _, raw, mirrors in self.kinds]
+        step_function = _normal_step if class_count <= DENSE_VARIABLES else _sparse_step
+
+        worst = math.inf
+        for _ in range(MAX_ITERATIONS):
+            P = coordinates.reshape(-1, 2)
+            blocks = [(residuals, classes[columns], entries * scales[classes[columns]])
+                      for (kind, indices, _, _), kind_values in zip(self.kinds, values)
+                      for residuals, columns, entries in EQUATIONS[kind](P, indices, kind_values)]
+            if not blocks:
+                return coordinates.reshape(-1, 2), 0.0
+            previous, worst = worst, max(float(np.max(np.abs(block[0]))) for block in blocks)
+            # Conflicting constraints stop improving: leave them at their least squares compromise
+            if worst <= TOLERANCE or worst > STAGNATION * previous:
+                break
+            step = step_function(blocks, class_count, translations) * scales
+            coordinates = coordinates - step[classes]
+        return coordinates.reshape(-1, 2), worst
+
+
+class ConstraintSolver:
+    """Class keeping constraints between component positions satisfied as the diagram is edited.
+
+    Components joined by constraints form clusters, tracked with a union-find forest as
+    constraints are added. An edit re-solves only the clusters of the components it
+    touched: each cluster is compiled once (see _Cluster) and a solve takes Gauss-Newton
+    steps of the smallest position change that zeroes the linearized residuals, with
+    every residual and Jacobian block computed with NumPy over all constraints of a
+    kind at once.
+    """
+
+    def __init__(self, components):
+        """Initialize without constraints for the editor's list of component dicts."""
+        self.components = components
+        self.constraints = []
+        # (kind, components) of the constraints, so adding one twice is a no-op
+        self.keys = set()
+        self.parents = {}
+        self.clusters = {}
+
+    def __len__(self):
+        return len(self.constraints)
+
+    def _find(self, index):
+        """Return the root of a component's cluster, halving paths on the way."""
+        parents = self.parents
+        parents.setdefault(index, index)
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    def _rebuild(self):
+        """Recompute the clusters after constraints were removed or renumbered."""
+        self.keys = {(constraint.kind, constraint.components) for constraint in self.constraints}
+        self.parents = {}
+        self.clusters = {}
+        for constraint in self.constraints:
+            self._union(constraint.components)
+
+    def _union(self, indices):
+        """Join the clusters of the components, dropping their compiled forms."""
+        roots = {self._find(index) for index in indices}
+        for root in roots:
+            self.clusters.pop(root, None)
+        root, *others = roots
+        for other in others:
+            self.parents[other] = root
+
+    def add(self, kind, components, value=None):
+        """Add a constraint and return it, or None if it exists.
+
+        Positions are not solved until the next solve(). A distance defaults to the
+        current one.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown constraint kind {kind}")
+        components = tuple(int(index) for index in components)
+        if len(components) != KINDS[kind] or len(set(components)) != len(components):
+            raise ValueError(f"A {kind} constraint takes {KINDS[kind]} different components")
+        if any(index < 0 or index >= len(self.components) for index in components):
+            raise IndexError("Constraints must reference existing components")
+        if (kind, components) in self.keys:
+            return None
+        if kind == 'distance' and value is None:
+            (x1, y1), (x2, y2) = (self.components[index]['position'] for index in components)
+            value = math.hypot(x2 - x1, y2 - y1)
+        if value is not None and kind not in VALUE_KINDS:
+            raise ValueError(f"A {kind} constraint takes no value")
+        constraint = Constraint(kind, components, None if value is None else float(value))
+        self.constraints.append(constraint)
+        self.keys.add((kind, components))
+        self._union(components)
+        return constraint
+
+    def remove_touching(self, indices):
+        """Remove the constraints on any of the components and return how many were removed."""
+        indices = set(indices)
+        kept = [constraint for constraint in self.constraints if not indices.intersection(constraint.components)]
+        removed = len(self.constraints) - len(kept)
+        if removed:
+            self.constraints = kept
+            self._rebuild()
+        return removed
+
+    def remap(self, mapping):
+        """Renumber the constraints after components were deleted, given group_ops.delete's mapping.
+
+        Constraints on deleted components are dropped.
+        """
+        kept = []
+        for constraint in self.constraints:
+            renumbered = tuple(mapping[index] if index < len(mapping) else None for index in constraint.components)
+            if None not in renumbered:
+                kept.append(constraint._replace(components=renumbered))
+        self.constraints = kept
+        self._rebuild()
+
+    def clear(self):
+        """Remove every constraint."""
+        self.constraints = []
+        self._rebuild()
+
+    def constrained(self, index):
+        """Return whether a component takes part in any constraint."""
+        return index in self.parents
+
+    def cluster(self, index):
+        """Return the sorted indices of the components constrained together with a component."""
+        if index not in self.parents:
+            return [index]
+        root = self._find(index)
+        return [member for member in sorted(self.parents) if self._find(member) == root]
+
+    def _compiled(self, root):
+        """Return the compiled cluster with a root, compiling every stale cluster in one pass."""
+        if root not in self.clusters:
+            members = {}
+            constraints = {}
+            for constraint in self.constraints:
+                cluster_root = self._find(constraint.components[0])
+                if cluster_root in self.clusters:
+                    continue
+                constraints.setdefault(cluster_root, []).append(constraint)
+                members.setdefault(cluster_root, set()).update(constraint.components)
+            for cluster_root, group in constraints.items():
+                self.clusters[cluster_root] = _Cluster(members[cluster_root], group)
+        return self.clusters[root]
+
+    def solve(self, indices=None, pinned=()):
+        """Re-solve the clusters of the components at indices (every cluster if None).
+
+        Components in pinned keep their positions. Returns {index: (dx, dy)} of the
+        components that moved, like the group operations.
+        """
+        pinned = set(pinned)
+        if indices is None:
+            roots = {self._find(index) for index in list(self.parents)}
+        else:
+            roots = {self._find(index) for index in indices if index in self.parents}
+        targets = {}
+        for root in roots:
+            cluster = self._compiled(root)
+            positions, _ = cluster.solve(self.components, pinned.intersection(cluster.members.tolist()))
+            for index, (x, y) in zip(cluster.members.tolist(), positions.tolist()):
+                targets[index] = (x, y)
+        return apply_targets(self.components, targets)
+
+    def drag(self, indices, dx, dy):
+        """Move components by (dx, dy) and re-solve their clusters around them.
+
+        The moved components are pinned, so the others follow them. Returns
+        {index: (dx, dy)} of every component that moved, the dragged ones included.
+        """
+        indices = list(indices)
+        moved = apply_targets(self.components, {index: (self.components[index]['position'][0] + dx,
+                                                        self.components[index]['position'][1] + dy)
+                                                for index in indices})
+        solved = self.solve(indices, pinned=indices)
+        for index, (sx, sy) in solved.items():
+            mx, my = moved.get(index, (0, 0))
+            moved[index] = (mx + sx, my + sy)
+        return moved
+
+    def to_list(self):
+        """Return the constraints as dicts stored in diagram files."""
+        stored = []
+        for constraint in self.constraints:
+            entry = {'kind': constraint.kind, 'components': list(constraint.components)}
+            if constraint.value is not None:
+                entry['value'] = constraint.value
+            stored.append(entry)
+        return stored
+
+    def load(self, stored):
+        """Replace the constraints with those stored in a diagram file, skipping invalid ones."""
+        self.clear()
+        for entry in stored:
+            try:
+                self.add(entry['kind'], entry['components'], entry.get('value'))
+            except (KeyError, TypeError, ValueError, IndexError):
+                continue
+
+
+def _beams_within(components, beams, indices):
+    """Return (start, end) of the beams between two of the components at indices."""
+    selected = set(indices)
+    return [(beam['start'], beam['end']) for beam in resolve_beams(len(components), beams)
+            if beam['start'] != beam['end'] and beam['start'] in selected and beam['end'] in selected]
+
+
+def axis_constraints(components, beams, indices):
+    """Return (kind, components) keeping the beams between the components at indices on
+    the axis they are closest to."""
+    found = []
+    for start, end in _beams_within(components, beams, indices):
+        (x1, y1), (x2, y2) = components[start]['position'], components[end]['position']
+        found.append(('horizontal' if abs(x2 - x1) >= abs(y2 - y1) else 'vertical', (start, end)))
+    return found
+
+
+def distance_constraints(components, beams, indices):
+    """Return (kind, components) keeping the lengths of the beams between the components at indices."""
+    return [('distance', beam) for beam in _beams_within(components, beams, indices)]
+
+
+def spacing_constraints(components, beams, indices):
+    """Return (kind, components) keeping the components at indices evenly spaced in their order
+    along their longer extent."""
+    ordered = _ordered(components, indices)
+    return [('spacing', tuple(ordered[i:i + 3])) for i in range(len(ordered) - 2)]
+
+
+def collinear_constraints(components, beams, indices):
+    """Return (kind, components) keeping the components at indices on the line through the
+    outermost two."""
+    ordered = _ordered(components, indices)
+    if len(ordered) < 3:
+        return []
+    return [('collinear', (ordered[0], ordered[-1], index)) for index in ordered[1:-1]]
+
+
+def reflection_constraints(components, beams, indices):
+    """Return (kind, components) reflecting the beam at each mirror among indices with
+    exactly one incoming and one outgoing beam, at the mirror's angle param."""
+    inputs, outputs = {}, {}
+    for beam in resolve_beams(len(components), beams):
+        outputs.setdefault(beam['start'], []).append(beam['end'])
+        inputs.setdefault(beam['end'], []).append(beam['start'])
+    found = []
+    for index in indices:
+        if classify_component(components[index]['name']) != 'mirror':
+            continue
+        if len(inputs.get(index, [])) == 1 and len(outputs.get(index, [])) == 1:
+            found.append(('reflection', (inputs[index][0], index, outputs[index][0])))
+    return found
+
+
+def fixed_constraints(components, beams, indices):
+    """Return (kind, components) keeping the components at indices where they are."""
+    return [('fixed', (index,)) for index in indices]
+
+
+def _ordered(components, indices):
+    """Return the indices sorted by position along the axis the components spread over most."""
+    indices = list(indices)
+    if not indices:
+        return indices
+    xs = [components[index]['position'][0] for index in indices]
+    ys = [components[index]['position'][1] for index in indices]
+    axis = 0 if max(xs) - min(xs) >= max(ys) - min(ys) else 1
+    return sorted(indices, key=lambda index: components[index]['position'][axis])
+
+
+# Constraints the editor adds to a selection, by name: each function returns the
+# (kind, components) of the constraints for (components, beams, selected indices)
+FINDERS = {
+    'axes': axis_constraints,
+    'distances': distance_constraints,
+    'spacing': spacing_constraints,
+    'collinear': collinear_constraints,
+    'reflections': reflection_constraints,
+    'fixed': fixed_constraints,
+}
@@ -3,52 +3,102 @@ Export - Handles PDF exporting and other export functions
 """
 
 import os
-import tempfile
-import subprocess
+import shutil
+import threading
 from tkinter import filedialog, messagebox
+from app.utils.compiler import LatexCompiler
+from app.utils.image_export import write_png, write_svg
+from app.utils.profiling import span
+from app.utils.tiling import compile_tiled
+
+# Longest side of exported PNG images in pixels; larger diagrams are scaled down to fit
+PNG_MAX_SIZE = 4096
 
 class PDFExporter:
     """Class for exporting diagrams as PDFs using LaTeX."""
     
+    def __init__(self, compiler=None):
+        """Initialize with the LatexCompiler used for PDF builds."""
+        self.compiler = compiler or LatexCompiler()
+    
+    def build_pdf(self, latex_code, cancel_event=None):
+        """Compile LaTeX code into a PDF without any dialogs and return the CompileResult.
+
+        Very large diagrams are compiled in parallel tiles.
+        """
+        return compile_tiled(self.compiler, latex_code, cancel_event=cancel_event)
+    
     def export_pdf(self, latex_code):
         """Export the current diagram as a PDF."""
-        # Create a temporary directory for the LaTeX build
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            # Create a temporary file for the LaTeX code
-            tmp_path = os.path.join(tmp_dir, "diagram.tex")
-            with open(tmp_path, 'w') as tmp:
-                tmp.write(latex_code)
+        result = self.build_pdf(latex_code)
+        
+        if result.success:
+            # Ask where to save the PDF
+            save_path = filedialog.asksaveasfilename(
+                defaultextension=".pdf",
+                filetypes=[("PDF files", "*.pdf"), ("All files", "*.*")],
+                initialdir=os.path.join(os.getcwd(), "output")
+            )
             
-            try:
-                # Run xelatex on the temporary file
-                process = subprocess.run(
-                    ['xelatex', '-output-directory', tmp_dir, tmp_path],
-                    capture_output=True, text=True, check=True
-                )
+            if save_path:
+                # Copy the PDF to the chosen location
+                with span("copy PDF", "io"):
+                    shutil.copyfile(result.pdf_path, save_path)
+                messagebox.showinfo("Success", f"PDF exported to {save_path}")
+        elif result.log:
+            messagebox.showerror("Error", f"LaTeX compilation failed: {result.error_summary()}")
+        else:
+            messagebox.showerror("Error", "PDF generation failed")
                 
-                # Get the PDF path
-                pdf_path = os.path.join(tmp_dir, "diagram.pdf")
-                
-                if os.path.exists(pdf_path):
-                    # Ask where to save the PDF
-                    save_path = filedialog.asksaveasfilename(
-                        defaultextension=".pdf",
-                        filetypes=[("PDF files", "*.pdf"), ("All files", "*.*")],
-                        initialdir=os.path.join(os.getcwd(), "output")
-                    )
-                    
-                    if save_path:
-                        # Copy the PDF to the chosen location
-                        with open(pdf_path, 'rb') as src, open(save_path, 'wb') as dst:
-                            dst.write(src.read())
-                        messagebox.showinfo("Success", f"PDF exported to {save_path}")
-                else:
-                    messagebox.showerror("Error", "PDF generation failed")
-                    
-            except subprocess.CalledProcessError as e:
-                messagebox.showerror("Error", f"LaTeX compilation failed: {e.stderr}")
-                
-    def export_png(self, latex_code):
-        """Export the current diagram as a PNG image (future feature)."""
-        # This is a placeholder for future PNG export functionality
-        messagebox.showinfo("Feature Not Available", "PNG export will be implemented in a future version") 
\ No newline at end of file
+    def export_png(self, components, beams=None, widget=None):
+        """Export the current diagram as a PNG image rendered directly from the model.
+
+        The image, at most PNG_MAX_SIZE pixels on its longest side, is rendered in a
+        background thread; with a widget, its event loop reports the outcome so the
+        window stays responsive, otherwise the call waits for it.
+        """
+        save_path = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=[("PNG files", "*.png"), ("All files", "*.*")],
+            initialdir=os.path.join(os.getcwd(), "output")
+        )
+        if not save_path:
+            return
+        # Snapshot the lists so edits made while rendering do not reach the image
+        components, beams = list(components), list(beams or [])
+        errors = []
+        
+        def render():
+            try:
+                with span("export PNG", "io"):
+                    write_png(components, beams, save_path, max_size=PNG_MAX_SIZE)
+            except Exception as e:
+                # Anything left unreported here would read as a successful export
+                errors.append(e)
+        
+        def report():
+            if worker.is_alive():
+                widget.after(50, report)
+            elif errors:
+                messagebox.showerror("Error", f"PNG export failed: {errors[0]}")
+            else:
+                messagebox.showinfo("Success", f"PNG exported to {save_path}")
+        
+        worker = threading.Thread(target=render, daemon=True)
+        worker.start()
+        if widget is None:
+            worker.join()
+            report()
+        else:
+            widget.after(50, report)
+    
+    def export_svg(self, components, beams=None):
+        """Export the current diagram as an SVG drawing rendered directly from the model."""
+        save_path = filedialog.asksaveasfilename(
+            defaultextension=".svg",
+            filetypes=[("SVG files", "*.svg"), ("All files", "*.*")],
+            initialdir=os.path.join(os.getcwd(), "output")
+        )
+        if save_path:
+            write_svg(components, beams, save_path)
+            messagebox.showinfo("Success", f"SVG exported to {save_path}")
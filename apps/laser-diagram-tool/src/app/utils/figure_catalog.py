@@ -0,0 +1,487 @@
+"""
+FigureCatalog - Incremental search index of the pst-optexp figures in a directory tree
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import Counter, namedtuple
+
+# Name of the index file, kept in the root of the indexed tree
+CATALOG_NAME = ".figure-catalog.sqlite"
+
+# Files parsed and stored per transaction
+INDEX_BATCH = 200
+
+# pst-optexp commands that draw a component, and the names the editor gives them
+COMPONENT_NAMES = {
+    'lens': "Lens",
+    'mirror': "Mirror",
+    'beamsplitter': "Beam Splitter",
+    'optretplate': "Wave Plate",
+    'optisolator': "Optical Isolator",
+    'optgrating': "Grating",
+    'optfiber': "Fiber",
+    'aom': "Acoustic-Optic Modulator",
+    'eom': "Electro-Optic Modulator",
+    'optfilter': "Filter",
+    'optbox': "Optical Box",
+    'optdetector': "Detector",
+    'optcirculator': "Optical Circulator",
+    'optamplifier': "Optical Amplifier",
+    'optplate': "Plate",
+    'optdiode': "Diode",
+    'optsource': "Source",
+    'crystal': "Crystal",
+    'pinhole': "Pinhole",
+    'polarization': "Polarization",
+    'doveprism': "Dove Prism",
+    'rightangleprism': "Right Angle Prism",
+    'pentaprism': "Penta Prism",
+    'optprism': "Prism",
+    'glanthompson': "Glan-Thompson Polarizer",
+    'optwedge': "Wedge",
+    'optcoupler': "Fiber Coupler",
+    'optswitch': "Optical Switch",
+    'fibercollimator': "Fiber Collimator",
+    'fiberdelayline': "Fiber Delay Line",
+    'fiberpolcontroller': "Fiber Polarization Controller",
+    'piezomirror': "Piezo Mirror",
+    'phasemirror': "Phase Mirror",
+}
+
+# Names refined by one option of the command, as used by the component library
+OPTION_NAMES = {
+    ('lens', 'lenstype=thick'): "Thick Lens",
+    ('lens', 'lenstype=objective'): "Objective Lens",
+    ('mirror', 'mirrortype=curved'): "Curved Mirror",
+    ('beamsplitter', 'bsstyle=cube'): "Polarizing Beam Splitter",
+    ('optretplate', 'platetype=half'): "Half-Wave Plate",
+    ('optretplate', 'platetype=quarter'): "Quarter-Wave Plate",
+    ('optfilter', 'filtertype=bandpass'): "Bandpass Filter",
+    ('optfilter', 'filtertype=nd'): "Neutral Density Filter",
+    ('optbox', 'position=start'): "Laser Source",
+    ('optbox', 'position=end'): "Photodiode",
+    ('optdetector', 'dettype=block'): "Beam Block",
+}
+
+# pst-optexp commands that draw beams between nodes
+BEAM_COMMANDS = {'drawbeam', 'drawwidebeam', 'drawfiber', 'drawwidebeamwithoutlabel'}
+
+# Scale from LaTeX units to canvas pixels, the inverse of the generator's
+LATEX_SCALE = 50
+
+COMMAND = re.compile(r"\\([A-Za-z]+)")
+NODE = re.compile(r"\s*\(\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)\s*\)\s*\{([^}]*)\}")
+WORD = re.compile(r"[a-z0-9]+")
+
+# One parsed figure; commands maps command name to count
+FigureInfo = namedtuple('FigureInfo', ['commands', 'labels', 'component_count', 'components', 'beams', 'nodes'])
+
+# One parsed optexp command: options string, node names and label (or None)
+OptexpCommand = namedtuple('OptexpCommand', ['command', 'options', 'nodes', 'label'])
+
+# One search result
+Match = namedtuple('Match', ['path', 'score', 'component_count', 'labels', 'commands'])
+
+# Outcome of an index update
+UpdateStats = namedtuple('UpdateStats', ['scanned', 'indexed', 'removed'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS figures (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    component_count INTEGER NOT NULL,
+    commands TEXT NOT NULL,
+    labels TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    path TEXT NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (token, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_path ON postings (path);
+"""
+
+
+def _group(text, start, opening, closing):
+    """Return (content, end) of a bracketed group starting at text[start], or (None, start).
+
+    Braces nest, so labels like {LD Pump\\\\915 nm} and {\\textbf{L1}} are read whole.
+    """
+    if start >= len(text) or text[start] != opening:
+        return None, start
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == opening:
+            depth += 1
+        elif text[i] == closing:
+            depth -= 1
+            if depth == 0:
+                return text[start + 1:i], i + 1
+    return None, start
+
+
+def _skip_spaces(text, i):
+    """Return the index of the next character that is not a space or tab."""
+    while i < len(text) and text[i] in " \t":
+        i += 1
+    return i
+
+
+def _strip_comments(text):
+    """Remove LaTeX comments, keeping escaped percent signs."""
+    return re.sub(r"(?<!\\)%.*", "", text)
+
+
+def parse_nodes(text):
+    """Return {node name: (x, y)} of the \\pnode and \\pnodes definitions, in LaTeX units."""
+    nodes = {}
+    for match in re.finditer(r"\\pnodes?\b", text):
+        i = match.end()
+        while True:
+            node = NODE.match(text, i)
+            if not node:
+                break
+            try:
+                nodes[node.group(3).strip()] = (float(node.group(1)), float(node.group(2)))
+            except ValueError:
+                pass
+            i = node.end()
+            if match.group(0) == "\\pnode":
+                break
+    return nodes
+
+
+def parse_optexp(text):
+    """Return the OptexpCommand of every component and beam command in the optexp environments."""
+    commands = []
+    for body in re.findall(r"\\begin\{optexp\}(.*?)\\end\{optexp\}", text, re.S):
+        for match in COMMAND.finditer(body):
+            command = match.group(1)
+            if command not in COMPONENT_NAMES and command not in BEAM_COMMANDS:
+                continue
+            i = _skip_spaces(body, match.end())
+            options, i = _group(body, i, "[", "]")
+            nodes = []
+            while True:
+                node, end = _group(body, _skip_spaces(body, i), "(", ")")
+                if node is None:
+                    break
+                nodes.append(node.strip())
+                i = end
+            if not nodes:
+                continue
+            label, _ = _group(body, _skip_spaces(body, i), "{", "}")
+            commands.append(OptexpCommand(command, options or "", nodes, label))
+    return commands
+
+
+def scan_figure(text):
+    """Parse the source of a figure into a FigureInfo."""
+    text = _strip_comments(text)
+    parsed = parse_optexp(text)
+    components = [command for command in parsed if command.command in COMPONENT_NAMES]
+    beams = [command for command in parsed if command.command in BEAM_COMMANDS]
+    labels = [command.label.strip() for command in components if command.label and command.label.strip()]
+    return FigureInfo(Counter(command.command for command in parsed), labels,
+                      len(components), components, beams, parse_nodes(text))
+
+
+def tokenize(text):
+    """Return the lowercase words of a label, file name or query."""
+    return WORD.findall(text.replace("\\\\", " ").lower())
+
+
+def figure_tokens(relative_path, info):
+    """Return {token: weight} indexing a figure by its commands, labels and file name."""
+    tokens = Counter()
+    for command, count in info.commands.items():
+        tokens[command] += count
+        name = COMPONENT_NAMES.get(command)
+        if name:
+            tokens.update({word: count for word in tokenize(name)})
+    for label in info.labels:
+        tokens.update(tokenize(label))
+    tokens.update(tokenize(os.path.splitext(relative_path)[0]))
+    return tokens
+
+
+def component_name(command):
+    """Return the editor's name for a parsed component command."""
+    options = [option.strip().replace(" ", "") for option in command.options.split(",")]
+    for option in options:
+        name = OPTION_NAMES.get((command.command, option))
+        if name:
+            return name
+    return COMPONENT_NAMES[command.command]
+
+
+def _anchor(command, nodes):
+    """Return (position, node) of a component from its nodes, like pst-optexp places it.
+
+    The node is the one the component sits on, or None for components placed between
+    their nodes; the position is None when none of the nodes is defined.
+    """
+    defined = [node for node in command.nodes if node in nodes]
+    if not defined:
+        return None, None
+    if len(command.nodes) >= 3 and command.nodes[1] in nodes:
+        # Three-node components sit on the middle node, where the beam turns
+        return nodes[command.nodes[1]], command.nodes[1]
+    options = command.options.replace(" ", "")
+    if "position=start" in options:
+        return nodes[defined[0]], defined[0]
+    if "position=end" in options:
+        return nodes[defined[-1]], defined[-1]
+    points = [nodes[node] for node in defined]
+    return (sum(x for x, _ in points) / len(points), sum(y for _, y in points) / len(points)), None
+
+
+def figure_to_diagram(text, name="Imported Figure"):
+    """Return diagram file data with the components and beams of a figure's source.
+
+    Positions are scaled back to canvas pixels. A beam node belongs to the component
+    sitting on it, or else to the first component placed between it and another, and
+    beams join the components of consecutive nodes; a figure without such beams gets
+    none, so the editor chains its components in order.
+    """
+    info = scan_figure(text)
+    from app.models.optical_component import new_component_id
+    components = []
+    owners = {}
+    users = {}
+    for command in info.components:
+        anchor, node = _anchor(command, info.nodes)
+        if anchor is None:
+            continue
+        index = len(components)
+        if node is not None:
+            owners.setdefault(node, index)
+        else:
+            for used in command.nodes:
+                users.setdefault(used, index)
+        x, y = (round(value * LATEX_SCALE, 2) for value in anchor)
+        options = f"[{command.options}]" if command.options else ""
+        components.append({
+            'name': component_name(command),
+            'latex': f"\\{command.command}{options}",
+            'params': {'label': command.label.strip() if command.label else component_name(command)},
+            'position': (int(x) if x == int(x) else x, int(y) if y == int(y) else y),
+            'id': new_component_id(),
+        })
+    beams = []
+    for command in info.beams:
+        ends = [owners.get(node, users.get(node)) for node in command.nodes]
+        for start, end in zip(ends, ends[1:]):
+            if start is not None and end is not None and start != end:
+                beams.append({'start': start, 'end': end, 'type': "wide" if "wide" in command.command else "normal"})
+    return {'name': name, 'components': components, 'beams': beams}
+
+
+def import_figure(path):
+    """Read a .tex file and return it as diagram file data named after the file."""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    return figure_to_diagram(text, os.path.splitext(os.path.basename(path))[0])
+
+
+class FigureCatalog:
+    """Class indexing the .tex figures below a root directory in one SQLite file.
+
+    Each figure is stored with its modification time and size, its command counts,
+    labels and component count, and an inverted index maps words of its labels,
+    commands and file name to the figures containing them. update() only parses the
+    files whose modification time or size changed, so reindexing an unchanged tree
+    costs one directory walk and one query.
+    """
+
+    def __init__(self, root, path=None):
+        """Open or create the catalog of the tree at root, stored at path (default: in root)."""
+        self.root = os.path.abspath(root)
+        self.path = path or os.path.join(self.root, CATALOG_NAME)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM figures").fetchone()[0]
+
+    def _walk(self):
+        """Return {relative path: (mtime_ns, size)} of the .tex files below the root."""
+        found = {}
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        pending.append(entry.path)
+                elif entry.name.endswith(".tex"):
+                    stat = entry.stat()
+                    found[os.path.relpath(entry.path, self.root)] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def update(self, progress=None, cancel_event=None):
+        """Bring the index up to date with the tree and return UpdateStats.
+
+        progress(done, total) is called after each batch of parsed files. cancel_event is
+        checked before every file; a cancelled update keeps the files parsed so far, and
+        the next update carries on from there. Updates of the same tree may run at once,
+        from several catalogs.
+        """
+        found = self._walk()
+        with self.lock:
+            stored = {path: (mtime_ns, size) for path, mtime_ns, size
+                      in self.connection.execute("SELECT path, mtime_ns, size FROM figures")}
+        changed = [path for path, stamp in found.items() if stored.get(path) != stamp]
+        removed = [path for path in stored if path not in found]
+
+        with self.lock, self.connection:
+            for path in removed:
+                self._remove(path)
+
+        indexed = 0
+        cancelled = False
+        changed.sort()
+        for start in range(0, len(changed), INDEX_BATCH):
+            figures = []
+            for path in changed[start:start + INDEX_BATCH]:
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+                try:
+                    with open(os.path.join(self.root, path), encoding='utf-8', errors='replace') as f:
+                        figures.append((path, scan_figure(f.read())))
+                except OSError:
+                    continue
+            # One transaction per batch; a file is rarely rewritten mid-batch, and if so
+            # its new modification time gets it reparsed by the next update
+            with self.lock, self.connection:
+                for path, info in figures:
+                    # Another update of the tree may have stored the file since stored was read
+                    self._remove(path)
+                    mtime_ns, size = found[path]
+                    self.connection.execute(
+                        "INSERT INTO figures VALUES (?, ?, ?, ?, ?, ?)",
+                        (path, mtime_ns, size, info.component_count,
+                         json.dumps(dict(info.commands)), json.dumps(info.labels)))
+                    self.connection.executemany(
+                        "INSERT INTO postings VALUES (?, ?, ?)",
+                        [(token, path, weight) for token, weight in figure_tokens(path, info).items()])
+            indexed += len(figures)
+            if progress:
+                progress(indexed, len(changed))
+            if cancelled:
+                break
+        return UpdateStats(len(found), indexed, len(removed))
+
+    def _remove(self, path):
+        """Delete a figure and its postings; the caller holds the lock and transaction."""
+        self.connection.execute("DELETE FROM figures WHERE path = ?", (path,))
+        self.connection.execute("DELETE FROM postings WHERE path = ?", (path,))
+
+    def search(self, query, limit=50):
+        """Return the Matches of figures containing every word of the query, best first.
+
+        A word matches tokens it is a prefix of, so "lens" finds lenses and "obj"
+        finds objectives. Figures score the summed weight of their matching tokens.
+        An empty query lists the figures with the most components.
+        """
+        words = tokenize(query)
+        with self.lock:
+            if not words:
+                rows = self.connection.execute(
+                    "SELECT path, 0, component_count, labels, commands FROM figures "
+                    "ORDER BY component_count DESC, path LIMIT ?", (limit,)).fetchall()
+                return [self._match(row) for row in rows]
+
+            scores = None
+            for word in words:
+                hits = Counter()
+                for path, weight in self.connection.execute(
+                        "SELECT path, weight FROM postings WHERE token >= ? AND token < ?",
+                        (word, word + "\uffff")):
+                    hits[path] += weight
+                if scores is None:
+                    scores = hits
+                else:
+                    scores = Counter({path: score + hits[path] for path, score in scores.items() if path in hits})
+                if not scores:
+                    return []
+
+            best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            matches = []
+            for path, score in best:
+                row = self.connection.execute(
+                    "SELECT path, ?, component_count, labels, commands FROM figures WHERE path = ?",
+                    (score, path)).fetchone()
+                if row:
+                    matches.append(self._match(row))
+            return matches
+
+    @staticmethod
+    def _match(row):
+        """Return the Match of a figures row."""
+        path, score, component_count, labels, commands = row
+        return Match(path, score, component_count, json.loads(labels), json.loads(commands))
+
+    def import_match(self, match):
+        """Return the diagram file data of a search result."""
+        return import_figure(os.path.join(self.root, match.path))
+
+
+def main(argv=None):
+    """Index, search and import figures from the command line."""
+    parser = argparse.ArgumentParser(description="Index and search a tree of pst-optexp figures.")
+    parser.add_argument('root', help="directory containing the .tex figures")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('index', help="bring the index up to date")
+    search_parser = commands.add_parser('search', help="list the figures matching every word")
+    search_parser.add_argument('query', nargs='*')
+    search_parser.add_argument('--limit', type=int, default=20)
+    import_parser = commands.add_parser('import', help="convert a figure to a diagram file")
+    import_parser.add_argument('figure', help="path of the .tex file, relative to the root")
+    import_parser.add_argument('-o', '--output', help="diagram file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        data = import_figure(os.path.join(args.root, args.figure))
+        if args.output:
+            from app.utils.file_ops import save_diagram
+            save_diagram(data, args.output)
+        else:
+            print(json.dumps(data, indent=2))
+        return 0
+
+    catalog = FigureCatalog(args.root)
+    try:
+        stats = catalog.update()
+        if args.command == 'index':
+            print(f"{stats.scanned} figures, {stats.indexed} indexed, {stats.removed} removed")
+            return 0
+        matches = catalog.search(" ".join(args.query), args.limit)
+        for match in matches:
+            labels = ", ".join(match.labels[:6])
+            print(f"{match.path}\t{match.component_count} components\t{labels}")
+        return 0 if matches else 1
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+FileOps - Diagram open and save on a worker thread with progress and cancellation
+"""
+
+import json
+import os
+import queue
+import tempfile
+import threading
+from app.models.diagram import Diagram
+from app.models.optical_component import OpticalComponent
+from app.models.revision_store import RevisionStore
+from app.models.setup_instance import instances_from_dict
+from app.utils.profiling import profiled
+
+# Components built and handed to the canvas per batch while loading
+LOAD_BATCH = 500
+
+# Bytes read between progress updates while loading
+READ_CHUNK = 1 << 20
+
+# List items encoded per written chunk while saving
+SAVE_BATCH = 1000
+
+# Encoder matching the layout of json.dump(..., indent=2), shared by every batch
+ENCODER = json.JSONEncoder(indent=2)
+
+# Smallest progress step worth a message to the GUI
+PROGRESS_STEP = 0.01
+
+
+def revisions_path(path):
+    """Return the path of the revision store kept next to a diagram file."""
+    return path + ".revisions"
+
+
+class OperationCancelled(Exception):
+    """Raised inside a file operation when its cancel event is set."""
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise OperationCancelled()
+
+
+def atomic_write(path, chunks, cancel_event=None):
+    """Write text chunks to a temporary file next to path and rename it over path.
+
+    The file at path is either the old one or the complete new one; a failed or
+    cancelled write removes the temporary file and leaves the old file untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as file:
+            for chunk in chunks:
+                _check_cancelled(cancel_event)
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        # Keep the permissions of the file being replaced
+        mode = os.stat(path).st_mode if os.path.exists(path) else 0o644
+        os.chmod(temp_path, mode & 0o7777)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def diagram_chunks(data, progress=None):
+    """Yield the JSON text of diagram file data in pieces, formatted like Diagram.save.
+
+    Lists are written in batches of items so progress (a function of the fraction done)
+    can be reported and a save can be cancelled between batches.
+    """
+    total = sum(len(value) for value in data.values() if isinstance(value, list)) or 1
+    done = 0
+    yield "{"
+    for n, (key, value) in enumerate(data.items()):
+        yield ("," if n else "") + "\n  " + json.dumps(key) + ": "
+        if isinstance(value, list) and value:
+            for start in range(0, len(value), SAVE_BATCH):
+                items = value[start:start + SAVE_BATCH]
+                # Encode the batch as one list and drop its brackets: "[...\n]"
+                yield ("[" if start == 0 else ",") + ENCODER.encode(items)[1:-2].replace("\n", "\n  ")
+                done += len(items)
+                if progress is not None:
+                    progress(done / total)
+            yield "\n  ]"
+        else:
+            yield json.dumps(value, indent=2).replace("\n", "\n  ")
+    yield "\n}"
+    if progress is not None:
+        progress(1.0)
+
+
+@profiled("save_diagram", "io")
+def save_diagram(data, path, progress=None, cancel_event=None, keep_revision=False):
+    """Save diagram file data (as returned by Diagram.to_dict) to path atomically.
+
+    With keep_revision the saved data is also committed to the revision store next
+    to the file; the revision id is returned.
+    """
+    # Normalise the components the same way Diagram.save does
+    data = Diagram.from_dict(data).to_dict()
+    atomic_write(path, diagram_chunks(data, progress), cancel_event)
+    if keep_revision:
+        store = RevisionStore(revisions_path(path))
+        try:
+            return store.commit(data, message=f"Saved {os.path.basename(path)}")
+        finally:
+            store.close()
+
+
+@profiled("load_diagram", "io")
+def load_diagram(path, progress=None, cancel_event=None, on_components=None, batch_size=LOAD_BATCH):
+    """Load a diagram file, handing its components to on_components in batches.
+
+    The first half of the progress is reading the file, the second half building
+    the components, so a large diagram can be drawn while it is still loading.
+    """
+    size = os.path.getsize(path) or 1
+    blocks = []
+    read = 0
+    with open(path, 'rb') as file:
+        while True:
+            _check_cancelled(cancel_event)
+            block = file.read(READ_CHUNK)
+            if not block:
+                break
+            blocks.append(block)
+            read += len(block)
+            if progress is not None:
+                progress(0.5 * read / size)
+    data = json.loads(b"".join(blocks))
+
+    diagram = Diagram(data.get('name', 'Untitled Diagram'))
+    diagram.file_path = path
+    components = data.get('components', [])
+    for start in range(0, len(components), batch_size):
+        _check_cancelled(cancel_event)
+        batch = [OpticalComponent.from_dict(component) for component in components[start:start + batch_size]]
+        diagram.components.extend(batch)
+        if on_components is not None:
+            on_components([component.to_dict() for component in batch])
+        if progress is not None:
+            progress(0.5 + 0.5 * (start + len(batch)) / len(components))
+    diagram.beams = [dict(beam) for beam in data.get('beams', [])]
+    if data.get('instances'):
+        diagram.instances = instances_from_dict(data)
+    diagram.constraints = [dict(constraint) for constraint in data.get('constraints', [])]
+    if progress is not None:
+        progress(1.0)
+    return diagram
+
+
+class FileOperation:
+    """Class running a diagram load or save on a worker thread.
+
+    The worker posts messages that the GUI drains with poll() from its event loop:
+    ('progress', fraction), ('components', component dicts) while loading, and
+    finally one of ('done', result), ('cancelled', None) or ('error', exception).
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        """Initialize with the function to run; it receives progress and cancel_event keywords."""
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+        self.messages = queue.Queue()
+        self.reported = 0.0
+        self.finished = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @classmethod
+    def save(cls, data, path, keep_revision=False):
+        """Return an operation saving diagram file data to path."""
+        return cls(save_diagram, data, path, keep_revision=keep_revision)
+
+    @classmethod
+    def load(cls, path, batch_size=LOAD_BATCH):
+        """Return an operation loading the diagram at path, streaming its components."""
+        operation = cls(load_diagram, path, batch_size=batch_size)
+        operation.kwargs['on_components'] = operation.post_components
+        return operation
+
+    def start(self):
+        """Start the worker thread and return the operation."""
+        self.thread.start()
+        return self
+
+    def run(self):
+        """Run the function and post its outcome (runs in the worker thread)."""
+        try:
+            result = self.function(*self.args, progress=self.report, cancel_event=self.cancel_event,
+                                   **self.kwargs)
+        except OperationCancelled:
+            self.messages.put(('cancelled', None))
+        except Exception as e:
+            self.messages.put(('error', e))
+        else:
+            self.messages.put(('done', result))
+
+    def report(self, fraction):
+        """Post the progress, skipping steps too small to show."""
+        if fraction >= 1.0 or fraction - self.reported >= PROGRESS_STEP:
+            self.reported = fraction
+            self.messages.put(('progress', fraction))
+
+    def post_components(self, components):
+        """Post a batch of loaded components."""
+        self.messages.put(('components', components))
+
+    def cancel(self):
+        """Ask the worker to stop at its next check."""
+        self.cancel_event.set()
+
+    def poll(self, limit=None):
+        """Return the messages posted since the last poll, at most limit of them."""
+        messages = []
+        while limit is None or len(messages) < limit:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            messages.append(message)
+            if message[0] in ('done', 'cancelled', 'error'):
+                self.finished = True
+        return messages
@@ -0,0 +1,165 @@
+"""
+GroupOps - Move, rotate, align, distribute, edit and delete groups of components in one batch
+"""
+
+import math
+
+# Alignment edges: the axis they act on and how the common coordinate is chosen
+ALIGN_EDGES = {
+    'left': (0, min),
+    'right': (0, max),
+    'top': (1, min),
+    'bottom': (1, max),
+    'center_x': (0, lambda values: sum(values) / len(values)),
+    'center_y': (1, lambda values: sum(values) / len(values)),
+}
+
+# Value of a parameter that differs between the components of a group
+MIXED = object()
+
+
+def _round(value):
+    """Return a coordinate as an int when it is one, otherwise rounded to 0.01 px."""
+    rounded = round(value, 2)
+    return int(rounded) if rounded == int(rounded) else rounded
+
+
+def apply_targets(components, targets):
+    """Move components to their target positions and return {index: (dx, dy)} of those that moved."""
+    deltas = {}
+    for index, (x, y) in targets.items():
+        old_x, old_y = components[index]['position']
+        x, y = _round(x), _round(y)
+        if (x, y) != (old_x, old_y):
+            components[index]['position'] = (x, y)
+            deltas[index] = (x - old_x, y - old_y)
+    return deltas
+
+
+def move(components, indices, dx, dy):
+    """Move the components by (dx, dy) and return {index: (dx, dy)}."""
+    return apply_targets(components, {index: (components[index]['position'][0] + dx,
+                                              components[index]['position'][1] + dy) for index in indices})
+
+
+def rotate(components, indices, angle=90, center=None):
+    """Rotate the component positions by angle degrees (clockwise on screen) about center.
+
+    The center defaults to the middle of the positions' bounding box, so rotating
+    four times by 90 degrees restores the group.
+    """
+    indices = list(indices)
+    if not indices:
+        return {}
+    if center is None:
+        xs = [components[index]['position'][0] for index in indices]
+        ys = [components[index]['position'][1] for index in indices]
+        center = ((min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2)
+    # Exact for multiples of 90 degrees
+    cos = round(math.cos(math.radians(angle)), 12)
+    sin = round(math.sin(math.radians(angle)), 12)
+    cx, cy = center
+    targets = {}
+    for index in indices:
+        x, y = components[index]['position']
+        targets[index] = (cx + (x - cx) * cos - (y - cy) * sin, cy + (x - cx) * sin + (y - cy) * cos)
+    return apply_targets(components, targets)
+
+
+def align(components, indices, edge):
+    """Line the components up on one edge or center of the group and return {index: (dx, dy)}."""
+    if edge not in ALIGN_EDGES:
+        raise ValueError(f"Unknown alignment {edge}")
+    axis, choose = ALIGN_EDGES[edge]
+    indices = list(indices)
+    if len(indices) < 2:
+        return {}
+    value = choose([components[index]['position'][axis] for index in indices])
+    targets = {}
+    for index in indices:
+        position = list(components[index]['position'])
+        position[axis] = value
+        targets[index] = tuple(position)
+    return apply_targets(components, targets)
+
+
+def distribute(components, indices, axis):
+    """Space the components evenly between the outermost two along 'x' or 'y'."""
+    if axis not in ('x', 'y'):
+        raise ValueError(f"Unknown axis {axis}")
+    coordinate = 0 if axis == 'x' else 1
+    ordered = sorted(indices, key=lambda index: components[index]['position'][coordinate])
+    if len(ordered) < 3:
+        return {}
+    first = components[ordered[0]]['position'][coordinate]
+    step = (components[ordered[-1]]['position'][coordinate] - first) / (len(ordered) - 1)
+    targets = {}
+    for n, index in enumerate(ordered):
+        position = list(components[index]['position'])
+        position[coordinate] = first + n * step
+        targets[index] = tuple(position)
+    return apply_targets(components, targets)
+
+
+def param_table(components, indices):
+    """Return (key, value, count) of each param of the components, in first-seen order.
+
+    value is the components' common value, or MIXED if they differ, and count is how
+    many of the components have the param.
+    """
+    table = {}
+    for index in indices:
+        for key, value in components[index]['params'].items():
+            entry = table.get(key)
+            if entry is None:
+                table[key] = [value, 1]
+                continue
+            if entry[0] is not MIXED and entry[0] != value:
+                entry[0] = MIXED
+            entry[1] += 1
+    return [(key, value, count) for key, (value, count) in table.items()]
+
+
+def set_param(components, indices, key, value):
+    """Set a param of the components to value and return the indices that changed.
+
+    The params dicts are replaced rather than updated, since components added from
+    the library or copied in the editor may share one.
+    """
+    changed = []
+    for index in indices:
+        params = components[index]['params']
+        if key not in params or params[key] != value:
+            components[index]['params'] = {**params, key: value}
+            changed.append(index)
+    return changed
+
+
+def delete(components, beams, indices):
+    """Remove the components and their beams in place, renumbering the remaining beams.
+
+    Returns the new index of every old component (None for deleted ones). Unlike
+    repeated Diagram.remove_component calls this is one pass over each list.
+    """
+    deleted = set(indices)
+    mapping = []
+    kept = []
+    for index, component in enumerate(components):
+        if index in deleted:
+            mapping.append(None)
+        else:
+            mapping.append(len(kept))
+            kept.append(component)
+    components[:] = kept
+    beams[:] = [{**beam, 'start': mapping[beam['start']], 'end': mapping[beam['end']]}
+                for beam in beams
+                if mapping[beam['start']] is not None and mapping[beam['end']] is not None]
+    return mapping
+
+
+def in_rectangle(components, x1, y1, x2, y2):
+    """Return the indices of the components positioned inside a rectangle."""
+    left, right = min(x1, x2), max(x1, x2)
+    top, bottom = min(y1, y2), max(y1, y2)
+    return [index for index, component in enumerate(components)
+            if left <= component['position'][0] <= right and top <= component['position'][1] <= bottom]
@@ -0,0 +1,504 @@
+"""
+Image Export - Native SVG and PNG rendering of diagrams without a LaTeX run
+"""
+
+import math
+import struct
+import zlib
+from html import escape
+import numpy as np
+from app.models.diagram import resolve_beams
+from app.utils.profiling import profiled
+from app.utils.shapes import BEAM_STYLE, COLORS, component_shapes, diagram_bounds
+
+# 5x7 bitmap font for labels in raster images, one hex byte per row (bit 4 = left column).
+# Lower case letters are drawn as upper case and unknown characters as a box.
+FONT = {
+    'A': "0E1111111F1111", 'B': "1E11111E11111E", 'C': "0E11101010110E", 'D': "1C12111111121C",
+    'E': "1F10101E10101F", 'F': "1F10101E101010", 'G': "0E11101711110F", 'H': "1111111F111111",
+    'I': "0E04040404040E", 'J': "0702020202120C", 'K': "11121418141211", 'L': "1010101010101F",
+    'M': "111B1515111111", 'N': "11111915131111", 'O': "0E11111111110E", 'P': "1E11111E101010",
+    'Q': "0E11111115120D", 'R': "1E11111E141211", 'S': "0F10100E01011E", 'T': "1F040404040404",
+    'U': "1111111111110E", 'V': "11111111110A04", 'W': "1111111515150A", 'X': "11110A040A1111",
+    'Y': "1111110A040404", 'Z': "1F01020408101F", '0': "0E11131519110E", '1': "040C040404040E",
+    '2': "0E11010204081F", '3': "1F02040201110E", '4': "02060A121F0202", '5': "1F101E0101110E",
+    '6': "0608101E11110E", '7': "1F010204080808", '8': "0E11110E11110E", '9': "0E11110F01020C",
+    ' ': "00000000000000", '-': "0000001F000000", '+': "0004041F040400", '.': "00000000000C0C",
+    ',': "000000000C0408", ':': "000C0C000C0C00", '/': "00010204081000", '(': "02040808080402",
+    ')': "08040202020408", '_': "0000000000001F", '=': "00001F001F0000", "'": "0C040800000000",
+    '?': "0E110102040004", '!': "04040404000004",
+}
+UNKNOWN_GLYPH = "1F11111111111F"
+GLYPH_WIDTH, GLYPH_HEIGHT, GLYPH_ADVANCE = 5, 7, 6
+
+# Number of straight segments used to approximate a full ellipse
+ELLIPSE_SEGMENTS = 32
+
+# Labels are left out of raster images scaled below this factor
+MIN_LABEL_SCALE = 0.5
+
+
+def svg_color(name):
+    """Return an SVG colour for a Tk colour name."""
+    if name in COLORS:
+        return "#%02x%02x%02x" % COLORS[name]
+    return name or "none"
+
+
+def _number(value):
+    """Format a coordinate compactly."""
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def _points(coords):
+    """Format a flat coordinate list as SVG points."""
+    return " ".join(f"{_number(x)},{_number(y)}" for x, y in zip(coords[::2], coords[1::2]))
+
+
+def _stroke(color, options):
+    """Return the SVG stroke attributes for Tk item options."""
+    attributes = f' stroke="{svg_color(color)}" stroke-width="{options.get("width", 1)}"'
+    if options.get('dash'):
+        attributes += f' stroke-dasharray="{",".join(str(length) for length in options["dash"])}"'
+    if options.get('arrow'):
+        attributes += ' marker-end="url(#arrow)"'
+    return attributes
+
+
+def _arc_endpoints(bbox, start, extent):
+    """Return the start and end points of a Tk arc (angles counterclockwise, y down)."""
+    x1, y1, x2, y2 = bbox
+    cx, cy, rx, ry = (x1 + x2) / 2, (y1 + y2) / 2, (x2 - x1) / 2, (y2 - y1) / 2
+    points = []
+    for angle in (start, start + extent):
+        radians = math.radians(angle)
+        points.append((cx + rx * math.cos(radians), cy - ry * math.sin(radians)))
+    return points, rx, ry
+
+
+def svg_element(shape):
+    """Return the SVG element for a shape."""
+    options = shape.options
+    coords = shape.coords
+    if shape.kind == 'rectangle':
+        x1, y1, x2, y2 = coords
+        return (f'<rect x="{x1}" y="{y1}" width="{x2 - x1}" height="{y2 - y1}" '
+                f'fill="{svg_color(options.get("fill"))}"{_stroke(options.get("outline", "black"), options)}/>')
+    if shape.kind == 'oval':
+        x1, y1, x2, y2 = coords
+        return (f'<ellipse cx="{_number((x1 + x2) / 2)}" cy="{_number((y1 + y2) / 2)}" '
+                f'rx="{_number((x2 - x1) / 2)}" ry="{_number((y2 - y1) / 2)}" '
+                f'fill="{svg_color(options.get("fill"))}"{_stroke(options.get("outline", "black"), options)}/>')
+    if shape.kind == 'line':
+        return (f'<polyline points="{_points(coords)}" fill="none"'
+                f'{_stroke(options.get("fill", "black"), options)}/>')
+    if shape.kind == 'arc':
+        extent = options.get('extent', 90)
+        ((sx, sy), (ex, ey)), rx, ry = _arc_endpoints(coords, options.get('start', 0), extent)
+        large = 1 if abs(extent) > 180 else 0
+        sweep = 0 if extent > 0 else 1
+        return (f'<path d="M {sx:.2f} {sy:.2f} A {_number(rx)} {_number(ry)} 0 {large} {sweep} {ex:.2f} {ey:.2f}" '
+                f'fill="none"{_stroke(options.get("outline", "black"), options)}/>')
+    if shape.kind == 'polygon':
+        outline = options.get('outline')
+        stroke = _stroke(outline, options) if outline else ''
+        return f'<polygon points="{_points(coords)}" fill="{svg_color(options.get("fill", "black"))}"{stroke}/>'
+    if shape.kind == 'text':
+        x, y = coords
+        return f'<text x="{_number(x)}" y="{_number(y)}">{escape(str(options.get("text", "")), quote=False)}</text>'
+    raise ValueError(f"Unknown shape kind: {shape.kind}")
+
+
+def iter_svg(components, beams=None):
+    """Yield an SVG document for a diagram piece by piece, one element per component or beam."""
+    x1, y1, x2, y2 = diagram_bounds(components)
+    width, height = x2 - x1, y2 - y1
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'viewBox="{x1} {y1} {width} {height}">\n')
+    yield ('<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="4" '
+           'markerHeight="4" orient="auto"><path d="M0,0 L10,5 L0,10 z" fill="black"/></marker></defs>\n'
+           '<style>text{font-family:sans-serif;font-size:12px;text-anchor:middle;'
+           'dominant-baseline:central}</style>\n'
+           f'<rect x="{x1}" y="{y1}" width="{width}" height="{height}" fill="white"/>\n')
+
+    for index, component in enumerate(components):
+        elements = "".join(svg_element(shape) for shape in component_shapes(component))
+        yield f'<g id="component{index}">{elements}</g>\n'
+
+    if len(components) >= 2:
+        for index, beam in enumerate(resolve_beams(len(components), beams)):
+            bx1, by1 = components[beam['start']]['position']
+            bx2, by2 = components[beam['end']]['position']
+            yield (f'<line id="beam{index}" x1="{bx1}" y1="{by1}" x2="{bx2}" y2="{by2}" '
+                   f'fill="none"{_stroke(BEAM_STYLE["fill"], BEAM_STYLE)}/>\n')
+    yield '</svg>\n'
+
+
+@profiled("write_svg", "io")
+def write_svg(components, beams, path):
+    """Stream the SVG document of a diagram to a file."""
+    with open(path, 'w', encoding='utf-8') as file:
+        for piece in iter_svg(components, beams):
+            file.write(piece)
+
+
+def _font_tables():
+    """Return the glyph index and the flattened pixel offsets of the bitmap font."""
+    index = {}
+    starts, counts, rows, columns = [], [], [], []
+    for char, glyph in list(FONT.items()) + [(None, UNKNOWN_GLYPH)]:
+        index[char] = len(starts)
+        starts.append(len(rows))
+        for row in range(GLYPH_HEIGHT):
+            bits = int(glyph[2 * row:2 * row + 2], 16)
+            for column in range(GLYPH_WIDTH):
+                if bits >> (GLYPH_WIDTH - 1 - column) & 1:
+                    rows.append(row)
+                    columns.append(column)
+        counts.append(len(rows) - starts[-1])
+    return index, np.array(starts), np.array(counts), np.array(rows), np.array(columns)
+
+
+_FONT_TABLES = None
+
+
+class Rasterizer:
+    """Class for rendering diagram shapes into an RGB NumPy image.
+
+    Every shape can be added at many offsets at once, and shapes are only collected
+    while they are added; render() then draws all fills, all strokes and all labels as
+    a few vectorized operations each, so the cost is dominated by the number of pixels
+    touched rather than the number of shapes.
+    """
+
+    def __init__(self, width, height, origin=(0, 0), scale=1.0, background="white"):
+        """Initialize an image of the given pixel size showing the area from origin."""
+        self.width = int(width)
+        self.height = int(height)
+        self.origin = np.array(origin, dtype=float)
+        self.scale = scale
+        self.background = background
+        self.palette = []
+        self.palette_index = {}
+        self.fill_rects = []
+        self.fill_ovals = []
+        self.fill_polygons = []
+        self.outline_ovals = []
+        self.segments = []
+        self.labels = []
+
+    def _color(self, name):
+        """Return the palette index of a colour name."""
+        if name not in self.palette_index:
+            self.palette_index[name] = len(self.palette)
+            self.palette.append(COLORS.get(name, (0, 0, 0)))
+        return self.palette_index[name]
+
+    def _transform(self, coords, offsets):
+        """Map shape coordinates repeated at each offset to an (offsets, points, 2) pixel array."""
+        points = np.asarray(coords, dtype=float).reshape(-1, 2)
+        if offsets is None:
+            offsets = np.zeros((1, 2))
+        return (points[None, :, :] + offsets[:, None, :] - self.origin) * self.scale
+
+    def _stroke_style(self, options):
+        """Return (width, dash on, dash off) in image pixels for Tk item options."""
+        width = max(1, int(round(options.get('width', 1) * self.scale)))
+        dash = options.get('dash')
+        if dash:
+            return width, max(1.0, dash[0] * self.scale), max(1.0, dash[1] * self.scale)
+        return width, 0.0, 0.0
+
+    def _add_segments(self, starts, ends, color, style):
+        """Add segments given as (n, 2) start and end pixel arrays."""
+        columns = np.empty((len(starts), 4))
+        columns[:] = (color,) + style
+        self.segments.append(np.hstack([starts, ends, columns]))
+
+    def add_segments(self, starts, ends, color, options):
+        """Add straight lines given as (n, 2) start and end arrays in canvas coordinates."""
+        starts = (np.asarray(starts, dtype=float) - self.origin) * self.scale
+        ends = (np.asarray(ends, dtype=float) - self.origin) * self.scale
+        self._add_segments(starts, ends, self._color(color), self._stroke_style(options))
+
+    def add_polyline(self, coords, color, options, offsets=None, closed=False):
+        """Add a polyline, optionally repeated at (n, 2) offsets."""
+        points = self._transform(coords, offsets)
+        if closed:
+            points = np.concatenate([points, points[:, :1]], axis=1)
+        if points.shape[1] < 2:
+            return
+        color = self._color(color)
+        style = self._stroke_style(options)
+        self._add_segments(points[:, :-1].reshape(-1, 2), points[:, 1:].reshape(-1, 2), color, style)
+        if options.get('arrow'):
+            self._add_arrowheads(points[:, -2], points[:, -1], color, style[0])
+
+    def _add_arrowheads(self, tails, tips, color, width):
+        """Add filled arrowheads at the tips of (n, 2) segments."""
+        delta = tips - tails
+        length = np.hypot(delta[:, 0], delta[:, 1])
+        keep = length > 0
+        unit = delta[keep] / length[keep, None]
+        normal = np.column_stack([-unit[:, 1], unit[:, 0]])
+        base = tips[keep] - unit * 8 * self.scale
+        half = (3 + width / 2) * self.scale
+        self.fill_polygons.append((np.stack([tips[keep], base + normal * half, base - normal * half], axis=1), color))
+
+    def add_shape(self, shape, offsets=None):
+        """Add a shape, optionally repeated at (n, 2) offsets in canvas coordinates."""
+        options = shape.options
+        if shape.kind == 'rectangle':
+            if options.get('fill'):
+                self._add_boxes(self.fill_rects, shape.coords, offsets, options['fill'])
+            x1, y1, x2, y2 = shape.coords
+            self.add_polyline((x1, y1, x2, y1, x2, y2, x1, y2), options.get('outline', "black"), options,
+                              offsets, closed=True)
+        elif shape.kind == 'oval':
+            if options.get('fill'):
+                self._add_boxes(self.fill_ovals, shape.coords, offsets, options['fill'])
+            boxes = self._transform(shape.coords, offsets).reshape(-1, 4)
+            columns = np.empty((len(boxes), 4))
+            columns[:] = (self._color(options.get('outline', "black")),) + self._stroke_style(options)
+            self.outline_ovals.append(np.hstack([boxes, columns]))
+        elif shape.kind == 'line':
+            self.add_polyline(shape.coords, options.get('fill', "black"), options, offsets)
+        elif shape.kind == 'arc':
+            x1, y1, x2, y2 = shape.coords
+            start, extent = options.get('start', 0), options.get('extent', 90)
+            radians = np.radians(start + extent * np.linspace(0, 1, max(2, int(abs(extent) / 360 * ELLIPSE_SEGMENTS)) + 1))
+            coords = np.column_stack([(x1 + x2) / 2 + (x2 - x1) / 2 * np.cos(radians),
+                                      (y1 + y2) / 2 - (y2 - y1) / 2 * np.sin(radians)])
+            self.add_polyline(coords, options.get('outline', "black"), options, offsets)
+        elif shape.kind == 'polygon':
+            self.fill_polygons.append((self._transform(shape.coords, offsets), self._color(options.get('fill', "black"))))
+            if options.get('outline'):
+                self.add_polyline(shape.coords, options['outline'], options, offsets, closed=True)
+        elif shape.kind == 'text':
+            count = 1 if offsets is None else len(offsets)
+            self.add_text(shape.coords, [str(options.get('text', ""))] * count, offsets)
+
+    def _add_boxes(self, target, coords, offsets, fill):
+        """Add (x1, y1, x2, y2, colour) rows for a filled box shape."""
+        boxes = self._transform(coords, offsets).reshape(-1, 4)
+        colors = np.full((len(boxes), 1), self._color(fill))
+        target.append(np.hstack([boxes, colors]))
+
+    def add_text(self, coords, texts, offsets=None):
+        """Add one centred label per offset."""
+        points = self._transform(coords, offsets).reshape(-1, 2)
+        self.labels.append((points, texts))
+
+    def render(self):
+        """Draw everything collected so far and return the (height, width, 3) image."""
+        image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        image[:] = COLORS.get(self.background, (255, 255, 255))
+        palette = np.array(self.palette or [(0, 0, 0)], dtype=np.uint8)
+        self._render_fills(image, palette)
+        self._render_strokes(image, palette)
+        if self.scale >= MIN_LABEL_SCALE:
+            self._render_labels(image)
+        return image
+
+    @staticmethod
+    def _rows(top, bottom):
+        """Return (owner, row) arrays listing every pixel row from top to bottom of each item."""
+        top, bottom = np.ceil(top).astype(int), np.floor(bottom).astype(int)
+        count = np.maximum(bottom - top + 1, 0)
+        owner = np.repeat(np.arange(len(top)), count)
+        return owner, top[owner] + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+
+    def _spans(self):
+        """Return (rows, x0, x1, color) arrays of the horizontal spans of every fill."""
+        rows, starts, ends, colors = [], [], [], []
+        if self.fill_rects:
+            rects = np.concatenate(self.fill_rects)
+            owner, row = self._rows(rects[:, 1], rects[:, 3])
+            rows.append(row)
+            starts.append(np.ceil(rects[owner, 0]).astype(int))
+            ends.append(np.floor(rects[owner, 2]).astype(int))
+            colors.append(rects[owner, 4].astype(int))
+        if self.fill_ovals:
+            ovals = np.concatenate(self.fill_ovals)
+            cx, cy = (ovals[:, 0] + ovals[:, 2]) / 2, (ovals[:, 1] + ovals[:, 3]) / 2
+            rx, ry = (ovals[:, 2] - ovals[:, 0]) / 2, np.maximum((ovals[:, 3] - ovals[:, 1]) / 2, 1e-9)
+            owner, row = self._rows(ovals[:, 1], ovals[:, 3])
+            half = rx[owner] * np.sqrt(np.clip(1 - ((row - cy[owner]) / ry[owner]) ** 2, 0, 1))
+            rows.append(row)
+            starts.append(np.ceil(cx[owner] - half).astype(int))
+            ends.append(np.floor(cx[owner] + half).astype(int))
+            colors.append(ovals[owner, 4].astype(int))
+        for polygons, color in self.fill_polygons:
+            # Convex polygons: each row spans between the leftmost and rightmost edge crossing
+            xa, ya = polygons[:, :, 0], polygons[:, :, 1]
+            xb, yb = np.roll(xa, -1, axis=1), np.roll(ya, -1, axis=1)
+            owner, row = self._rows(ya.min(axis=1), ya.max(axis=1))
+            xa, ya, xb, yb = xa[owner], ya[owner], xb[owner], yb[owner]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = (row[:, None] - ya) / (yb - ya)
+                crossing = xa + t * (xb - xa)
+            valid = (t >= 0) & (t <= 1) & (ya != yb)
+            left = np.where(valid, crossing, np.inf).min(axis=1)
+            right = np.where(valid, crossing, -np.inf).max(axis=1)
+            keep = np.isfinite(left)
+            rows.append(row[keep])
+            starts.append(np.ceil(left[keep]).astype(int))
+            ends.append(np.floor(right[keep]).astype(int))
+            colors.append(np.full(keep.sum(), color))
+        if not rows:
+            return None
+        return np.concatenate(rows), np.concatenate(starts), np.concatenate(ends), np.concatenate(colors)
+
+    def _render_fills(self, image, palette):
+        """Fill every rectangle, ellipse and polygon, one colour at a time."""
+        spans = self._spans()
+        if spans is None:
+            return
+        rows, starts, ends, colors = spans
+        starts = np.clip(starts, 0, self.width)
+        ends = np.clip(ends + 1, 0, self.width)
+        keep = (rows >= 0) & (rows < self.height) & (starts < ends)
+        rows, starts, ends, colors = rows[keep], starts[keep], ends[keep], colors[keep]
+        stride = self.width + 1
+        size = self.height * stride
+        for color in np.unique(colors):
+            chosen = colors == color
+            # Difference array along each row: +1 where a span starts, -1 after it ends
+            coverage = (np.bincount(rows[chosen] * stride + starts[chosen], minlength=size)
+                        - np.bincount(rows[chosen] * stride + ends[chosen], minlength=size))
+            mask = np.cumsum(coverage.reshape(self.height, stride), axis=1)[:, :self.width] > 0
+            image[mask] = palette[color]
+
+    def _outline_segments(self):
+        """Return the segments approximating every ellipse outline."""
+        batches = []
+        for ovals in self.outline_ovals:
+            # Ellipses of one batch share their size, so they share the number of segments
+            radius = max(ovals[0, 2] - ovals[0, 0], ovals[0, 3] - ovals[0, 1]) / 2
+            segments = int(np.clip(np.ceil(radius), 4, ELLIPSE_SEGMENTS))
+            angles = np.linspace(0, 2 * np.pi, segments + 1)
+            cx, cy = (ovals[:, 0:1] + ovals[:, 2:3]) / 2, (ovals[:, 1:2] + ovals[:, 3:4]) / 2
+            xs = cx + (ovals[:, 2:3] - ovals[:, 0:1]) / 2 * np.cos(angles)
+            ys = cy + (ovals[:, 3:4] - ovals[:, 1:2]) / 2 * np.sin(angles)
+            style = np.repeat(ovals[:, 4:], segments, axis=0)
+            batches.append(np.column_stack([xs[:, :-1].ravel(), ys[:, :-1].ravel(),
+                                            xs[:, 1:].ravel(), ys[:, 1:].ravel(), style]))
+        return batches
+
+    def _render_strokes(self, image, palette):
+        """Draw every line segment by sampling it at pixel spacing."""
+        batches = self._outline_segments() + self.segments
+        if not batches:
+            return
+        segments = np.concatenate(batches)
+        x1, y1, x2, y2, color, width, dash_on, dash_off = segments.T
+        length = np.hypot(x2 - x1, y2 - y1)
+        # Segments shorter than a pixel are drawn as their start point only
+        count = np.where(length < 1, 1, np.ceil(length).astype(int) + 1)
+        owner = np.repeat(np.arange(len(segments)), count)
+        step = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        t = step / np.maximum(count - 1, 1)[owner]
+        xs = x1[owner] + t * (x2 - x1)[owner]
+        ys = y1[owner] + t * (y2 - y1)[owner]
+
+        period = (dash_on + dash_off)[owner]
+        drawn = (period == 0) | (np.fmod(t * length[owner], np.where(period == 0, 1, period)) < dash_on[owner])
+        xs, ys, owner = xs[drawn], ys[drawn], owner[drawn]
+
+        for thickness in np.unique(width[owner]):
+            chosen = width[owner] == thickness
+            px, py = np.rint(xs[chosen]).astype(int), np.rint(ys[chosen]).astype(int)
+            rgb = palette[color[owner[chosen]].astype(int)]
+            low = -(int(thickness) - 1) // 2
+            for dy in range(low, low + int(thickness)):
+                for dx in range(low, low + int(thickness)):
+                    qx, qy = px + dx, py + dy
+                    inside = (qx >= 0) & (qx < self.width) & (qy >= 0) & (qy < self.height)
+                    image[qy[inside], qx[inside]] = rgb[inside]
+
+    def _render_labels(self, image):
+        """Draw every label centred on its position with the bitmap font."""
+        global _FONT_TABLES
+        if not self.labels:
+            return
+        if _FONT_TABLES is None:
+            _FONT_TABLES = _font_tables()
+        index, starts, counts, glyph_rows, glyph_columns = _FONT_TABLES
+        zoom = max(1, int(round(self.scale)))
+
+        centres = np.concatenate([points for points, _ in self.labels])
+        texts = [text for _, batch in self.labels for text in batch]
+        lengths = np.array([len(text) for text in texts], dtype=int)
+        glyphs = np.array([index.get(char, index[None]) for char in "".join(texts).upper()], dtype=int)
+        label_of = np.repeat(np.arange(len(texts)), lengths)
+        position = np.arange(len(glyphs)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        left = np.floor(centres[label_of, 0] - (lengths[label_of] * GLYPH_ADVANCE - 1) * zoom / 2).astype(int)
+        char_x = left + position * GLYPH_ADVANCE * zoom
+        char_y = np.floor(centres[label_of, 1] - GLYPH_HEIGHT * zoom / 2).astype(int)
+
+        pixels = counts[glyphs]
+        char = np.repeat(np.arange(len(glyphs)), pixels)
+        offset = starts[glyphs][char] + np.arange(pixels.sum()) - np.repeat(np.cumsum(pixels) - pixels, pixels)
+        base_x = char_x[char] + glyph_columns[offset] * zoom
+        base_y = char_y[char] + glyph_rows[offset] * zoom
+        for dy in range(zoom):
+            for dx in range(zoom):
+                qx, qy = base_x + dx, base_y + dy
+                inside = (qx >= 0) & (qx < self.width) & (qy >= 0) & (qy < self.height)
+                image[qy[inside], qx[inside]] = COLORS["black"]
+
+
+def render_image(components, beams=None, scale=1.0, max_size=None):
+    """Render a diagram to an RGB NumPy image.
+
+    Components sharing a name share their shapes, so each shape is added once at the
+    positions of all such components. If max_size is given, the scale is reduced so the
+    longer side fits in that many pixels.
+    """
+    x1, y1, x2, y2 = diagram_bounds(components)
+    if max_size:
+        scale = min(scale, max_size / max(x2 - x1, y2 - y1))
+    rasterizer = Rasterizer(math.ceil((x2 - x1) * scale), math.ceil((y2 - y1) * scale), (x1, y1), scale)
+
+    groups = {}
+    for component in components:
+        groups.setdefault(component['name'], []).append(component)
+    for name, members in groups.items():
+        offsets = np.array([member['position'] for member in members], dtype=float)
+        template = {'name': name, 'params': {'label': ""}, 'position': (0, 0)}
+        for shape in component_shapes(template):
+            if shape.role == 'label':
+                rasterizer.add_text(shape.coords, [str(member['params']['label']) for member in members], offsets)
+            else:
+                rasterizer.add_shape(shape, offsets)
+
+    if len(components) >= 2:
+        beam_list = resolve_beams(len(components), beams)
+        if beam_list:
+            positions = np.array([component['position'] for component in components], dtype=float)
+            ends = np.array([(beam['start'], beam['end']) for beam in beam_list])
+            rasterizer.add_segments(positions[ends[:, 0]], positions[ends[:, 1]], BEAM_STYLE['fill'], BEAM_STYLE)
+    return rasterizer.render()
+
+
+def encode_png(image, level=6):
+    """Encode an RGB image as PNG bytes."""
+    height, width, _ = image.shape
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), level))
+            + chunk(b"IEND", b""))
+
+
+@profiled("write_png", "io")
+def write_png(components, beams, path, scale=1.0, max_size=None):
+    """Render a diagram and save it as a PNG file."""
+    with open(path, 'wb') as file:
+        file.write(encode_png(render_image(components, beams, scale, max_size)))
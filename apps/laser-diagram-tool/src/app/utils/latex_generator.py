@@ -4,12 +4,47 @@ LatexGenerator - Handles LaTeX code generation for optical diagrams
 
 import os
 from tkinter import filedialog, messagebox
+from app.utils.profiling import PROFILER, profiled
+
+def setup_macro_name(number):
+    """Return the name of the macro drawing the number-th distinct setup: \\setupA, \\setupB, ..."""
+    letters = ""
+    number += 1
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return "\\setup" + letters
 
 class LatexGenerator:
     """Class for generating LaTeX code from diagram components."""
     
-    def generate_latex_code(self, components):
-        """Generate LaTeX code from current diagram."""
+    def __init__(self):
+        """Initialize with an empty cache of setup macro bodies."""
+        # Macro body per distinct setup (SetupInstance.variant_key), kept across regenerations
+        self.setup_bodies = {}
+    
+    def setup_body(self, instance):
+        """Return the picture code of a setup instance's definition as one line.
+        
+        Node names take the macro's argument as a prefix, so every instance gets its own
+        nodes; the code is generated once per distinct setup.
+        """
+        key = instance.variant_key()
+        if key not in self.setup_bodies:
+            lines = self.generate_latex_code(instance.local_components()).split("\n")
+            start, end = lines.index("    \\begin{optexp}"), lines.index("    \\end{optexp}")
+            body = [line.strip() for line in lines[:start] if line.strip().startswith("\\pnodes")]
+            body += [line.strip() for line in lines[start + 1:end]
+                     if line.strip() and not line.strip().startswith("%")]
+            self.setup_bodies[key] = " ".join(body).replace("(Node", "(#1Node").replace("{Node", "{#1Node")
+        return self.setup_bodies[key]
+    
+    @profiled("generate_latex_code", "latex")
+    def generate_latex_code(self, components, instances=()):
+        """Generate LaTeX code from current diagram.
+        
+        Setup instances are drawn by one macro per distinct setup, placed with \\rput.
+        """
         latex = "\\documentclass{standalone}\n\\usepackage{pst-optexp}\n\n\\begin{document}\n\n"
         latex += "% Optical Diagram Generated with Optical Diagram Creator\n"
         latex += "\\begin{pspicture}(-2,-2)(12,6)\n"
@@ -29,6 +64,17 @@ class LatexGenerator:
             # Default nodes if no components
             latex += "    \\pnodes(0,0){Start}(5,0){Middle}(10,0){End}\n\n"
         
+        # Setup definitions, one macro per distinct setup
+        setup_macros = {}
+        if instances:
+            latex += "    % Setup definitions\n"
+            for instance in instances:
+                key = instance.variant_key()
+                if key not in setup_macros:
+                    setup_macros[key] = setup_macro_name(len(setup_macros))
+                    latex += f"    \\newcommand{{{setup_macros[key]}}}[1]{{{self.setup_body(instance)}}}\n"
+            latex += "\n"
+        
         latex += "    \\begin{optexp}\n"
         
         # Track beam splitters for special handling of beam paths
@@ -234,10 +280,17 @@ class LatexGenerator:
                         latex += f"        {component['latex']}(Node{i-1})(Node{i}){{{component['params']['label']}}}\n"
                     else:  # Middle components
                         latex += f"        {component['latex']}(Node{i-1})(Node{i+1}){{{component['params']['label']}}}\n"
-        else:
+        elif not instances:
             # Placeholder comment if no components
             latex += "        % Add components to your diagram\n"
         
+        # Setup instances, each with its own node prefix
+        if instances:
+            latex += "        % Setup instances\n"
+            for i, instance in enumerate(instances):
+                x, y = instance.offset
+                latex += f"        \\rput({x / 50:.2f},{y / 50:.2f}){{{setup_macros[instance.variant_key()]}{{I{i}}}}}\n"
+        
         # Beam path with proper pst-optexp settings
         latex += "\n        % Beam paths\n"
         
@@ -301,11 +354,13 @@ class LatexGenerator:
         latex += "\\end{pspicture}\n\n"
         latex += "\\end{document}"
         
+        if PROFILER.enabled:
+            PROFILER.count("latex lines emitted", latex.count("\n"))
         return latex
     
-    def save_latex_file(self, components):
+    def save_latex_file(self, components, instances=()):
         """Save the LaTeX code to a file."""
-        latex_code = self.generate_latex_code(components)
+        latex_code = self.generate_latex_code(components, instances)
         
         file_path = filedialog.asksaveasfilename(
             defaultextension=".tex",
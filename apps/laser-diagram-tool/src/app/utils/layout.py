@@ -0,0 +1,200 @@
+"""
+Layout - Automatic placement of diagram components along the beam graph
+"""
+
+import math
+import numpy as np
+from app.models.diagram import resolve_beams
+from app.models.optical_component import classify_component
+
+class LayoutEngine:
+    """Class for laying out components on an orthogonal grid that follows the beam paths.
+
+    Each beam path continues straight to the next grid column; additional outputs of a
+    component (e.g. the reflected arm of a beam splitter) turn by 90 degrees into a new
+    lane, so mirrors end up at 45 degree turns. Occupied cells are tracked in a spatial
+    grid so placement never overlaps components and runs in near-linear time.
+    """
+
+    def __init__(self, spacing=(150, 150), origin=(100, 100)):
+        """Initialize with the grid spacing and the origin of the layout in canvas pixels."""
+        self.spacing = spacing
+        self.origin = origin
+
+    def layout(self, components, beams=None, selection=None):
+        """Compute new positions for the selected components (all by default).
+
+        Returns a (len(components), 2) array of positions; unselected components keep
+        their current positions and are treated as obstacles.
+        """
+        count = len(components)
+        positions = np.array([component['position'] for component in components],
+                             dtype=float).reshape(count, 2)
+        selected = list(range(count)) if selection is None else sorted(set(selection))
+        if not selected:
+            return positions
+
+        # Lay a selection out from its own top-left corner so it stays in place
+        if selection is None:
+            origin = np.array(self.origin, dtype=float)
+        else:
+            origin = positions[selected].min(axis=0)
+        spacing = np.array(self.spacing, dtype=float)
+
+        # Spatial grid of cells occupied by the components that stay where they are
+        in_selection = np.zeros(count, dtype=bool)
+        in_selection[selected] = True
+        fixed_cells = np.rint((positions[~in_selection] - origin) / spacing).astype(int)
+        grid = _Grid(map(tuple, fixed_cells))
+
+        # Beam graph restricted to the selection
+        successors = {index: [] for index in selected}
+        has_input = set()
+        for beam in resolve_beams(count, beams):
+            start, end = beam['start'], beam['end']
+            if in_selection[start] and in_selection[end] and start != end:
+                successors[start].append(end)
+                has_input.add(end)
+
+        # Sources first, then other entry points, then whatever is left (cycles, orphans)
+        roots = [i for i in selected if classify_component(components[i]['name']) == 'source']
+        roots += [i for i in selected if i not in has_input]
+        roots += selected
+
+        cells = {}
+        for root in roots:
+            if root in cells:
+                continue
+            self._place_tree(root, successors, cells, grid)
+
+        indices = np.array(list(cells.keys()), dtype=int)
+        grid_cells = np.array(list(cells.values()), dtype=float).reshape(-1, 2)
+        positions[indices] = origin + grid_cells * spacing
+        return positions
+
+    def _place_tree(self, root, successors, cells, grid):
+        """Place every component reachable from the root, one straight chain at a time."""
+        cells[root] = grid.place(0, grid.new_row())
+        branches = []
+        chain_start = root
+        while True:
+            # Follow the first unplaced output straight along the current row
+            node = chain_start
+            while True:
+                col, row = cells[node]
+                outputs = [nxt for nxt in successors[node] if nxt not in cells]
+                if not outputs:
+                    break
+                for branch in reversed(outputs[1:]):
+                    branches.append((node, branch))
+                node = outputs[0]
+                cells[node] = grid.place(col + 1, row)
+
+            # Start the next chain on a new lane, turning 90 degrees where possible
+            chain_start = None
+            while branches:
+                parent, branch = branches.pop()
+                if branch in cells:
+                    continue
+                col, row = cells[parent]
+                lane = grid.new_row()
+                if grid.column_clear_below(col, row):
+                    cells[branch] = grid.place(col, lane)
+                else:
+                    cells[branch] = grid.place(col + 1, lane)
+                chain_start = branch
+                break
+            if chain_start is None:
+                return
+
+    def apply(self, components, beams=None, selection=None):
+        """Lay out the components in place and orient mirrors along the new beam turns."""
+        positions = self.layout(components, beams, selection)
+        selected = range(len(components)) if selection is None else set(selection)
+        for index in selected:
+            x, y = positions[index]
+            components[index]['position'] = (int(round(x)), int(round(y)))
+        self.orient_mirrors(components, beams, selected)
+        return positions
+
+    def orient_mirrors(self, components, beams=None, indices=None):
+        """Set the angle param of mirrors so they bisect their incoming and outgoing beams."""
+        inputs = {}
+        outputs = {}
+        for beam in resolve_beams(len(components), beams):
+            outputs.setdefault(beam['start'], []).append(beam['end'])
+            inputs.setdefault(beam['end'], []).append(beam['start'])
+
+        for index in range(len(components)) if indices is None else indices:
+            component = components[index]
+            if classify_component(component['name']) != 'mirror' or 'angle' not in component['params']:
+                continue
+            if len(inputs.get(index, [])) != 1 or len(outputs.get(index, [])) != 1:
+                continue
+            x, y = component['position']
+            in_x, in_y = components[inputs[index][0]]['position']
+            out_x, out_y = components[outputs[index][0]]['position']
+            # The surface is perpendicular to the bisector of the reversed input and the output
+            back = math.atan2(in_y - y, in_x - x)
+            forward = math.atan2(out_y - y, out_x - x)
+            normal = math.atan2(math.sin(back) + math.sin(forward), math.cos(back) + math.cos(forward))
+            angle = round(math.degrees(normal) + 90) % 180
+            # Copy the params so setups sharing a library dict are not modified
+            component['params'] = {**component['params'], 'angle': str(angle)}
+
+    def find_free_position(self, components):
+        """Return a free grid position for a newly added component.
+
+        The component is placed one column to the right of the last component so that
+        consecutively added parts form a beam path, or at the origin for an empty diagram.
+        """
+        spacing = np.array(self.spacing, dtype=float)
+        origin = np.array(self.origin, dtype=float)
+        if not components:
+            return tuple(int(v) for v in origin)
+
+        positions = np.array([component['position'] for component in components], dtype=float)
+        grid = _Grid(map(tuple, np.rint((positions - origin) / spacing).astype(int)))
+        col, row = np.rint((positions[-1] - origin) / spacing).astype(int)
+        col, row = grid.place(int(col) + 1, int(row))
+        x, y = origin + np.array([col, row]) * spacing
+        return (int(x), int(y))
+
+
+class _Grid:
+    """Sparse occupancy grid with a skip list per column for finding free cells quickly."""
+
+    def __init__(self, occupied=()):
+        """Initialize with already occupied (col, row) cells."""
+        self.occupied = set()
+        self.skip = {}
+        self.column_max = {}
+        self.max_row = -1
+        for col, row in occupied:
+            self._mark(int(col), int(row))
+
+    def _mark(self, col, row):
+        """Mark a cell as occupied."""
+        self.occupied.add((col, row))
+        self.column_max[col] = max(self.column_max.get(col, row), row)
+        self.max_row = max(self.max_row, row)
+
+    def place(self, col, row):
+        """Occupy the first free cell at or below (col, row) in the column and return it."""
+        path = []
+        while (col, row) in self.occupied:
+            path.append(row)
+            row = self.skip.get((col, row), row + 1)
+        # Path compression: later searches jump straight past this run of occupied cells
+        for visited in path:
+            self.skip[(col, visited)] = row
+        self._mark(col, row)
+        return (col, row)
+
+    def new_row(self):
+        """Return the first row below every occupied cell."""
+        return self.max_row + 1
+
+    def column_clear_below(self, col, row):
+        """Check that nothing in the column sits below the given row."""
+        return self.column_max.get(col, row) <= row
@@ -0,0 +1,164 @@
+"""
+Profiling - Named spans and counters around pipeline stages, exported as Chrome traces
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+
+class _NullSpan:
+    """Span returned while profiling is disabled; entering and leaving it does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Span timing the code inside its with block."""
+
+    __slots__ = ('profiler', 'name', 'category', 'args', 'start')
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Profiler:
+    """Class collecting timed spans and counters of the pipeline stages.
+
+    While disabled, span() hands out a shared no-op context manager and count() returns
+    at once, so instrumented code costs one attribute check per call. Spans from all
+    threads are recorded and can be exported as Chrome trace JSON (chrome://tracing or
+    Perfetto) or summarised per stage.
+    """
+
+    def __init__(self):
+        """Initialize a disabled profiler."""
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop everything recorded so far."""
+        with self.lock:
+            self.origin = time.perf_counter_ns()
+            # (name, category, start ns, end ns, thread id, args)
+            self.events = []
+            self.counters = Counter()
+            # (name, time ns, running total)
+            self.counter_events = []
+
+    def enable(self):
+        """Start recording."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording; what was recorded is kept."""
+        self.enabled = False
+
+    def span(self, name, category="app", **args):
+        """Return a context manager timing a stage."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def record(self, name, category, start, end, args=None):
+        """Record a finished span with perf_counter_ns timestamps."""
+        with self.lock:
+            self.events.append((name, category, start, end, threading.get_ident(), args or {}))
+
+    def count(self, name, value=1):
+        """Add to a counter, e.g. of canvas items created."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] += value
+            self.counter_events.append((name, time.perf_counter_ns(), self.counters[name]))
+
+    def profiled(self, name=None, category="app"):
+        """Return a decorator recording every call of a function as a span."""
+        def decorate(function):
+            label = name or function.__qualname__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Span(self, label, category, {}):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def chrome_trace(self):
+        """Return the recording in the Chrome trace event format."""
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.events)
+            counter_events = list(self.counter_events)
+
+        trace = []
+        for name, category, start, end, thread, args in events:
+            trace.append({'name': name, 'cat': category, 'ph': "X", 'pid': pid, 'tid': thread,
+                          'ts': (start - self.origin) / 1000, 'dur': (end - start) / 1000,
+                          'args': {key: str(value) for key, value in args.items()}})
+        for name, timestamp, total in counter_events:
+            trace.append({'name': name, 'ph': "C", 'pid': pid, 'tid': 0,
+                          'ts': (timestamp - self.origin) / 1000, 'args': {name: total}})
+        return {'traceEvents': trace, 'displayTimeUnit': "ms"}
+
+    def write_chrome_trace(self, path):
+        """Write the Chrome trace JSON to a file."""
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+    def summary(self):
+        """Return (name, calls, total ms, mean ms, max ms) per span name, slowest total first."""
+        stages = {}
+        with self.lock:
+            for name, _, start, end, _, _ in self.events:
+                calls, total, longest = stages.get(name, (0, 0, 0))
+                stages[name] = (calls + 1, total + end - start, max(longest, end - start))
+        rows = [(name, calls, total / 1e6, total / calls / 1e6, longest / 1e6)
+                for name, (calls, total, longest) in stages.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def format_summary(self):
+        """Return the summary and counters as a text table."""
+        width = max([len("Stage")] + [len(row[0]) for row in self.summary()])
+        lines = [f"{'Stage':<{width}} {'Calls':>7} {'Total ms':>10} {'Mean ms':>9} {'Max ms':>9}"]
+        for name, calls, total, mean, longest in self.summary():
+            lines.append(f"{name:<{width}} {calls:>7} {total:>10.2f} {mean:>9.3f} {longest:>9.3f}")
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for name, total in counters:
+            lines.append(f"{name}: {total}")
+        return "\n".join(lines)
+
+
+# Profiler shared by the whole application
+PROFILER = Profiler()
+span = PROFILER.span
+count = PROFILER.count
+profiled = PROFILER.profiled
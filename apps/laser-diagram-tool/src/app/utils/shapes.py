@@ -0,0 +1,162 @@
+"""
+Shapes - Drawing primitives for components, shared by the canvas and the image exporters
+"""
+
+from collections import namedtuple
+
+# One drawing primitive. kind is a Tk canvas item type, coords are canvas coordinates,
+# options are Tk item options and role is 'body', 'detail' or 'label'.
+Shape = namedtuple('Shape', ['kind', 'coords', 'options', 'role'])
+
+# RGB values of the colours used by the shapes and overlays
+COLORS = {
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "red": (255, 0, 0),
+    "blue": (0, 0, 255),
+    "gray": (190, 190, 190),
+    "orange": (255, 165, 0),
+    "purple": (160, 32, 240),
+    "light gray": (211, 211, 211),
+    "light blue": (173, 216, 230),
+    "light yellow": (255, 255, 224),
+    "light green": (144, 238, 144),
+    "light purple": (203, 195, 227),
+}
+
+# Style of the beam lines between components
+BEAM_STYLE = {'fill': "red", 'width': 2, 'dash': (4, 2)}
+
+# Largest distance of any shape from its component's position, used for bounds
+MAX_EXTENT = 50
+
+
+def _body(kind, coords, **options):
+    return Shape(kind, coords, options, 'body')
+
+
+def _detail(kind, coords, **options):
+    return Shape(kind, coords, options, 'detail')
+
+
+def _label(x, y, component):
+    return Shape('text', (x, y), {'text': component['params']['label']}, 'label')
+
+
+def component_shapes(component):
+    """Return the shapes that draw a component, in drawing order."""
+    x, y = component['position']
+    component_name = component['name']
+
+    if "Lens" in component_name:
+        if "Thick" in component_name:
+            return [_body('oval', (x-30, y-40, x+30, y+40), outline="black", width=2),
+                    _detail('oval', (x-25, y-35, x+25, y+35), outline="black", width=1, dash=(2, 2)),
+                    _label(x, y, component)]
+        if "Objective" in component_name:
+            return [_body('oval', (x-30, y-40, x+30, y+40), outline="black", width=2, fill="light gray"),
+                    _label(x, y, component)]
+        return [_body('oval', (x-30, y-40, x+30, y+40), outline="black", width=2),
+                _label(x, y, component)]
+
+    if "Mirror" in component_name:
+        if "Curved" in component_name:
+            return [_body('arc', (x-40, y-40, x+40, y+40), start=135, extent=90,
+                          style="arc", outline="black", width=3),
+                    _label(x+10, y-10, component)]
+        return [_body('line', (x-40, y-40, x+40, y+40), fill="black", width=3),
+                _label(x+10, y-10, component)]
+
+    if "Beam Splitter" in component_name or "BS" in component_name:
+        if "Polarizing" in component_name or "PBS" in component_name:
+            return [_body('rectangle', (x-30, y-30, x+30, y+30), outline="black", width=2, fill="light gray"),
+                    _detail('line', (x-30, y-30, x+30, y+30), fill="black", width=1),
+                    _label(x, y-40, component)]
+        return [_body('rectangle', (x-5, y-30, x+5, y+30), outline="black", width=2, fill="light blue"),
+                _detail('line', (x-30, y, x+30, y), fill="black", width=1, dash=(4, 2)),
+                _label(x, y-40, component)]
+
+    if "Wave Plate" in component_name or "WP" in component_name:
+        shapes = [_body('rectangle', (x-20, y-30, x+20, y+30), outline="black", width=2, fill="light yellow")]
+        # Different patterns for half vs quarter wave plates
+        offsets = (-15, 15) if "Half" in component_name or "HWP" in component_name else (-10, 0, 10)
+        for offset in offsets:
+            shapes.append(_detail('line', (x-20, y+offset, x+20, y+offset), fill="black"))
+        shapes.append(_label(x, y, component))
+        return shapes
+
+    if "Filter" in component_name:
+        return [_body('rectangle', (x-30, y-7, x+30, y+7), outline="black", width=2, fill="light green"),
+                _label(x, y-20, component)]
+
+    if "Isolator" in component_name:
+        return [_body('oval', (x-25, y-25, x+25, y+25), outline="black", width=2),
+                _detail('line', (x-15, y, x+15, y), fill="black", arrow="last", width=2),
+                _label(x, y-35, component)]
+
+    if "Modulator" in component_name or "AOM" in component_name or "EOM" in component_name:
+        return [_body('rectangle', (x-35, y-25, x+35, y+25), outline="black", width=2),
+                _detail('line', (x-25, y-10, x-15, y+10, x-5, y-10, x+5, y+10, x+15, y-10, x+25, y+10),
+                        fill="black", width=1),
+                _label(x, y-35, component)]
+
+    if "Grating" in component_name:
+        shapes = [_body('rectangle', (x-30, y-4, x+30, y+4), outline="black", width=1, fill="gray")]
+        for i in range(-25, 26, 5):
+            shapes.append(_detail('line', (x+i, y-7, x+i, y+7), fill="black", width=1))
+        shapes.append(_label(x, y-15, component))
+        return shapes
+
+    if "Fiber" in component_name:
+        return [_body('arc', (x-40, y-40, x+40, y+40), start=0, extent=180,
+                      style="arc", outline="blue", width=2),
+                _label(x, y+25, component)]
+
+    if "Source" in component_name or "Laser" in component_name or "LED" in component_name:
+        if "Laser" in component_name:
+            fill_color = "light yellow"
+        elif "LED" in component_name:
+            fill_color = "light green"
+        else:
+            fill_color = "white"
+        return [_body('rectangle', (x-40, y-30, x+40, y+30), outline="black", fill=fill_color),
+                _label(x, y, component)]
+
+    if "Detector" in component_name or "Photodiode" in component_name or "Camera" in component_name:
+        shapes = []
+        if "Camera" in component_name:
+            fill_color = "light blue"
+            # Camera lens symbol
+            shapes.append(_detail('oval', (x-15, y-15, x+15, y+15), outline="black"))
+        elif "Spectrometer" in component_name:
+            fill_color = "light purple"
+        elif "Power" in component_name:
+            fill_color = "light green"
+        else:
+            fill_color = "light gray"
+        shapes.append(_body('rectangle', (x-40, y-30, x+40, y+30), outline="black", fill=fill_color))
+        shapes.append(_label(x, y, component))
+        return shapes
+
+    if "Circulator" in component_name:
+        return [_body('oval', (x-30, y-30, x+30, y+30), outline="black", width=2, fill="light yellow"),
+                _detail('arc', (x-20, y-20, x+20, y+20), start=45, extent=270,
+                        style="arc", outline="black", width=2, arrow="last"),
+                _label(x, y-40, component)]
+
+    if "Amplifier" in component_name:
+        return [_body('polygon', (x-30, y-25, x-30, y+25, x+30, y), outline="black", fill="light green", width=2),
+                _label(x, y-35, component)]
+
+    # Generic component
+    return [_body('rectangle', (x-30, y-30, x+30, y+30), outline="black"),
+            _label(x, y, component)]
+
+
+def diagram_bounds(components, margin=MAX_EXTENT):
+    """Return the (x1, y1, x2, y2) area covering every component of a diagram."""
+    if not components:
+        return (0, 0, 2 * margin, 2 * margin)
+    xs = [component['position'][0] for component in components]
+    ys = [component['position'][1] for component in components]
+    return (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
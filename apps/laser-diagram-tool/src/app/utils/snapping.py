@@ -0,0 +1,138 @@
+"""
+Snapping - Grid snapping and alignment guides for dragging components
+"""
+
+import bisect
+from app.models.diagram import resolve_beams
+
+class SortedCoordinates:
+    """Sorted multiset of coordinates with binary-search nearest lookups."""
+
+    def __init__(self, values=()):
+        """Initialize with the given coordinates."""
+        self.values = sorted(values)
+
+    def __len__(self):
+        """Return the number of stored coordinates."""
+        return len(self.values)
+
+    def add(self, value):
+        """Insert a coordinate."""
+        bisect.insort(self.values, value)
+
+    def remove(self, value):
+        """Remove one occurrence of a coordinate, if present."""
+        index = bisect.bisect_left(self.values, value)
+        if index < len(self.values) and self.values[index] == value:
+            del self.values[index]
+
+    def nearest(self, value, tolerance):
+        """Return the stored coordinate closest to value within the tolerance, or None."""
+        index = bisect.bisect_left(self.values, value)
+        best = None
+        for candidate in self.values[max(index - 1, 0):index + 1]:
+            distance = abs(candidate - value)
+            if distance <= tolerance and (best is None or distance < abs(best - value)):
+                best = candidate
+        return best
+
+
+class SnapEngine:
+    """Class for snapping dragged components to the grid, other components and beam axes.
+
+    The x and y coordinates of all components and the axes of horizontal and vertical
+    beams are kept in sorted indexes. Only the dragged components' own entries are taken
+    out while they move, so each drag event costs two binary searches.
+    """
+
+    def __init__(self, grid_size=10, tolerance=8):
+        """Initialize with the grid spacing and the alignment snap distance in pixels."""
+        self.grid_size = grid_size
+        self.tolerance = tolerance
+        self.components = []
+        self.beams = []
+        self.incident = []
+        self.xs = SortedCoordinates()
+        self.ys = SortedCoordinates()
+
+    def rebuild(self, components, beams=None):
+        """Rebuild the indexes for a diagram."""
+        self.components = components
+        self.beams = resolve_beams(len(components), beams)
+        self.incident = [[] for _ in components]
+        for index, beam in enumerate(self.beams):
+            self.incident[beam['start']].append(index)
+            if beam['end'] != beam['start']:
+                self.incident[beam['end']].append(index)
+
+        xs = [component['position'][0] for component in components]
+        ys = [component['position'][1] for component in components]
+        for beam in self.beams:
+            axis = self._beam_axis(beam)
+            if axis:
+                (xs if axis[0] == 'x' else ys).append(axis[1])
+        self.xs = SortedCoordinates(xs)
+        self.ys = SortedCoordinates(ys)
+
+    def _beam_axis(self, beam):
+        """Return ('x', value) for a vertical beam, ('y', value) for a horizontal one, else None."""
+        x1, y1 = self.components[beam['start']]['position']
+        x2, y2 = self.components[beam['end']]['position']
+        if beam['start'] == beam['end']:
+            return None
+        if y1 == y2:
+            return ('y', y1)
+        if x1 == x2:
+            return ('x', x1)
+        return None
+
+    def _entries(self, indices):
+        """Return the index entries that depend on the positions of a group of components.
+
+        A beam joining two components of the group counts once.
+        """
+        indices = {index for index in indices if index < len(self.incident)}
+        entries = []
+        beams = set()
+        for index in indices:
+            x, y = self.components[index]['position']
+            entries += [('x', x), ('y', y)]
+            beams.update(self.incident[index])
+        for beam in beams:
+            axis = self._beam_axis(self.beams[beam])
+            if axis:
+                entries.append(axis)
+        return entries
+
+    def begin_drag(self, indices):
+        """Take the dragged components' own coordinates out of the indexes before they move."""
+        for axis, value in self._entries(indices):
+            (self.xs if axis == 'x' else self.ys).remove(value)
+
+    def end_drag(self, indices):
+        """Put the dragged components' coordinates back into the indexes at their new positions."""
+        for axis, value in self._entries(indices):
+            (self.xs if axis == 'x' else self.ys).add(value)
+
+    def snap(self, x, y):
+        """Snap a position and return (x, y, guides).
+
+        Each coordinate snaps to the nearest aligned component or beam axis within the
+        tolerance, otherwise to the grid. Guides are ('x', value) or ('y', value) lines.
+        """
+        guides = []
+        aligned_x = self.xs.nearest(x, self.tolerance)
+        if aligned_x is not None:
+            x = aligned_x
+            guides.append(('x', aligned_x))
+        elif self.grid_size:
+            x = round(x / self.grid_size) * self.grid_size
+
+        aligned_y = self.ys.nearest(y, self.tolerance)
+        if aligned_y is not None:
+            y = aligned_y
+            guides.append(('y', aligned_y))
+        elif self.grid_size:
+            y = round(y / self.grid_size) * self.grid_size
+
+        return x, y, guides
@@ -0,0 +1,221 @@
+"""
+Thumbnails - Disk cache of diagram and library thumbnails rendered in a background process pool
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Side of the square thumbnails, in pixels, of diagrams and of component library entries
+THUMBNAIL_SIZE = 64
+LIBRARY_THUMBNAIL_SIZE = 32
+
+# Bumped when the renderer changes, so thumbnails drawn by an older one are not reused
+RENDER_VERSION = 1
+
+# Directory of the cache unless another is given
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "optical-diagram-thumbnails")
+
+# Encoder of canonical JSON for the keys of library entries
+ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+
+def thumbnail_key(content, size):
+    """Return the cache key of a thumbnail of content (bytes) at a size."""
+    digest = hashlib.blake2b(content, digest_size=16)
+    digest.update(f":{size}:{RENDER_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def entry_key(name, latex, params, size):
+    """Return the cache key of a library entry; it changes whenever the entry's definition does."""
+    return thumbnail_key(ENCODER.encode([name, latex, params]).encode('utf-8'), size)
+
+
+def thumbnail_path(directory, key):
+    """Return where the thumbnail with a key is cached, in a subdirectory per first two digits."""
+    return os.path.join(directory, key[:2], key + ".png")
+
+
+def render_thumbnail(components, beams, size):
+    """Render components and beams to PNG bytes of a size x size thumbnail.
+
+    Labels are left out, since they are unreadable at thumbnail size, and the image
+    is centered on a white square so rows of thumbnails line up.
+    """
+    import numpy as np
+    from app.utils.image_export import encode_png, render_image
+    unlabeled = [{**component, 'params': {'label': ""}} for component in components]
+    image = render_image(unlabeled, beams, max_size=size)[:size, :size]
+    square = np.full((size, size, 3), 255, dtype=np.uint8)
+    top = (size - image.shape[0]) // 2
+    left = (size - image.shape[1]) // 2
+    square[top:top + image.shape[0], left:left + image.shape[1]] = image
+    return encode_png(square)
+
+
+def _store(path, data):
+    """Write bytes to path through a temporary file, so readers never see a partial thumbnail."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def component_thumbnail(directory, key, components, beams, size):
+    """Return the path of a cached thumbnail, rendering it first if needed (runs in a worker)."""
+    path = thumbnail_path(directory, key)
+    if not os.path.exists(path):
+        _store(path, render_thumbnail(components, beams, size))
+    return path
+
+
+def diagram_thumbnail(directory, diagram_path, size):
+    """Return the path of the cached thumbnail of a diagram file (runs in a worker).
+
+    The key is the hash of the file's bytes, so an edited diagram gets a new
+    thumbnail and a copied or renamed one reuses the existing thumbnail.
+    """
+    with open(diagram_path, 'rb') as file:
+        content = file.read()
+    path = thumbnail_path(directory, thumbnail_key(content, size))
+    if not os.path.exists(path):
+        from app.models.diagram import Diagram
+        from app.models.setup_instance import flatten
+        diagram = Diagram.from_dict(json.loads(content))
+        components, beams = flatten(diagram.get_component_dicts(), diagram.beams, diagram.instances)
+        _store(path, render_thumbnail(components, beams, size))
+    return path
+
+
+def library_entry_scene(name, latex, params):
+    """Return the (components, beams) drawn for a component library entry.
+
+    Setups show their components and beams; other entries show the one component.
+    """
+    if 'components' in params:
+        return params['components'], params.get('beams', [])
+    return [{'name': name, 'latex': latex, 'params': params, 'position': (0, 0)}], []
+
+
+class ThumbnailCache:
+    """Class handing out thumbnails from the disk cache and rendering missing ones in worker processes.
+
+    Requests are identified by the caller's ids, such as tree rows. Finished requests
+    are posted to the results queue as (request id, thumbnail path or None, error
+    message or None), for the GUI to drain from its event loop. A cached library
+    entry is answered without a worker; requests that are no longer wanted, such as
+    rows scrolled out of view, are dropped with keep_only() before they start.
+    """
+
+    def __init__(self, directory=None, size=THUMBNAIL_SIZE, workers=None):
+        """Initialize a cache of size x size thumbnails in directory (default: the user cache)."""
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.size = size
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.results = queue.Queue()
+        self.pending = {}
+        self.pool = None
+        self.lock = threading.Lock()
+        # Thumbnails of diagram files by (path, mtime_ns, size), to skip rereading unchanged files
+        self.diagram_paths = {}
+
+    def _executor(self):
+        """Return the worker pool, started on the first render."""
+        if self.pool is None:
+            # Spawned workers do not inherit the GUI's state
+            context = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self.pool
+
+    def _submit(self, request_id, function, *args, on_done=None):
+        """Run function(*args) in a worker unless a request with this id is pending."""
+        with self.lock:
+            if request_id in self.pending:
+                return
+            try:
+                future = self._executor().submit(function, self.directory, *args)
+            except BrokenProcessPool:
+                # A worker died (killed or out of memory); start a new pool
+                self.pool = None
+                future = self._executor().submit(function, self.directory, *args)
+            self.pending[request_id] = future
+
+        def finished(future):
+            with self.lock:
+                if self.pending.get(request_id) is future:
+                    del self.pending[request_id]
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                self.results.put((request_id, None, str(error)))
+                return
+            if on_done is not None:
+                on_done(future.result())
+            self.results.put((request_id, future.result(), None))
+
+        future.add_done_callback(finished)
+
+    def request_entry(self, request_id, name, latex, params):
+        """Request the thumbnail of a component library entry."""
+        key = entry_key(name, latex, params, self.size)
+        path = thumbnail_path(self.directory, key)
+        if os.path.exists(path):
+            self.results.put((request_id, path, None))
+            return
+        components, beams = library_entry_scene(name, latex, params)
+        self._submit(request_id, component_thumbnail, key, components, beams, self.size)
+
+    def request_diagram(self, request_id, diagram_path):
+        """Request the thumbnail of a diagram file."""
+        try:
+            stat = os.stat(diagram_path)
+        except OSError as e:
+            self.results.put((request_id, None, str(e)))
+            return
+        stamp = (os.path.abspath(diagram_path), stat.st_mtime_ns, stat.st_size)
+        known = self.diagram_paths.get(stamp)
+        if known is not None and os.path.exists(known):
+            self.results.put((request_id, known, None))
+            return
+
+        def remember(path):
+            self.diagram_paths[stamp] = path
+
+        self._submit(request_id, diagram_thumbnail, diagram_path, self.size, on_done=remember)
+
+    def keep_only(self, request_ids):
+        """Cancel the pending requests whose ids are not in request_ids, if they have not started."""
+        with self.lock:
+            dropped = [future for request_id, future in self.pending.items() if request_id not in request_ids]
+        for future in dropped:
+            future.cancel()
+
+    def has_pending(self):
+        """Return whether any request is still being rendered."""
+        with self.lock:
+            return bool(self.pending)
+
+    def shutdown(self):
+        """Cancel pending requests and stop the workers."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        with self.lock:
+            self.pending.clear()
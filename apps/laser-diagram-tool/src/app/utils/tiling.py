@@ -0,0 +1,240 @@
+"""
+Tiling - Splits very large diagrams into tiles that compile in parallel
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.compiler import CompileResult, source_hash, split_preamble
+from app.utils.profiling import profiled
+
+# Edge length of a tile in PSTricks units (cm)
+TILE_SIZE = 20.0
+
+# Distance around a command's nodes that it may draw into, so components and beams
+# near a tile boundary are drawn on both sides and clipped there
+TILE_OVERLAP = 2.0
+
+# "(x,y){Name}" in \pnode and \pnodes
+NODE_PATTERN = re.compile(r"\(\s*(-?\d*\.?\d+)\s*,\s*(-?\d*\.?\d+)\s*\)\{(\w+)\}")
+# "(Name)" node references of a command
+REFERENCE_PATTERN = re.compile(r"\((\w+)\)")
+
+# One cell of the tile grid; bounds is (x1, y1, x2, y2) in PSTricks units
+Tile = namedtuple('Tile', ['row', 'column', 'bounds'])
+
+
+class _EitherEvent:
+    """Cancel event that is set when any of its events is set."""
+
+    def __init__(self, *events):
+        """Initialize with the events to watch; None entries are ignored."""
+        self.events = [event for event in events if event is not None]
+
+    def is_set(self):
+        """Check whether any event is set."""
+        return any(event.is_set() for event in self.events)
+
+
+class TiledDiagram:
+    """A single-pspicture standalone document split into a grid of tiles.
+
+    Every command of the picture that references nodes is assigned to the tiles its
+    nodes' bounding box (grown by the overlap) touches; other lines such as styles are
+    kept in every tile. Each tile is a document of its own, holding only its commands
+    and the nodes they use inside a clipping pspicture*, so editing one part of a large
+    diagram only changes the sources of the tiles around it.
+    """
+
+    def __init__(self, preamble, lines, nodes, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+        """Initialize from the parsed picture.
+
+        lines are (text, references) pairs in source order, where references is None for
+        the placeholder of the node definitions and a list of node names otherwise.
+        """
+        self.preamble = preamble
+        self.lines = lines
+        self.nodes = nodes
+        self.tile_size = tile_size
+        self.overlap = overlap
+
+        xs = [x for x, _ in nodes.values()]
+        ys = [y for _, y in nodes.values()]
+        # Area covered by the tiles; the last row and column are cut to it
+        self.origin = (min(xs) - overlap, min(ys) - overlap)
+        self.extent = (max(xs) + overlap, max(ys) + overlap)
+        self.columns = max(1, math.ceil((self.extent[0] - self.origin[0]) / tile_size))
+        self.rows = max(1, math.ceil((self.extent[1] - self.origin[1]) / tile_size))
+
+        # Node definition order, and the line indices drawn in every tile and per tile
+        self.node_order = {name: index for index, name in enumerate(nodes)}
+        self.shared = [index for index, (_, references) in enumerate(lines) if not references]
+        self.buckets = {}
+        for index, (_, references) in enumerate(lines):
+            if references:
+                rows, columns = self._tile_range(references)
+                for row in rows:
+                    for column in columns:
+                        self.buckets.setdefault((row, column), []).append(index)
+
+    @classmethod
+    def parse(cls, latex_code, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+        """Parse a document, or return None if it cannot be tiled.
+
+        Only standalone documents whose body is one pspicture in the default unit, with
+        nodes defined by \\pnode or \\pnodes, can be tiled.
+        """
+        preamble, body = split_preamble(latex_code)
+        if preamble is None or "standalone" not in preamble or "unit=" in latex_code:
+            return None
+
+        body_lines = body.splitlines()
+        starts = [i for i, line in enumerate(body_lines) if line.strip().startswith("\\begin{pspicture}")]
+        ends = [i for i, line in enumerate(body_lines) if line.strip().startswith("\\end{pspicture}")]
+        if len(starts) != 1 or len(ends) != 1 or ends[0] < starts[0]:
+            return None
+        # Anything but comments outside the picture would be lost
+        for i, line in enumerate(body_lines):
+            text = line.strip()
+            if starts[0] <= i <= ends[0] or not text or text.startswith("%"):
+                continue
+            if text not in ("\\begin{document}", "\\end{document}"):
+                return None
+
+        picture = body_lines[starts[0] + 1:ends[0]]
+        nodes = {}
+        for line in picture:
+            if line.strip().startswith("\\pnode"):
+                for x, y, name in NODE_PATTERN.findall(line):
+                    nodes[name] = (float(x), float(y))
+        if not nodes:
+            return None
+
+        lines = []
+        for line in picture:
+            if line.strip().startswith("%"):
+                continue
+            if line.strip().startswith("\\pnode"):
+                if not any(references is None for _, references in lines):
+                    lines.append((line, None))
+                continue
+            references = [name for name in REFERENCE_PATTERN.findall(line) if name in nodes]
+            lines.append((line, references))
+        return cls(preamble, lines, nodes, tile_size, overlap)
+
+    def tiles(self):
+        """Return every tile of the grid."""
+        x0, y0 = self.origin
+        size = self.tile_size
+        return [Tile(row, column, (x0 + column * size, y0 + row * size,
+                                   min(x0 + (column + 1) * size, self.extent[0]),
+                                   min(y0 + (row + 1) * size, self.extent[1])))
+                for row in range(self.rows) for column in range(self.columns)]
+
+    def _tile_range(self, references):
+        """Return the rows and columns of the tiles a command on the given nodes may draw into."""
+        xs = [self.nodes[name][0] for name in references]
+        ys = [self.nodes[name][1] for name in references]
+        x0, y0 = self.origin
+        size = self.tile_size
+        # A tile is touched if the grown box overlaps it by more than its edge
+        columns = range(max(0, math.floor((min(xs) - self.overlap - x0) / size)),
+                        min(self.columns, math.ceil((max(xs) + self.overlap - x0) / size)))
+        rows = range(max(0, math.floor((min(ys) - self.overlap - y0) / size)),
+                     min(self.rows, math.ceil((max(ys) + self.overlap - y0) / size)))
+        return rows, columns
+
+    def tile_lines(self, tile):
+        """Return the lines of the picture that a tile draws, with node references."""
+        return [self.lines[index] for index in self.buckets.get((tile.row, tile.column), [])]
+
+    def occupied_tiles(self):
+        """Return the tiles that draw at least one command."""
+        return [tile for tile in self.tiles() if (tile.row, tile.column) in self.buckets]
+
+    def tile_source(self, tile):
+        """Return the document of one tile."""
+        drawn = self.buckets.get((tile.row, tile.column), [])
+        used = set()
+        for index in drawn:
+            used.update(self.lines[index][1])
+        x1, y1, x2, y2 = tile.bounds
+
+        parts = [self.preamble, "\\standaloneconfig{border=0pt}\n\\begin{document}\n",
+                 f"\\begin{{pspicture*}}({x1:.2f},{y1:.2f})({x2:.2f},{y2:.2f})\n"]
+        for index in sorted(self.shared + drawn):
+            text, references = self.lines[index]
+            if references is None:
+                definitions = "".join(f"({self.nodes[name][0]:.2f},{self.nodes[name][1]:.2f}){{{name}}}"
+                                      for name in sorted(used, key=self.node_order.__getitem__))
+                parts.append(f"    \\pnodes{definitions}\n")
+            else:
+                parts.append(text + "\n")
+        parts.append("\\end{pspicture*}\n\\end{document}")
+        return "".join(parts)
+
+    def stitch_source(self, tile_pdfs):
+        """Return the document placing compiled tiles, given as (tile, pdf path) pairs."""
+        x0, y0 = self.origin
+        width = self.extent[0] - x0
+        height = self.extent[1] - y0
+        latex = "\\documentclass[border=0pt]{standalone}\n\\usepackage{graphicx}\n\n\\begin{document}\n"
+        latex += "\\setlength{\\unitlength}{1cm}%\n"
+        latex += f"\\begin{{picture}}({width:.2f},{height:.2f})({x0:.2f},{y0:.2f})\n"
+        for tile, pdf_path in tile_pdfs:
+            x1, y1, _, _ = tile.bounds
+            latex += f"\\put({x1:.2f},{y1:.2f}){{\\includegraphics{{{pdf_path}}}}}\n"
+        latex += "\\end{picture}\n\\end{document}"
+        return latex
+
+
+@profiled("compile_tiled", "latex")
+def compile_tiled(compiler, latex_code, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_workers=None,
+                  cancel_event=None):
+    """Compile a document tile by tile in parallel and stitch the tiles into one PDF.
+
+    Documents that cannot be tiled or fit in one tile are compiled as they are. Returns a
+    CompileResult whose mode is 'tiled' and whose timings hold the wall time of the tile
+    compiles and of the stitching.
+    """
+    diagram = TiledDiagram.parse(latex_code, tile_size, overlap)
+    tiles = diagram.occupied_tiles() if diagram is not None else []
+    if len(tiles) < 2:
+        return compiler.compile(latex_code, cancel_event)
+
+    # Every tile's PDF must still exist when they are stitched, and stay for the next compile
+    compiler.reserve_jobs(2 * len(tiles) + 2)
+    started = time.perf_counter()
+    failed = threading.Event()
+    stop_event = _EitherEvent(cancel_event, failed)
+
+    def compile_tile(tile):
+        """Compile one tile, stopping the others if it fails."""
+        result = compiler.compile(diagram.tile_source(tile), stop_event)
+        if not result.success:
+            # One broken tile makes the others pointless
+            failed.set()
+        return result
+
+    # Each tile compile waits on an engine process, so threads run the engines in parallel
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as pool:
+        results = list(pool.map(compile_tile, tiles))
+    timings = {'tiles': time.perf_counter() - started, 'stitch': 0.0, 'tile_count': len(tiles)}
+
+    digest = source_hash(latex_code)
+    failures = [result for result in results if not result.success]
+    if failures:
+        # Report the tile that failed rather than those it cancelled
+        failure = min(failures, key=lambda result: result.cancelled)
+        return CompileResult(digest, False, log=failure.log, duration=time.perf_counter() - started,
+                             cancelled=failure.cancelled, mode='tiled', timings=timings)
+
+    stitch = compiler.compile(diagram.stitch_source(
+        [(tile, result.pdf_path) for tile, result in zip(tiles, results)]), cancel_event)
+    timings['stitch'] = stitch.duration
+    return CompileResult(digest, stitch.success, stitch.pdf_path, stitch.log,
+                         time.perf_counter() - started, stitch.cancelled, mode='tiled', timings=timings)
@@ -0,0 +1,206 @@
+"""
+Workspace - Open diagrams kept under a memory budget by spilling inactive ones to disk
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import weakref
+import zlib
+from app.models.setup_instance import instances_from_dict, instances_to_dict
+
+# Memory the open diagrams may take unless another budget is given
+DEFAULT_BUDGET = 256 * 2 ** 20
+
+# Estimated memory of a component dict with its params, and of a beam dict; measured
+# on synthetic diagrams, where a component takes 550 to 800 bytes without its id
+COMPONENT_BYTES = 1024
+BEAM_BYTES = 256
+
+# zlib level of spilled diagrams: compact JSON compresses about tenfold even at level 1,
+# so higher levels only make switching tabs slower
+SPILL_LEVEL = 1
+
+# Encoder of the spilled diagrams
+ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+
+class Document:
+    """One open diagram: its content while resident, or the file it was spilled to.
+
+    While spilled, components, beams, instances and constraints are None and only the
+    name, path and counts stay in memory.
+    """
+
+    def __init__(self, name, path=None, components=(), beams=(), instances=(), constraints=()):
+        """Initialize a resident document."""
+        self.name = name
+        self.path = path
+        self.components = list(components)
+        self.beams = list(beams)
+        self.instances = list(instances)
+        self.constraints = list(constraints)
+        self.component_count = len(self.components)
+        self.beam_count = len(self.beams)
+        self.spill_path = None
+        # Workspace clock value of the last activation, for least recently used eviction
+        self.last_used = 0
+
+    @property
+    def resident(self):
+        """Return whether the content is in memory."""
+        return self.spill_path is None
+
+    def estimated_bytes(self):
+        """Return the estimated memory of the content (each setup definition's components count once)."""
+        if not self.resident:
+            return 0
+        definitions = {id(instance.definition): instance.definition for instance in self.instances}
+        components = self.component_count + sum(len(definition.components) for definition in definitions.values())
+        return components * COMPONENT_BYTES + self.beam_count * BEAM_BYTES
+
+    def data(self):
+        """Return the content as diagram file data."""
+        data = {'name': self.name, 'components': self.components, 'beams': self.beams}
+        if self.instances:
+            data.update(instances_to_dict(self.instances))
+        if self.constraints:
+            data['constraints'] = self.constraints
+        return data
+
+
+class Workspace:
+    """Class holding the open diagrams, one of them active, within a memory budget.
+
+    Only the diagrams' own content lives here: the component library, the LaTeX
+    generator with its cache of setup macros and the compiler with its cache of PDFs
+    are the editor's and shared by every diagram. When the resident diagrams exceed
+    the budget, the least recently active ones are spilled to zlib-compressed JSON
+    files in a private directory, about 10 to 20 bytes per component, and read back
+    when activated; the active diagram always stays resident. Memory thus grows
+    with the budget rather than with the number of open diagrams.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, directory=None):
+        """Initialize an empty workspace spilling to a new directory inside directory
+        (default: the system's temporary directory)."""
+        self.budget = budget
+        self.parent_directory = directory
+        self.directory = None
+        self.documents = []
+        self.active = None
+        self.clock = 0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __getitem__(self, index):
+        return self.documents[index]
+
+    def add(self, name, path=None, components=(), beams=(), instances=(), constraints=()):
+        """Open a diagram, inactive, and return its index."""
+        self.documents.append(Document(name, path, components, beams, instances, constraints))
+        self.clock += 1
+        self.documents[-1].last_used = self.clock
+        self.enforce_budget()
+        return len(self.documents) - 1
+
+    def update(self, index, name, path, components, beams, instances, constraints):
+        """Replace the content of a diagram, such as the active one's before switching away."""
+        document = self.documents[index]
+        if not document.resident:
+            os.unlink(document.spill_path)
+            document.spill_path = None
+        document.name = name
+        document.path = path
+        document.components = list(components)
+        document.beams = list(beams)
+        document.instances = list(instances)
+        document.constraints = list(constraints)
+        document.component_count = len(document.components)
+        document.beam_count = len(document.beams)
+
+    def activate(self, index):
+        """Make a diagram the active one, reading it back if it was spilled, and return it.
+
+        Other diagrams are then spilled as needed to stay within the budget.
+        """
+        document = self.documents[index]
+        if not document.resident:
+            self.restore(document)
+        self.active = index
+        self.clock += 1
+        document.last_used = self.clock
+        self.enforce_budget()
+        return document
+
+    def close(self, index):
+        """Close a diagram, deleting its spilled form; the active index follows the remaining ones."""
+        document = self.documents.pop(index)
+        if not document.resident:
+            os.unlink(document.spill_path)
+        if self.active == index:
+            self.active = None
+        elif self.active is not None and self.active > index:
+            self.active -= 1
+
+    def find(self, path):
+        """Return the index of the diagram opened from path, or None."""
+        path = os.path.abspath(path)
+        for index, document in enumerate(self.documents):
+            if document.path is not None and os.path.abspath(document.path) == path:
+                return index
+        return None
+
+    def resident_bytes(self):
+        """Return the estimated memory of the resident diagrams."""
+        return sum(document.estimated_bytes() for document in self.documents)
+
+    def enforce_budget(self):
+        """Spill the least recently active inactive diagrams until the resident ones fit the budget."""
+        used = self.resident_bytes()
+        if used <= self.budget:
+            return
+        candidates = sorted((document for index, document in enumerate(self.documents)
+                             if document.resident and index != self.active),
+                            key=lambda document: document.last_used)
+        for document in candidates:
+            if used <= self.budget:
+                break
+            used -= document.estimated_bytes()
+            self.spill(document)
+
+    def spill(self, document):
+        """Write a diagram's content to its spill file and drop it from memory."""
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="optical-workspace-", dir=self.parent_directory)
+            # Spilled diagrams are only valid while the workspace exists
+            weakref.finalize(self, shutil.rmtree, self.directory, True)
+        fd, path = tempfile.mkstemp(suffix=".json.z", dir=self.directory)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(zlib.compress(ENCODER.encode(document.data()).encode('utf-8'), SPILL_LEVEL))
+        document.spill_path = path
+        document.components = document.beams = document.instances = document.constraints = None
+
+    def restore(self, document):
+        """Read a spilled diagram back into memory and delete its spill file."""
+        with open(document.spill_path, 'rb') as file:
+            data = json.loads(zlib.decompress(file.read()))
+        for component in data['components']:
+            component['position'] = tuple(component['position'])
+        os.unlink(document.spill_path)
+        document.spill_path = None
+        document.components = data['components']
+        document.beams = data['beams']
+        document.instances = instances_from_dict(data) if data.get('instances') else []
+        document.constraints = data.get('constraints', [])
+
+    def shutdown(self):
+        """Delete every spilled diagram."""
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+        for document in self.documents:
+            if not document.resident:
+                document.spill_path = None
@@ -8,14 +8,47 @@ of optical components, configuration of their properties, and automatic
 generation of LaTeX code with PDF output.
 """
 
+import time
+
+# Reference point of the time-to-first-window measurement
+STARTED = time.perf_counter()
+
+import argparse
 import tkinter as tk
 from app.gui.application import OpticalDiagramCreator
+from app.utils.profiling import PROFILER
+from app.utils.workspace import DEFAULT_BUDGET
 
-def main():
+def main(argv=None):
     """Main entry point for the application."""
+    parser = argparse.ArgumentParser(description="Create optical diagrams for pst-optexp.")
+    parser.add_argument('--profile', metavar='TRACE',
+                        help="record stage timings and write them as a Chrome trace JSON on exit")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="print the time until the first window is drawn and exit")
+    parser.add_argument('--memory-budget', metavar='MB', type=float, default=DEFAULT_BUDGET / 2 ** 20,
+                        help="memory for open diagrams before inactive tabs are spilled to disk "
+                             "(default: %(default)g MB)")
+    args = parser.parse_args(argv)
+    if args.profile:
+        PROFILER.enable()
+    
     root = tk.Tk()
-    app = OpticalDiagramCreator(root)
+    app = OpticalDiagramCreator(root, memory_budget=int(args.memory_budget * 2 ** 20))
+    if args.startup_time:
+        # Draw the first frame, then run the deferred work that follows it
+        root.update()
+        first_window = time.perf_counter() - STARTED
+        root.update()
+        print(f"Time to first window: {first_window * 1000:.0f} ms "
+              f"(ready after {(time.perf_counter() - STARTED) * 1000:.0f} ms)")
+        root.destroy()
+        return
     root.mainloop()
+    
+    if args.profile:
+        PROFILER.write_chrome_trace(args.profile)
+        print(PROFILER.format_summary())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
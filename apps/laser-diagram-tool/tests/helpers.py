@@ -0,0 +1,40 @@
+"""
+Helpers - Component, beam and event factories shared by the tests
+"""
+
+
+class Event:
+    """Mouse event stand-in."""
+
+    def __init__(self, x, y, state=0):
+        self.x = x
+        self.y = y
+        self.state = state
+
+
+def make_component(name, position=(0, 0), label=None, **params):
+    """Return a component dict, labelled with its name unless a label is given."""
+    return {'name': name, 'latex': '', 'params': {'label': label or name, **params}, 'position': position}
+
+
+def make_components(count, spacing=100, prefix="L", ids=False, shared_params=None, **params):
+    """Return a row of lenses spacing px apart from (100, 200).
+
+    Each lens is labelled prefix + index and gets its own params, or all of them share
+    shared_params like repeated adds from the library. With ids, each gets the id
+    prefix-index.
+    """
+    components = []
+    for i in range(count):
+        component = {'name': "Lens", 'latex': "\\lens",
+                     'params': shared_params if shared_params is not None else {'label': f"{prefix}{i}", **params},
+                     'position': (100 + i * spacing, 200)}
+        if ids:
+            component['id'] = f"{prefix}-{i}"
+        components.append(component)
+    return components
+
+
+def make_beams(count, beam_type="beam"):
+    """Return beams joining a row of count components."""
+    return [{'start': i, 'end': i + 1, 'type': beam_type} for i in range(count - 1)]
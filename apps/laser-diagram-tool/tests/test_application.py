@@ -1,7 +1,11 @@
+import os
+import tempfile
+import time
 import tkinter as tk
 import unittest
 from unittest.mock import MagicMock
 from app.gui.application import OpticalDiagramCreator
+from app.utils.file_ops import save_diagram
 
 class TestHandleTab(unittest.TestCase):
     def setUp(self):
@@ -25,5 +29,44 @@ class TestHandleTab(unittest.TestCase):
         # This is the expected behavior
         self.assertEqual(self.text_widget.get("1.0", "end-1c"), "    line1\n    line2")
 
+class TestDiagramTabs(unittest.TestCase):
+    def setUp(self):
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.app = OpticalDiagramCreator(self.root)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "diagram.json")
+        save_diagram({'name': "Saved", 'beams': [],
+                      'components': [{'name': "Lens", 'latex': "\\lens", 'params': {'label': "L1"},
+                                      'position': [100, 100]}]}, self.path)
+
+    def tearDown(self):
+        self.root.destroy()
+        self.directory.cleanup()
+
+    def open_and_wait(self, path):
+        self.app.open_diagram_file(path)
+        while self.app.file_operation is not None:
+            self.root.update()
+            time.sleep(0.01)
+
+    def test_reopening_an_open_file_switches_to_its_tab(self):
+        # The untitled diagram's tab is reused for the first file
+        self.open_and_wait(self.path)
+        self.assertEqual(len(self.app.workspace), 1)
+        self.assertEqual(self.app.diagram_name, "Saved")
+
+        # Opening the file of the active tab again opens no copy of it
+        self.open_and_wait(self.path)
+        self.assertEqual(len(self.app.workspace), 1)
+        self.assertEqual(len(self.app.diagram_components), 1)
+
+        self.app.new_diagram()
+        self.assertEqual(self.app.workspace.active, 1)
+        self.open_and_wait(self.path)
+        self.assertEqual(len(self.app.workspace), 2)
+        self.assertEqual(self.app.workspace.active, 0)
+        self.assertEqual(self.app.diagram_path, self.path)
+
 if __name__ == '__main__':
     unittest.main()
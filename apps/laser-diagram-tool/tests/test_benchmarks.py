@@ -0,0 +1,27 @@
+import unittest
+from benchmarks.run_benchmarks import BENCHMARKS, build_diagram, compare, run
+from benchmarks.synthetic import SHAPES
+
+class TestBenchmarks(unittest.TestCase):
+    def test_synthetic_diagrams_have_the_requested_size(self):
+        for shape in SHAPES:
+            for size in (1, 10, 257):
+                diagram = build_diagram(shape, size)
+                self.assertEqual(len(diagram.components), size)
+                for beam in diagram.get_beams():
+                    self.assertTrue(0 <= beam['start'] < size and 0 <= beam['end'] < size)
+
+    def test_every_benchmark_runs_on_small_diagrams(self):
+        results = run(sizes=(10,), repeat=1, log=lambda line: None)
+        self.assertEqual(len(results['results']), len(SHAPES) * len(BENCHMARKS))
+        self.assertTrue(all(case['min'] >= 0 for case in results['results'].values()))
+
+    def test_regressions_are_detected_above_the_threshold(self):
+        baseline = {'results': {'a': {'min': 0.010}, 'b': {'min': 0.010}, 'c': {'min': 0.0001}}}
+        current = {'results': {'a': {'min': 0.012}, 'b': {'min': 0.030}, 'c': {'min': 0.0005},
+                               'new': {'min': 1.0}}}
+        regressions = compare(current, baseline, threshold=1.5)
+        self.assertEqual([case for case, *_ in regressions], ['b'])
+
+if __name__ == '__main__':
+    unittest.main()
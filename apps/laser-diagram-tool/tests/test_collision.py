@@ -0,0 +1,38 @@
+import unittest
+from app.analysis.collision import CollisionChecker, segments_intersect, segment_hits_box
+from tests.helpers import make_component
+
+class TestCollisionChecker(unittest.TestCase):
+    def test_geometry_primitives(self):
+        self.assertTrue(segments_intersect((0, 0, 10, 10), (0, 10, 10, 0)))
+        self.assertFalse(segments_intersect((0, 0, 10, 0), (0, 5, 10, 5)))
+        self.assertTrue(segment_hits_box((0, 0, 100, 0), (40, -5, 60, 5)))
+        self.assertFalse(segment_hits_box((0, 0, 100, 0), (40, 10, 60, 20)))
+
+    def test_beam_through_unrelated_component_is_reported(self):
+        components = [make_component("Laser Source", (0, 0)),
+                      make_component("Photodiode", (600, 0)),
+                      make_component("Lens", (300, 10))]
+        beams = [{'start': 0, 'end': 1}]
+        report = CollisionChecker(components, beams).check()
+
+        self.assertEqual(report.beam_component, [(0, 2)])
+        self.assertEqual(report.offending_components(), {2})
+
+    def test_crossing_beams_and_incremental_move(self):
+        components = [make_component("Laser Source", (0, 0)), make_component("Mirror", (400, 400)),
+                      make_component("Laser Source", (0, 400)), make_component("Mirror", (400, 0))]
+        beams = [{'start': 0, 'end': 1}, {'start': 2, 'end': 3}]
+        checker = CollisionChecker(components, beams)
+        self.assertEqual(checker.check().beam_beam, [(0, 1)])
+
+        # Moving one end below the other beam removes the crossing
+        components[3]['position'] = (400, 800)
+        report = checker.move_component(3)
+        self.assertEqual(len(report), 0)
+
+        components[3]['position'] = (400, 0)
+        self.assertEqual(checker.move_component(3).beam_beam, [(0, 1)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from app.utils.compiler import LatexCompiler, source_hash
+
+# Stand-in for the TeX engine: copies the source to the PDF path, or fails or hangs on request
+FAKE_ENGINE = """
+import os, sys, time
+tex_path, output_dir, format_name = sys.argv[1], sys.argv[2], sys.argv[3]
+source = open(tex_path).read()
+with open(os.path.join(output_dir, "runs.log"), "a") as log:
+    log.write("run\\n")
+if "HANG" in source:
+    time.sleep(30)
+if "FAIL" in source:
+    print("! Undefined control sequence.")
+    sys.exit(1)
+with open(os.path.join(output_dir, "diagram.pdf"), "w") as pdf:
+    pdf.write(format_name + ":" + source)
+"""
+
+# Stand-in for dumping a format: counts the dumps and fails for a BROKEN preamble
+FAKE_DUMP = """
+import sys
+name = sys.argv[1]
+with open("dumps.log", "a") as log:
+    log.write(name + "\\n")
+if "BROKEN" in open(name + ".tex").read():
+    sys.exit(1)
+open(name + ".fmt", "w").close()
+"""
+
+# Stand-in for a warm worker: waits for its input line, then compiles diagram.tex
+FAKE_WORKER = """
+import sys
+format_name = sys.argv[1]
+line = sys.stdin.readline()
+source = open("diagram.tex").read()
+with open("diagram.pdf", "w") as pdf:
+    pdf.write("warm-" + format_name + ":" + source)
+"""
+
+class FakeCompiler(LatexCompiler):
+    def command(self, tex_path, output_dir, format_name=None):
+        return [sys.executable, "-c", FAKE_ENGINE, tex_path, output_dir, str(format_name)]
+
+    def format_command(self, format_name):
+        return [sys.executable, "-c", FAKE_DUMP, format_name]
+
+    def worker_command(self, format_name):
+        return [sys.executable, "-c", FAKE_WORKER, format_name]
+
+    def dumps(self):
+        with open(os.path.join(self.format_dir, "dumps.log")) as log:
+            return log.read().split()
+
+class TestLatexCompiler(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.compiler = FakeCompiler(work_dir=self.work_dir.name)
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def test_unchanged_source_is_not_recompiled(self):
+        first = self.compiler.compile("\\begin{document}A\\end{document}")
+        second = self.compiler.compile("\\begin{document}A\\end{document}")
+
+        self.assertTrue(first.success)
+        self.assertEqual(second.pdf_path, first.pdf_path)
+        with open(os.path.join(os.path.dirname(first.pdf_path), "runs.log")) as log:
+            self.assertEqual(log.read().count("run"), 1)
+
+    def test_failure_reports_the_latex_error(self):
+        result = self.compiler.compile("FAIL")
+        self.assertFalse(result.success)
+        self.assertEqual(result.error_summary(), "! Undefined control sequence.")
+
+    def test_unwritable_job_directory_fails_the_compile(self):
+        code = "\\begin{document}A\\end{document}"
+        # A file where the job directory belongs
+        open(self.compiler.job_dir(source_hash(code)), 'w').close()
+        result = self.compiler.compile(code)
+        self.assertFalse(result.success)
+        self.assertIn("exists", result.log)
+
+    def test_cancel_event_stops_a_running_compile(self):
+        cancel_event = threading.Event()
+        threading.Timer(0.3, cancel_event.set).start()
+        started = time.monotonic()
+        result = self.compiler.compile("HANG", cancel_event)
+
+        self.assertTrue(result.cancelled)
+        self.assertFalse(result.success)
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_format_is_dumped_once_per_preamble(self):
+        first = self.compiler.compile("\\documentclass{standalone}\\begin{document}A\\end{document}")
+        second = self.compiler.compile("\\documentclass{standalone}\\begin{document}B\\end{document}")
+        third = self.compiler.compile("\\documentclass{article}\\begin{document}A\\end{document}")
+
+        self.assertEqual([first.mode, second.mode, third.mode], ['format'] * 3)
+        self.assertGreater(first.timings['format'], 0)
+        self.assertEqual(second.timings['format'], 0)
+        self.assertEqual(len(self.compiler.dumps()), 2)
+        with open(second.pdf_path) as pdf:
+            self.assertTrue(pdf.read().startswith(self.compiler.format_name("\\documentclass{standalone}")))
+        self.assertEqual(self.compiler.timing_summary()['format'][0], 3)
+
+    def test_broken_preamble_falls_back_to_a_plain_compile(self):
+        first = self.compiler.compile("BROKEN\\begin{document}A\\end{document}")
+        second = self.compiler.compile("BROKEN\\begin{document}B\\end{document}")
+
+        self.assertTrue(first.success)
+        self.assertEqual([first.mode, second.mode], ['cold', 'cold'])
+        self.assertEqual(len(self.compiler.dumps()), 1)
+
+    def test_warm_workers_compile_and_are_replaced(self):
+        compiler = FakeCompiler(work_dir=self.work_dir.name, warm_workers=1)
+        self.addCleanup(compiler.close)
+        # The first compile starts the pool, later ones use it
+        compiler.compile("\\documentclass{standalone}\\begin{document}A\\end{document}")
+        result = compiler.compile("\\documentclass{standalone}\\begin{document}B\\end{document}")
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.mode, 'warm')
+        with open(result.pdf_path) as pdf:
+            self.assertTrue(pdf.read().startswith("warm-"))
+        self.assertEqual(len(compiler.idle_workers), 1)
+
+        # A new preamble retires the workers of the old one
+        result = compiler.compile("\\documentclass{article}\\begin{document}B\\end{document}")
+        self.assertEqual(result.mode, 'format')
+        self.assertEqual(compiler.idle_workers[0].format_name, compiler.format_name("\\documentclass{article}"))
+
+    def test_old_job_directories_are_deleted(self):
+        compiler = FakeCompiler(work_dir=self.work_dir.name, use_format=False, max_jobs=3)
+        results = [compiler.compile(f"\\begin{{document}}{i}\\end{{document}}") for i in range(5)]
+        # Using a job again keeps it; only the least recently used ones go
+        compiler.compile("\\begin{document}2\\end{document}")
+        compiler.compile("\\begin{document}5\\end{document}")
+        kept = [os.path.exists(result.pdf_path) for result in results]
+        self.assertEqual(kept, [False, False, True, False, True])
+        self.assertEqual(len(os.listdir(self.work_dir.name)), 3)
+
+    def test_own_working_directory_is_deleted_with_the_compiler(self):
+        compiler = FakeCompiler(use_format=False)
+        work_dir = compiler.work_dir
+        self.assertTrue(compiler.compile("\\begin{document}A\\end{document}").success)
+        del compiler
+        self.assertFalse(os.path.exists(work_dir))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import math
+import unittest
+from app.gui.canvas_manager import CanvasManager
+from app.models.diagram import Diagram
+from app.utils import group_ops
+from app.utils.constraints import ConstraintSolver, axis_constraints, reflection_constraints, spacing_constraints
+from benchmarks.fake_canvas import FakeCanvas
+from tests.helpers import Event, make_component
+
+def grid(columns, rows, spacing=100):
+    """Return a grid of lenses, row by row."""
+    return [make_component("Lens", (100 + c * spacing, 100 + r * spacing))
+            for r in range(rows) for c in range(columns)]
+
+class TestConstraints(unittest.TestCase):
+    def test_reflection_follows_mirror_angle(self):
+        components = [make_component("Laser", (0, 0)), make_component("Mirror", (200, 0), angle="45"),
+                      make_component("Detector", (260, 150))]
+        solver = ConstraintSolver(components)
+        self.assertEqual(reflection_constraints(components, [], range(3)), [('reflection', (0, 1, 2))])
+        solver.add('reflection', (0, 1, 2))
+        solver.add('fixed', (0,))
+        solver.add('fixed', (1,))
+        solver.solve()
+        # A 45 degree mirror turns the beam from the right to straight down
+        x, y = components[2]['position']
+        self.assertAlmostEqual(x, 200, delta=0.02)
+        self.assertGreater(y, 100)
+
+        # Changing the mirror's angle param moves the detector onto the new ray, the one
+        # LayoutEngine.orient_mirrors would give the angle for
+        components[1]['params'] = {**components[1]['params'], 'angle': "60"}
+        solver.solve([1])
+        x, y = components[2]['position']
+        self.assertAlmostEqual(math.degrees(math.atan2(y, x - 200)), 120, delta=0.1)
+        self.assertEqual(components[0]['position'], (0, 0))
+        self.assertEqual(components[1]['position'], (200, 0))
+
+    def test_drag_keeps_constraints(self):
+        components = grid(12, 12)
+        solver = ConstraintSolver(components)
+        for kind, indices in axis_constraints(components, [{'start': i, 'end': i + 1} for i in range(143)
+                                                           if i % 12 != 11] +
+                                              [{'start': i, 'end': i + 12} for i in range(132)], range(144)):
+            solver.add(kind, indices)
+        for row in range(12):
+            for kind, indices in spacing_constraints(components, [], range(row * 12, row * 12 + 12)):
+                solver.add(kind, indices)
+        solver.add('distance', (0, 1), 150)
+        # Stretching the first gap stretches every column apart evenly, and no row moves
+        deltas = solver.solve()
+        self.assertEqual({dy for dx, dy in deltas.values()}, {0})
+        xs = [components[column]['position'][0] for column in range(12)]
+        self.assertTrue(all(abs(b - a - 150) < 0.05 for a, b in zip(xs, xs[1:])))
+
+        deltas = solver.drag([30], 4, 7)
+        self.assertEqual(deltas[30], (4, 7))
+        for index, (x, y) in enumerate(component['position'] for component in components):
+            row, column = divmod(index, 12)
+            self.assertAlmostEqual(y, components[row * 12]['position'][1], delta=0.02)
+            self.assertAlmostEqual(x, components[column]['position'][0], delta=0.02)
+        xs = [components[column]['position'][0] for column in range(12)]
+        self.assertTrue(all(abs(b - a - 150) < 0.05 for a, b in zip(xs, xs[1:])))
+
+    def test_clusters_are_solved_separately(self):
+        components = grid(6, 2)
+        solver = ConstraintSolver(components)
+        for row in (0, 6):
+            for i in range(row, row + 5):
+                solver.add('horizontal', (i, i + 1))
+        self.assertIsNone(solver.add('horizontal', (0, 1)))
+        self.assertEqual(len(solver), 10)
+        self.assertEqual(solver.cluster(2), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(solver.drag([2], 0, 10), {index: (0, 10) for index in range(6)})
+        self.assertEqual([component['position'][1] for component in components[6:]], [200] * 6)
+
+        with self.assertRaises(ValueError):
+            solver.add('parallel', (0, 1))
+        with self.assertRaises(ValueError):
+            solver.add('horizontal', (0, 0))
+        with self.assertRaises(IndexError):
+            solver.add('vertical', (0, 12))
+
+    def test_delete_and_save_keep_constraints(self):
+        components = grid(5, 1)
+        beams = []
+        solver = ConstraintSolver(components)
+        solver.add('distance', (0, 1))
+        solver.add('collinear', (1, 3, 4))
+        solver.add('fixed', (2,))
+        solver.remap(group_ops.delete(components, beams, [2]))
+        self.assertEqual(solver.to_list(), [{'kind': 'distance', 'components': [0, 1], 'value': 100.0},
+                                            {'kind': 'collinear', 'components': [1, 2, 3]}])
+        self.assertFalse(solver.constrained(4))
+
+        diagram = Diagram.from_dict({'components': components, 'beams': beams, 'constraints': solver.to_list()})
+        diagram.remove_component(0)
+        self.assertEqual(diagram.to_dict()['constraints'], [{'kind': 'collinear', 'components': [0, 1, 2]}])
+        loaded = ConstraintSolver(components)
+        loaded.load(solver.to_list() + [{'kind': 'distance', 'components': [0, 9]}, {'kind': 'unknown'}])
+        self.assertEqual(loaded.to_list(), solver.to_list())
+        self.assertNotIn('constraints', Diagram.from_dict({'components': components}).to_dict())
+
+    def test_canvas_drag_moves_constrained_components(self):
+        components = grid(5, 2)
+        changes = []
+        manager = CanvasManager(FakeCanvas(), components, [])
+        manager.constraint_solver = ConstraintSolver(components)
+        manager.constraint_solver.add('vertical', (1, 6))
+        manager.group_listeners.append(lambda operation, indices: changes.append((operation, indices)))
+        manager.redraw_canvas()
+        x, y = components[1]['position']
+        manager.on_mouse_down(Event(x, y))
+        manager.on_mouse_drag(Event(x + 30, y - 10))
+        manager.on_mouse_up(Event(x + 30, y - 10))
+        self.assertEqual(components[1]['position'], (230, 90))
+        self.assertEqual(components[6]['position'], (230, 200))
+        # The beams of the moved component follow it
+        self.assertEqual(manager.canvas.bbox("beam5"), (100, 200, 230, 200))
+        self.assertEqual(changes, [('move', [1, 6])])
+
+if __name__ == '__main__':
+    unittest.main()
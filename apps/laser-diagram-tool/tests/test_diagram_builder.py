@@ -0,0 +1,66 @@
+import time
+import unittest
+import numpy as np
+from app.models.diagram import Diagram
+from app.models.diagram_builder import ComponentBlock, DiagramBuilder, arc_positions, grid_positions, line_positions
+
+class TestDiagramBuilder(unittest.TestCase):
+    def test_block_columns(self):
+        block = ComponentBlock("Lens", "\\lens", line_positions(3, (0, 0), (50, 12.5)),
+                               {'label': "L{i}", 'focal_length': np.array([10, 20.5, 30.0]), 'kind': "thin"},
+                               id_prefix="lens")
+        self.assertEqual(block.component_dicts()[1], {
+            'name': "Lens", 'latex': "\\lens", 'position': (50.0, 12.5), 'id': "lens1",
+            'params': {'label': "L1", 'focal_length': "20.5", 'kind': "thin"}})
+        with self.assertRaises(ValueError):
+            ComponentBlock("Lens", "\\lens", [[0, 0], [1, 1]], {'label': ["a"]})
+        with self.assertRaises(ValueError):
+            ComponentBlock("Lens", "\\lens", [0, 0])
+
+    def test_braced_latex_labels(self):
+        block = ComponentBlock("Lens", "\\lens", line_positions(2),
+                               {'label': "\\textbf{L{i}}", 'note': "\\textbf{L}", 'name': "{i}-{i}"})
+        self.assertEqual([component['params'] for component in block.component_dicts()], [
+            {'label': "\\textbf{L0}", 'note': "\\textbf{L}", 'name': "0-0"},
+            {'label': "\\textbf{L1}", 'note': "\\textbf{L}", 'name': "1-1"}])
+
+    def test_whole_positions_are_ints(self):
+        positions = grid_positions(2, 3, origin=(10, 20), spacing=(100, 50))
+        components = ComponentBlock("Photodiode", "\\optdetector", positions).component_dicts()
+        self.assertEqual([component['position'] for component in components],
+                         [(10, 20), (110, 20), (210, 20), (10, 70), (110, 70), (210, 70)])
+        self.assertIsInstance(components[0]['position'][0], int)
+
+    def test_builder_wires_beams(self):
+        builder = DiagramBuilder("Fan-out")
+        laser = builder.add("Laser", "\\laser", [[0, 300]], {'label': "Laser"})
+        lenses = builder.add("Lens", "\\lens", arc_positions(8, (0, 300), 200), {'label': "L{i}"})
+        detectors = builder.add_template(("Photodiode", "\\optdetector", {'label': "PD"}),
+                                         arc_positions(8, (0, 300), 400), {'label': "PD{i}"})
+        builder.fan_out(laser[0], lenses)
+        builder.connect(lenses, detectors, "narrow")
+        with self.assertRaises(IndexError):
+            builder.connect([0], [17])
+
+        diagram = builder.build()
+        self.assertIsInstance(diagram, Diagram)
+        self.assertEqual(len(diagram.components), 17)
+        self.assertEqual(diagram.components[9].params, {'label': "PD0"})
+        self.assertEqual(diagram.beams[:2], [{'start': 0, 'end': 1, 'type': 'wide'},
+                                             {'start': 0, 'end': 2, 'type': 'wide'}])
+        self.assertEqual(diagram.beams[8], {'start': 1, 'end': 9, 'type': 'narrow'})
+        self.assertEqual(diagram.get_component_dicts(), builder.component_dicts())
+        self.assertEqual(Diagram.from_dict(diagram.to_dict()).to_dict(), diagram.to_dict())
+
+    def test_large_layout_is_fast(self):
+        start = time.perf_counter()
+        builder = DiagramBuilder("Grid")
+        detectors = builder.add("Photodiode", "\\optdetector", grid_positions(250, 400), {'label': "D{i}"})
+        builder.chain(detectors)
+        diagram = builder.build()
+        elapsed = time.perf_counter() - start
+        self.assertEqual((len(diagram.components), len(diagram.beams)), (100000, 99999))
+        self.assertLess(elapsed, 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
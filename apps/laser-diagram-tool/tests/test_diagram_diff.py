@@ -0,0 +1,164 @@
+import copy
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from app.models.diagram_diff import DiagramDiff, carry_ids, main, match_components, merge
+
+def make_data(count, ids=True):
+    """Return diagram file data of a row of lenses with explicit beams."""
+    components = [{'name': "Lens", 'latex': "\\lens", 'params': {'label': f"L{i}"}, 'position': [i * 100, 0]}
+                  for i in range(count)]
+    if ids:
+        for i, component in enumerate(components):
+            component['id'] = f"c{i}"
+    return {'name': "Row", 'components': components,
+            'beams': [{'start': i, 'end': i + 1, 'type': 'wide'} for i in range(count - 1)]}
+
+def remove_component(data, index):
+    """Remove a component and its beams like Diagram.remove_component."""
+    del data['components'][index]
+    data['beams'] = [{**beam, 'start': beam['start'] - (beam['start'] > index),
+                      'end': beam['end'] - (beam['end'] > index)}
+                     for beam in data['beams'] if index not in (beam['start'], beam['end'])]
+
+class CountingComponent(dict):
+    """Component dict counting the equality comparisons made between components."""
+
+    comparisons = 0
+
+    def __eq__(self, other):
+        CountingComponent.comparisons += 1
+        return super().__eq__(other)
+
+    __hash__ = None
+
+class TestDiagramDiff(unittest.TestCase):
+    def test_identical(self):
+        data = make_data(10)
+        self.assertFalse(DiagramDiff(data, copy.deepcopy(data)))
+
+    def test_changes_by_id(self):
+        old = make_data(10)
+        new = copy.deepcopy(old)
+        new['components'][3]['position'] = [5, 5]
+        remove_component(new, 7)
+        new['components'].reverse()
+        new['beams'] = [{**beam, 'start': 8 - beam['start'], 'end': 8 - beam['end']} for beam in new['beams']]
+        new['components'].append({'name': "Mirror", 'latex': "\\mirror", 'params': {'label': "M"},
+                                  'position': [0, 0], 'id': "m"})
+        diff = DiagramDiff(old, new)
+        self.assertEqual(diff.added, [9])
+        self.assertEqual(diff.removed, [7])
+        self.assertEqual(diff.modified, [(3, 5)])
+        self.assertEqual(len(diff.beams_removed), 2)
+        self.assertEqual(diff.beams_added, [])
+
+    def test_matching_without_ids(self):
+        old = make_data(6, ids=False)['components']
+        new = copy.deepcopy(old)
+        new[1]['position'] = [7, 7]
+        new[2]['params']['label'] = "Moved"
+        new[4], new[5] = new[5], new[4]
+        del new[0]
+        self.assertEqual(match_components(old, new), [1, 2, 3, 5, 4])
+        carry_ids(make_data(6)['components'], new)
+        self.assertEqual([component['id'] for component in new], ["c1", "c2", "c3", "c5", "c4"])
+
+    def test_merge_combines_changes(self):
+        base = make_data(10)
+        ours = copy.deepcopy(base)
+        theirs = copy.deepcopy(base)
+        ours['components'][2]['position'] = [1, 1]
+        ours['components'][4]['params']['label'] = "Ours"
+        theirs['components'][4]['position'] = [9, 9]
+        remove_component(theirs, 8)
+        theirs['components'].append({'name': "Mirror", 'latex': "\\mirror", 'params': {'label': "M"},
+                                     'position': [0, 0], 'id': "m"})
+        theirs['beams'].append({'start': 7, 'end': 9, 'type': 'wide'})
+        theirs['name'] = "Merged"
+
+        data, conflicts = merge(base, ours, theirs)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(data['name'], "Merged")
+        components = {component['id']: component for component in data['components']}
+        self.assertNotIn("c8", components)
+        self.assertEqual(components["c2"]['position'], [1, 1])
+        self.assertEqual(components["c4"]['position'], [9, 9])
+        self.assertEqual(components["c4"]['params']['label'], "Ours")
+        ids = [component['id'] for component in data['components']]
+        beams = {(ids[beam['start']], ids[beam['end']]) for beam in data['beams']}
+        self.assertEqual(beams, {(f"c{i}", f"c{i + 1}") for i in range(7)} | {("c7", "m")})
+
+    def test_merge_conflicts(self):
+        base = make_data(5)
+        ours = copy.deepcopy(base)
+        theirs = copy.deepcopy(base)
+        ours['components'][1]['params']['label'] = "A"
+        theirs['components'][1]['params']['label'] = "B"
+        ours['components'][2]['position'] = [3, 3]
+        remove_component(theirs, 2)
+
+        data, conflicts = merge(base, ours, theirs)
+        kinds = sorted((conflict.kind, conflict.field) for conflict in conflicts)
+        self.assertEqual(kinds, [('modify/delete', None), ('modify/modify', 'label')])
+        self.assertEqual(data['components'][1]['params']['label'], "A")
+        self.assertEqual(len(data['components']), 5)
+
+    def test_merge_remaps_constraints(self):
+        base = make_data(3)
+        base['constraints'] = [{'kind': 'fixed', 'components': [2]}]
+        ours = copy.deepcopy(base)
+        theirs = copy.deepcopy(base)
+        ours['constraints'] += [{'kind': 'distance', 'components': [1, 2], 'value': 150.0},
+                                {'kind': 'vertical', 'components': [0, 1]}]
+        # Theirs deletes the first component, renumbering its constraints like the editor does
+        remove_component(theirs, 0)
+        theirs['constraints'] = [{'kind': 'fixed', 'components': [1]}, {'kind': 'horizontal', 'components': [0, 1]}]
+
+        data, conflicts = merge(base, ours, theirs)
+        self.assertEqual(conflicts, [])
+        self.assertEqual([component['id'] for component in data['components']], ["c1", "c2"])
+        # Indices follow the merged components, and the constraint on the deleted one is gone
+        self.assertEqual(data['constraints'], [{'kind': 'fixed', 'components': [1]},
+                                               {'kind': 'distance', 'components': [0, 1], 'value': 150.0},
+                                               {'kind': 'horizontal', 'components': [0, 1]}])
+
+        # Constraints removed on one side are removed from the merge
+        theirs['constraints'] = []
+        self.assertNotIn('constraints', merge(base, base, theirs)[0])
+
+    def test_large_diff_compares_each_component_once(self):
+        for ids in (True, False):
+            old = make_data(100000, ids)
+            old['components'] = [CountingComponent(component) for component in old['components']]
+            new = copy.deepcopy(old)
+            for i in range(0, 100000, 2000):
+                new['components'][i]['position'] = [1, 2]
+            remove_component(new, 500)
+            CountingComponent.comparisons = 0
+            diff = DiagramDiff(old, new)
+            self.assertEqual((len(diff.modified), len(diff.removed)), (50, 1))
+            # Matching is linear: a few comparisons per component, never one per pair
+            self.assertLess(CountingComponent.comparisons, 3 * 100000)
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f"{name}.json") for name in ("base", "ours", "theirs", "out")]
+            base = make_data(4)
+            ours = copy.deepcopy(base)
+            ours['components'][0]['position'] = [1, 1]
+            for path, data in zip(paths, (base, ours, base)):
+                with open(path, 'w') as file:
+                    json.dump(data, file)
+            with redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(main(['diff', paths[0], paths[1]]), 1)
+            self.assertIn("1 modified", output.getvalue())
+            self.assertEqual(main(['merge', *paths[:3], '-o', paths[3]]), 0)
+            with open(paths[3]) as file:
+                self.assertEqual(json.load(file)['components'][0]['position'], [1, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from app.utils.figure_catalog import FigureCatalog, figure_to_diagram, main, scan_figure
+
+FIGURE = r"""\documentclass{standalone}
+\usepackage{pst-optexp}
+\begin{document}
+\begin{pspicture}(-2,-2)(12,6)
+    \pnodes(0,0){Src}(2,0){L1}(4,0){BS}(4,2){Det}
+    \pnode(6,0){End}
+    \begin{optexp}
+        % \lens(Src)(L1){Commented}
+        \optbox[position=start, innerlabel](Src)(L1){Pump\\915 nm}
+        \lens[lensradius=1, lenstype=objective](L1)(BS){\textbf{OBJ}}
+        \beamsplitter[bsstyle=cube](L1)(BS)(Det){PBS}
+        \optbox[position=end](BS)(End){Camera}
+        \drawwidebeam(Src)(L1)(BS)(End)
+    \end{optexp}
+\end{pspicture}
+\end{document}
+"""
+
+def write(path, text):
+    """Write text to path, creating its directory."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+class TestFigureCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        write(os.path.join(self.root, "setups", "microscope.tex"), FIGURE)
+        write(os.path.join(self.root, "ring.tex"),
+              "\\begin{optexp}\\mirror(A)(B)(C){M1}\\mirror(B)(C)(A){M2}\\end{optexp}")
+        self.catalog = FigureCatalog(self.root)
+
+    def tearDown(self):
+        self.catalog.close()
+        self.directory.cleanup()
+
+    def test_scan_figure(self):
+        info = scan_figure(FIGURE)
+        self.assertEqual(info.component_count, 4)
+        self.assertEqual(info.labels, ["Pump\\\\915 nm", "\\textbf{OBJ}", "PBS", "Camera"])
+        self.assertEqual(info.commands['optbox'], 2)
+        self.assertEqual(info.commands['drawwidebeam'], 1)
+        self.assertNotIn('Commented', " ".join(info.labels))
+        self.assertEqual(info.nodes['Det'], (4.0, 2.0))
+        self.assertEqual(info.nodes['End'], (6.0, 0.0))
+
+    def test_incremental_update(self):
+        stats = self.catalog.update()
+        self.assertEqual((stats.scanned, stats.indexed, stats.removed), (2, 2, 0))
+        self.assertEqual(self.catalog.update().indexed, 0)
+
+        # A changed file is reindexed and a deleted one dropped
+        path = os.path.join(self.root, "ring.tex")
+        write(path, "\\begin{optexp}\\lens(A)(B){Relay}\\end{optexp}")
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+        os.remove(os.path.join(self.root, "setups", "microscope.tex"))
+        stats = self.catalog.update()
+        self.assertEqual((stats.scanned, stats.indexed, stats.removed), (1, 1, 1))
+        self.assertEqual([match.path for match in self.catalog.search("relay")], ["ring.tex"])
+        self.assertEqual(self.catalog.search("pbs"), [])
+
+        # The index persists between catalogs
+        self.catalog.close()
+        self.catalog = FigureCatalog(self.root)
+        self.assertEqual(len(self.catalog), 1)
+        self.assertEqual(self.catalog.update().indexed, 0)
+
+    def test_cancel_and_concurrent_updates(self):
+        for i in range(450):
+            write(os.path.join(self.root, "many", f"f{i:03}.tex"), f"\\begin{{optexp}}\\lens(A)(B){{L{i}}}\\end{{optexp}}")
+
+        class CountdownEvent:
+            """Cancel event that becomes set after a number of checks."""
+
+            def __init__(self, checks):
+                self.checks = checks
+
+            def is_set(self):
+                self.checks -= 1
+                return self.checks < 0
+
+        # Cancelling stops before the next file, keeping those parsed so far
+        self.assertEqual(self.catalog.update(cancel_event=CountdownEvent(5)).indexed, 5)
+
+        # A second catalog of the tree stores files while the first one's update runs
+        other = FigureCatalog(self.root)
+        self.addCleanup(other.close)
+        runs = []
+
+        def interleave(done, total):
+            if not runs:
+                runs.append(other.update())
+
+        stats = self.catalog.update(progress=interleave)
+        self.assertEqual(stats.indexed, 447)
+        self.assertEqual(runs[0].indexed, 247)
+        self.assertEqual(len(self.catalog), 452)
+        self.assertEqual(len(self.catalog.search("L449")), 1)
+
+    def test_search(self):
+        self.catalog.update()
+        microscope = os.path.join("setups", "microscope.tex")
+        # Every word must match; words match as prefixes of labels, commands and file names
+        self.assertEqual([match.path for match in self.catalog.search("obj pbs")], [microscope])
+        self.assertEqual([match.path for match in self.catalog.search("mirror")], ["ring.tex"])
+        self.assertEqual([match.path for match in self.catalog.search("micro")], [microscope])
+        self.assertEqual(self.catalog.search("obj m1"), [])
+        match = self.catalog.search("beamsplitter")[0]
+        self.assertEqual(match.component_count, 4)
+        self.assertEqual(match.commands['lens'], 1)
+        # An empty query lists the largest figures first
+        self.assertEqual([match.path for match in self.catalog.search("")], [microscope, "ring.tex"])
+
+    def test_figure_to_diagram(self):
+        data = figure_to_diagram(FIGURE, "Microscope")
+        self.assertEqual(data['name'], "Microscope")
+        names = [component['name'] for component in data['components']]
+        self.assertEqual(names, ["Laser Source", "Objective Lens", "Polarizing Beam Splitter", "Photodiode"])
+        positions = [tuple(component['position']) for component in data['components']]
+        self.assertEqual(positions, [(0, 0), (150, 0), (200, 0), (300, 0)])
+        self.assertEqual(data['components'][2]['latex'], "\\beamsplitter[bsstyle=cube]")
+        self.assertEqual(data['components'][2]['params']['label'], "PBS")
+        self.assertEqual(len({component['id'] for component in data['components']}), 4)
+        self.assertEqual([(beam['start'], beam['end']) for beam in data['beams']], [(0, 1), (1, 2), (2, 3)])
+
+    def test_cli(self):
+        with redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(main([self.root, "index"]), 0)
+        self.assertEqual(output.getvalue(), "2 figures, 2 indexed, 0 removed\n")
+        with redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(main([self.root, "search", "pbs"]), 0)
+        self.assertEqual(output.getvalue().split("\t")[:2],
+                         [os.path.join("setups", "microscope.tex"), "4 components"])
+        with redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(main([self.root, "search", "nothing"]), 1)
+        self.assertEqual(output.getvalue(), "")
+        path = os.path.join(self.root, "imported.json")
+        with redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(main([self.root, "import", "ring.tex", "-o", path]), 0)
+        self.assertEqual(output.getvalue(), "")
+        self.assertTrue(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
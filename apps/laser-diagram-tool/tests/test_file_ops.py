@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from app.models.diagram import Diagram
+from app.utils.file_ops import FileOperation, OperationCancelled, load_diagram, save_diagram
+
+def make_diagram(count):
+    """Return a diagram of a row of lenses with explicit beams."""
+    diagram = Diagram("Row")
+    for i in range(count):
+        diagram.add_component({'name': "Lens", 'latex': "\\lens", 'params': {'label': f"L{i}"},
+                               'position': [i * 100, 0]})
+    diagram.beams = [{'start': i, 'end': i + 1, 'type': 'wide'} for i in range(count - 1)]
+    return diagram
+
+def run_to_end(operation):
+    """Start an operation, wait for it and return its messages."""
+    operation.start()
+    operation.thread.join(10)
+    return operation.poll()
+
+class TestFileOps(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "diagram.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_matches_diagram_save(self):
+        diagram = make_diagram(5)
+        progress = []
+        save_diagram(diagram.to_dict(), self.path, progress.append)
+        with open(self.path) as file:
+            self.assertEqual(file.read(), json.dumps(diagram.to_dict(), indent=2))
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 1.0)
+        self.assertEqual(Diagram.load(self.path).to_dict(), diagram.to_dict())
+
+    def test_cancelled_save_keeps_the_old_file(self):
+        make_diagram(2).save(self.path)
+        with open(self.path) as file:
+            original = file.read()
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with self.assertRaises(OperationCancelled):
+            save_diagram(make_diagram(50).to_dict(), self.path, cancel_event=cancel_event)
+        with open(self.path) as file:
+            self.assertEqual(file.read(), original)
+        self.assertEqual(os.listdir(self.directory.name), ["diagram.json"])
+
+    def test_load_streams_components_in_batches(self):
+        make_diagram(25).save(self.path)
+        batches = []
+        progress = []
+        diagram = load_diagram(self.path, progress.append, on_components=batches.append, batch_size=10)
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        self.assertEqual(batches[2][-1]['params']['label'], "L24")
+        self.assertEqual(len(diagram.beams), 24)
+        self.assertEqual(diagram.file_path, self.path)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 1.0)
+
+    def test_operation_posts_progress_components_and_result(self):
+        make_diagram(30).save(self.path)
+        messages = run_to_end(FileOperation.load(self.path, batch_size=10))
+        kinds = [kind for kind, _ in messages]
+        self.assertEqual(kinds.count('components'), 3)
+        self.assertIn('progress', kinds)
+        self.assertEqual(kinds[-1], 'done')
+        self.assertEqual(len(messages[-1][1].components), 30)
+
+    def test_poll_limit(self):
+        make_diagram(30).save(self.path)
+        operation = FileOperation.load(self.path, batch_size=10).start()
+        operation.thread.join(10)
+        self.assertEqual(len(operation.poll(limit=2)), 2)
+        self.assertFalse(operation.finished)
+        self.assertEqual(operation.poll()[-1][0], 'done')
+        self.assertTrue(operation.finished)
+
+    def test_cancelled_and_failed_operations(self):
+        make_diagram(3).save(self.path)
+        operation = FileOperation.load(self.path)
+        operation.cancel()
+        self.assertEqual(run_to_end(operation)[-1], ('cancelled', None))
+        self.assertTrue(operation.finished)
+
+        kind, error = run_to_end(FileOperation.load(os.path.join(self.directory.name, "missing.json")))[-1]
+        self.assertEqual(kind, 'error')
+        self.assertIsInstance(error, FileNotFoundError)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from app.gui.canvas_manager import CanvasManager
+from app.utils import group_ops
+from app.utils.snapping import SnapEngine
+from benchmarks.fake_canvas import FakeCanvas
+from tests.helpers import Event, make_beams, make_components
+
+class RecordingCanvas(FakeCanvas):
+    """Fake canvas counting the item commands it receives."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def move(self, tag_or_id, dx, dy):
+        self.calls += 1
+        super().move(tag_or_id, dx, dy)
+
+    def coords(self, tag_or_id, *coords):
+        self.calls += 1
+        super().coords(tag_or_id, *coords)
+
+class TestGroupOps(unittest.TestCase):
+    def test_rotate_four_times_restores_positions(self):
+        components = make_components(4)
+        components[1]['position'] = (150, 260)
+        original = [component['position'] for component in components]
+        deltas = group_ops.rotate(components, range(4), 90)
+        self.assertEqual(components[0]['position'], (280, 80))
+        self.assertEqual(len(deltas), 4)
+        for _ in range(3):
+            group_ops.rotate(components, range(4), 90)
+        self.assertEqual([component['position'] for component in components], original)
+
+    def test_align_and_distribute(self):
+        components = make_components(4)
+        components[2]['position'] = (330, 260)
+        deltas = group_ops.align(components, [0, 2, 3], 'bottom')
+        self.assertEqual(sorted(deltas), [0, 3])
+        self.assertEqual({components[i]['position'][1] for i in (0, 2, 3)}, {260})
+        self.assertEqual(components[1]['position'], (200, 200))
+        group_ops.distribute(components, range(4), 'x')
+        self.assertEqual([component['position'][0] for component in components], [100, 200, 300, 400])
+        with self.assertRaises(ValueError):
+            group_ops.align(components, range(4), 'middle')
+
+    def test_delete_renumbers_beams(self):
+        components = make_components(5)
+        beams = make_beams(5, 'wide') + [{'start': 4, 'end': 0, 'type': 'wide'}]
+        mapping = group_ops.delete(components, beams, [1, 3])
+        self.assertEqual(mapping, [0, None, 1, None, 2])
+        self.assertEqual([component['params']['label'] for component in components], ["L0", "L2", "L4"])
+        self.assertEqual(beams, [{'start': 2, 'end': 0, 'type': 'wide'}])
+
+    def test_rubber_band_and_shift_click(self):
+        components = make_components(6)
+        manager = CanvasManager(FakeCanvas(), components, [])
+        manager.redraw_canvas()
+        manager.on_mouse_down(Event(50, 100))
+        manager.on_mouse_drag(Event(350, 300))
+        manager.on_mouse_up(Event(350, 300))
+        self.assertEqual(manager.selection, {0, 1, 2})
+        self.assertEqual(manager.boundary_beams, [(2, 2, 3)])
+        manager.on_mouse_down(Event(500, 200, state=1))
+        manager.on_mouse_up(Event(500, 200, state=1))
+        manager.on_mouse_down(Event(100, 200, state=1))
+        manager.on_mouse_up(Event(100, 200, state=1))
+        self.assertEqual(manager.selection, {1, 2, 4})
+        self.assertIsNone(manager.band_item)
+        self.assertFalse(manager.canvas._matching("rubberband"))
+
+    def test_group_drag_is_one_batch_per_event(self):
+        components = make_components(50)
+        changes = []
+        canvas = RecordingCanvas()
+        manager = CanvasManager(canvas, components, [])
+        manager.group_listeners.append(lambda operation, indices: changes.append((operation, indices)))
+        manager.redraw_canvas()
+        manager.set_selection(range(10, 40))
+        x, y = components[20]['position']
+        manager.on_mouse_down(Event(x, y))
+        canvas.calls = 0
+        manager.on_mouse_drag(Event(x + 15, y + 5))
+        # One move of the shared tag, plus the two beams leaving the selection
+        self.assertEqual(canvas.calls, 3)
+        manager.on_mouse_up(Event(x + 15, y + 5))
+        self.assertEqual(components[10]['position'], (1115, 205))
+        self.assertEqual(components[9]['position'], (1000, 200))
+        self.assertEqual(canvas.bbox("beam9"), (1000, 200, 1115, 205))
+        self.assertEqual(changes, [('move', list(range(10, 40)))])
+
+    def test_small_group_drag_does_not_snap_to_itself(self):
+        components = make_components(4)
+        components[1]['position'] = (200, 300)
+        components[2]['position'] = (300, 300)
+        beams = [{'start': 1, 'end': 2, 'type': 'beam'}]
+        manager = CanvasManager(FakeCanvas(), components, beams)
+        manager.snap_engine = SnapEngine(grid_size=0, tolerance=8)
+        manager.snap_engine.rebuild(components, beams)
+        manager.redraw_canvas()
+        manager.set_selection([1, 2])
+        manager.on_mouse_down(Event(200, 300))
+        # Within the tolerance of the row the selection left, but nothing else is on it
+        manager.on_mouse_drag(Event(205, 304))
+        manager.on_mouse_up(Event(205, 304))
+        self.assertEqual(components[1]['position'], (205, 304))
+        self.assertEqual(components[2]['position'], (305, 304))
+        # The selection and its beam are back in the indexes at their new row
+        self.assertEqual(manager.snap_engine.ys.values, [200, 200, 304, 304, 304])
+
+    def test_transform_and_delete_selection(self):
+        components = make_components(5)
+        beams = []
+        manager = CanvasManager(FakeCanvas(), components, beams)
+        manager.redraw_canvas()
+        manager.set_selection([0, 2])
+        manager.transform_selection(group_ops.align, 'left')
+        self.assertEqual(manager.canvas.bbox("beam1"), (100, 200, 200, 200))
+        manager.delete_selection()
+        self.assertEqual([component['params']['label'] for component in components], ["L1", "L3", "L4"])
+        self.assertEqual(manager.selection, set())
+
+if __name__ == '__main__':
+    unittest.main()
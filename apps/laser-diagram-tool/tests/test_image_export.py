@@ -0,0 +1,93 @@
+import os
+import tempfile
+import time
+import unittest
+import zlib
+from unittest.mock import patch
+import xml.etree.ElementTree as ET
+import numpy as np
+from app.utils.export import PNG_MAX_SIZE, PDFExporter
+from app.utils.image_export import encode_png, iter_svg, render_image
+from app.utils.shapes import COLORS
+from tests.helpers import make_component
+
+class TestImageExport(unittest.TestCase):
+    def setUp(self):
+        self.components = [make_component("Laser Source", (100, 100)),
+                           make_component("Thin Lens", (300, 100)),
+                           make_component("Photodiode", (500, 100), label="PD <1>")]
+
+    def test_svg_has_one_group_per_component_and_one_line_per_beam(self):
+        root = ET.fromstring("".join(iter_svg(self.components)))
+        groups = [element for element in root if element.tag.endswith('g')]
+        beams = [element for element in root if element.tag.endswith('line')]
+
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(len(beams), 2)
+        # Labels are escaped
+        texts = [element.text for element in root.iter() if element.tag.endswith('text')]
+        self.assertIn("PD <1>", texts)
+
+    def test_raster_draws_fills_beams_and_outlines(self):
+        image = render_image(self.components)
+        # Bounds are the component positions plus a margin on every side
+        self.assertEqual(image.shape, (100, 500, 3))
+
+        laser_fill = image[50 - 20, 50 - 30]
+        self.assertEqual(tuple(laser_fill), COLORS["light yellow"])
+        # The dashed red beam between the lens and the detector
+        beam_row = image[50, 340:400]
+        self.assertTrue((beam_row == COLORS["red"]).all(axis=1).any())
+        # The lens outline crosses the row through its centre
+        self.assertTrue((image[46, 214:223] == 0).all(axis=1).any())
+
+    def test_png_encoding_round_trips(self):
+        image = render_image(self.components, max_size=200)
+        self.assertLessEqual(max(image.shape[:2]), 200)
+        data = encode_png(image)
+
+        self.assertTrue(data.startswith(b"\x89PNG\r\n\x1a\n"))
+        idat = data.index(b"IDAT")
+        length = int.from_bytes(data[idat - 4:idat], "big")
+        raw = np.frombuffer(zlib.decompress(data[idat + 4:idat + 4 + length]), dtype=np.uint8)
+        height, width = image.shape[:2]
+        rows = raw.reshape(height, width * 3 + 1)
+        self.assertTrue((rows[:, 0] == 0).all())
+        self.assertTrue((rows[:, 1:].reshape(image.shape) == image).all())
+
+    def test_png_export_is_capped_and_runs_in_the_background(self):
+        # Wide enough for an image of 30000 pixels at full scale
+        components = [make_component("Thin Lens", (i * 1000, 100)) for i in range(31)]
+        scheduled = []
+
+        class Widget:
+            def after(self, delay, callback):
+                scheduled.append(callback)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "diagram.png")
+            with patch('app.utils.export.filedialog.asksaveasfilename', return_value=path), \
+                 patch('app.utils.export.messagebox') as messagebox:
+                PDFExporter().export_png(components, widget=Widget())
+                # The call returns at once and the widget's event loop polls for the outcome
+                self.assertEqual(len(scheduled), 1)
+                while scheduled:
+                    time.sleep(0.01)
+                    scheduled.pop()()
+                messagebox.showinfo.assert_called_once()
+            with open(path, 'rb') as file:
+                header = file.read(24)
+        width, height = int.from_bytes(header[16:20], "big"), int.from_bytes(header[20:24], "big")
+        self.assertEqual(width, PNG_MAX_SIZE)
+        self.assertLess(height, PNG_MAX_SIZE)
+
+    def test_png_export_reports_unexpected_errors(self):
+        with patch('app.utils.export.filedialog.asksaveasfilename', return_value="diagram.png"), \
+             patch('app.utils.export.write_png', side_effect=MemoryError("out of memory")), \
+             patch('app.utils.export.messagebox') as messagebox:
+            PDFExporter().export_png(self.components)
+        messagebox.showerror.assert_called_once_with("Error", "PNG export failed: out of memory")
+        messagebox.showinfo.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
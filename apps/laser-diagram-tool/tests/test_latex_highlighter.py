@@ -0,0 +1,56 @@
+import unittest
+from app.gui.latex_highlighter import DirtyLines, changed_lines, tokenize_line
+
+class TestLatexHighlighter(unittest.TestCase):
+    def tokens(self, line):
+        return [(tag, line[start:end]) for tag, start, end in tokenize_line(line)]
+
+    def test_tokenizes_commands_options_nodes_and_comments(self):
+        self.assertEqual(self.tokens(r"    \lens[lens=0.5 0.5 1.4](N0)(N1){L1} % first lens"),
+                         [('command', r"\lens"), ('option', "[lens=0.5 0.5 1.4]"), ('node', "(N0)"),
+                          ('node', "(N1)"), ('comment', "% first lens")])
+
+    def test_node_definitions_follow_coordinates(self):
+        self.assertEqual(self.tokens(r"\pnodes(1.0,2.0){N0}(3,4){N1}"),
+                         [('command', r"\pnodes"), ('node', "{N0}"), ('node', "{N1}")])
+        # A label after node references is not a node
+        self.assertNotIn(('node', "{L1}"), self.tokens(r"\lens(N0)(N1){L1}"))
+
+    def test_escaped_percent_is_not_a_comment(self):
+        self.assertEqual(self.tokens(r"50\% % note"), [('command', r"\%"), ('comment', "% note")])
+
+    def test_unclosed_option_runs_to_end_of_line(self):
+        self.assertEqual(self.tokens(r"\psset[unit=1"), [('command', r"\psset"), ('option', "[unit=1")])
+
+    def test_changed_lines_skips_common_prefix_and_suffix(self):
+        old = ["a", "b", "c", "d"]
+        self.assertEqual(changed_lines(old, ["a", "x", "y", "c", "d"]), (1, 2, 3))
+        self.assertEqual(changed_lines(old, old), (4, 4, 4))
+        self.assertEqual(changed_lines(old, ["a", "b"]), (2, 4, 2))
+
+    def test_dirty_lines_merge_and_shift(self):
+        dirty = DirtyLines()
+        dirty.mark(10, 12)
+        dirty.mark(13, 15)
+        dirty.mark(30, 30)
+        self.assertEqual(dirty.ranges, [[10, 15], [30, 30]])
+
+        # Two lines inserted after line 20 move what follows
+        dirty.shift(20, 2)
+        self.assertEqual(dirty.ranges, [[10, 15], [32, 32]])
+        # Lines 12 to 14 joined into line 11
+        dirty.shift(11, -3)
+        self.assertEqual(dirty.ranges, [[10, 12], [29, 29]])
+
+    def test_pop_prefers_visible_lines_in_chunks(self):
+        dirty = DirtyLines()
+        dirty.mark(1, 1000)
+        dirty.mark(5000, 5100)
+        self.assertEqual(dirty.pop(50, visible=(5020, 5060)), (5020, 5069))
+        self.assertEqual(dirty.pop(50, visible=(5060, 5100)), (5070, 5100))
+        self.assertEqual(dirty.ranges, [[1, 1000], [5000, 5019]])
+        self.assertEqual(dirty.pop(400), (1, 400))
+        self.assertEqual(dirty.ranges, [[401, 1000], [5000, 5019]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from app.utils.layout import LayoutEngine
+from tests.helpers import make_component
+
+class TestLayoutEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = LayoutEngine(spacing=(100, 100), origin=(0, 0))
+
+    def test_chain_is_laid_out_along_one_row(self):
+        components = [make_component("Laser Source")] + [make_component("Lens") for _ in range(3)]
+        positions = self.engine.layout(components)
+
+        self.assertEqual([tuple(p) for p in positions], [(0, 0), (100, 0), (200, 0), (300, 0)])
+
+    def test_branches_turn_into_free_lanes_without_overlap(self):
+        components = [
+            make_component("Laser Source"),
+            make_component("Beam Splitter"),
+            make_component("Mirror", angle="45"),
+            make_component("Mirror", angle="45"),
+            make_component("Photodiode"),
+        ]
+        beams = [{'start': 0, 'end': 1}, {'start': 1, 'end': 2}, {'start': 1, 'end': 3}, {'start': 3, 'end': 4}]
+        positions = self.engine.apply(components, beams)
+
+        self.assertEqual(len({tuple(p) for p in positions}), len(components))
+        # The reflected arm drops straight down from the splitter, then turns right
+        self.assertEqual(tuple(positions[3]), (100, 100))
+        self.assertEqual(tuple(positions[4]), (200, 100))
+        self.assertIn(components[3]['params']['angle'], ("45", "135"))
+
+    def test_selection_avoids_fixed_components(self):
+        components = [make_component("Laser Source", (0, 0)), make_component("Lens", (100, 0)),
+                      make_component("Lens", (500, 500)), make_component("Lens", (900, 900))]
+        positions = self.engine.layout(components, selection=[0, 2, 3])
+
+        self.assertEqual(tuple(positions[1]), (100, 0))
+        self.assertEqual(len({tuple(p) for p in positions}), len(components))
+
+    def test_new_components_continue_the_last_row(self):
+        components = [make_component("Laser Source", (0, 0)), make_component("Lens", (100, 0))]
+        self.assertEqual(self.engine.find_free_position(components), (200, 0))
+        self.assertEqual(self.engine.find_free_position([]), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from app.utils.latex_generator import LatexGenerator
+from app.utils.profiling import NULL_SPAN, PROFILER, Profiler
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = Profiler()
+
+    def test_disabled_profiler_records_nothing(self):
+        self.assertIs(self.profiler.span("stage"), NULL_SPAN)
+        with self.profiler.span("stage"):
+            pass
+        self.profiler.count("items")
+        self.assertEqual(self.profiler.events, [])
+        self.assertEqual(self.profiler.counters, {})
+
+    def test_spans_and_counters_export_as_chrome_trace(self):
+        self.profiler.enable()
+
+        @self.profiler.profiled("inner", "test")
+        def inner():
+            self.profiler.count("items", 3)
+
+        with self.profiler.span("outer", "test", size=2):
+            inner()
+        worker = threading.Thread(target=inner)
+        worker.start()
+        worker.join()
+
+        trace = self.profiler.chrome_trace()['traceEvents']
+        spans = {event['name']: event for event in trace if event['ph'] == "X"}
+        self.assertEqual(set(spans), {"outer", "inner"})
+        self.assertLessEqual(spans['outer']['ts'], spans['inner']['ts'])
+        self.assertEqual(spans['outer']['args'], {'size': "2"})
+        self.assertEqual(len({event['tid'] for event in trace if event['ph'] == "X"}), 2)
+        self.assertEqual([event['args']['items'] for event in trace if event['ph'] == "C"], [3, 6])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            self.profiler.write_chrome_trace(path)
+            with open(path) as file:
+                self.assertEqual(len(json.load(file)['traceEvents']), len(trace))
+
+        rows = {row[0]: row for row in self.profiler.summary()}
+        self.assertEqual(rows['inner'][1], 2)
+        self.assertIn("items: 6", self.profiler.format_summary())
+
+    def test_pipeline_stages_are_instrumented(self):
+        components = [{'name': "Lens", 'latex': "\\lens", 'params': {'label': "L"}, 'position': (0, 0)}]
+        PROFILER.clear()
+        PROFILER.enable()
+        try:
+            LatexGenerator().generate_latex_code(components)
+        finally:
+            PROFILER.disable()
+        self.assertEqual([row[0] for row in PROFILER.summary()], ["generate_latex_code"])
+        self.assertGreater(PROFILER.counters["latex lines emitted"], 0)
+        PROFILER.clear()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from app.gui.canvas_manager import CanvasManager
+from app.utils import group_ops
+from benchmarks.fake_canvas import FakeCanvas
+from tests.helpers import make_components
+
+class LabelCanvas(FakeCanvas):
+    """Fake canvas recording the texts set on items and the batches of commands."""
+
+    def __init__(self):
+        super().__init__()
+        self.texts = {}
+        self.configure_calls = 0
+
+    def itemconfig(self, tag_or_id, **options):
+        self.configure_calls += 1
+        for item in self._matching(tag_or_id):
+            self.texts[item] = options.get('text')
+
+class TestPropertyEditor(unittest.TestCase):
+    def test_param_table_marks_mixed_values(self):
+        components = make_components(3, shared_params={'label': "Lens", 'focal_length': "50"})
+        components[1]['params'] = {'label': "L2", 'focal_length': "50", 'ratio': "50:50"}
+        table = group_ops.param_table(components, range(3))
+        self.assertEqual(table, [('label', group_ops.MIXED, 3), ('focal_length', "50", 3), ('ratio', "50:50", 1)])
+        self.assertEqual(group_ops.param_table(components, [0]), [('label', "Lens", 1), ('focal_length', "50", 1)])
+        self.assertEqual(group_ops.param_table(components, []), [])
+
+    def test_set_param_replaces_shared_params(self):
+        components = make_components(4, shared_params={'label': "Lens", 'focal_length': "50"})
+        shared = components[0]['params']
+        components[2]['params'] = {'label': "L2"}
+        self.assertEqual(group_ops.set_param(components, [1, 2, 3], 'focal_length', "50"), [2])
+        self.assertEqual(group_ops.set_param(components, [1, 3], 'label', "Relay"), [1, 3])
+        self.assertEqual([component['params']['label'] for component in components], ["Lens", "Relay", "L2", "Relay"])
+        # Components not edited keep the dict they shared
+        self.assertIs(components[0]['params'], shared)
+        self.assertEqual(shared, {'label': "Lens", 'focal_length': "50"})
+
+    def test_selection_edit_is_one_batch(self):
+        canvas = LabelCanvas()
+        components = make_components(500, shared_params={'label': "Lens", 'focal_length': "50"})
+        manager = CanvasManager(canvas, components)
+        manager.redraw_canvas()
+        notified, selections = [], []
+        manager.group_listeners.append(lambda operation, indices: notified.append((operation, indices)))
+        manager.selection_listeners.append(lambda selection: selections.append(set(selection)))
+        manager.set_selection(range(100, 400))
+        self.assertEqual(selections, [set(range(100, 400))])
+
+        changed = manager.set_selection_param('label', "Relay")
+        self.assertEqual(changed, list(range(100, 400)))
+        self.assertEqual(notified, [('set_param', changed)])
+        # One text change for all the labels, and the temporary tag is gone afterwards
+        self.assertEqual(canvas.configure_calls, 1)
+        relabeled = {manager.canvas_objects[index]['text_id'] for index in changed}
+        self.assertEqual(set(canvas.texts), relabeled)
+        self.assertEqual(set(canvas.texts.values()), {"Relay"})
+        self.assertEqual(canvas._matching("relabel"), [])
+
+        # Params that are not drawn change the model only; unchanged values change nothing
+        self.assertEqual(manager.set_selection_param('focal_length', "75"), changed)
+        self.assertEqual(canvas.configure_calls, 1)
+        self.assertEqual(manager.set_selection_param('focal_length', "75"), [])
+        self.assertEqual(len(notified), 2)
+        self.assertEqual(components[0]['params']['focal_length'], "50")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import random
+import unittest
+from app.analysis.reachability import BeamGraphAnalyzer
+from tests.helpers import make_component
+
+def summary(report):
+    return (report.sources, report.detectors, report.reachable, report.cavities,
+            report.orphans, report.unreached)
+
+class TestBeamGraphAnalyzer(unittest.TestCase):
+    def test_ring_cavity_is_a_strongly_connected_component(self):
+        components = [make_component(name) for name in
+                      ("Laser Source", "Mirror", "Mirror", "Mirror", "Photodiode", "Lens")]
+        beams = [{'start': 0, 'end': 1}, {'start': 1, 'end': 2}, {'start': 2, 'end': 3},
+                 {'start': 3, 'end': 1}, {'start': 3, 'end': 4}]
+        report = BeamGraphAnalyzer(components, beams).analyze()
+
+        self.assertEqual(report.cavities, [[1, 2, 3]])
+        self.assertEqual(report.reachable, {0: [4]})
+        self.assertEqual(report.fed_by(4), [0])
+        self.assertEqual(report.orphans, [5])
+        self.assertEqual(report.unreached, [5])
+
+    def test_report_is_cached_per_version(self):
+        components = [make_component("Laser Source"), make_component("Photodiode")]
+        analyzer = BeamGraphAnalyzer(components)
+        report = analyzer.analyze()
+        self.assertIs(analyzer.analyze(), report)
+
+        analyzer.remove_edge(0, 1)
+        updated = analyzer.analyze()
+        self.assertIsNot(updated, report)
+        self.assertEqual(updated.dark_detectors(), [1])
+
+    def test_incremental_updates_match_full_recomputation(self):
+        rng = random.Random(7)
+        names = ["Laser Source", "Mirror", "Lens", "Beam Splitter", "Photodiode"]
+        components = [make_component(rng.choice(names)) for _ in range(60)]
+        beams = []
+        analyzer = BeamGraphAnalyzer(components, beams)
+        for _ in range(600):
+            if beams and rng.random() < 0.3:
+                beams.pop(rng.randrange(len(beams)))
+            else:
+                beams.append({'start': rng.randrange(60), 'end': rng.randrange(60)})
+            analyzer.sync(components, beams)
+            expected = BeamGraphAnalyzer(components, beams).analyze()
+            self.assertEqual(summary(analyzer.analyze()), summary(expected))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+from app.service.render_service import RenderServer, RenderService
+from tests.test_compiler import FakeCompiler
+
+def make_diagram(label="L1"):
+    return {'name': "Test", 'beams': [],
+            'components': [{'name': "Laser", 'latex': "\\laser", 'params': {'label': "Source"}, 'position': [0, 0]},
+                           {'name': "Lens", 'latex': "\\lens", 'params': {'label': label}, 'position': [150, 0]}]}
+
+class TestRenderService(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.service = RenderService(FakeCompiler(work_dir=self.work_dir.name))
+        self.server = RenderServer(("127.0.0.1", 0), self.service)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=10)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        self.work_dir.cleanup()
+
+    def request(self, method, path, body=None):
+        self.connection.request(method, path, body=body)
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_render_then_serve_from_cache(self):
+        body = json.dumps(make_diagram())
+        response, content = self.request("POST", "/render?format=pdf", body)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('X-Cache'), "miss")
+        self.assertIn(b"\\lens[lensradius=1]", content)
+
+        response, cached = self.request("POST", "/render?format=pdf", body)
+        self.assertEqual(response.getheader('X-Cache'), "hit")
+        self.assertEqual(cached, content)
+        key = response.getheader('X-Render-Key')
+        response, by_key = self.request("GET", f"/render/{key}.pdf")
+        self.assertEqual(by_key, content)
+
+    def test_identical_concurrent_requests_render_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.service.render(make_diagram(), 'pdf')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        metrics = self.service.metrics()
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual(metrics['renders'], 1)
+        self.assertEqual(metrics['cache_hits'] + metrics['deduplicated'], 7)
+        self.assertEqual(metrics['requests'], 8)
+
+    def test_failed_cache_write_is_reported(self):
+        os.rmdir(self.service.cache_dir)
+        result = self.service.render(make_diagram(), 'tex', timeout=10)
+        self.assertFalse(result.success)
+        self.assertIn("FileNotFoundError", result.error)
+        self.assertEqual(self.service.metrics()['in_flight'], 0)
+        # Once the cache is writable again the same diagram renders, not waiting on the failed one
+        os.makedirs(self.service.cache_dir)
+        self.assertTrue(self.service.render(make_diagram(), 'tex', timeout=10).success)
+        self.assertEqual(os.listdir(self.service.cache_dir), [result.key + ".tex"])
+
+    def test_errors_are_reported(self):
+        response, _ = self.request("POST", "/render", "{not json")
+        self.assertEqual(response.status, 400)
+        response, _ = self.request("POST", "/render", json.dumps({'components': [{'name': "Lens"}]}))
+        self.assertEqual(response.status, 400)
+        response, content = self.request("POST", "/render", json.dumps(make_diagram("FAIL")))
+        self.assertEqual(response.status, 422)
+        self.assertEqual(json.loads(content)['error'], "! Undefined control sequence.")
+        response, _ = self.request("GET", "/render/0123.pdf")
+        self.assertEqual(response.status, 404)
+
+    def test_malformed_content_length_is_rejected(self):
+        for length in ("twelve", "-1"):
+            connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=10)
+            connection.putrequest("POST", "/render")
+            connection.putheader('Content-Length', length)
+            connection.endheaders()
+            response = connection.getresponse()
+            self.assertEqual(response.status, 400)
+            self.assertEqual(json.loads(response.read())['error'], "Invalid Content-Length")
+            connection.close()
+
+    def test_batch_keeps_every_pdf_until_read(self):
+        self.service.close()
+        compiler = FakeCompiler(work_dir=self.work_dir.name, max_jobs=2)
+        # A window long enough for all requests to land in one batch
+        self.service = RenderService(compiler, batch_window=1.0, batch_size=8, workers=8)
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(self.service.render(make_diagram(f"L{i}"))))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.service.metrics()['batches'], 1)
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual(len({result.content for result in results}), 8)
+        # The shared preamble was dumped once, before the compiles, so none of them waited for it
+        self.assertEqual(len(compiler.dumps()), 1)
+        self.assertEqual([result.timings['format'] for result in compiler.history], [0.0] * 8)
+
+    def test_native_formats_need_no_compiler(self):
+        response, content = self.request("POST", "/render?format=svg", json.dumps(make_diagram()))
+        self.assertEqual(response.getheader('Content-Type'), "image/svg+xml")
+        self.assertTrue(content.startswith(b"<svg") or content.startswith(b"<?xml"))
+        response, content = self.request("POST", "/render?format=png", json.dumps(make_diagram()))
+        self.assertTrue(content.startswith(b"\x89PNG"))
+
+    def test_repeated_requests_are_served_from_cache(self):
+        body = json.dumps(make_diagram())
+        self.request("POST", "/render?format=tex", body)
+        for _ in range(300):
+            response, _ = self.request("POST", "/render?format=tex", body)
+
+        self.assertEqual(response.getheader('X-Cache'), "hit")
+        response, content = self.request("GET", "/metrics")
+        metrics = json.loads(content)
+        # Only the first request rendered; every repeat was answered from the cache
+        self.assertEqual(metrics['renders'], 1)
+        self.assertEqual(metrics['cache_hits'], 300)
+        self.assertEqual(metrics['deduplicated'], 0)
+        self.assertEqual(metrics['requests'], 301)
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertIn('p95', metrics['latency_ms'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from app.models.diagram import Diagram
+from app.models.revision_store import RevisionStore
+from app.utils.file_ops import revisions_path, save_diagram
+
+def make_data(count):
+    """Return diagram file data of a row of lenses with explicit beams."""
+    diagram = Diagram("Row")
+    for i in range(count):
+        diagram.add_component({'name': "Lens", 'latex': "\\lens", 'params': {'label': f"L{i}"},
+                               'position': [i * 100, 0]})
+    diagram.beams = [{'start': i, 'end': i + 1, 'type': 'wide'} for i in range(count - 1)]
+    return diagram.to_dict()
+
+class TestRevisionStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = RevisionStore(os.path.join(self.directory.name, "diagram.json.revisions"))
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_checkout_roundtrip(self):
+        first = make_data(30)
+        second = make_data(31)
+        second['components'][4]['position'] = [7, 8]
+        ids = [self.store.commit(first), self.store.commit(second), self.store.commit(make_data(0))]
+        self.assertEqual(self.store.checkout(ids[0]), first)
+        self.assertEqual(self.store.checkout(ids[1]), second)
+        self.assertEqual(self.store.checkout(ids[2]), make_data(0))
+        with self.assertRaises(KeyError):
+            self.store.checkout(99)
+
+    def test_history(self):
+        first = self.store.commit(make_data(3), "first")
+        second = self.store.commit(make_data(5), "second")
+        history = self.store.history()
+        self.assertEqual([revision.id for revision in history], [second, first])
+        self.assertEqual(history[0].parent, first)
+        self.assertEqual(history[0].component_count, 5)
+        self.assertEqual(history[1].message, "first")
+        self.assertEqual(len(self.store.history(limit=1)), 1)
+
+    def test_identical_revision_adds_no_objects(self):
+        self.store.commit(make_data(200))
+        size = self.store.stored_bytes()
+        self.store.commit(make_data(200))
+        self.assertEqual(self.store.stored_bytes(), size)
+
+    def test_small_edits_cost_little(self):
+        data = make_data(2000)
+        self.store.commit(data)
+        one_copy = len(json.dumps(data))
+        rng = random.Random(1)
+        for revision in range(100):
+            for index in rng.sample(range(len(data['components'])), 2):
+                data['components'][index]['position'] = [rng.randrange(1000), revision]
+            if revision % 10 == 0:
+                data['components'].insert(rng.randrange(len(data['components'])),
+                                          {'name': "Mirror", 'latex': "\\mirror",
+                                           'params': {'label': f"M{revision}"}, 'position': [0, 0]})
+            self.store.commit(data)
+        self.assertEqual(self.store.checkout(self.store.history(limit=1)[0].id), data)
+        self.assertLess(self.store.stored_bytes(), 2 * one_copy)
+
+    def test_failed_commit_stores_nothing(self):
+        self.store.connection.execute("CREATE TRIGGER refuse BEFORE INSERT ON revisions "
+                                      "BEGIN SELECT RAISE(ABORT, 'refused'); END")
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.store.commit(make_data(20))
+        self.assertEqual(self.store.stored_bytes(), 0)
+        # The objects of the rolled back commit are written again by the next one
+        self.store.connection.execute("DROP TRIGGER refuse")
+        revision = self.store.commit(make_data(20))
+        self.assertEqual(self.store.checkout(revision), make_data(20))
+
+    def test_save_keeps_revision(self):
+        path = os.path.join(self.directory.name, "saved.json")
+        revision = save_diagram(make_data(4), path, keep_revision=True)
+        store = RevisionStore(revisions_path(path))
+        try:
+            self.assertEqual(store.checkout(revision), make_data(4))
+        finally:
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
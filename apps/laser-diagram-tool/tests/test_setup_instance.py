@@ -0,0 +1,93 @@
+import unittest
+from app.gui.canvas_manager import CanvasManager
+from app.gui.component_library import ComponentLibrary
+from app.models.diagram import Diagram
+from app.models.setup_instance import SetupDefinition, SetupInstance, flatten
+from app.utils.latex_generator import LatexGenerator
+from benchmarks.fake_canvas import FakeCanvas
+
+class Event:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+class TestSetupInstance(unittest.TestCase):
+    def setUp(self):
+        self.library = ComponentLibrary()
+        self.definition = SetupDefinition.from_library(self.library, "Mach-Zehnder Interferometer")
+        # The library has no plain "Detector" template, so the setup keeps five components
+        self.assertEqual(self.definition.missing_types, ["Detector"])
+
+    def test_definition_owns_its_params(self):
+        library_params = self.library.get_setup_components("Mach-Zehnder Interferometer")[0][0]['params']
+        expanded = SetupInstance(self.definition, (0, 300)).expand()
+        expanded[0]['params']['label'] = "Changed"
+        self.assertEqual(library_params['label'], "Laser")
+        self.assertEqual(self.definition.components[0]['params']['label'], "Laser")
+        self.assertEqual(expanded[1]['position'], (250, 500))
+
+    def test_unknown_setup_raises(self):
+        with self.assertRaises(ValueError):
+            SetupDefinition.from_library(self.library, "Lens")
+
+    def test_latex_defines_each_distinct_setup_once(self):
+        instances = [SetupInstance(self.definition, (0, 300 * i)) for i in range(50)]
+        instances.append(SetupInstance(self.definition, (0, -300), {1: {'label': "PBS"}}))
+        generator = LatexGenerator()
+        latex = generator.generate_latex_code([], instances)
+
+        self.assertEqual(latex.count("\\newcommand"), 2)
+        self.assertEqual(latex.count("\\rput"), 51)
+        self.assertIn("\\rput(0.00,6.00){\\setupA{I1}}", latex)
+        self.assertIn("\\rput(0.00,-6.00){\\setupB{I50}}", latex)
+        self.assertIn("{#1Node0}", latex)
+        self.assertIn("(#1Node1)", latex)
+        self.assertIn("{PBS}", latex)
+        self.assertEqual(len(generator.setup_bodies), 2)
+
+    def test_flatten_expands_instances_after_free_components(self):
+        free = [{'name': "Lens", 'latex': "\\lens", 'params': {'label': "L"}, 'position': (0, 0)},
+                {'name': "Lens", 'latex': "\\lens", 'params': {'label': "L2"}, 'position': (100, 0)}]
+        components, beams = flatten(free, [], [SetupInstance(self.definition, (0, 300))])
+        self.assertEqual(len(components), 7)
+        # The free components keep their default chain, the setup's beams follow it
+        self.assertEqual(beams[0], {'start': 0, 'end': 1, 'type': 'wide'})
+        self.assertEqual(beams[1], {'start': 2, 'end': 3, 'type': 'wide'})
+        self.assertEqual(len(beams), 5)
+        self.assertEqual(flatten(free, [], []), (free, []))
+
+    def test_diagram_round_trip_shares_definitions(self):
+        diagram = Diagram("Setups")
+        diagram.instances = [SetupInstance(self.definition, (0, 300 * i)) for i in range(3)]
+        diagram.instances[2].overrides = {0: {'label': "Seed"}}
+        data = diagram.to_dict()
+        self.assertEqual(list(data['setups']), ["Mach-Zehnder Interferometer"])
+
+        loaded = Diagram.from_dict(data)
+        self.assertEqual(len(loaded.instances), 3)
+        self.assertIs(loaded.instances[0].definition, loaded.instances[1].definition)
+        self.assertEqual(loaded.instances[2].local_components()[0]['params']['label'], "Seed")
+        self.assertEqual(loaded.to_dict(), data)
+        self.assertNotIn('setups', Diagram("Plain").to_dict())
+
+    def test_canvas_draws_and_drags_instances(self):
+        instances = [SetupInstance(self.definition, (0, 300 * i)) for i in range(3)]
+        canvas = FakeCanvas()
+        manager = CanvasManager(canvas, [], [], instances)
+        moved, opened = [], []
+        manager.instance_move_listeners.append(moved.append)
+        manager.instance_open_listeners.append(opened.append)
+        manager.redraw_canvas()
+        self.assertEqual(len(manager.setup_shapes), 1)
+        self.assertEqual(len(manager.instance_objects), 3)
+
+        manager.on_mouse_down(Event(250, 500))
+        manager.on_mouse_drag(Event(270, 540))
+        manager.on_mouse_up(Event(270, 540))
+        self.assertEqual(instances[1].offset, (20, 340))
+        self.assertEqual(moved, [1])
+        manager.on_double_click(Event(270, 540))
+        self.assertEqual(opened, [1])
+
+if __name__ == '__main__':
+    unittest.main()
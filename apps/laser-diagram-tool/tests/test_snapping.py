@@ -0,0 +1,35 @@
+import unittest
+from app.utils.snapping import SnapEngine, SortedCoordinates
+from tests.helpers import make_component
+
+class TestSnapEngine(unittest.TestCase):
+    def test_nearest_coordinate_within_tolerance(self):
+        coords = SortedCoordinates([10, 50, 50, 200])
+        self.assertEqual(coords.nearest(47, 5), 50)
+        self.assertIsNone(coords.nearest(120, 5))
+        coords.remove(50)
+        self.assertEqual(coords.nearest(52, 5), 50)
+
+    def test_snaps_to_aligned_components_then_grid(self):
+        components = [make_component("Lens", position) for position in [(100, 100), (300, 250), (500, 400)]]
+        engine = SnapEngine(grid_size=10, tolerance=8)
+        engine.rebuild(components, [{'start': 0, 'end': 1}])
+
+        # Close to x=300 of component 1; y falls back to the grid
+        self.assertEqual(engine.snap(304, 173), (300, 170, [('x', 300)]))
+
+    def test_dragged_component_does_not_snap_to_itself(self):
+        components = [make_component("Lens", (100, 100)), make_component("Lens", (300, 100))]
+        engine = SnapEngine(grid_size=0, tolerance=8)
+        engine.rebuild(components, [{'start': 0, 'end': 1}])
+
+        engine.begin_drag([1])
+        # The horizontal beam axis y=100 is gone with the dragged endpoint, but component 0 still aligns
+        x, y, guides = engine.snap(303, 104)
+        self.assertEqual((x, y), (303, 100))
+        components[1]['position'] = (303, 100)
+        engine.end_drag([1])
+        self.assertEqual(engine.snap(301, 300)[0], 303)
+
+if __name__ == '__main__':
+    unittest.main()
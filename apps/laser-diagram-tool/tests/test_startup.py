@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+# Modules that must not load before the window appears
+DEFERRED = [
+    'numpy',
+    'app.utils.export',
+    'app.utils.image_export',
+    'app.utils.latex_generator',
+    'app.utils.latex_parser',
+    'app.utils.layout',
+    'app.analysis.collision',
+    'app.analysis.reachability',
+    'app.analysis.tolerance',
+    'app.gui.tolerance_dialog',
+]
+
+# Generous wall-clock budget for importing the application, in seconds
+IMPORT_BUDGET = 0.5
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.gui.application
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))
+"""
+
+class TestStartup(unittest.TestCase):
+    def probe(self):
+        """Import the application in a fresh interpreter and return what it loaded."""
+        env = dict(os.environ, PYTHONPATH=SRC)
+        output = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True,
+                                check=True).stdout
+        return json.loads(output)
+
+    def test_heavy_modules_load_on_first_use(self):
+        loaded = set(self.probe()['modules'])
+        self.assertEqual([module for module in DEFERRED if module in loaded], [])
+
+    def test_import_time_budget(self):
+        # Best of three to keep a busy machine from failing the build
+        seconds = min(self.probe()['seconds'] for _ in range(3))
+        self.assertLess(seconds, IMPORT_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import queue
+import tempfile
+import unittest
+from app.models.diagram import Diagram
+from app.utils.thumbnails import (ThumbnailCache, diagram_thumbnail, entry_key, render_thumbnail,
+                                  thumbnail_path)
+
+LENS = ("Lens", "\\lens[lensradius=1]", {"label": "Lens", "focal_length": "50"})
+
+def write_diagram(path, count, offset=0):
+    """Save a row of lenses to path."""
+    diagram = Diagram("Row")
+    for i in range(count):
+        diagram.add_component({'name': "Lens", 'latex': "\\lens", 'params': {'label': f"L{i}"},
+                               'position': [i * 100 + offset, 0]})
+    diagram.save(path)
+
+class TestThumbnails(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def collect(self, cache, count):
+        """Return {request id: (path, error)} of the next count results."""
+        results = {}
+        while len(results) < count:
+            request_id, path, error = cache.results.get(timeout=60)
+            results[request_id] = (path, error)
+        return results
+
+    def test_render_thumbnail(self):
+        png = render_thumbnail([{'name': "Lens", 'latex': "\\lens", 'params': {'label': "L"},
+                                 'position': (x, 0)} for x in (0, 500, 1000)], [], 48)
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        # Width and height from the IHDR chunk: always the requested square
+        self.assertEqual((int.from_bytes(png[16:20], 'big'), int.from_bytes(png[20:24], 'big')), (48, 48))
+
+    def test_keys_follow_content(self):
+        name, latex, params = LENS
+        key = entry_key(name, latex, params, 32)
+        self.assertEqual(key, entry_key(name, latex, dict(reversed(list(params.items()))), 32))
+        self.assertNotEqual(key, entry_key(name, latex, {**params, "label": "L2"}, 32))
+        self.assertNotEqual(key, entry_key(name, "\\lens[lensradius=2]", params, 32))
+        self.assertNotEqual(key, entry_key(name, latex, params, 64))
+
+        # Diagram thumbnails are keyed by the file's content: a copy reuses one, an edit gets a new one
+        first = os.path.join(self.directory.name, "first.json")
+        copy = os.path.join(self.directory.name, "copy.json")
+        write_diagram(first, 3)
+        write_diagram(copy, 3)
+        path = diagram_thumbnail(self.cache_dir, first, 32)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(diagram_thumbnail(self.cache_dir, copy, 32), path)
+        write_diagram(copy, 3, offset=50)
+        self.assertNotEqual(diagram_thumbnail(self.cache_dir, copy, 32), path)
+
+    def test_cache_renders_in_workers(self):
+        paths = []
+        for i in range(6):
+            paths.append(os.path.join(self.directory.name, f"diagram{i}.json"))
+            write_diagram(paths[-1], i + 1)
+        cache = ThumbnailCache(self.cache_dir, size=32, workers=2)
+        try:
+            for path in paths:
+                cache.request_diagram(path, path)
+            cache.request_entry("lens", *LENS)
+            cache.request_diagram("missing", os.path.join(self.directory.name, "missing.json"))
+            results = self.collect(cache, 8)
+            self.assertIsNotNone(results["missing"][1])
+            for request_id in paths + ["lens"]:
+                path, error = results[request_id]
+                self.assertIsNone(error)
+                self.assertTrue(os.path.exists(path))
+            self.assertEqual(len({results[path][0] for path in paths}), 6)
+            self.assertFalse(cache.has_pending())
+
+            # Cached thumbnails are answered without a worker
+            cache.request_entry("again", *LENS)
+            self.assertEqual(cache.results.get_nowait(), ("again", results["lens"][0], None))
+            cache.request_diagram("again", paths[0])
+            self.assertEqual(cache.results.get_nowait(), ("again", results[paths[0]][0], None))
+        finally:
+            cache.shutdown()
+
+    def test_keep_only_drops_requests(self):
+        cache = ThumbnailCache(self.cache_dir, size=32, workers=1)
+        try:
+            entries = [(f"entry{i}", "Lens", "\\lens", {"label": f"L{i}"}) for i in range(40)]
+            for request_id, name, latex, params in entries:
+                cache.request_entry(request_id, name, latex, params)
+            cache.keep_only({"entry39"})
+            while cache.has_pending():
+                try:
+                    cache.results.get(timeout=60)
+                except queue.Empty:
+                    break
+            # Requests that had not started were cancelled and rendered nothing
+            rendered = [request_id for request_id, name, latex, params in entries
+                        if os.path.exists(thumbnail_path(self.cache_dir, entry_key(name, latex, params, 32)))]
+            self.assertIn("entry39", rendered)
+            self.assertLess(len(rendered), len(entries))
+        finally:
+            cache.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from app.utils.latex_generator import LatexGenerator
+from app.utils.tiling import TiledDiagram, compile_tiled
+from tests.test_compiler import FakeCompiler
+
+def make_row(count, spacing=100):
+    """Return a straight row of lenses spaced in canvas pixels (2 LaTeX units apart)."""
+    return [{'name': "Lens", 'latex': "\\lens", 'params': {'label': f"L{i}"}, 'position': (i * spacing, 0)}
+            for i in range(count)]
+
+class TestTiling(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.compiler = FakeCompiler(work_dir=self.work_dir.name)
+        self.generator = LatexGenerator()
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def test_commands_go_to_the_tiles_they_touch(self):
+        diagram = TiledDiagram.parse(self.generator.generate_latex_code(make_row(28)), tile_size=20)
+        tiles = diagram.occupied_tiles()
+        self.assertEqual(len(tiles), 3)
+
+        first, second = diagram.tile_source(tiles[0]), diagram.tile_source(tiles[1])
+        self.assertIn("\\begin{pspicture*}", first)
+        self.assertIn("{L0}", first)
+        self.assertNotIn("{L0}", second)
+        self.assertNotIn("{Node0}", second)
+        # The beam crossing the first boundary (x = 18) is drawn on both sides
+        self.assertIn("(Node9)(Node10)", first)
+        self.assertIn("(Node9)(Node10)", second)
+        # Style lines without nodes are kept everywhere
+        self.assertIn("\\addtopsstyle{Beam}", second)
+
+    def test_untileable_documents_are_rejected(self):
+        self.assertIsNone(TiledDiagram.parse("\\documentclass{article}\\begin{document}x\\end{document}"))
+        code = self.generator.generate_latex_code(make_row(3)).replace("\\end{pspicture}", "\\end{pspicture}\nText")
+        self.assertIsNone(TiledDiagram.parse(code))
+
+    def test_tiles_are_compiled_and_stitched(self):
+        code = self.generator.generate_latex_code(make_row(28))
+        result = compile_tiled(self.compiler, code, tile_size=20, max_workers=3)
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.mode, 'tiled')
+        self.assertEqual(result.timings['tile_count'], 3)
+        with open(result.pdf_path) as pdf:
+            stitched = pdf.read()
+        self.assertEqual(stitched.count("\\includegraphics"), 3)
+
+        # Moving the last component only recompiles the tiles around it
+        components = make_row(28)
+        components[-1]['position'] = (2750, 0)
+        compile_tiled(self.compiler, self.generator.generate_latex_code(components), tile_size=20)
+        runs = 0
+        for entry in os.scandir(self.work_dir.name):
+            log_path = os.path.join(entry.path, "runs.log")
+            if os.path.exists(log_path):
+                with open(log_path) as log:
+                    runs += log.read().count("run")
+        self.assertEqual(runs, 3 + 1 + 1 + 1)
+
+    def test_small_diagrams_compile_in_one_piece(self):
+        result = compile_tiled(self.compiler, self.generator.generate_latex_code(make_row(3)))
+        self.assertTrue(result.success)
+        self.assertNotEqual(result.mode, 'tiled')
+
+    def test_a_failing_tile_fails_the_compile(self):
+        components = make_row(28)
+        components[25]['params']['label'] = "FAIL"
+        result = compile_tiled(self.compiler, self.generator.generate_latex_code(components), tile_size=20)
+
+        self.assertFalse(result.success)
+        self.assertEqual(result.error_summary(), "! Undefined control sequence.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+from app.analysis.tolerance import ToleranceAnalyzer, ToleranceStats
+
+def make_components():
+    return [
+        {'name': 'Laser Source', 'latex': '', 'params': {'label': 'Laser'}, 'position': (0, 0)},
+        {'name': 'Lens', 'latex': '', 'params': {'label': 'L1', 'focal_length': '50'}, 'position': (250, 0)},
+        {'name': 'Photodiode', 'latex': '', 'params': {'label': 'PD'}, 'position': (750, 0)},
+    ]
+
+class TestToleranceAnalyzer(unittest.TestCase):
+    def test_zero_tolerance_gives_nominal_values(self):
+        analyzer = ToleranceAnalyzer(make_components(), position_sigma=0.0, focal_sigma=0.0, seed=1)
+        stats = analyzer.run(samples=100, batch_size=30, workers=1)
+
+        self.assertEqual(stats.count, 100)
+        total, path, radius = stats.mean
+        # 750 px at 5 px/mm; a collimated 1 mm beam focused by f=50 mm, observed 100 mm later
+        self.assertAlmostEqual(total, 150.0)
+        self.assertAlmostEqual(path, 150.0)
+        self.assertAlmostEqual(radius, 1.0)
+        self.assertTrue(np.allclose(stats.std, 0.0))
+
+    def test_streamed_batches_match_whole_sample(self):
+        values = np.random.default_rng(0).normal(size=(1000, 3))
+        merged = ToleranceStats(["a", "b", "c"])
+        for batch in np.array_split(values, 7):
+            merged.add_batch(batch)
+
+        self.assertTrue(np.allclose(merged.mean, values.mean(axis=0)))
+        self.assertTrue(np.allclose(merged.std, values.std(axis=0, ddof=1)))
+        self.assertTrue(np.allclose(merged.maximum, values.max(axis=0)))
+
+    def test_process_pool_reports_progress(self):
+        analyzer = ToleranceAnalyzer(make_components(), seed=3)
+        progress = []
+        stats = analyzer.run(samples=5000, batch_size=1000, workers=2,
+                             callback=lambda stats, done, total: progress.append(done))
+
+        self.assertEqual(stats.count, 5000)
+        self.assertEqual(progress[-1], 5000)
+        self.assertEqual(len(progress), 5)
+
+if __name__ == '__main__':
+    unittest.main()
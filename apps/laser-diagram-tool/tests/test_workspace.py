@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from app.models.setup_instance import SetupDefinition, SetupInstance
+from app.utils.workspace import BEAM_BYTES, COMPONENT_BYTES, Workspace
+from tests.helpers import make_beams, make_components
+
+class TestWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spilled_diagram_is_restored(self):
+        workspace = Workspace(budget=0, directory=self.directory)
+        definition = SetupDefinition("Relay", make_components(2, prefix="R", ids=True), make_beams(2))
+        instances = [SetupInstance(definition, (0, 0)), SetupInstance(definition, (300, 0), {1: {'label': "X"}})]
+        constraints = [{'kind': 'horizontal', 'components': [0, 1]}]
+        components = make_components(20, ids=True)
+        first = workspace.add("First", "first.json", components, make_beams(20), instances, constraints)
+        workspace.activate(workspace.add("Second"))
+        # Over budget, the inactive diagram is spilled and only its name and path stay
+        document = workspace[first]
+        self.assertFalse(document.resident)
+        self.assertIsNone(document.components)
+        self.assertEqual((document.name, document.path), ("First", "first.json"))
+        self.assertEqual(workspace.find(os.path.abspath("first.json")), first)
+
+        document = workspace.activate(first)
+        self.assertTrue(document.resident)
+        self.assertEqual(document.components, components)
+        self.assertIsInstance(document.components[0]['position'], tuple)
+        self.assertEqual(document.beams, make_beams(20))
+        self.assertEqual(document.constraints, constraints)
+        self.assertEqual([instance.offset for instance in document.instances], [(0, 0), (300, 0)])
+        self.assertIs(document.instances[0].definition, document.instances[1].definition)
+        self.assertEqual(document.instances[1].expand()[1]['params']['label'], "X")
+        # The diagram switched away from was spilled in turn, and nothing else is left on disk
+        self.assertFalse(workspace[1 - first].resident)
+        self.assertEqual(len(os.listdir(workspace.directory)), 1)
+
+    def test_many_diagrams_stay_within_budget(self):
+        size = 400
+        workspace = Workspace(budget=3 * size * (COMPONENT_BYTES + BEAM_BYTES), directory=self.directory)
+        tracemalloc.start()
+        try:
+            for number in range(50):
+                index = workspace.add(f"Diagram {number}", None, make_components(size, ids=True), make_beams(size))
+                workspace.activate(index)
+                self.assertLessEqual(workspace.resident_bytes(), workspace.budget)
+            resident = sum(document.resident for document in workspace)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # The three most recent diagrams stay in memory, the others take a few bytes per component
+        self.assertEqual(resident, 3)
+        self.assertEqual([document.resident for document in workspace][-3:], [True] * 3)
+        self.assertLess(current, 10 * size * COMPONENT_BYTES)
+        self.assertLess(sum(os.path.getsize(document.spill_path) for document in workspace
+                            if not document.resident), 47 * size * 50)
+
+        # Switching back reads a diagram in again and spills the least recently used one
+        workspace.activate(0)
+        self.assertEqual(len(workspace[0].components), size)
+        self.assertFalse(workspace[47].resident)
+
+    def test_close_and_shutdown_delete_spill_files(self):
+        workspace = Workspace(budget=0, directory=self.directory)
+        for number in range(4):
+            workspace.add(f"Diagram {number}", None, make_components(10, ids=True))
+        workspace.activate(3)
+        self.assertEqual(len(os.listdir(workspace.directory)), 3)
+        workspace.close(0)
+        self.assertEqual(workspace.active, 2)
+        self.assertEqual(len(os.listdir(workspace.directory)), 2)
+        workspace.update(0, "Edited", None, make_components(5, ids=True), [], [], [])
+        self.assertTrue(workspace[0].resident)
+        self.assertEqual(len(os.listdir(workspace.directory)), 1)
+        workspace.shutdown()
+        self.assertEqual(os.listdir(self.directory), [])
+
+if __name__ == '__main__':
+    unittest.main()